@@ -0,0 +1,388 @@
+"""
+This module matches large batches of addresses with the adresmatch service
+of the adressenregister.
+
+Inputs are cleaned and normalised first, so `Kerkstr. 12` and
+`kerkstraat  12` are matched once. Results are cached, the matches run with
+a bounded number of parallel requests and come back in the order of the
+input::
+
+    from crabpy.adresmatch import BatchMatcher
+    from crabpy.client import AdressenRegisterClient
+
+    matcher = BatchMatcher(AdressenRegisterClient(url, key), concurrency=8)
+    for result in matcher.match([{"adres": "Kerkstraat 12, 9000 Gent"}]):
+        print(result.score, result.adres_id)
+
+CSV and NDJSON files can be matched from the command line, an interrupted
+run continues where it stopped when it is given the same checkpoint::
+
+    python -m crabpy.adresmatch adressen.csv -o resultaat.csv \\
+        --api-key KEY --checkpoint resultaat.checkpoint
+
+.. versionadded:: 1.9.0
+"""
+
+import argparse
+import contextvars
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from collections import OrderedDict
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.ratelimit import bulk
+from crabpy.text import clean
+from crabpy.text import normalise
+from crabpy.text import parse_address
+
+log = logging.getLogger(__name__)
+
+MATCH_FIELDS = (
+    "gemeentenaam",
+    "niscode",
+    "postcode",
+    "straatnaam",
+    "huisnummer",
+    "busnummer",
+)
+"""
+The fields of an input record that are passed to the adresmatch service.
+"""
+
+RESULT_FIELDS = ("adres_id", "volledig_adres", "score", "matches", "error")
+"""
+The fields a :class:`MatchResult` adds to its input record.
+"""
+
+
+def to_params(record, address_field="adres"):
+    """
+    Get the adresmatch parameters of an input record.
+
+    A record either has some of the :data:`MATCH_FIELDS` or a free text
+    address in `address_field`.
+
+    :param dict record: The input record.
+    :param str address_field: The field with the free text address.
+    :returns: A dict of cleaned parameters, empty when the record holds no
+        address.
+    """
+    params = {
+        field: clean(record[field]) for field in MATCH_FIELDS if record.get(field)
+    }
+    if not params and record.get(address_field):
+        params = parse_address(record[address_field]) or {}
+    return params
+
+
+def query_key(params):
+    """
+    Get the key under which the matches for some parameters are cached.
+    """
+    return tuple(sorted((field, normalise(value)) for field, value in params.items()))
+
+
+class MatchResult:
+    """
+    The outcome of matching one input record.
+
+    :param int index: The position of the record in the input.
+    :param dict record: The input record.
+    :param dict params: The parameters that were sent to the adresmatch
+        service.
+    :param list matches: The `adresMatches` of the response, best first.
+    :param str error: Why the record could not be matched.
+    """
+
+    def __init__(self, index, record, params, matches=(), error=None):
+        self.index = index
+        self.record = record
+        self.params = params
+        self.matches = list(matches)
+        self.error = error
+
+    @property
+    def best(self):
+        """
+        The best match of an adres, `None` when no adres matched.
+
+        Partial matches, of only a gemeente or a straat, have no
+        `identificator` and are skipped.
+        """
+        return next((m for m in self.matches if "identificator" in m), None)
+
+    @property
+    def score(self):
+        return self.best["score"] if self.best else None
+
+    @property
+    def adres_id(self):
+        return self.best["identificator"]["objectId"] if self.best else None
+
+    @property
+    def volledig_adres(self):
+        if self.best is None or "volledigAdres" not in self.best:
+            return None
+        return self.best["volledigAdres"]["geografischeNaam"]["spelling"]
+
+    def to_record(self):
+        """
+        :returns: The input record with the :data:`RESULT_FIELDS` added.
+        """
+        return dict(
+            self.record,
+            adres_id=self.adres_id,
+            volledig_adres=self.volledig_adres,
+            score=self.score,
+            matches=len(self.matches),
+            error=self.error,
+        )
+
+    def __repr__(self):
+        return f"MatchResult({self.index}, adres_id={self.adres_id!r})"
+
+
+class BatchMatcher:
+    """
+    Matches batches of addresses with bounded concurrency.
+
+    Inputs with the same normalised parameters are only sent once, also
+    when they are being matched at the same time. Failed matches are not
+    cached.
+
+    :param client: A :class:`crabpy.client.AdressenRegisterClient`.
+    :param int concurrency: The number of parallel requests.
+    :param int cache_size: The number of normalised queries to remember.
+    :param str address_field: The input field with a free text address.
+    :param int window: How many records may be in flight, defaults to four
+        times the concurrency. Bounds the memory use on large inputs.
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency=8,
+        cache_size=100000,
+        address_field="adres",
+        window=None,
+    ):
+        self.client = client
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self.address_field = address_field
+        self.window = window or 4 * concurrency
+        self.counts = Counter()
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @bulk()
+    def _call(self, key, params):
+        try:
+            matches = self.client.get_adres_match(**params)["adresMatches"]
+        except Exception:
+            with self._lock:
+                self._pending.pop(key, None)
+                self.counts["errors"] += 1
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            self._cache[key] = matches
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return matches
+
+    def _lookup(self, executor, params):
+        key = query_key(params)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.counts["cache_hits"] += 1
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._pending:
+                self.counts["duplicates"] += 1
+                return self._pending[key]
+            self.counts["requests"] += 1
+            future = executor.submit(
+                contextvars.copy_context().run, self._call, key, params
+            )
+            self._pending[key] = future
+            return future
+
+    def match(self, records, start=0):
+        """
+        Match records.
+
+        :param records: An iterable of dicts, read lazily.
+        :param int start: The number of records to skip, eg. the ones
+            already matched before an interruption.
+        :returns: A generator of :class:`MatchResult`, in input order.
+        """
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="crabpy-adresmatch"
+        )
+        window = deque()
+        try:
+            for index, record in enumerate(records):
+                if index < start:
+                    continue
+                params = to_params(record, self.address_field)
+                future = self._lookup(executor, params) if params else None
+                window.append((index, record, params, future))
+                if len(window) >= self.window:
+                    yield self._result(*window.popleft())
+            while window:
+                yield self._result(*window.popleft())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _result(self, index, record, params, future):
+        if future is None:
+            return MatchResult(index, record, params, error="Geen adres gevonden")
+        try:
+            return MatchResult(index, record, params, future.result())
+        except AdressenRegisterClientException as e:
+            cause = e.__cause__ or e
+            return MatchResult(index, record, params, error=str(cause) or repr(e))
+
+
+class Checkpoint:
+    """
+    Remembers how far a batch got, so it can be resumed.
+
+    :param path: The file that keeps the checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        :returns: The number of processed records and the size of the
+            output after them, `(0, 0)` when nothing was processed yet.
+        """
+        if not os.path.exists(self.path):
+            return 0, 0
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data["done"], data["offset"]
+
+    def save(self, done, offset):
+        """
+        Store the progress, atomically.
+
+        :param int done: The number of processed records.
+        :param int offset: The size of the output after these records.
+        """
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"done": done, "offset": offset}, f)
+        os.replace(tmp, self.path)
+
+
+def _format(path, default="csv"):
+    if path is None or path == "-":
+        return default
+    return "ndjson" if path.endswith((".ndjson", ".jsonl", ".json")) else "csv"
+
+
+def read_records(f, fmt):
+    """
+    Read the records of a CSV or NDJSON file one by one.
+
+    :param f: A text file.
+    :param str fmt: `csv` or `ndjson`.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _encode_csv(fieldnames, record):
+    buffer = io.StringIO()
+    csv.DictWriter(buffer, fieldnames, extrasaction="ignore").writerow(record)
+    return buffer.getvalue().encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Match the addresses in a CSV or NDJSON file."
+    )
+    parser.add_argument("input", help="CSV or NDJSON file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="- for stdout")
+    parser.add_argument(
+        "--base-url", default="https://api.basisregisters.vlaanderen.be"
+    )
+    parser.add_argument("--api-key", default=os.environ.get("CRABPY_API_KEY"))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--address-field", default="adres")
+    parser.add_argument("--checkpoint", help="file to resume an interrupted run")
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    args = parser.parse_args(argv)
+    if args.checkpoint and args.output == "-":
+        parser.error("--checkpoint needs an --output file")
+
+    matcher = BatchMatcher(
+        AdressenRegisterClient(args.base_url, args.api_key),
+        concurrency=args.concurrency,
+        address_field=args.address_field,
+    )
+    checkpoint = Checkpoint(args.checkpoint) if args.checkpoint else None
+    done, offset = checkpoint.load() if checkpoint else (0, 0)
+    in_format, out_format = _format(args.input), _format(args.output, "ndjson")
+    if args.input == "-":
+        infile = sys.stdin
+    else:
+        infile = open(args.input, encoding="utf-8-sig", newline="")
+    if args.output == "-":
+        outfile = sys.stdout.buffer
+    else:
+        outfile = open(args.output, "r+b" if offset else "wb")
+        outfile.truncate(offset)
+        outfile.seek(offset)
+    fieldnames = None
+    try:
+        for result in matcher.match(read_records(infile, in_format), start=done):
+            record = result.to_record()
+            if out_format == "ndjson":
+                outfile.write(json.dumps(record).encode("utf-8") + b"\n")
+            else:
+                if fieldnames is None:
+                    fieldnames = list(result.record) + list(RESULT_FIELDS)
+                    if offset == 0:
+                        outfile.write(
+                            _encode_csv(fieldnames, dict(zip(fieldnames, fieldnames)))
+                        )
+                outfile.write(_encode_csv(fieldnames, record))
+            done = result.index + 1
+            if checkpoint and done % args.checkpoint_every == 0:
+                outfile.flush()
+                checkpoint.save(done, outfile.tell())
+        outfile.flush()
+        if checkpoint:
+            checkpoint.save(done, outfile.tell())
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout.buffer:
+            outfile.close()
+    log.info("Matched %d records: %s", done, dict(matcher.counts))
+
+
+if __name__ == "__main__":
+    main()
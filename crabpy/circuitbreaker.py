@@ -0,0 +1,242 @@
+"""
+This module stops calling an upstream service that is down.
+
+Every upstream, the CRAB service and every host of the REST APIs, gets a
+:class:`CircuitBreaker`. After `failure_threshold` failed calls in a row the
+circuit opens: calls fail right away with :class:`CircuitOpenError`, wrapped
+in the usual exception of the gateway, instead of waiting for a timeout.
+Cached gateway methods serve the value they cached before, even when it
+expired. After `reset_timeout` seconds one call is let through to probe the
+service, the circuit closes again when it succeeds.
+
+Changes of state are reported as :data:`crabpy.instrumentation.CIRCUIT`
+spans, :func:`circuit_states` shows the current states::
+
+    from crabpy.circuitbreaker import configure_breakers
+
+    configure_breakers("crab", failure_threshold=3, reset_timeout=60)
+
+.. versionadded:: 1.9.0
+"""
+
+import logging
+import threading
+import time
+
+import requests
+
+from crabpy.instrumentation import CIRCUIT
+from crabpy.instrumentation import Span
+from crabpy.timeouts import DeadlineExceeded
+
+log = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    A call was not sent because the circuit of the upstream is open.
+    """
+
+
+def is_circuit_open(exception):
+    """
+    Check if an exception was caused by an open circuit.
+
+    :param Exception exception: An exception raised by a gateway.
+    :rtype: bool
+    """
+    seen = set()
+    while exception is not None and id(exception) not in seen:
+        if isinstance(exception, CircuitOpenError):
+            return True
+        seen.add(id(exception))
+        exception = exception.__cause__ or exception.__context__
+    return False
+
+
+def is_failure(exception):
+    """
+    Check if an exception means the upstream service failed.
+
+    HTTP errors only count when the status code is 500 or higher, an
+    upstream that answers `404 Not Found` or `429 Too Many Requests` works.
+    A call given up because the deadline of the caller passed does not
+    count either, see :func:`crabpy.timeouts.send`.
+
+    :param Exception exception: The exception raised by a call.
+    :rtype: bool
+    """
+    if isinstance(exception, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    response = getattr(exception, "response", None)
+    if isinstance(exception, requests.HTTPError) and response is not None:
+        return response.status_code >= 500
+    return True
+
+
+def _not_sent(exception):
+    # The call was given up before it reached the upstream, or because the
+    # deadline of the caller ran out, so it tells nothing about its health.
+    return isinstance(exception, (CircuitOpenError, DeadlineExceeded))
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker for one upstream service.
+
+    :param str name: The name of the upstream, used in the spans.
+    :param int failure_threshold: The number of failed calls in a row that
+        opens the circuit.
+    :param float reset_timeout: The seconds the circuit stays open before a
+        call is let through to probe the upstream.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        :data:`CLOSED`, :data:`OPEN` or :data:`HALF_OPEN`.
+        """
+        with self._lock:
+            if self._state == OPEN and self._cooled_down():
+                return HALF_OPEN
+            return self._state
+
+    def _cooled_down(self):
+        return time.monotonic() - self._opened_at >= self.reset_timeout
+
+    def _transition(self, state):
+        previous, self._state = self._state, state
+        return previous
+
+    def _report(self, previous, state):
+        if previous == state:
+            return
+        if state == OPEN:
+            log.warning(
+                "Circuit of %s opened after %d failures", self.name, self.failures
+            )
+        else:
+            log.info("Circuit of %s is %s", self.name, state)
+        with Span(
+            CIRCUIT, self.name, state=state, previous=previous, failures=self.failures
+        ):
+            pass
+
+    def allow(self, stats=None):
+        """
+        Check if a call may be sent.
+
+        :param stats: `Optional.` A :class:`crabpy.stats.Statistics` that
+            counts the `circuit_rejected_requests`.
+        :raises CircuitOpenError: When the circuit is open, or half open
+            while another call probes the upstream.
+        """
+        with self._lock:
+            previous = self._state
+            if self._state == OPEN and self._cooled_down():
+                self._transition(HALF_OPEN)
+            allowed = self._state == CLOSED or (
+                self._state == HALF_OPEN and not self._probing
+            )
+            if allowed and self._state == HALF_OPEN:
+                self._probing = True
+            state = self._state
+        self._report(previous, state)
+        if not allowed:
+            if stats is not None:
+                stats.increment("circuit_rejected_requests")
+            raise CircuitOpenError(f"The circuit of {self.name} is open")
+
+    def record(self, exception=None, is_failure=is_failure):
+        """
+        Record the outcome of a call that was allowed by :meth:`allow`.
+
+        A call that never reached the upstream because the circuit was open,
+        or that was given up because the deadline of the caller passed,
+        leaves the state as it is, but lets another call probe a half open
+        circuit.
+
+        :param Exception exception: The exception raised by the call,
+            `None` when it succeeded.
+        :param is_failure: A function that checks if an exception means the
+            upstream failed.
+        """
+        failed = exception is not None and is_failure(exception)
+        with self._lock:
+            self._probing = False
+            if exception is not None and _not_sent(exception):
+                previous = self._state
+            elif failed:
+                self.failures += 1
+                if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+                    self._opened_at = time.monotonic()
+                    previous = self._transition(OPEN)
+                else:
+                    previous = self._state
+            else:
+                self.failures = 0
+                previous = self._transition(CLOSED)
+            state = self._state
+        self._report(previous, state)
+
+
+_settings = {}
+_breakers = {}
+_lock = threading.Lock()
+
+
+def configure_breakers(api, **settings):
+    """
+    Configure the circuit breakers of an API.
+
+    :param str api: `crab`, `adressenregister` or `capakey`.
+    :param settings: The arguments of :class:`CircuitBreaker`.
+    """
+    with _lock:
+        _settings[api] = settings
+        for key in [key for key in _breakers if key[0] == api]:
+            del _breakers[key]
+
+
+def get_breaker(api, upstream=None):
+    """
+    Get the shared circuit breaker of an upstream.
+
+    :param str api: `crab`, `adressenregister` or `capakey`.
+    :param upstream: `Optional.` The host or url of the upstream, when the
+        API can be reached at several ones.
+    :rtype: CircuitBreaker
+    """
+    with _lock:
+        breaker = _breakers.get((api, upstream))
+        if breaker is None:
+            name = api if upstream is None else f"{api} {upstream}"
+            breaker = _breakers[(api, upstream)] = CircuitBreaker(
+                name, **_settings.get(api, {})
+            )
+        return breaker
+
+
+def circuit_states():
+    """
+    Get the state of every circuit breaker.
+
+    :returns: A dict with the state per breaker name.
+    """
+    with _lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.state for breaker in breakers}
@@ -3,14 +3,36 @@ This module contains utility functions for interacting with AGIV SOAP services.
 
 .. versionadded:: 0.1.0
 """
+
+import contextvars
 import logging
+import time
+from collections import deque
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlparse
 
 import requests
 from requests import RequestException
-from suds.client import Client
+
+from crabpy.instrumentation import REQUEST
+from crabpy.instrumentation import Span
+from crabpy.ratelimit import get_limiter
+from crabpy.ratelimit import in_bulk
+from crabpy.ratelimit import limited
+from crabpy.singleflight import SingleFlight
+from crabpy.singleflight import freeze
+from crabpy.stats import endpoint_name
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import send
 
 log = logging.getLogger(__name__)
 
+MAX_PAGE_SIZE = 500
+"""
+The largest page the lists of the adressenregister return.
+"""
+
 
 def crab_factory(**kwargs):
     """
@@ -24,6 +46,8 @@ def crab_factory(**kwargs):
         to the underlying :class:`suds.client.Client`
     :rtype: :class:`suds.client.Client`
     """
+    from suds.client import Client
+
     if "wsdl" in kwargs:
         wsdl = kwargs["wsdl"]
         del kwargs["wsdl"]
@@ -53,77 +77,295 @@ class AdressenRegisterClientException(Exception):
 
 
 class AdressenRegisterClient:
-    def __init__(self, base_url, api_key):
+    """
+    A client for the REST api of the adressenregister.
+
+    :param str base_url: The url of the api.
+    :param str api_key: The api key.
+    :param hedging: `Optional.` A :class:`crabpy.timeouts.Hedging` policy
+        for slow requests.
+    :param limiter: `Optional.` A :class:`crabpy.ratelimit.Limiter`. By
+        default only the requests inside :func:`crabpy.ratelimit.bulk` go
+        through the shared limiter of the api key.
+    :param int page_size: The number of objects asked for per page of a list,
+        defaults to :data:`MAX_PAGE_SIZE`.
+    :param int page_concurrency: The number of pages of a list fetched in
+        parallel. Once the first page links to the next one, the following
+        pages are fetched ahead by their offset, so a long list takes about
+        `page_concurrency` times less round trips. A few requests are wasted
+        on the pages after the last one.
+
+    The list methods take `fields` to only keep those keys of the objects,
+    which saves memory when only a few are needed.
+
+    All requests respect the current :func:`crabpy.timeouts.deadline` and
+    fail fast while the :mod:`circuit <crabpy.circuitbreaker>` of the host is
+    open.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        api_key,
+        hedging=None,
+        limiter=None,
+        page_size=MAX_PAGE_SIZE,
+        page_concurrency=1,
+    ):
         super().__init__()
+        self.api_key = api_key
         self.session = requests.Session()
         self.v1_header = {"Accept": "application/json", "x-api-key": api_key}
         self.v2_header = {"Accept": "application/ld+json", "x-api-key": api_key}
         self.base_url = base_url[:-1] if base_url.endswith("/") else base_url
+        self.stats = None
+        self.hedging = hedging
+        self._limiter = limiter
+        self.page_size = page_size
+        self.page_concurrency = page_concurrency
+        self._flight = SingleFlight()
+
+    @property
+    def limiter(self):
+        """
+        The :class:`crabpy.ratelimit.Limiter` the current requests go
+        through, `None` when they are not limited.
+        """
+        if self._limiter is not None:
+            return self._limiter
+        if in_bulk():
+            return get_limiter("adressenregister", self.api_key)
+        return None
+
+    def _request(self, url, span, params=None, headers=None, key=None, fields=None):
+        """
+        Get a url and decode the json response.
+
+        With a `key`, the response is a list page. Only the `fields` of the
+        items in the array under the `key` are kept when they are given.
+
+        The page and the number of bytes are added to the span. When
+        :attr:`stats` is set, the call is recorded in it. The outcome is
+        recorded in the circuit breaker of the host.
+        """
+        from crabpy.circuitbreaker import get_breaker
 
-    def _get_list(self, url, response_key, params=None):
+        breaker = get_breaker("adressenregister", urlparse(url).netloc)
+        breaker.allow(self.stats)
+        start = time.perf_counter()
+        nbytes = 0
+        error = None
+        limiter = self.limiter
+
+        def get(url, **kwargs):
+            # Hedged duplicates take a slot of the limiter as well.
+            return limited(limiter, lambda: self.session.get(url, **kwargs), self.stats)
+
+        try:
+            response = send(
+                get,
+                url,
+                self.hedging,
+                self.stats,
+                params=params,
+                headers=headers or (self.v2_header if "v2" in url else self.v1_header),
+            )
+            span.increment("pages")
+            span.set(status_code=response.status_code)
+            nbytes = len(response.content)
+            span.increment("bytes", nbytes)
+            response.raise_for_status()
+            page = response.json()
+            if key is not None and fields is not None:
+                page[key] = [
+                    {field: item[field] for field in fields if field in item}
+                    for item in page[key]
+                ]
+            return page
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            breaker.record(error)
+            if self.stats is not None:
+                self.stats.record_upstream(
+                    endpoint_name(url),
+                    time.perf_counter() - start,
+                    nbytes=nbytes,
+                    error=error is not None,
+                )
+
+    def _get_list(self, url, response_key, params=None, fields=None):
+        """
+        Get all pages of a list.
+
+        :param fields: `Optional.` Only keep these keys of the objects.
+        """
         if params is None:
             params = {}
         if "limit" not in params:
-            params["limit"] = 500
-        result = []
-        response = {"volgende": f"{self.base_url}{url}"}
+            params["limit"] = self.page_size
+        if fields is not None:
+            fields = tuple(fields)
         try:
-            while "volgende" in response:
-                url = response["volgende"]
-                # Originele params komen mee in de volgende url vanaf 2de request
-                if "?" in url:
-                    params = None
-                response = self.session.get(
-                    url,
-                    params=params,
-                    headers=self.v2_header if "v2" in url else self.v1_header,
+            return self._flight.do(
+                ("list", url, response_key, freeze(params), fields),
+                lambda: self._fetch_list(url, response_key, params, fields),
+                self.stats,
+            )
+        except DeadlineExceeded as e:
+            raise AdressenRegisterClientException from e
+
+    def _fetch_list(self, url, response_key, params, fields=None):
+        url = f"{self.base_url}{url}"
+        span = Span(
+            REQUEST,
+            endpoint_name(url),
+            gateway="adressenregister",
+            url=url,
+            params=dict(params),
+        )
+        try:
+            with span:
+                response = self._request(
+                    url, span, params=params, key=response_key, fields=fields
                 )
-                response.raise_for_status()
-                response = response.json()
-                result.extend(response[response_key])
+                result = response[response_key]
+                if "volgende" in response:
+                    # Originele params komen mee in de volgende url vanaf 2de request
+                    if self.page_concurrency > 1:
+                        get_pages = self._fetch_pages
+                    else:
+                        get_pages = self._follow_pages
+                    pages = get_pages(response["volgende"], span, response_key, fields)
+                    for page in pages:
+                        result.extend(page[response_key])
         except RequestException as e:
             raise AdressenRegisterClientException from e
         return result
 
-    def _get(self, url, params=None):
+    def _follow_pages(self, url, span, key, fields=None):
+        """
+        Get the pages of a list one by one, following the `volgende` links.
+        """
+        while url is not None:
+            page = self._request(url, span, key=key, fields=fields)
+            yield page
+            url = page.get("volgende")
+
+    def _fetch_pages(self, url, span, key, fields=None):
+        """
+        Get the pages of a list from `url` on, :attr:`page_concurrency` at a
+        time.
+
+        The `volgende` links carry the `offset` and `limit` of the next page,
+        so the urls of the pages after it are known up front. They are
+        fetched ahead in a window and yielded in order, until a page does not
+        link to a next one. The page size is taken from the link, it is the
+        size the endpoint actually returns.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        base, _, query = url.partition("?")
+        params = dict(parse_qsl(query))
+        if "offset" not in params or "limit" not in params:
+            yield from self._follow_pages(url, span, key, fields)
+            return
+        offset, limit = int(params["offset"]), int(params["limit"])
+        executor = ThreadPoolExecutor(
+            max_workers=self.page_concurrency, thread_name_prefix="crabpy-pages"
+        )
+        window = deque()
         try:
-            response = self.session.get(
-                f"{self.base_url}{url}",
-                params=params,
-                headers=self.v2_header if "v2" in url else self.v1_header,
+            while True:
+                while len(window) < self.page_concurrency:
+                    params["offset"] = offset
+                    offset += limit
+                    window.append(
+                        executor.submit(
+                            # Every page runs in a copy of the context, so it
+                            # respects the current deadline.
+                            contextvars.copy_context().run,
+                            self._page,
+                            f"{base}?{urlencode(params)}",
+                            key,
+                            fields,
+                        )
+                    )
+                page, page_span = window.popleft().result()
+                span.increment("pages")
+                span.increment("bytes", page_span.attributes["bytes"])
+                span.set(status_code=page_span.attributes["status_code"])
+                yield page
+                if "volgende" not in page:
+                    return
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _page(self, url, key, fields):
+        # The span only collects the attributes of the page, it is merged
+        # into the span of the list in order.
+        span = Span(REQUEST, endpoint_name(url))
+        return self._request(url, span, key=key, fields=fields), span
+
+    def _get(self, url, params=None, headers=None):
+        """
+        Get a single json document.
+
+        Concurrent calls for the same url, params and headers share one
+        request.
+        """
+        url = f"{self.base_url}{url}"
+        try:
+            return self._flight.do(
+                ("get", url, freeze(params), freeze(headers)),
+                lambda: self._fetch(url, params, headers),
+                self.stats,
             )
-            response.raise_for_status()
-            return response.json()
+        except DeadlineExceeded as e:
+            raise AdressenRegisterClientException from e
+
+    def _fetch(self, url, params=None, headers=None):
+        span = Span(
+            REQUEST,
+            endpoint_name(url),
+            gateway="adressenregister",
+            url=url,
+            params=params,
+        )
+        try:
+            with span:
+                return self._request(url, span, params=params, headers=headers)
         except RequestException as e:
             raise AdressenRegisterClientException from e
 
     def get_gemeente(self, gemeente_id):
         return self._get(f"/v2/gemeenten/{gemeente_id}")
 
-    def get_gemeenten(self, gemeentenaam=None, status=None):
+    def get_gemeenten(self, gemeentenaam=None, status=None, fields=None):
         params = {}
         if gemeentenaam is not None:
             params["gemeentenaam"] = gemeentenaam
         if status is not None:
             params["status"] = status
-        return self._get_list("/v2/gemeenten", "gemeenten", params=params)
+        return self._get_list("/v2/gemeenten", "gemeenten", params, fields)
 
     def get_postinfo(self, postinfo_id):
         return self._get(f"/v2/postinfo/{postinfo_id}")
 
-    def get_postinfos(self, gemeentenaam=None, postnaam=None):
+    def get_postinfos(self, gemeentenaam=None, postnaam=None, fields=None):
         params = {}
         if gemeentenaam is not None:
             params["gemeentenaam"] = gemeentenaam
         if postnaam is not None:
             params["postnaam"] = postnaam
-        return self._get_list("/v2/postinfo", "postInfoObjecten", params=params)
+        return self._get_list("/v2/postinfo", "postInfoObjecten", params, fields)
 
     def get_straatnaam(self, straatnaam_id):
         return self._get(f"/v2/straatnamen/{straatnaam_id}")
 
     def get_straatnamen(
-        self, straatnaam=None, gemeentenaam=None, niscode=None, status=None
+        self, straatnaam=None, gemeentenaam=None, niscode=None, status=None, fields=None
     ):
         params = {}
         if straatnaam is not None:
@@ -134,7 +376,7 @@ class AdressenRegisterClient:
             params["nisCode"] = niscode
         if status is not None:
             params["status"] = status
-        return self._get_list("/v2/straatnamen", "straatnamen", params=params)
+        return self._get_list("/v2/straatnamen", "straatnamen", params, fields)
 
     def get_adres_match(
         self,
@@ -183,6 +425,7 @@ class AdressenRegisterClient:
         niscode=None,
         status=None,
         straatnaamObjectId=None,
+        fields=None,
     ):
         params = {}
         if gemeentenaam is not None:
@@ -203,24 +446,44 @@ class AdressenRegisterClient:
             params["status"] = status
         if straatnaamObjectId is not None:
             params["straatnaamObjectId"] = straatnaamObjectId
-        return self._get_list("/v2/adressen", "adressen", params=params)
+        return self._get_list("/v2/adressen", "adressen", params, fields)
 
     def get_perceel(self, perceel_id):
         return self._get(f"/v2/percelen/{perceel_id}")
 
-    def get_percelen(self, status=None, adresObjectId=None):
+    def get_percelen(self, status=None, adresObjectId=None, fields=None):
         params = {}
         if status is not None:
             params["status"] = status
         if adresObjectId is not None:
             params["adresObjectId"] = adresObjectId
-        return self._get_list("/v2/percelen", "percelen", params=params)
+        return self._get_list("/v2/percelen", "percelen", params, fields)
 
     def get_gebouw(self, gebouw_id):
         return self._get(f"/v2/gebouwen/{gebouw_id}")
 
-    def get_gebouwen(self, status=None):
+    def get_gebouwen(self, status=None, fields=None):
         params = {}
         if status is not None:
             params["status"] = status
-        return self._get_list("/v2/gebouwen", "gebouwen", params=params)
+        return self._get_list("/v2/gebouwen", "gebouwen", params, fields)
+
+    def get_wijzigingen(self, collection, page=1, page_size=None):
+        """
+        Get a page of the change feed of a collection.
+
+        :param str collection: `adressen`, `straatnamen`, `percelen` or
+            `gebouwen`.
+        :param int page: The page of the feed, starting at 1.
+        :param int page_size: `Optional.` The number of events on a page,
+            the server decides when it is not given.
+        :returns: A list of CloudEvents, oldest first.
+        """
+        params = {"page": page}
+        if page_size is not None:
+            params["pageSize"] = page_size
+        return self._get(
+            f"/v2/{collection}/wijzigingen",
+            params=params,
+            headers=dict(self.v2_header, Accept="application/cloudevents-batch+json"),
+        )
@@ -0,0 +1,348 @@
+"""
+This module exports percelen and gebouwen with their geometry.
+
+:func:`export_percelen` writes every perceel of some secties or kadastrale
+afdelingen of the capakey service, :func:`export_gebouwen` writes gebouwen
+of the adressenregister by id. The features are fetched with `concurrency`
+parallel requests and written to a binary file as they come in, as a GeoJSON
+`FeatureCollection` or as newline delimited GeoJSON features::
+
+    from crabpy.export import NDJSON
+    from crabpy.export import export_percelen
+    from crabpy.gateway.capakey import CapakeyRestGateway
+
+    gateway = CapakeyRestGateway()
+    with open("percelen.ndjson", "ab") as out:
+        export_percelen(
+            gateway, out, afdelingen=[44021], format=NDJSON,
+            checkpoint="percelen.checkpoint",
+        )
+
+With a `checkpoint`, the progress is saved when the file is started and
+after every sectie or batch of gebouwen. When the export is interrupted,
+running it again with the same file and checkpoint continues where it
+stopped. The checkpoint is removed when the export is complete.
+
+.. versionadded:: 1.9.0
+"""
+
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway.cache import is_not_found
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from crabpy.ratelimit import bulk
+
+log = logging.getLogger(__name__)
+
+GEOJSON = "geojson"
+"""
+A GeoJSON `FeatureCollection`.
+"""
+
+NDJSON = "ndjson"
+"""
+One GeoJSON `Feature` per line.
+"""
+
+BATCH_SIZE = 500
+"""
+The number of gebouwen exported between two checkpoints.
+"""
+
+CRS = {"type": "name", "properties": {"name": "urn:ogc:def:crs:EPSG::31370"}}
+"""
+The coordinate reference system of the features, Belgian Lambert 72.
+"""
+
+
+class _FeatureWriter:
+    """
+    Writes features to a binary file in one of the formats.
+    """
+
+    def __init__(self, out, format, features=0):
+        self.out = out
+        self.format = format
+        self.features = features
+
+    def start(self):
+        if self.format == GEOJSON:
+            self.out.write(
+                b'{"type": "FeatureCollection", "crs": '
+                + json.dumps(CRS).encode()
+                + b', "features": [\n'
+            )
+
+    def write(self, feature):
+        data = json.dumps(feature, ensure_ascii=False).encode("utf-8")
+        if self.format == GEOJSON:
+            self.out.write(b",\n" + data if self.features else data)
+        else:
+            self.out.write(data + b"\n")
+        self.features += 1
+
+    def finish(self):
+        if self.format == GEOJSON:
+            self.out.write(b"\n]}\n")
+
+
+def _load_checkpoint(path):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path, state):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temporary, path)
+
+
+@bulk()
+def _export(units, fetch, out, format, checkpoint, concurrency):
+    """
+    Write the features of units of work, saving a checkpoint after each.
+
+    :param units: `(key, items)` tuples, `items` is a function that returns
+        what is passed to `fetch`, it is not called for units that were
+        exported before.
+    :param fetch: A function that gets the feature of an item, or `None`
+        when the item does not exist.
+    :returns: The number of features in the export.
+    """
+    if format not in (GEOJSON, NDJSON):
+        raise ValueError(f"Unknown format {format}, use {GEOJSON} or {NDJSON}")
+    state = _load_checkpoint(checkpoint)
+    if state is None:
+        writer = _FeatureWriter(out, format)
+        writer.start()
+        out.flush()
+        done = []
+        if checkpoint is not None:
+            # Without this an export interrupted in its first unit would be
+            # resumed from scratch, after the features it already wrote.
+            _save_checkpoint(
+                checkpoint,
+                {"format": format, "done": done, "offset": out.tell(), "features": 0},
+            )
+    else:
+        if state["format"] != format:
+            raise ValueError(f"The checkpoint is of a {state['format']} export")
+        if out.seek(0, os.SEEK_END) < state["offset"]:
+            raise ValueError(
+                "The file is shorter than the checkpoint, it must be opened "
+                "without truncating it, eg. with mode 'r+b'"
+            )
+        out.seek(state["offset"])
+        out.truncate()
+        writer = _FeatureWriter(out, format, state["features"])
+        done = state["done"]
+        log.info("Resuming export after %d features", writer.features)
+    exported = set(done)
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="crabpy-export") as pool:
+        for key, items in units:
+            if key in exported:
+                continue
+            for feature in pool.map(
+                lambda item: context.copy().run(fetch, item), items()
+            ):
+                if feature is not None:
+                    writer.write(feature)
+            out.flush()
+            done.append(key)
+            if checkpoint is not None:
+                _save_checkpoint(
+                    checkpoint,
+                    {
+                        "format": format,
+                        "done": done,
+                        "offset": out.tell(),
+                        "features": writer.features,
+                    },
+                )
+            log.debug("Exported %s, %d features", key, writer.features)
+    writer.finish()
+    out.flush()
+    if checkpoint is not None and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return writer.features
+
+
+def _geometry(geometry):
+    """
+    A GeoJSON geometry without the crs, which is the same for all features.
+    """
+    return {key: value for key, value in geometry.items() if key != "crs"}
+
+
+def perceel_feature(perceel):
+    """
+    Build the GeoJSON feature of a perceel of the capakey service.
+
+    :param perceel: A :class:`crabpy.gateway.capakey.Perceel` with a shape.
+    :rtype: dict
+    """
+    return {
+        "type": "Feature",
+        "id": perceel.capakey,
+        "geometry": _geometry(json.loads(perceel.shape)) if perceel.shape else None,
+        "properties": {
+            "capakey": perceel.capakey,
+            "percid": perceel.percid,
+            "afdeling": perceel.sectie.afdeling.id,
+            "sectie": perceel.sectie.id,
+            "perceelnummer": perceel.id,
+            "adressen": perceel.adres or [],
+        },
+    }
+
+
+def _gml_polygon(gml):
+    rings = []
+    for element in ElementTree.fromstring(gml).iter():
+        if element.tag.rpartition("}")[2] not in ("exterior", "interior"):
+            continue
+        pos_list = next(e for e in element.iter() if e.tag.endswith("posList"))
+        values = [float(value) for value in pos_list.text.split()]
+        rings.append([values[i : i + 2] for i in range(0, len(values), 2)])
+    return {"type": "Polygon", "coordinates": rings}
+
+
+def gebouw_feature(gebouw):
+    """
+    Build the GeoJSON feature of a gebouw of the adressenregister.
+
+    The polygon of a gebouw is given as GeoJSON or as GML.
+
+    :param gebouw: A :class:`crabpy.gateway.adressenregister.Gebouw` or a
+        :class:`crabpy.gateway.adressenregister.Record` with an `id`, a
+        `uri`, a `status` and the `geojson`.
+    :rtype: dict
+    """
+    polygon = (gebouw.geojson or {}).get("polygon")
+    if polygon is None:
+        geometry = None
+    elif "gml" in polygon:
+        geometry = _gml_polygon(polygon["gml"])
+    else:
+        geometry = _geometry(polygon)
+    return {
+        "type": "Feature",
+        "id": gebouw.id,
+        "geometry": geometry,
+        "properties": {"id": gebouw.id, "uri": gebouw.uri, "status": gebouw.status},
+    }
+
+
+def export_percelen(
+    gateway,
+    out,
+    secties=(),
+    afdelingen=(),
+    format=GEOJSON,
+    checkpoint=None,
+    concurrency=8,
+):
+    """
+    Export the percelen of secties and kadastrale afdelingen.
+
+    The capakeys of a sectie are listed first, then the percelen are fetched
+    with their geometry. Percelen that disappear in the meantime are left
+    out, other errors stop the export.
+
+    :param gateway: A :class:`crabpy.gateway.capakey.CapakeyRestGateway`.
+    :param out: A binary file to write to. To resume an export it must be
+        opened without truncating it, eg. with mode `ab` or `r+b`.
+    :param secties: The :class:`crabpy.gateway.capakey.Sectie` objects to
+        export.
+    :param afdelingen: The :class:`crabpy.gateway.capakey.Afdeling` objects,
+        or their ids, of which every sectie is exported.
+    :param str format: :data:`GEOJSON` or :data:`NDJSON`.
+    :param str checkpoint: `Optional.` The path of the checkpoint file.
+    :param int concurrency: The number of parallel requests.
+    :returns: The number of exported percelen.
+    """
+
+    def capakeys(sectie):
+        return gateway.list_percelen_by_sectie(sectie, as_table=True)["capakey"]
+
+    def units():
+        all_secties = itertools.chain(
+            secties,
+            itertools.chain.from_iterable(
+                gateway.list_secties_by_afdeling(afdeling) for afdeling in afdelingen
+            ),
+        )
+        for sectie in all_secties:
+            key = f"{sectie.afdeling.id}{sectie.id}"
+            yield key, functools.partial(capakeys, sectie)
+
+    def fetch(capakey):
+        try:
+            return perceel_feature(gateway.get_perceel_by_capakey(capakey))
+        except GatewayResourceNotFoundException as e:
+            # The capakey gateway raises this for every HTTP error.
+            if not is_not_found(e):
+                raise
+            log.warning("Perceel %s disappeared while exporting", capakey)
+            return None
+
+    return _export(units(), fetch, out, format, checkpoint, concurrency)
+
+
+def export_gebouwen(
+    gateway,
+    out,
+    gebouw_ids,
+    format=GEOJSON,
+    checkpoint=None,
+    concurrency=8,
+    batch_size=BATCH_SIZE,
+):
+    """
+    Export gebouwen of the adressenregister.
+
+    Gebouwen that do not exist are left out.
+
+    :param gateway: A :class:`crabpy.gateway.adressenregister.Gateway`.
+    :param out: A binary file to write to. To resume an export it must be
+        opened without truncating it, eg. with mode `ab` or `r+b`.
+    :param gebouw_ids: An iterable of the ids of the gebouwen, in the same
+        order when an export is resumed.
+    :param str format: :data:`GEOJSON` or :data:`NDJSON`.
+    :param str checkpoint: `Optional.` The path of the checkpoint file.
+    :param int concurrency: The number of parallel requests.
+    :param int batch_size: The number of gebouwen between two checkpoints.
+    :returns: The number of exported gebouwen.
+    """
+    fields = ("id", "uri", "status", "geojson")
+
+    def units():
+        ids = iter(gebouw_ids)
+        while True:
+            batch = [str(gebouw_id) for gebouw_id in itertools.islice(ids, batch_size)]
+            if not batch:
+                return
+            yield f"{batch[0]}..{batch[-1]}", functools.partial(iter, batch)
+
+    def fetch(gebouw_id):
+        try:
+            return gebouw_feature(gateway.get_gebouw_by_id(gebouw_id, fields=fields))
+        except (AdressenRegisterClientException, GatewayResourceNotFoundException) as e:
+            if not is_not_found(e):
+                raise
+            log.warning("Gebouw %s does not exist", gebouw_id)
+            return None
+
+    return _export(units(), fetch, out, format, checkpoint, concurrency)
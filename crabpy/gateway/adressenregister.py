@@ -4,20 +4,99 @@ This module contains an opionated gateway for the adressen register.
 .. versionadded:: 0.14.0
 """
 
+import functools
+import inspect
+import itertools
 import json
 import logging
 import os
+import threading
+import time
+import types
 
-from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
 from dogpile.util import compat
 
 from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway.cache import GatewayCacheRegion
+from crabpy.gateway.cache import configure_not_found_region
+from crabpy.gateway.cache import gateway_stats
+from crabpy.gateway.cache import negative_cache
+from crabpy.gateway.cache import recording
+from crabpy.instrumentation import lazy_load
+from crabpy.stats import Statistics
 
 LOG = logging.getLogger(__name__)
 AUTO = object()
 
-LONG_CACHE = make_region()
-SHORT_CACHE = make_region()
+ADRES_FILTERS = ("huisnummer", "busnummer", "status")
+"""
+The parameters of `list_adressen_with_params` that can be applied locally to
+the cached `adressen` of a straat.
+"""
+
+
+def canonical_key_generator(namespace, fn, to_str=str):
+    """
+    A `function_key_generator` that gives every logical request one key.
+
+    The default `function_key_generator` from dogpile uses `str()` on every
+    positional argument and refuses keyword arguments. This means a call with
+    a :class:`Gemeente` and a call with the niscode of that same gemeente end
+    up in different cache entries, and so do calls that do or don't pass a
+    default value explicitly.
+
+    This generator binds the arguments to the signature of the cached
+    function, fills in the defaults and reduces every :class:`GatewayObject`
+    to its identifier before building the key.
+    """
+    if namespace is None:
+        namespace = f"{fn.__module__}:{fn.__name__}"
+    else:
+        namespace = f"{fn.__module__}:{fn.__name__}|{namespace}"
+
+    signature = inspect.signature(fn)
+    has_self = next(iter(signature.parameters), None) in ("self", "cls")
+
+    def generate_key(*args, **kw):
+        bound = signature.bind(*args, **kw)
+        bound.apply_defaults()
+        values = list(bound.arguments.values())
+        if has_self:
+            values = values[1:]
+        return (
+            namespace
+            + "|"
+            + " ".join(to_str(canonical_argument(value)) for value in values)
+        )
+
+    return generate_key
+
+
+def canonical_argument(value):
+    """
+    Reduce a :class:`GatewayObject` to the identifier it is looked up by.
+
+    Lists, eg. of `fields`, become tuples. Any other value is returned
+    unchanged.
+    """
+    if isinstance(value, GatewayObject):
+        return getattr(value, value.key_attribute)
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+LONG_CACHE = GatewayCacheRegion(
+    name="long", function_key_generator=canonical_key_generator
+)
+SHORT_CACHE = GatewayCacheRegion(
+    name="short", function_key_generator=canonical_key_generator
+)
+NOT_FOUND_CACHE = GatewayCacheRegion(
+    name="notfound", function_key_generator=canonical_key_generator
+)
 
 
 def setup_cache(cache_settings, gateway):
@@ -26,11 +105,17 @@ def setup_cache(cache_settings, gateway):
             LONG_CACHE.configure("dogpile.cache.null")
         if not SHORT_CACHE.is_configured:
             SHORT_CACHE.configure("dogpile.cache.null")
+        if not NOT_FOUND_CACHE.is_configured:
+            NOT_FOUND_CACHE.configure("dogpile.cache.null")
     else:
         cache_settings["long.replace_existing_backend"] = True
         LONG_CACHE.configure_from_config(cache_settings, "long.")
         cache_settings["short.replace_existing_backend"] = True
         SHORT_CACHE.configure_from_config(cache_settings, "short.")
+        configure_not_found_region(
+            NOT_FOUND_CACHE,
+            {"notfound.backend": "dogpile.cache.null", **cache_settings},
+        )
 
     original_serializer = LONG_CACHE.serializer
     original_deserializer = LONG_CACHE.deserializer
@@ -122,6 +207,35 @@ def cache_on_attribute(attribute):
     return function_key_generator
 
 
+def cache_not_found(function_key_generator=canonical_key_generator):
+    """
+    Remembers lookups of resources that don't exist in `NOT_FOUND_CACHE`.
+
+    A lookup that failed because the resource does not exist raises an
+    :class:`AdressenRegisterClientException` again, without calling the
+    adressenregister, until the key expires from the `notfound` region.
+    This decorator should be placed above the `cache_on_arguments`
+    decorator so known missing resources skip the regular regions as well.
+    """
+
+    def decorator(fn):
+        generate_key = function_key_generator(None, fn)
+
+        @functools.wraps(fn)
+        def wrapper(obj, *args, **kwargs):
+            with recording(gateway_stats(obj)):
+                return negative_cache(
+                    NOT_FOUND_CACHE,
+                    generate_key(obj, *args, **kwargs),
+                    functools.partial(fn, obj, *args, **kwargs),
+                    exception=AdressenRegisterClientException,
+                )()
+
+        return wrapper
+
+    return decorator
+
+
 class LazyProperty:
     """
     A lazy property is a cached_property which can also be set a value.
@@ -138,22 +252,34 @@ class LazyProperty:
         self.cache_name = f"_cache_{self.method.__name__}"
 
     def __get__(self, instance, owner):
+        if instance is None:
+            return self
         try:
             return getattr(instance, self.cache_name)
         except AttributeError:
-            value = self.method(instance)
+            with lazy_load(instance, self.method.__name__):
+                value = self.method(instance)
             setattr(instance, self.cache_name, value)
             return value
 
     def __set__(self, instance, value):
         setattr(instance, self.cache_name, value)
 
+    def peek(self, instance, default=None):
+        """
+        Get the value of an instance when it was accessed or given before,
+        without running the code inside.
+        """
+        return getattr(instance, self.cache_name, default)
+
 
 class Gateway:
     """A gateway to the adressen register."""
 
     def __init__(self, client: AdressenRegisterClient, cache_settings=None):
         self.client = client
+        self.stats = Statistics("adressenregister")
+        self.client.stats = self.stats
 
         def deelgemeente_from_json_data(data):
             return Deelgemeente(
@@ -201,6 +327,9 @@ class Gateway:
             self.gemeenten = [gemeente_from_json_data(data) for data in json.load(f)]
 
         setup_cache(cache_settings, self)
+        self.search_index_max_age = 3600
+        self._straat_indexes = {}
+        self._search_lock = threading.Lock()
 
     def list_gewesten(self):
         return self.gewesten
@@ -326,15 +455,47 @@ class Gateway:
         return next(
             (
                 gemeente
-                for gemeente in self.gemeenten
-                if any(
-                    n["naam"] == naam and n["taal"] in talen
-                    for n in gemeente.namen
-                )
+                for taal, gemeente in self._gemeenten_by_naam.get(naam, ())
+                if taal in talen
             ),
             None,
         )
 
+    @functools.cached_property
+    def _gemeenten_by_naam(self):
+        index = {}
+        for gemeente in self.gemeenten:
+            for naam in gemeente.namen:
+                index.setdefault(naam["naam"], []).append((naam["taal"], gemeente))
+        return index
+
+    @functools.cached_property
+    def gemeente_index(self):
+        """
+        The :class:`crabpy.search.GemeenteIndex` over the gemeenten and
+        deelgemeenten.
+        """
+        from crabpy.search import GemeenteIndex
+
+        return GemeenteIndex(self.gemeenten, self.deelgemeenten)
+
+    def find_gemeenten(self, naam, limit=5, min_score=0.6):
+        """
+        Find `gemeenten` and `deelgemeenten` by a name as a user typed it.
+
+        Case, accents, hyphens and the language of the name don't matter,
+        small typos are tolerated.
+
+        :param string naam: The name.
+        :param int limit: The maximum number of candidates.
+        :param float min_score: The lowest accepted similarity, between 0
+            and 1.
+        :rtype: A :class:`list` of :class:`crabpy.search.Candidate` with a
+            :class:`Gemeente` or :class:`Deelgemeente` as `item`, best
+            match first.
+        """
+        return self.gemeente_index.find(naam, limit=limit, min_score=min_score)
+
     @LONG_CACHE.cache_on_arguments()
     def get_postinfo_by_gemeentenaam(self, gemeente_naam):
         """
@@ -348,6 +509,7 @@ class Gateway:
             for postinfo in self.client.get_postinfos(gemeentenaam=gemeente_naam)
         ]
 
+    @cache_not_found()
     @LONG_CACHE.cache_on_arguments()
     def get_postinfo_by_id(self, postcode):
         """
@@ -411,19 +573,70 @@ class Gateway:
             None,
         )
 
+    def _project(self, cls, fields, get_list, **params):
+        """
+        List objects as :class:`Record` with only the `fields`.
+
+        Only the members of the json the fields are read from are kept by
+        the client.
+        """
+        project = cls.projector(fields)
+        return [project(item) for item in get_list(fields=project.keys, **params)]
+
+    def _tabulate(self, cls, fields, get_list, **params):
+        """
+        List objects as a :class:`crabpy.tables.Table`, with a column per
+        field or per field of :attr:`GatewayObject.column_types`.
+        """
+        from crabpy.tables import Table
+
+        schema = cls.table_schema(fields)
+        return Table(schema, get_list(fields=schema.keys, **params))
+
     @LONG_CACHE.cache_on_arguments()
-    def list_straten(self, gemeente, include_homoniem=False, status=None):
+    def list_straten(
+        self,
+        gemeente,
+        include_homoniem=False,
+        status=None,
+        fields=None,
+        as_table=False,
+    ):
         """
         List all `straten` in a `Gemeente`.
 
         :param gemeente: The :class:`Gemeente` for which the \
             `straten` are wanted.
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields of every straat, see :attr:`Straat.projections`.
+        :param bool as_table: Return a :class:`crabpy.tables.Table` with a
+            column per field, see :attr:`Straat.column_types`.
         :rtype: A :class:`list` of :class:`Straat`
         """
         if not isinstance(gemeente, Gemeente):
             gemeente = self.get_gemeente_by_niscode(gemeente)
         if gemeente is None:
+            if as_table:
+                from crabpy.tables import Table
+
+                return Table(Straat.table_schema(fields))
             return []
+        if as_table:
+            return self._tabulate(
+                Straat,
+                fields,
+                self.client.get_straatnamen,
+                niscode=gemeente.niscode,
+                status=status,
+            )
+        if fields is not None:
+            return self._project(
+                Straat,
+                fields,
+                self.client.get_straatnamen,
+                niscode=gemeente.niscode,
+                status=status,
+            )
         return [
             Straat.from_list_response(straat, self, include_homoniem)
             for straat in self.client.get_straatnamen(
@@ -431,40 +644,93 @@ class Gateway:
             )
         ]
 
+    def search_straten(self, gemeente, prefix, limit=10):
+        """
+        Search the `straten` of a `Gemeente` as the user types.
+
+        Matches the start of the name or of any word in it, in all known
+        languages and with or without the homoniem, ignoring case and
+        accents. When fewer names start with the prefix, similar names are
+        added. The index of a gemeente is built from :meth:`list_straten`
+        and refreshed after `search_index_max_age` seconds.
+
+        :param gemeente: The :class:`Gemeente` or its niscode.
+        :param str prefix: What the user typed so far.
+        :param int limit: The maximum number of results.
+        :rtype: A :class:`list` of :class:`crabpy.search.Candidate` with a
+            :class:`Straat` as `item`, best match first.
+        """
+        from crabpy.search import StraatIndex
+
+        if not isinstance(gemeente, Gemeente):
+            gemeente = self.get_gemeente_by_niscode(gemeente)
+        if gemeente is None:
+            return []
+        with self._search_lock:
+            index = self._straat_indexes.setdefault(gemeente.niscode, StraatIndex())
+        if (
+            index.updated_at is None
+            or time.monotonic() - index.updated_at > self.search_index_max_age
+        ):
+            index.update(self.list_straten(gemeente))
+        return index.search(prefix, limit)
+
+    @cache_not_found()
     @LONG_CACHE.cache_on_arguments()
-    def get_straat_by_id(self, straat_id):
+    def get_straat_by_id(self, straat_id, fields=None):
         """
         Retrieve a `straat` by the Id.
 
         :param string straat_id: The id of the `straat`.
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields, see :attr:`Straat.projections`.
         :rtype: :class:`Straat`
         """
+        if fields is not None:
+            return Straat.projector(fields)(self.client.get_straatnaam(straat_id))
         return Straat.from_get_response(self.client.get_straatnaam(straat_id), self)
 
     @SHORT_CACHE.cache_on_arguments()
-    def list_adressen_by_straat(self, straat):
+    def list_adressen_by_straat(self, straat, fields=None, as_table=False):
         """
         List all `adressen` in a `Straat`.
 
         :param straat: The :class:`Straat` for which the \
             `adressen` are wanted.
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields of every adres, see :attr:`Adres.projections`.
+        :param bool as_table: Return a :class:`crabpy.tables.Table` with a
+            column per field, see :attr:`Adres.column_types`.
         :rtype: A :class:`list` of :class:`Adres`
         """
         if not isinstance(straat, Straat):
             straat = self.get_straat_by_id(straat)
+        if as_table:
+            return self._tabulate(
+                Adres, fields, self.client.get_adressen, straatnaamObjectId=straat.id
+            )
+        if fields is not None:
+            return self._project(
+                Adres, fields, self.client.get_adressen, straatnaamObjectId=straat.id
+            )
         return [
             Adres.from_list_response(adres, self)
             for adres in self.client.get_adressen(straatnaamObjectId=straat.id)
         ]
 
+    @cache_not_found()
     @LONG_CACHE.cache_on_arguments()
-    def get_adres_by_id(self, adres_id):
+    def get_adres_by_id(self, adres_id, fields=None):
         """
         Retrieve a `adres` by the Id.
 
         :param string adres_id: The id of the `adres`.
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields, see :attr:`Adres.projections`.
         :rtype: :class:`Adres`
         """
+        if fields is not None:
+            return Adres.projector(fields)(self.client.get_adres(adres_id))
         return Adres.from_get_response(self.client.get_adres(adres_id), self)
 
     @SHORT_CACHE.cache_on_arguments()
@@ -479,6 +745,8 @@ class Gateway:
         niscode=None,
         status=None,
         straatnaamObjectId=None,
+        fields=None,
+        as_table=False,
     ):
         """
         List all `adressen` with the given parameters.
@@ -492,32 +760,116 @@ class Gateway:
         :param niscode: string
         :param status: string
         :param straatnaamObjectId: string
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields of every adres, see :attr:`Adres.projections`.
+        :param bool as_table: Return a :class:`crabpy.tables.Table` with a
+            column per field, see :attr:`Adres.column_types`.
         :return: :rtype: Adres
+
+        A query for a straat that only filters on :data:`ADRES_FILTERS` is
+        answered from the cache when the `adressen` of the straat, or a query
+        with fewer of these filters, are cached already. These queries are
+        counted as `subsumed_queries` in :attr:`stats`.
         """
+        params = dict(
+            gemeentenaam=gemeentenaam,
+            postcode=postcode,
+            straatnaam=straatnaam,
+            homoniem_toevoeging=homoniem_toevoeging,
+            huisnummer=huisnummer,
+            busnummer=busnummer,
+            niscode=niscode,
+            status=status,
+            straatnaamObjectId=straatnaamObjectId,
+        )
+        if as_table:
+            return self._tabulate(Adres, fields, self.client.get_adressen, **params)
+        if fields is not None:
+            return self._project(Adres, fields, self.client.get_adressen, **params)
+        if straatnaamObjectId is not None and not any(
+            (gemeentenaam, postcode, straatnaam, homoniem_toevoeging, niscode)
+        ):
+            filters = {
+                name: value
+                for name, value in (
+                    ("huisnummer", huisnummer),
+                    ("busnummer", busnummer),
+                    ("status", status),
+                )
+                if value is not None
+            }
+            adressen = self._filter_cached_adressen(straatnaamObjectId, filters)
+            if adressen is not None:
+                self.stats.increment("subsumed_queries")
+                return adressen
         return [
             Adres.from_list_response(adres, self)
-            for adres in self.client.get_adressen(
-                gemeentenaam=gemeentenaam,
-                postcode=postcode,
-                straatnaam=straatnaam,
-                homoniem_toevoeging=homoniem_toevoeging,
-                huisnummer=huisnummer,
-                busnummer=busnummer,
-                niscode=niscode,
-                status=status,
-                straatnaamObjectId=straatnaamObjectId,
-            )
+            for adres in self.client.get_adressen(**params)
         ]
 
+    def _filter_cached_adressen(self, straat_id, filters):
+        """
+        Filter the cached `adressen` of a query that returns a superset.
+
+        :returns: A :class:`list` of :class:`Adres`, `None` when no superset
+            is cached.
+        """
+        gateway_type = type(self)
+        supersets = [lambda: gateway_type.list_adressen_by_straat.get(self, straat_id)]
+        for size in range(len(filters) - 1, -1, -1):
+            for names in itertools.combinations(filters, size):
+                supersets.append(
+                    functools.partial(
+                        gateway_type.list_adressen_with_params.get,
+                        self,
+                        straatnaamObjectId=straat_id,
+                        **{name: filters[name] for name in names},
+                    )
+                )
+        for superset in supersets:
+            adressen = superset()
+            if adressen is not NO_VALUE:
+                return [
+                    adres
+                    for adres in adressen
+                    if all(
+                        str(getattr(adres, name) or "") == str(value)
+                        for name, value in filters.items()
+                    )
+                ]
+        return None
+
     @SHORT_CACHE.cache_on_arguments()
-    def list_percelen_with_params(self, status=None, adresObjectId=None):
+    def list_percelen_with_params(
+        self, status=None, adresObjectId=None, fields=None, as_table=False
+    ):
         """
         List all `percelen` with the given parameters.
 
         :param status: str
         :param adresOjbectId: str
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields of every perceel, see :attr:`Perceel.projections`.
+        :param bool as_table: Return a :class:`crabpy.tables.Table` with a
+            column per field, see :attr:`Perceel.column_types`.
         :return: :rtype:
         """
+        if as_table:
+            return self._tabulate(
+                Perceel,
+                fields,
+                self.client.get_percelen,
+                status=status,
+                adresObjectId=adresObjectId,
+            )
+        if fields is not None:
+            return self._project(
+                Perceel,
+                fields,
+                self.client.get_percelen,
+                status=status,
+                adresObjectId=adresObjectId,
+            )
 
         return [
             Perceel.from_list_response(perceel, self)
@@ -539,24 +891,34 @@ class Gateway:
             perceel = self.get_perceel_by_id(perceel)
         return perceel.adressen
 
+    @cache_not_found()
     @SHORT_CACHE.cache_on_arguments()
-    def get_perceel_by_id(self, perceel_id):
+    def get_perceel_by_id(self, perceel_id, fields=None):
         """
         Retrieve a `Perceel` by the Id.
 
         :param string perceel_id: the Id of the `Perceel`
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields, see :attr:`Perceel.projections`.
         :rtype: :class:`Perceel`
         """
+        if fields is not None:
+            return Perceel.projector(fields)(self.client.get_perceel(perceel_id))
         return Perceel.from_get_response(self.client.get_perceel(perceel_id), self)
 
+    @cache_not_found()
     @SHORT_CACHE.cache_on_arguments()
-    def get_gebouw_by_id(self, gebouw_id):
+    def get_gebouw_by_id(self, gebouw_id, fields=None):
         """
         Retrieve a `Gebouw` by the Id.
 
         :param str gebouw_id: the Id of the `Gebouw`
+        :param fields: `Optional.` Return a :class:`Record` with only these
+            fields, see :attr:`Gebouw.projections`.
         :rtype: :class:`Gebouw`
         """
+        if fields is not None:
+            return Gebouw.projector(fields)(self.client.get_gebouw(gebouw_id))
         return Gebouw.from_get_response(self.client.get_gebouw(gebouw_id), self)
 
 
@@ -568,10 +930,137 @@ class CallableString:
         return self.s
 
 
+class Record(types.SimpleNamespace):
+    """
+    A projection of a :class:`GatewayObject` on some of its fields.
+
+    Records are returned by the gateway methods that take `fields`. They only
+    hold those fields as attributes, eg. `record.label`, and have no link to
+    the gateway.
+    """
+
+
+class _Member:
+    """
+    A projection that reads the value at a path in a member of the json.
+
+    Integers in the path index a list, eg. the coordinates of a point.
+    """
+
+    def __init__(self, key, *path, default=None):
+        self.keys = (key,)
+        self.path = path
+        self.default = default
+
+    def __call__(self, source):
+        value = source.get(self.keys[0])
+        for step in self.path:
+            if value is None:
+                break
+            value = value[step] if isinstance(step, int) else value.get(step)
+        return self.default if value is None else value
+
+
+class _Spelling:
+    """
+    A projection of a name, from a list response or a get response.
+
+    A list response has a `geografischeNaam` under `list_key`, a get response
+    has the names in all languages under `get_key`.
+    """
+
+    def __init__(self, list_key, get_key, taal="nl"):
+        self.keys = (list_key, get_key)
+        self.taal = taal
+
+    def __call__(self, source):
+        list_key, get_key = self.keys
+        if source.get(list_key):
+            return source[list_key]["geografischeNaam"]["spelling"]
+        namen = source.get(get_key)
+        if not namen:
+            return None
+        spelling = next((n["spelling"] for n in namen if n["taal"] == self.taal), None)
+        return spelling or namen[0]["spelling"]
+
+
 class GatewayObject:
+    key_attribute = "id"
+    """
+    The attribute that identifies this object in cache keys.
+    """
+
+    projections = {}
+    """
+    The fields the object can be projected on, with the function that reads
+    each one from the json of the object. See :meth:`projector`.
+    """
+
+    column_types = {}
+    """
+    The fields that are columns of :meth:`table_schema`, with their type,
+    :data:`crabpy.tables.STRING`, :data:`~crabpy.tables.CATEGORY` or
+    :data:`~crabpy.tables.FLOAT64`.
+    """
+
     def __init__(self, gateway):
         self.gateway: Gateway = gateway
 
+    @classmethod
+    def table_schema(cls, fields=None):
+        """
+        Get the columns of a table of these objects.
+
+        :param fields: `Optional.` The names of the columns, all fields of
+            :attr:`column_types` by default.
+        :raises ValueError: When a field can't be a column, or no fields
+            are given.
+        :rtype: :class:`crabpy.tables.Schema`
+        """
+        if fields is None:
+            fields = cls.column_types
+        if not fields:
+            raise ValueError("A table needs at least one column")
+        unknown = [field for field in fields if field not in cls.column_types]
+        if unknown:
+            raise ValueError(
+                f"{cls.__name__} has no columns {', '.join(unknown)}, "
+                f"use {', '.join(cls.column_types)}"
+            )
+        from crabpy.tables import Column
+        from crabpy.tables import Schema
+
+        return Schema(
+            Column(field, cls.column_types[field], cls.projections[field])
+            for field in fields
+        )
+
+    @classmethod
+    def projector(cls, fields):
+        """
+        Get a function that builds a :class:`Record` from the json of an
+        object, with only the given fields.
+
+        The `keys` attribute of the function are the members of the json it
+        needs, they can be passed as `fields` to the client.
+
+        :param fields: The names of the fields, eg. `("id", "label")`.
+        :raises ValueError: When a field can't be projected on.
+        """
+        unknown = [field for field in fields if field not in cls.projections]
+        if unknown:
+            raise ValueError(
+                f"{cls.__name__} has no fields {', '.join(unknown)}, "
+                f"use {', '.join(cls.projections)}"
+            )
+        getters = [(field, cls.projections[field]) for field in fields]
+
+        def project(source):
+            return Record(**{field: get(source) for field, get in getters})
+
+        project.keys = tuple(dict.fromkeys(k for _, get in getters for k in get.keys))
+        return project
+
 
 class Gewest(GatewayObject):
     """
@@ -581,6 +1070,8 @@ class Gewest(GatewayObject):
     of the country.
     """
 
+    key_attribute = "niscode"
+
     def __init__(self, id_, niscode, naam, centroid, bounding_box, gateway=None):
         super().__init__(gateway=gateway)
         self.id = int(id_)
@@ -614,6 +1105,8 @@ class Provincie(GatewayObject):
     .. versionadded:: 0.4.0
     """
 
+    key_attribute = "niscode"
+
     def __init__(self, niscode, naam, gewest_niscode, gateway):
         super().__init__(gateway)
         self.niscode = niscode
@@ -636,6 +1129,8 @@ class Gemeente(GatewayObject):
     The smallest administrative unit in Belgium.
     """
 
+    key_attribute = "niscode"
+
     def __init__(
         self,
         niscode,
@@ -722,6 +1217,22 @@ class Straat(GatewayObject):
     A street object is always located in one and exactly one :class:`Gemeente`.
     """
 
+    projections = {
+        "id": _Member("identificator", "objectId"),
+        "uri": _Member("identificator", "id"),
+        "naam": _Spelling("straatnaam", "straatnamen"),
+        "homoniem": _Spelling("homoniemToevoeging", "homoniemToevoegingen"),
+        "status": _Member("straatnaamStatus"),
+    }
+
+    column_types = {
+        "id": "string",
+        "uri": "string",
+        "naam": "string",
+        "homoniem": "string",
+        "status": "category",
+    }
+
     def __init__(
         self,
         id_,
@@ -776,6 +1287,17 @@ class Straat(GatewayObject):
         res._source_json = straat
         return res
 
+    def loaded_namen(self):
+        """
+        Get the names of the straat in every language, when it was loaded
+        completely, without loading it.
+
+        :rtype: A :class:`list` of names, empty when the straat was not
+            loaded.
+        """
+        source = Straat._source_json.peek(self, {})
+        return [naam["spelling"] for naam in source.get("straatnamen", [])]
+
     def naam(self, taal="nl", include_homoniem=False):
         naam = next(
             (
@@ -832,6 +1354,7 @@ class Straat(GatewayObject):
         return self.gateway.list_adressen_by_straat(self)
 
     @LazyProperty
+    @cache_not_found(cache_on_attribute("id"))
     @SHORT_CACHE.cache_on_arguments(function_key_generator=cache_on_attribute("id"))
     def _source_json(self):
         return self.gateway.client.get_straatnaam(self.id)
@@ -850,6 +1373,28 @@ class Adres(GatewayObject):
     An address object is always located in one and exactly one :class:`Gemeente`.
     """
 
+    projections = {
+        "id": _Member("identificator", "objectId"),
+        "uri": _Member("identificator", "id"),
+        "label": _Member("volledigAdres", "geografischeNaam", "spelling"),
+        "huisnummer": _Member("huisnummer"),
+        "busnummer": _Member("busnummer", default=""),
+        "status": _Member("adresStatus"),
+        "x": _Member("adresPositie", "point", "coordinates", 0),
+        "y": _Member("adresPositie", "point", "coordinates", 1),
+    }
+
+    column_types = {
+        "id": "string",
+        "uri": "string",
+        "label": "string",
+        "huisnummer": "string",
+        "busnummer": "string",
+        "status": "category",
+        "x": "float64",
+        "y": "float64",
+    }
+
     def __init__(
         self,
         id_,
@@ -952,6 +1497,7 @@ class Adres(GatewayObject):
         return self.gateway.get_gemeente_by_niscode(gemeente_niscode)
 
     @LazyProperty
+    @cache_not_found(cache_on_attribute("id"))
     @SHORT_CACHE.cache_on_arguments(function_key_generator=cache_on_attribute("id"))
     def _source_json(self):
         return self.gateway.client.get_adres(self.id)
@@ -966,6 +1512,14 @@ class Adres(GatewayObject):
 class Perceel(GatewayObject):
     """A cadastral Parcel."""
 
+    projections = {
+        "id": _Member("identificator", "objectId"),
+        "uri": _Member("identificator", "id"),
+        "status": _Member("perceelStatus"),
+    }
+
+    column_types = {"id": "string", "uri": "string", "status": "category"}
+
     def __init__(self, id_, gateway, status=AUTO, uri=AUTO):
         super().__init__(gateway=gateway)
         self.id = id_
@@ -993,6 +1547,7 @@ class Perceel(GatewayObject):
         return res
 
     @LazyProperty
+    @cache_not_found(cache_on_attribute("id"))
     @SHORT_CACHE.cache_on_arguments(function_key_generator=cache_on_attribute("id"))
     def _source_json(self):
         return self.gateway.client.get_perceel(self.id)
@@ -1024,6 +1579,13 @@ class Gebouw(GatewayObject):
     A building.
     """
 
+    projections = {
+        "id": _Member("identificator", "objectId"),
+        "uri": _Member("identificator", "id"),
+        "status": _Member("gebouwStatus"),
+        "geojson": _Member("geometriePolygoon"),
+    }
+
     def __init__(
         self, id_, gateway, status=AUTO, percelen=AUTO, geojson=AUTO, uri=AUTO
     ):
@@ -1064,6 +1626,7 @@ class Gebouw(GatewayObject):
         return self._source_json["geometriePolygoon"]
 
     @LazyProperty
+    @cache_not_found(cache_on_attribute("id"))
     @SHORT_CACHE.cache_on_arguments(function_key_generator=cache_on_attribute("id"))
     def _source_json(self):
         return self.gateway.client.get_gebouw(self.id)
@@ -1138,6 +1701,7 @@ class Postinfo(GatewayObject):
             ]
 
     @LazyProperty
+    @cache_not_found(cache_on_attribute("id"))
     @SHORT_CACHE.cache_on_arguments(function_key_generator=cache_on_attribute("id"))
     def _source_json(self):
         return self.gateway.client.get_postinfo(self.id)
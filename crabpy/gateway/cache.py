@@ -0,0 +1,267 @@
+"""
+This module contains caching utilities shared by the gateways.
+
+.. versionadded:: 1.9.0
+"""
+
+import contextvars
+import functools
+import logging
+from contextlib import contextmanager
+
+from dogpile.cache.api import NO_VALUE
+from dogpile.cache.backends.null import NullBackend
+from dogpile.cache.region import CacheRegion
+
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from crabpy.instrumentation import CACHE
+from crabpy.instrumentation import Span
+from crabpy.stats import method_name
+
+
+log = logging.getLogger(__name__)
+
+NOT_FOUND_STATUS_CODES = (400, 404, 410)
+"""
+HTTP status codes that mean the requested resource does not exist (anymore).
+"""
+
+NOT_FOUND_EXPIRATION_TIME = 300
+"""
+Expiration time used for the `notfound` region when none was configured.
+
+Not-found results should only be remembered briefly, a resource that does not
+exist yet might be created in the meantime.
+"""
+
+NOT_FOUND_KEY_PREFIX = "notfound|"
+"""
+Prefix of the keys in the `notfound` region.
+
+The regions of a gateway may share one backend, eg. one Redis server. The
+prefix keeps a not-found marker from being read as the cached value of the
+same lookup.
+"""
+
+
+_recording = contextvars.ContextVar("crabpy_cache_stats", default=None)
+
+
+@contextmanager
+def recording(stats):
+    """
+    Record the cache lookups made in this context in `stats`.
+
+    A region can be shared by several gateways, the lookups are recorded in
+    the statistics of the gateway that made them instead of in the
+    :attr:`GatewayCacheRegion.stats` of the region.
+
+    :param stats: A :class:`crabpy.stats.Statistics`, `None` to record in
+        the statistics of the regions.
+    """
+    token = _recording.set(stats)
+    try:
+        yield
+    finally:
+        _recording.reset(token)
+
+
+def gateway_stats(obj):
+    """
+    Get the statistics of a gateway, or of the gateway of a gateway object.
+
+    :returns: A :class:`crabpy.stats.Statistics`, or `None`.
+    """
+    stats = getattr(obj, "stats", None)
+    if stats is None:
+        stats = getattr(getattr(obj, "gateway", None), "stats", None)
+    return stats
+
+
+class GatewayCacheRegion(CacheRegion):
+    """
+    A dogpile cache region that records its hits and misses.
+
+    Every call to :meth:`get_or_create`, which is also used by
+    `cache_on_arguments`, is recorded in the statistics of the calling
+    gateway under the name of the region and the gateway method derived
+    from the key. Methods decorated with :meth:`cache_on_arguments` record
+    in the statistics of their gateway, other lookups in the statistics passed
+    to :func:`recording`, or else in :attr:`stats`.
+
+    While the circuit of the upstream is open, an expired value is served
+    instead of raising, see :mod:`crabpy.circuitbreaker`.
+    """
+
+    stats = None
+    """
+    The :class:`crabpy.stats.Statistics` to record in when the calling
+    gateway is not known, or `None`.
+    """
+
+    def _stats(self):
+        stats = _recording.get()
+        return self.stats if stats is None else stats
+
+    def record(self, key, hit):
+        """
+        Record a lookup of a key in this region.
+
+        :param key: The cache key that was looked up.
+        :param bool hit: Whether the value was found.
+        """
+        stats = self._stats()
+        if stats is not None:
+            stats.record_cache(self.name, method_name(key), hit)
+
+    def cache_on_arguments(self, *args, **kwargs):
+        """
+        Like :meth:`dogpile.cache.region.CacheRegion.cache_on_arguments`, for
+        methods of a gateway or of a gateway object. The lookups are recorded
+        in the statistics of that gateway, see :func:`gateway_stats`.
+        """
+        decorator = super().cache_on_arguments(*args, **kwargs)
+
+        def decorate(fn):
+            cached = decorator(fn)
+
+            @functools.wraps(cached)
+            def wrapper(obj, *args, **kwargs):
+                with recording(gateway_stats(obj)):
+                    return cached(obj, *args, **kwargs)
+
+            return wrapper
+
+        return decorate
+
+    def get_or_create(
+        self,
+        key,
+        creator,
+        expiration_time=None,
+        should_cache_fn=None,
+        creator_args=None,
+    ):
+        created = False
+
+        def recording_creator(*args, **kwargs):
+            nonlocal created
+            created = True
+            return creator(*args, **kwargs)
+
+        with Span(CACHE, method_name(key), region=self.name, key=key) as span:
+            try:
+                return super().get_or_create(
+                    key,
+                    recording_creator,
+                    expiration_time,
+                    should_cache_fn,
+                    creator_args,
+                )
+            except Exception as e:
+                from crabpy.circuitbreaker import is_circuit_open
+
+                if not is_circuit_open(e):
+                    raise
+                value = self.get(key, ignore_expiration=True)
+                if value is NO_VALUE:
+                    raise
+                log.debug("Serving stale value for %s", key)
+                span.set(stale=True)
+                stats = self._stats()
+                if stats is not None:
+                    stats.increment("stale_values_served")
+                return value
+            finally:
+                span.set(hit=not created)
+                self.record(key, hit=not created)
+
+
+def is_not_found(exception):
+    """
+    Check if an exception means the requested resource does not exist.
+
+    Exceptions caused by an HTTP error are only considered a not-found when
+    the status code is one of :data:`NOT_FOUND_STATUS_CODES`, so server
+    errors and throttling are never remembered as a missing resource.
+
+    :param Exception exception: The exception raised by a lookup.
+    :rtype: bool
+    """
+    response = getattr(exception.__cause__, "response", None)
+    if response is not None:
+        return response.status_code in NOT_FOUND_STATUS_CODES
+    return isinstance(exception, GatewayResourceNotFoundException)
+
+
+def _is_null(region):
+    # ``region.actual_backend`` is cached and goes stale when the region is
+    # configured again with ``replace_existing_backend``.
+    backend = region.backend
+    while hasattr(backend, "proxied"):
+        backend = backend.proxied
+    return isinstance(backend, NullBackend)
+
+
+def configure_not_found_region(region, cache_config, prefix="notfound."):
+    """
+    Configure a region for negative caching from a dogpile config dictionary.
+
+    The region is only configured when a `backend` was passed for it. When no
+    `expiration_time` was passed, :data:`NOT_FOUND_EXPIRATION_TIME` is used.
+
+    :param region: A :class:`dogpile.cache.region.CacheRegion`.
+    :param dict cache_config: The dogpile configuration dictionary.
+    :param str prefix: The prefix of the region settings.
+    """
+    if f"{prefix}backend" not in cache_config:
+        return
+    settings = {
+        f"{prefix}expiration_time": NOT_FOUND_EXPIRATION_TIME,
+        f"{prefix}replace_existing_backend": True,
+    }
+    settings.update(cache_config)
+    region.configure_from_config(settings, prefix)
+
+
+def negative_cache(region, key, creator, exception=GatewayResourceNotFoundException):
+    """
+    Wrap a creator so a not-found result is remembered in a region.
+
+    When the key is known to be missing, the wrapped creator raises
+    `exception` without calling the creator. The marker is stored under the
+    key prefixed with :data:`NOT_FOUND_KEY_PREFIX`. When the creator raises an
+    exception that :func:`is_not_found`, the key is remembered before the
+    exception is reraised. A region that is not configured, or configured
+    with the null backend, disables negative caching: the creator is called
+    right away, without recording a lookup or a span.
+
+    :param region: A :class:`dogpile.cache.region.CacheRegion`.
+    :param str key: The cache key of the lookup.
+    :param creator: A function that performs the lookup.
+    :param exception: The exception class to raise for a known missing key.
+    :returns: A function with the same behaviour as the creator.
+    """
+
+    marker_key = NOT_FOUND_KEY_PREFIX + key
+
+    def wrapper():
+        if not region.is_configured or _is_null(region):
+            return creator()
+        name = getattr(region, "name", None)
+        with Span(CACHE, method_name(key), region=name, key=marker_key) as span:
+            known_missing = region.get(marker_key) is not NO_VALUE
+            span.set(hit=known_missing)
+        if isinstance(region, GatewayCacheRegion):
+            region.record(key, hit=known_missing)
+        if known_missing:
+            log.debug("Negative cache hit for %s", key)
+            raise exception()
+        try:
+            return creator()
+        except Exception as e:
+            if is_not_found(e):
+                region.set(marker_key, True)
+            raise
+
+    return wrapper
@@ -6,63 +6,192 @@ This module contains an opionated gateway for the capakey webservice.
 
 import json
 import logging
+import operator
+import re
+import time
+from urllib.parse import urlparse
 
 import requests
-from dogpile.cache import make_region
 
+from crabpy.gateway.cache import GatewayCacheRegion
+from crabpy.gateway.cache import configure_not_found_region
+from crabpy.gateway.cache import negative_cache
 from crabpy.gateway.exception import GatewayResourceNotFoundException
 from crabpy.gateway.exception import GatewayRuntimeException
+from crabpy.instrumentation import REQUEST
+from crabpy.instrumentation import Span
+from crabpy.instrumentation import lazy_load
+from crabpy.ratelimit import get_limiter
+from crabpy.ratelimit import in_bulk
+from crabpy.ratelimit import limited
+from crabpy.singleflight import SingleFlight
+from crabpy.singleflight import freeze
+from crabpy.stats import Statistics
+from crabpy.stats import endpoint_name
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import send
 
 
 log = logging.getLogger(__name__)
 
+_flight = SingleFlight()
 
-def capakey_rest_gateway_request(url, headers=None, params=None):
+CAPAKEY_PATTERN = re.compile(
+    r"^([0-9]{5})([A-Z]{1})([0-9]{4})\/([0-9]{2})([A-Z\_]{1})([0-9]{3})$"
+)
+"""
+A capakey, eg. `46013A1154/02C000`.
+"""
+
+PERCID_PATTERN = re.compile(
+    r"^([0-9]{5})_([A-Z]{1})_([0-9]{4})_([A-Z\_]{1})_([0-9]{3})_([0-9]{2})$"
+)
+"""
+A percid, eg. `46013_A_1154_C_000_02`.
+"""
+
+
+def _percid(parcel):
+    return Perceel.get_percid_from_capakey(parcel["capakey"])
+
+
+def perceel_schema():
+    """
+    Get the columns of the table of
+    :meth:`CapakeyRestGateway.list_percelen_by_sectie`.
+
+    :rtype: :class:`crabpy.tables.Schema`
+    """
+    from crabpy.tables import Column
+    from crabpy.tables import STRING
+    from crabpy.tables import Schema
+
+    return Schema(
+        [
+            Column("id", STRING, operator.itemgetter("perceelnummer")),
+            Column("capakey", STRING, operator.itemgetter("capakey")),
+            Column("percid", STRING, _percid),
+        ]
+    )
+
+
+def capakey_rest_gateway_request(
+    url, headers=None, params=None, stats=None, hedging=None, limiter=None
+):
     """
     Utility function that helps making requests to the CAPAKEY REST service.
 
     :param string url: URL to request.
     :param dict headers: Headers to send with the URL.
     :param dict params: Parameters to send with the URL.
-    :returns: Result of the call.
+    :param stats: `Optional.` A :class:`crabpy.stats.Statistics` to record
+        the call in.
+    :param hedging: `Optional.` A :class:`crabpy.timeouts.Hedging` policy.
+    :param limiter: `Optional.` A :class:`crabpy.ratelimit.Limiter`.
+    :returns: Result of the call. Concurrent calls with the same url, headers
+        and params share one request and its response.
     """
     headers = headers or {}
     params = params or {}
     try:
-        # calls to geoservices give a 403 if the user-agent is not set
-        headers["user-agent"] = "*"
-        res = requests.get(url, headers=headers, params=params)
-        res.raise_for_status()
-        return res
-    except requests.ConnectionError as ce:
-        raise GatewayRuntimeException(
-            "Could not execute request due to connection problems:\n%s" % repr(ce), ce
+        return _flight.do(
+            (url, freeze(headers), freeze(params)),
+            lambda: _capakey_rest_request(
+                url, headers, params, stats, hedging, limiter
+            ),
+            stats,
         )
-    except requests.HTTPError:
-        raise GatewayResourceNotFoundException()
-    except requests.RequestException as re:
+    except DeadlineExceeded as e:
         raise GatewayRuntimeException(
-            "Could not execute request due to:\n%s" % repr(re), re
+            "Could not execute request due to:\n%s" % repr(e), e
         )
 
 
+def _capakey_rest_request(url, headers, params, stats, hedging, limiter):
+    from crabpy.circuitbreaker import get_breaker
+
+    breaker = get_breaker("capakey", urlparse(url).netloc)
+    start = None
+    res = None
+    failed = True
+    with Span(
+        REQUEST, endpoint_name(url), gateway="capakey", url=url, params=params
+    ) as span:
+        try:
+            breaker.allow(stats)
+            start = time.perf_counter()
+            error = None
+            try:
+                # calls to geoservices give a 403 if the user-agent is not set
+                headers["user-agent"] = "*"
+                res = send(
+                    # Hedged duplicates take a slot of the limiter as well.
+                    lambda url, **kwargs: limited(
+                        limiter, lambda: requests.get(url, **kwargs), stats
+                    ),
+                    url,
+                    hedging,
+                    stats,
+                    headers=headers,
+                    params=params,
+                )
+                span.set(status_code=res.status_code, bytes=len(res.content))
+                res.raise_for_status()
+                failed = False
+                return res
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                breaker.record(error)
+        except requests.ConnectionError as ce:
+            raise GatewayRuntimeException(
+                "Could not execute request due to connection problems:\n%s" % repr(ce),
+                ce,
+            )
+        except requests.HTTPError as he:
+            raise GatewayResourceNotFoundException() from he
+        except requests.RequestException as re:
+            raise GatewayRuntimeException(
+                "Could not execute request due to:\n%s" % repr(re), re
+            )
+        finally:
+            # Calls rejected by an open circuit never reached the service.
+            if stats is not None and start is not None:
+                stats.record_upstream(
+                    endpoint_name(url),
+                    time.perf_counter() - start,
+                    nbytes=len(res.content) if res is not None else 0,
+                    error=failed,
+                )
+
+
 class CapakeyRestGateway:
     """
     A REST gateway to the capakey webservice.
 
+    :param hedging: `Optional.` A :class:`crabpy.timeouts.Hedging` policy
+        for slow requests.
+    :param limiter: `Optional.` A :class:`crabpy.ratelimit.Limiter`. By
+        default only the requests inside :func:`crabpy.ratelimit.bulk` go
+        through the shared limiter of the capakey API.
+
     .. versionadded:: 0.8.0
     """
 
-    caches = {}
-
     def __init__(self, **kwargs):
         self.base_url = kwargs.get(
             "base_url", "https://geo.api.vlaanderen.be/capakey/v2"
         )
+        self.hedging = kwargs.get("hedging")
+        self._limiter = kwargs.get("limiter")
         self.base_headers = {"Accept": "application/json"}
+        self.stats = Statistics("capakey")
+        self.caches = {}
         cache_regions = ["permanent", "long", "short"]
-        for cr in cache_regions:
-            self.caches[cr] = make_region(key_mangler=str)
+        for cr in cache_regions + ["notfound"]:
+            self.caches[cr] = GatewayCacheRegion(name=cr, key_mangler=str)
+            self.caches[cr].stats = self.stats
         if "cache_config" in kwargs:
             for cr in cache_regions:
                 if ("%s.backend" % cr) in kwargs["cache_config"]:
@@ -70,6 +199,21 @@ class CapakeyRestGateway:
                     self.caches[cr].configure_from_config(
                         kwargs["cache_config"], "%s." % cr
                     )
+        configure_not_found_region(
+            self.caches["notfound"], kwargs.get("cache_config", {})
+        )
+
+    @property
+    def limiter(self):
+        """
+        The :class:`crabpy.ratelimit.Limiter` the current requests go
+        through, `None` when they are not limited.
+        """
+        if self._limiter is not None:
+            return self._limiter
+        if in_bulk():
+            return get_limiter("capakey")
+        return None
 
     @staticmethod
     def _parse_centroid(center):
@@ -108,7 +252,14 @@ class CapakeyRestGateway:
             url = self.base_url + "/municipality"
             h = self.base_headers
             p = {"orderbyCode": sort == 1}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return [
                 Gemeente(r["municipalityCode"], r["municipalityName"])
                 for r in res["municipalities"]
@@ -134,7 +285,14 @@ class CapakeyRestGateway:
             url = self.base_url + "/municipality/%s" % id
             h = self.base_headers
             p = {"geometry": "full", "srs": "31370"}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return Gemeente(
                 res["municipalityCode"],
                 res["municipalityName"],
@@ -143,8 +301,9 @@ class CapakeyRestGateway:
                 res["geometry"]["shape"],
             )
 
+        key = "get_gemeente_by_id_rest#%s" % id
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["long"].is_configured:
-            key = "get_gemeente_by_id_rest#%s" % id
             gemeente = self.caches["long"].get_or_create(key, creator)
         else:
             gemeente = creator()
@@ -193,7 +352,14 @@ class CapakeyRestGateway:
             url = self.base_url + "/municipality/%s/department" % gid
             h = self.base_headers
             p = {"orderbyCode": sort == 1}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return [
                 Afdeling(
                     id=r["departmentCode"], naam=r["departmentName"], gemeente=gemeente
@@ -222,7 +388,14 @@ class CapakeyRestGateway:
             url = self.base_url + "/department/%s" % (aid)
             h = self.base_headers
             p = {"geometry": "full", "srs": "31370"}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return Afdeling(
                 id=res["departmentCode"],
                 naam=res["departmentName"],
@@ -232,8 +405,9 @@ class CapakeyRestGateway:
                 shape=res["geometry"]["shape"],
             )
 
+        key = "get_kadastrale_afdeling_by_id_rest#%s" % aid
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["long"].is_configured:
-            key = "get_kadastrale_afdeling_by_id_rest#%s" % aid
             afdeling = self.caches["long"].get_or_create(key, creator)
         else:
             afdeling = creator()
@@ -260,7 +434,13 @@ class CapakeyRestGateway:
         def creator():
             url = self.base_url + f"/municipality/{gid}/department/{aid}/section"
             h = self.base_headers
-            res = capakey_rest_gateway_request(url, h).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return [Sectie(r["sectionCode"], afdeling) for r in res["sections"]]
 
         if self.caches["long"].is_configured:
@@ -297,7 +477,14 @@ class CapakeyRestGateway:
             )
             h = self.base_headers
             p = {"geometry": "full", "srs": "31370"}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return Sectie(
                 res["sectionCode"],
                 afdeling,
@@ -306,8 +493,9 @@ class CapakeyRestGateway:
                 res["geometry"]["shape"],
             )
 
+        key = f"get_sectie_by_id_and_afdeling_rest#{id}#{aid}"
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["long"].is_configured:
-            key = f"get_sectie_by_id_and_afdeling_rest#{id}#{aid}"
             sectie = self.caches["long"].get_or_create(key, creator)
         else:
             sectie = creator()
@@ -315,12 +503,7 @@ class CapakeyRestGateway:
         return sectie
 
     def parse_percid(self, capakey):
-        import re
-
-        match = re.match(
-            r"^([0-9]{5})([A-Z]{1})([0-9]{4})\/([0-9]{2})([A-Z\_]{1})([0-9]{3})$",
-            capakey,
-        )
+        match = CAPAKEY_PATTERN.match(capakey)
         if match:
             percid = (
                 match.group(1)
@@ -340,12 +523,7 @@ class CapakeyRestGateway:
             raise ValueError("Invalid Capakey %s can't be parsed" % capakey)
 
     def parse_capakey(self, percid):
-        import re
-
-        match = re.match(
-            r"^([0-9]{5})_([A-Z]{1})_([0-9]{4})_([A-Z\_]{1})_([0-9]{3})_([0-9]{2})$",
-            percid,
-        )
+        match = PERCID_PATTERN.match(percid)
         if match:
             capakey = (
                 match.group(1)
@@ -362,18 +540,21 @@ class CapakeyRestGateway:
         else:
             raise ValueError("Invalid percid %s can't be parsed" % percid)
 
-    def list_percelen_by_sectie(self, sectie):
+    def list_percelen_by_sectie(self, sectie, as_table=False):
         """
         List all percelen in a `sectie`.
 
         :param sectie: The :class:`Sectie` for which the percelen are wanted.
         :param integer sort: Field to sort on.
+        :param bool as_table: Return a :class:`crabpy.tables.Table` with the
+            columns of :func:`perceel_schema` instead.
         :rtype: A :class:`list` of :class:`Perceel`.
         """
         sid = sectie.id
         aid = sectie.afdeling.id
         gid = sectie.afdeling.gemeente.id
-        sectie.clear_gateway()
+        if not as_table:
+            sectie.clear_gateway()
 
         def creator():
             url = (
@@ -382,7 +563,18 @@ class CapakeyRestGateway:
             )
             h = self.base_headers
             p = {"data": "adp", "status": "actual"}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
+            if as_table:
+                from crabpy.tables import Table
+
+                return Table(perceel_schema(), res["parcels"])
             return [
                 Perceel(
                     r["perceelnummer"],
@@ -395,9 +587,13 @@ class CapakeyRestGateway:
 
         if self.caches["short"].is_configured:
             key = f"list_percelen_by_sectie_rest#{gid}#{aid}#{sid}"
+            if as_table:
+                key += "#table"
             percelen = self.caches["short"].get_or_create(key, creator)
         else:
             percelen = creator()
+        if as_table:
+            return percelen
         for p in percelen:
             p.set_gateway(self)
         return percelen
@@ -424,7 +620,14 @@ class CapakeyRestGateway:
             )
             h = self.base_headers
             p = {"geometry": "full", "srs": "31370", "data": "adp", "status": "actual"}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return Perceel(
                 res["perceelnummer"],
                 sectie,
@@ -438,11 +641,12 @@ class CapakeyRestGateway:
                 res["geometry"]["shape"],
             )
 
+        key = (
+            f"get_perceel_by_id_and_sectie_rest#{id}"
+            f"#{sectie.id}#{sectie.afdeling.id}"
+        )
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = (
-                f"get_perceel_by_id_and_sectie_rest#{id}"
-                f"#{sectie.id}#{sectie.afdeling.id}"
-            )
             perceel = self.caches["short"].get_or_create(key, creator)
         else:
             perceel = creator()
@@ -453,7 +657,14 @@ class CapakeyRestGateway:
         def creator():
             h = self.base_headers
             p = {"geometry": "full", "srs": "31370", "data": "adp", "status": "actual"}
-            res = capakey_rest_gateway_request(url, h, p).json()
+            res = capakey_rest_gateway_request(
+                url,
+                h,
+                p,
+                stats=self.stats,
+                hedging=self.hedging,
+                limiter=self.limiter,
+            ).json()
             return Perceel(
                 res["perceelnummer"],
                 Sectie(
@@ -474,9 +685,9 @@ class CapakeyRestGateway:
                 res["geometry"]["shape"],
             )
 
+        creator = negative_cache(self.caches["notfound"], cache_key, creator)
         if self.caches["short"].is_configured:
-            key = cache_key
-            perceel = self.caches["short"].get_or_create(key, creator)
+            perceel = self.caches["short"].get_or_create(cache_key, creator)
         else:
             perceel = creator()
         perceel.set_gateway(self)
@@ -562,12 +773,13 @@ def check_lazy_load_gemeente(f):
     def wrapper(self):
         gemeente = self
         if getattr(gemeente, "_%s" % f.__name__, None) is None:
-            log.debug("Lazy loading Gemeente %d", gemeente.id)
-            gemeente.check_gateway()
-            g = gemeente.gateway.get_gemeente_by_id(gemeente.id)
-            gemeente._naam = g._naam
-            gemeente._centroid = g._centroid
-            gemeente._bounding_box = g._bounding_box
+            with lazy_load(gemeente, f.__name__):
+                log.debug("Lazy loading Gemeente %d", gemeente.id)
+                gemeente.check_gateway()
+                g = gemeente.gateway.get_gemeente_by_id(gemeente.id)
+                gemeente._naam = g._naam
+                gemeente._centroid = g._centroid
+                gemeente._bounding_box = g._bounding_box
         return f(self)
 
     return wrapper
@@ -623,13 +835,14 @@ def check_lazy_load_afdeling(f):
     def wrapper(self):
         afdeling = self
         if getattr(afdeling, "_%s" % f.__name__, None) is None:
-            log.debug("Lazy loading Afdeling %d", afdeling.id)
-            afdeling.check_gateway()
-            a = afdeling.gateway.get_kadastrale_afdeling_by_id(afdeling.id)
-            afdeling._naam = a._naam
-            afdeling._gemeente = a._gemeente
-            afdeling._centroid = a._centroid
-            afdeling._bounding_box = a._bounding_box
+            with lazy_load(afdeling, f.__name__):
+                log.debug("Lazy loading Afdeling %d", afdeling.id)
+                afdeling.check_gateway()
+                a = afdeling.gateway.get_kadastrale_afdeling_by_id(afdeling.id)
+                afdeling._naam = a._naam
+                afdeling._gemeente = a._gemeente
+                afdeling._centroid = a._centroid
+                afdeling._bounding_box = a._bounding_box
         return f(self)
 
     return wrapper
@@ -720,15 +933,18 @@ def check_lazy_load_sectie(f):
     def wrapper(self):
         sectie = self
         if getattr(sectie, "_%s" % f.__name__, None) is None:
-            log.debug(
-                "Lazy loading Sectie %s in Afdeling %d", sectie.id, sectie.afdeling.id
-            )
-            sectie.check_gateway()
-            s = sectie.gateway.get_sectie_by_id_and_afdeling(
-                sectie.id, sectie.afdeling.id
-            )
-            sectie._centroid = s._centroid
-            sectie._bounding_box = s._bounding_box
+            with lazy_load(sectie, f.__name__):
+                log.debug(
+                    "Lazy loading Sectie %s in Afdeling %d",
+                    sectie.id,
+                    sectie.afdeling.id,
+                )
+                sectie.check_gateway()
+                s = sectie.gateway.get_sectie_by_id_and_afdeling(
+                    sectie.id, sectie.afdeling.id
+                )
+                sectie._centroid = s._centroid
+                sectie._bounding_box = s._bounding_box
         return f(self)
 
     return wrapper
@@ -793,18 +1009,21 @@ def check_lazy_load_perceel(f):
     def wrapper(self):
         perceel = self
         if getattr(perceel, "_%s" % f.__name__, None) is None:
-            log.debug(
-                "Lazy loading Perceel %s in Sectie %s in Afdeling %d",
-                perceel.id,
-                perceel.sectie.id,
-                perceel.sectie.afdeling.id,
-            )
-            perceel.check_gateway()
-            p = perceel.gateway.get_perceel_by_id_and_sectie(perceel.id, perceel.sectie)
-            perceel._centroid = p._centroid
-            perceel._bounding_box = p._bounding_box
-            perceel._capatype = p._capatype
-            perceel._cashkey = p._cashkey
+            with lazy_load(perceel, f.__name__):
+                log.debug(
+                    "Lazy loading Perceel %s in Sectie %s in Afdeling %d",
+                    perceel.id,
+                    perceel.sectie.id,
+                    perceel.sectie.afdeling.id,
+                )
+                perceel.check_gateway()
+                p = perceel.gateway.get_perceel_by_id_and_sectie(
+                    perceel.id, perceel.sectie
+                )
+                perceel._centroid = p._centroid
+                perceel._bounding_box = p._bounding_box
+                perceel._capatype = p._capatype
+                perceel._cashkey = p._cashkey
         return f(self)
 
     return wrapper
@@ -858,12 +1077,7 @@ class Perceel(GatewayObject):
 
     @staticmethod
     def get_percid_from_capakey(capakey):
-        import re
-
-        match = re.match(
-            r"^([0-9]{5})([A-Z]{1})([0-9]{4})\/([0-9]{2})([A-Z\_]{1})([0-9]{3})$",
-            capakey,
-        )
+        match = CAPAKEY_PATTERN.match(capakey)
         if match:
             percid = (
                 match.group(1)
@@ -884,12 +1098,7 @@ class Perceel(GatewayObject):
 
     @staticmethod
     def get_capakey_from_percid(percid):
-        import re
-
-        match = re.match(
-            r"^([0-9]{5})_([A-Z]{1})_([0-9]{4})_([A-Z\_]{1})_([0-9]{3})_([0-9]{2})$",
-            percid,
-        )
+        match = PERCID_PATTERN.match(percid)
         if match:
             capakey = (
                 match.group(1)
@@ -910,17 +1119,12 @@ class Perceel(GatewayObject):
 
         Splits a capakey into it's grondnummer, bisnummer, exponent and macht.
         """
-        import re
-
-        match = re.match(
-            r"^[0-9]{5}[A-Z]{1}([0-9]{4})\/([0-9]{2})([A-Z\_]{1})([0-9]{3})$",
-            self.capakey,
-        )
+        match = CAPAKEY_PATTERN.match(self.capakey)
         if match:
-            self.grondnummer = match.group(1)
-            self.bisnummer = match.group(2)
-            self.exponent = match.group(3)
-            self.macht = match.group(4)
+            self.grondnummer = match.group(3)
+            self.bisnummer = match.group(4)
+            self.exponent = match.group(5)
+            self.macht = match.group(6)
         else:
             raise ValueError("Invalid Capakey %s can't be parsed" % self.capakey)
 
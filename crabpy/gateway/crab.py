@@ -8,19 +8,28 @@ import json
 import logging
 import math
 import os
-
-from dogpile.cache import make_region
-from suds import WebFault
+import time
 
 from crabpy.client import crab_request
+from crabpy.gateway.cache import GatewayCacheRegion
+from crabpy.gateway.cache import configure_not_found_region
+from crabpy.gateway.cache import negative_cache
 from crabpy.gateway.exception import GatewayResourceNotFoundException
 from crabpy.gateway.exception import GatewayRuntimeException
+from crabpy.instrumentation import REQUEST
+from crabpy.instrumentation import Span
+from crabpy.instrumentation import lazy_load
+from crabpy.singleflight import SingleFlight
+from crabpy.stats import Statistics
+from crabpy.timeouts import DeadlineExceeded
 
 
 log = logging.getLogger(__name__)
 
+_flight = SingleFlight()
+
 
-def crab_gateway_request(client, method, *args):
+def crab_gateway_request(client, method, *args, stats=None):
     """
     Utility function that helps making requests to the CRAB service.
 
@@ -29,17 +38,59 @@ def crab_gateway_request(client, method, *args):
 
     :param client: A :class:`suds.client.Client` for the CRAB service.
     :param string action: Which method to call, eg. `ListGewesten`
-    :returns: Result of the SOAP call.
+    :param stats: `Optional.` A :class:`crabpy.stats.Statistics` to record
+        the call in. Suds does not expose the size of the response, so no
+        bytes are recorded.
+    :returns: Result of the SOAP call. Concurrent calls of the same method
+        with the same arguments on the same client share one call and its
+        result.
     """
     try:
-        return crab_request(client, method, *args)
-    except WebFault as wf:
-        err = GatewayRuntimeException(
-            "Could not execute request. Message from server:\n%s"
-            % wf.fault["faultstring"],
-            wf,
+        return _flight.do(
+            (id(client), method, args),
+            lambda: _crab_request(client, method, args, stats),
+            stats,
         )
-        raise err
+    except DeadlineExceeded as e:
+        raise GatewayRuntimeException("Could not execute request: %s" % e, e)
+
+
+def _crab_request(client, method, args, stats):
+    from suds import WebFault
+
+    from crabpy.circuitbreaker import CircuitOpenError
+    from crabpy.circuitbreaker import get_breaker
+
+    breaker = get_breaker("crab", getattr(getattr(client, "wsdl", None), "url", None))
+    start = None
+    failed = True
+    with Span(REQUEST, method, gateway="crab", action=method, params=args):
+        try:
+            breaker.allow(stats)
+            start = time.perf_counter()
+            error = None
+            try:
+                result = crab_request(client, method, *args)
+                failed = False
+                return result
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                # A fault means the service is up and rejected the call.
+                breaker.record(error, lambda e: not isinstance(e, WebFault))
+        except CircuitOpenError as e:
+            raise GatewayRuntimeException("Could not execute request: %s" % e, e)
+        except WebFault as wf:
+            err = GatewayRuntimeException(
+                "Could not execute request. Message from server:\n%s"
+                % wf.fault["faultstring"],
+                wf,
+            )
+            raise err
+        finally:
+            if stats is not None and start is not None:
+                stats.record_upstream(method, time.perf_counter() - start, error=failed)
 
 
 class CrabGateway:
@@ -47,8 +98,6 @@ class CrabGateway:
     A gateway to the CRAB webservice.
     """
 
-    caches = {}
-
     provincies = [
         (10000, "Antwerpen", 2),
         (20001, "Vlaams-Brabant", 2),
@@ -64,9 +113,12 @@ class CrabGateway:
 
     def __init__(self, client, **kwargs):
         self.client = client
+        self.stats = Statistics("crab")
+        self.caches = {}
         cache_regions = ["permanent", "long", "short"]
-        for cr in cache_regions:
-            self.caches[cr] = make_region(key_mangler=str)
+        for cr in cache_regions + ["notfound"]:
+            self.caches[cr] = GatewayCacheRegion(name=cr, key_mangler=str)
+            self.caches[cr].stats = self.stats
         if "cache_config" in kwargs:
             for cr in cache_regions:
                 if ("%s.backend" % cr) in kwargs["cache_config"]:
@@ -74,6 +126,9 @@ class CrabGateway:
                     self.caches[cr].configure_from_config(
                         kwargs["cache_config"], "%s." % cr
                     )
+        configure_not_found_region(
+            self.caches["notfound"], kwargs.get("cache_config", {})
+        )
         data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
         with open(os.path.join(data_dir, "deelgemeenten.json"), encoding="utf-8") as f:
             deelgemeenten_json = json.load(f)
@@ -96,7 +151,9 @@ class CrabGateway:
         """
 
         def creator():
-            res = crab_gateway_request(self.client, "ListGewesten", sort)
+            res = crab_gateway_request(
+                self.client, "ListGewesten", sort, stats=self.stats
+            )
             tmp = {}
             for r in res.GewestItem:
                 if r.GewestId not in tmp:
@@ -123,13 +180,25 @@ class CrabGateway:
 
         def creator():
             nl = crab_gateway_request(
-                self.client, "GetGewestByGewestIdAndTaalCode", id, "nl"
+                self.client,
+                "GetGewestByGewestIdAndTaalCode",
+                id,
+                "nl",
+                stats=self.stats,
             )
             fr = crab_gateway_request(
-                self.client, "GetGewestByGewestIdAndTaalCode", id, "fr"
+                self.client,
+                "GetGewestByGewestIdAndTaalCode",
+                id,
+                "fr",
+                stats=self.stats,
             )
             de = crab_gateway_request(
-                self.client, "GetGewestByGewestIdAndTaalCode", id, "de"
+                self.client,
+                "GetGewestByGewestIdAndTaalCode",
+                id,
+                "de",
+                stats=self.stats,
             )
             if nl is None:
                 raise GatewayResourceNotFoundException()
@@ -140,8 +209,9 @@ class CrabGateway:
                 (nl.MinimumX, nl.MinimumY, nl.MaximumX, nl.MaximumY),
             )
 
+        key = "GetGewestByGewestId#%s" % id
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["permanent"].is_configured:
-            key = "GetGewestByGewestId#%s" % id
             gewest = self.caches["long"].get_or_create(key, creator)
         else:
             gewest = creator()
@@ -252,7 +322,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListGemeentenByGewestId", gewest_id, sort
+                self.client,
+                "ListGemeentenByGewestId",
+                gewest_id,
+                sort,
+                stats=self.stats,
             )
             return [
                 Gemeente(r.GemeenteId, r.GemeenteNaam, r.NISGemeenteCode, gewest)
@@ -278,7 +352,9 @@ class CrabGateway:
         """
 
         def creator():
-            res = crab_gateway_request(self.client, "GetGemeenteByGemeenteId", id)
+            res = crab_gateway_request(
+                self.client, "GetGemeenteByGemeenteId", id, stats=self.stats
+            )
             if res is None:
                 raise GatewayResourceNotFoundException()
             return Gemeente(
@@ -297,8 +373,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetGemeenteByGemeenteId#%s" % id
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["long"].is_configured:
-            key = "GetGemeenteByGemeenteId#%s" % id
             gemeente = self.caches["long"].get_or_create(key, creator)
         else:
             gemeente = creator()
@@ -315,7 +392,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetGemeenteByNISGemeenteCode", niscode
+                self.client, "GetGemeenteByNISGemeenteCode", niscode, stats=self.stats
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -335,8 +412,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetGemeenteByNISGemeenteCode#%s" % niscode
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["long"].is_configured:
-            key = "GetGemeenteByNISGemeenteCode#%s" % niscode
             gemeente = self.caches["long"].get_or_create(key, creator)
         else:
             gemeente = creator()
@@ -430,7 +508,7 @@ class CrabGateway:
 
     def _list_codeobject(self, function, sort, returnclass):
         def creator():
-            res = crab_gateway_request(self.client, function, sort)
+            res = crab_gateway_request(self.client, function, sort, stats=self.stats)
             return [
                 globals()[returnclass](r.Code, r.Naam, r.Definitie)
                 for r in res.CodeItem
@@ -593,7 +671,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListStraatnamenWithStatusByGemeenteId", id, sort
+                self.client,
+                "ListStraatnamenWithStatusByGemeenteId",
+                id,
+                sort,
+                stats=self.stats,
             )
             try:
                 return [
@@ -631,7 +713,10 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetStraatnaamWithStatusByStraatnaamId", id
+                self.client,
+                "GetStraatnaamWithStatusByStraatnaamId",
+                id,
+                stats=self.stats,
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -652,8 +737,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetStraatnaamWithStatusByStraatnaamId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["long"].is_configured:
-            key = "GetStraatnaamWithStatusByStraatnaamId#%s" % (id)
             straat = self.caches["long"].get_or_create(key, creator)
         else:
             straat = creator()
@@ -675,7 +761,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListHuisnummersWithStatusByStraatnaamId", id, sort
+                self.client,
+                "ListHuisnummersWithStatusByStraatnaamId",
+                id,
+                sort,
+                stats=self.stats,
             )
             try:
                 return [
@@ -711,7 +801,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListHuisnummersWithStatusByIdentificatorPerceel", id, sort
+                self.client,
+                "ListHuisnummersWithStatusByIdentificatorPerceel",
+                id,
+                sort,
+                stats=self.stats,
             )
             try:
                 huisnummers = []
@@ -742,7 +836,10 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetHuisnummerWithStatusByHuisnummerId", id
+                self.client,
+                "GetHuisnummerWithStatusByHuisnummerId",
+                id,
+                stats=self.stats,
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -759,8 +856,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetHuisnummerWithStatusByHuisnummerId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetHuisnummerWithStatusByHuisnummerId#%s" % (id)
             huisnummer = self.caches["short"].get_or_create(key, creator)
         else:
             huisnummer = creator()
@@ -783,7 +881,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetHuisnummerWithStatusByHuisnummer", nummer, straat_id
+                self.client,
+                "GetHuisnummerWithStatusByHuisnummer",
+                nummer,
+                straat_id,
+                stats=self.stats,
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -800,8 +902,9 @@ class CrabGateway:
                 ),
             )
 
+        key = f"GetHuisnummerWithStatusByHuisnummer#{nummer}{straat_id}"
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = f"GetHuisnummerWithStatusByHuisnummer#{nummer}{straat_id}"
             huisnummer = self.caches["short"].get_or_create(key, creator)
         else:
             huisnummer = creator()
@@ -822,7 +925,9 @@ class CrabGateway:
             id = gemeente
 
         def creator():
-            res = crab_gateway_request(self.client, "ListPostkantonsByGemeenteId", id)
+            res = crab_gateway_request(
+                self.client, "ListPostkantonsByGemeenteId", id, stats=self.stats
+            )
             try:
                 return [Postkanton(r.PostkantonCode) for r in res.PostkantonItem]
             except AttributeError:
@@ -851,13 +956,16 @@ class CrabGateway:
             id = huisnummer
 
         def creator():
-            res = crab_gateway_request(self.client, "GetPostkantonByHuisnummerId", id)
+            res = crab_gateway_request(
+                self.client, "GetPostkantonByHuisnummerId", id, stats=self.stats
+            )
             if res is None:
                 raise GatewayResourceNotFoundException()
             return Postkanton(res.PostkantonCode)
 
+        key = "GetPostkantonByHuisnummerId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetPostkantonByHuisnummerId#%s" % (id)
             postkanton = self.caches["short"].get_or_create(key, creator)
         else:
             postkanton = creator()
@@ -874,7 +982,10 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetWegobjectByIdentificatorWegobject", id
+                self.client,
+                "GetWegobjectByIdentificatorWegobject",
+                id,
+                stats=self.stats,
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -891,8 +1002,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetWegobjectByIdentificatorWegobject#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetWegobjectByIdentificatorWegobject#%s" % (id)
             wegobject = self.caches["short"].get_or_create(key, creator)
         else:
             wegobject = creator()
@@ -913,7 +1025,9 @@ class CrabGateway:
             id = straat
 
         def creator():
-            res = crab_gateway_request(self.client, "ListWegobjectenByStraatnaamId", id)
+            res = crab_gateway_request(
+                self.client, "ListWegobjectenByStraatnaamId", id, stats=self.stats
+            )
             try:
                 return [
                     Wegobject(r.IdentificatorWegobject, r.AardWegobject)
@@ -941,7 +1055,10 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetWegsegmentByIdentificatorWegsegment", id
+                self.client,
+                "GetWegsegmentByIdentificatorWegsegment",
+                id,
+                stats=self.stats,
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -958,8 +1075,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetWegsegmentByIdentificatorWegsegment#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetWegsegmentByIdentificatorWegsegment#%s" % (id)
             wegsegment = self.caches["short"].get_or_create(key, creator)
         else:
             wegsegment = creator()
@@ -981,7 +1099,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListWegsegmentenByStraatnaamId", id
+                self.client, "ListWegsegmentenByStraatnaamId", id, stats=self.stats
             )
             try:
                 return [
@@ -1015,7 +1133,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListTerreinobjectenByHuisnummerId", id
+                self.client, "ListTerreinobjectenByHuisnummerId", id, stats=self.stats
             )
             try:
                 return [
@@ -1044,7 +1162,10 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetTerreinobjectByIdentificatorTerreinobject", id
+                self.client,
+                "GetTerreinobjectByIdentificatorTerreinobject",
+                id,
+                stats=self.stats,
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -1061,8 +1182,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetTerreinobjectByIdentificatorTerreinobject#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetTerreinobjectByIdentificatorTerreinobject#%s" % (id)
             terreinobject = self.caches["short"].get_or_create(key, creator)
         else:
             terreinobject = creator()
@@ -1083,7 +1205,9 @@ class CrabGateway:
             id = huisnummer
 
         def creator():
-            res = crab_gateway_request(self.client, "ListPercelenByHuisnummerId", id)
+            res = crab_gateway_request(
+                self.client, "ListPercelenByHuisnummerId", id, stats=self.stats
+            )
             try:
                 return [Perceel(r.IdentificatorPerceel) for r in res.PerceelItem]
             except AttributeError:
@@ -1108,7 +1232,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetPerceelByIdentificatorPerceel", id
+                self.client, "GetPerceelByIdentificatorPerceel", id, stats=self.stats
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -1123,8 +1247,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetPerceelByIdentificatorPerceel#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetPerceelByIdentificatorPerceel#%s" % (id)
             perceel = self.caches["short"].get_or_create(key, creator)
         else:
             perceel = creator()
@@ -1145,7 +1270,9 @@ class CrabGateway:
             id = huisnummer
 
         def creator():
-            res = crab_gateway_request(self.client, "ListGebouwenByHuisnummerId", id)
+            res = crab_gateway_request(
+                self.client, "ListGebouwenByHuisnummerId", id, stats=self.stats
+            )
             try:
                 return [
                     Gebouw(r.IdentificatorGebouw, r.AardGebouw, r.StatusGebouw)
@@ -1173,7 +1300,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetGebouwByIdentificatorGebouw", id
+                self.client, "GetGebouwByIdentificatorGebouw", id, stats=self.stats
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -1191,8 +1318,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetGebouwByIdentificatorGebouw#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetGebouwByIdentificatorGebouw#%s" % (id)
             gebouw = self.caches["short"].get_or_create(key, creator)
         else:
             gebouw = creator()
@@ -1226,7 +1354,10 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListSubadressenWithStatusByHuisnummerId", id
+                self.client,
+                "ListSubadressenWithStatusByHuisnummerId",
+                id,
+                stats=self.stats,
             )
             try:
                 return [
@@ -1255,7 +1386,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetSubadresWithStatusBySubadresId", id
+                self.client, "GetSubadresWithStatusBySubadresId", id, stats=self.stats
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -1273,8 +1404,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetSubadresWithStatusBySubadresId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetSubadresWithStatusBySubadresId#%s" % (id)
             subadres = self.caches["short"].get_or_create(key, creator)
         else:
             subadres = creator()
@@ -1296,7 +1428,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListAdrespositiesByHuisnummerId", id
+                self.client, "ListAdrespositiesByHuisnummerId", id, stats=self.stats
             )
             try:
                 return [
@@ -1331,7 +1463,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListAdrespositiesByHuisnummer", nummer, sid
+                self.client,
+                "ListAdrespositiesByHuisnummer",
+                nummer,
+                sid,
+                stats=self.stats,
             )
             try:
                 return [
@@ -1364,7 +1500,9 @@ class CrabGateway:
             id = subadres
 
         def creator():
-            res = crab_gateway_request(self.client, "ListAdrespositiesBySubadresId", id)
+            res = crab_gateway_request(
+                self.client, "ListAdrespositiesBySubadresId", id, stats=self.stats
+            )
             try:
                 return [
                     Adrespositie(r.AdrespositieId, r.HerkomstAdrespositie)
@@ -1398,7 +1536,11 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "ListAdrespositiesBySubadres", subadres, hid
+                self.client,
+                "ListAdrespositiesBySubadres",
+                subadres,
+                hid,
+                stats=self.stats,
             )
             try:
                 return [
@@ -1427,7 +1569,7 @@ class CrabGateway:
 
         def creator():
             res = crab_gateway_request(
-                self.client, "GetAdrespositieByAdrespositieId", id
+                self.client, "GetAdrespositieByAdrespositieId", id, stats=self.stats
             )
             if res is None:
                 raise GatewayResourceNotFoundException()
@@ -1444,8 +1586,9 @@ class CrabGateway:
                 ),
             )
 
+        key = "GetAdrespositieByAdrespositieId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetAdrespositieByAdrespositieId#%s" % (id)
             adrespositie = self.caches["short"].get_or_create(key, creator)
         else:
             adrespositie = creator()
@@ -1466,13 +1609,16 @@ class CrabGateway:
             id = huisnummer
 
         def creator():
-            res = crab_gateway_request(self.client, "GetPostadresByHuisnummerId", id)
+            res = crab_gateway_request(
+                self.client, "GetPostadresByHuisnummerId", id, stats=self.stats
+            )
             if res is None:
                 raise GatewayResourceNotFoundException()
             return res.Postadres
 
+        key = "GetPostadresByHuisnummerId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetPostadresByHuisnummerId#%s" % (id)
             postadres = self.caches["short"].get_or_create(key, creator)
         else:
             postadres = creator()
@@ -1492,13 +1638,16 @@ class CrabGateway:
             id = subadres
 
         def creator():
-            res = crab_gateway_request(self.client, "GetPostadresBySubadresId", id)
+            res = crab_gateway_request(
+                self.client, "GetPostadresBySubadresId", id, stats=self.stats
+            )
             if res is None:
                 raise GatewayResourceNotFoundException()
             return res.Postadres
 
+        key = "GetPostadresBySubadresId#%s" % (id)
+        creator = negative_cache(self.caches["notfound"], key, creator)
         if self.caches["short"].is_configured:
-            key = "GetPostadresBySubadresId#%s" % (id)
             postadres = self.caches["short"].get_or_create(key, creator)
         else:
             postadres = creator()
@@ -1553,12 +1702,13 @@ def check_lazy_load_gewest(f):
         gewest = self
         attribute = "namen" if f.__name__ == "naam" else f.__name__
         if getattr(gewest, "_%s" % attribute, None) is None:
-            log.debug("Lazy loading Gewest %d", gewest.id)
-            gewest.check_gateway()
-            g = gewest.gateway.get_gewest_by_id(gewest.id)
-            gewest._namen = g._namen
-            gewest._centroid = g._centroid
-            gewest._bounding_box = g._bounding_box
+            with lazy_load(gewest, f.__name__):
+                log.debug("Lazy loading Gewest %d", gewest.id)
+                gewest.check_gateway()
+                g = gewest.gateway.get_gewest_by_id(gewest.id)
+                gewest._namen = g._namen
+                gewest._centroid = g._centroid
+                gewest._bounding_box = g._bounding_box
         return f(self)
 
     return wrapper
@@ -1663,13 +1813,14 @@ def check_lazy_load_gemeente(f):
             or gemeente._taal_id is None
             or gemeente._metadata is None
         ):
-            log.debug("Lazy loading Gemeente %d", gemeente.id)
-            gemeente.check_gateway()
-            g = gemeente.gateway.get_gemeente_by_id(gemeente.id)
-            gemeente._taal_id = g._taal_id
-            gemeente._centroid = g._centroid
-            gemeente._bounding_box = g._bounding_box
-            gemeente._metadata = g._metadata
+            with lazy_load(gemeente, f.__name__):
+                log.debug("Lazy loading Gemeente %d", gemeente.id)
+                gemeente.check_gateway()
+                g = gemeente.gateway.get_gemeente_by_id(gemeente.id)
+                gemeente._taal_id = g._taal_id
+                gemeente._centroid = g._centroid
+                gemeente._bounding_box = g._bounding_box
+                gemeente._metadata = g._metadata
         return f(*args)
 
     return wrapper
@@ -1971,10 +2122,11 @@ def check_lazy_load_straat(f):
     def wrapper(*args):
         straat = args[0]
         if straat._metadata is None:
-            log.debug("Lazy loading Straat %d", straat.id)
-            straat.check_gateway()
-            s = straat.gateway.get_straat_by_id(straat.id)
-            straat._metadata = s._metadata
+            with lazy_load(straat, f.__name__):
+                log.debug("Lazy loading Straat %d", straat.id)
+                straat.check_gateway()
+                s = straat.gateway.get_straat_by_id(straat.id)
+                straat._metadata = s._metadata
         return f(*args)
 
     return wrapper
@@ -2088,10 +2240,11 @@ def check_lazy_load_huisnummer(f):
     def wrapper(*args):
         huisnummer = args[0]
         if huisnummer._metadata is None:
-            log.debug("Lazy loading Huisnummer %d", huisnummer.id)
-            huisnummer.check_gateway()
-            h = huisnummer.gateway.get_huisnummer_by_id(huisnummer.id)
-            huisnummer._metadata = h._metadata
+            with lazy_load(huisnummer, f.__name__):
+                log.debug("Lazy loading Huisnummer %d", huisnummer.id)
+                huisnummer.check_gateway()
+                h = huisnummer.gateway.get_huisnummer_by_id(huisnummer.id)
+                huisnummer._metadata = h._metadata
         return f(*args)
 
     return wrapper
@@ -2218,12 +2371,13 @@ def check_lazy_load_wegobject(f):
             or wegobject._bounding_box is None
             or wegobject._metadata is None
         ):
-            log.debug("Lazy loading Wegobject %d", wegobject.id)
-            wegobject.check_gateway()
-            w = wegobject.gateway.get_wegobject_by_id(wegobject.id)
-            wegobject._centroid = w._centroid
-            wegobject._bounding_box = w._bounding_box
-            wegobject._metadata = w._metadata
+            with lazy_load(wegobject, f.__name__):
+                log.debug("Lazy loading Wegobject %d", wegobject.id)
+                wegobject.check_gateway()
+                w = wegobject.gateway.get_wegobject_by_id(wegobject.id)
+                wegobject._centroid = w._centroid
+                wegobject._bounding_box = w._bounding_box
+                wegobject._metadata = w._metadata
         return f(*args)
 
     return wrapper
@@ -2288,12 +2442,13 @@ def check_lazy_load_wegsegment(f):
             or wegsegment._geometrie is None
             or wegsegment._metadata is None
         ):
-            log.debug("Lazy loading Wegsegment %d", wegsegment.id)
-            wegsegment.check_gateway()
-            w = wegsegment.gateway.get_wegsegment_by_id(wegsegment.id)
-            wegsegment._methode_id = w._methode_id
-            wegsegment._geometrie = w._geometrie
-            wegsegment._metadata = w._metadata
+            with lazy_load(wegsegment, f.__name__):
+                log.debug("Lazy loading Wegsegment %d", wegsegment.id)
+                wegsegment.check_gateway()
+                w = wegsegment.gateway.get_wegsegment_by_id(wegsegment.id)
+                wegsegment._methode_id = w._methode_id
+                wegsegment._geometrie = w._geometrie
+                wegsegment._metadata = w._metadata
         return f(*args)
 
     return wrapper
@@ -2368,12 +2523,13 @@ def check_lazy_load_terreinobject(f):
             or terreinobject._bounding_box is None
             or terreinobject._metadata is None
         ):
-            log.debug("Lazy loading Terreinobject %s", terreinobject.id)
-            terreinobject.check_gateway()
-            t = terreinobject.gateway.get_terreinobject_by_id(terreinobject.id)
-            terreinobject._centroid = t._centroid
-            terreinobject._bounding_box = t._bounding_box
-            terreinobject._metadata = t._metadata
+            with lazy_load(terreinobject, f.__name__):
+                log.debug("Lazy loading Terreinobject %s", terreinobject.id)
+                terreinobject.check_gateway()
+                t = terreinobject.gateway.get_terreinobject_by_id(terreinobject.id)
+                terreinobject._centroid = t._centroid
+                terreinobject._bounding_box = t._bounding_box
+                terreinobject._metadata = t._metadata
         return f(*args)
 
     return wrapper
@@ -2443,11 +2599,12 @@ def check_lazy_load_perceel(f):
     def wrapper(*args):
         perceel = args[0]
         if perceel._centroid is None or perceel._metadata is None:
-            log.debug("Lazy loading Perceel %s", perceel.id)
-            perceel.check_gateway()
-            p = perceel.gateway.get_perceel_by_id(perceel.id)
-            perceel._centroid = p._centroid
-            perceel._metadata = p._metadata
+            with lazy_load(perceel, f.__name__):
+                log.debug("Lazy loading Perceel %s", perceel.id)
+                perceel.check_gateway()
+                p = perceel.gateway.get_perceel_by_id(perceel.id)
+                perceel._centroid = p._centroid
+                perceel._metadata = p._metadata
         return f(*args)
 
     return wrapper
@@ -2521,12 +2678,13 @@ def check_lazy_load_gebouw(f):
             or gebouw._geometrie is None
             or gebouw._metadata is None
         ):
-            log.debug("Lazy loading Gebouw %d", gebouw.id)
-            gebouw.check_gateway()
-            g = gebouw.gateway.get_gebouw_by_id(gebouw.id)
-            gebouw._methode_id = g._methode_id
-            gebouw._geometrie = g._geometrie
-            gebouw._metadata = g._metadata
+            with lazy_load(gebouw, f.__name__):
+                log.debug("Lazy loading Gebouw %d", gebouw.id)
+                gebouw.check_gateway()
+                g = gebouw.gateway.get_gebouw_by_id(gebouw.id)
+                gebouw._methode_id = g._methode_id
+                gebouw._geometrie = g._geometrie
+                gebouw._metadata = g._metadata
         return f(*args)
 
     return wrapper
@@ -2622,12 +2780,13 @@ def check_lazy_load_subadres(f):
             or subadres.aard_id is None
             or subadres.huisnummer_id is None
         ):
-            log.debug("Lazy loading Subadres %d", subadres.id)
-            subadres.check_gateway()
-            s = subadres.gateway.get_subadres_by_id(subadres.id)
-            subadres._metadata = s._metadata
-            subadres.aard_id = s.aard_id
-            subadres.huisnummer_id = s.huisnummer_id
+            with lazy_load(subadres, f.__name__):
+                log.debug("Lazy loading Subadres %d", subadres.id)
+                subadres.check_gateway()
+                s = subadres.gateway.get_subadres_by_id(subadres.id)
+                subadres._metadata = s._metadata
+                subadres.aard_id = s.aard_id
+                subadres.huisnummer_id = s.huisnummer_id
         return f(*args)
 
     return wrapper
@@ -2729,12 +2888,13 @@ def check_lazy_load_adrespositie(f):
             or adrespositie._aard is None
             or adrespositie._metadata is None
         ):
-            log.debug("Lazy loading Adrespositie %d", adrespositie.id)
-            adrespositie.check_gateway()
-            a = adrespositie.gateway.get_adrespositie_by_id(adrespositie.id)
-            adrespositie._geometrie = a._geometrie
-            adrespositie.aard_id = a.aard_id
-            adrespositie._metadata = a._metadata
+            with lazy_load(adrespositie, f.__name__):
+                log.debug("Lazy loading Adrespositie %d", adrespositie.id)
+                adrespositie.check_gateway()
+                a = adrespositie.gateway.get_adrespositie_by_id(adrespositie.id)
+                adrespositie._geometrie = a._geometrie
+                adrespositie.aard_id = a.aard_id
+                adrespositie._metadata = a._metadata
         return f(*args)
 
     return wrapper
@@ -0,0 +1,367 @@
+"""
+This module contains hooks to instrument the calls made by the gateways.
+
+The gateways wrap every upstream request, every cache lookup and every lazy
+load of an object in a :class:`Span`, and report every change of state of a
+circuit breaker as one. Every registered :class:`Hook` is called
+before and after such a span. A hook used as a context manager is only
+registered in the current context, and in the worker threads crabpy starts
+from it::
+
+    from crabpy.instrumentation import Hook
+
+    class SlowRequests(Hook):
+        def after(self, span):
+            if span.kind == "request" and span.duration > 1:
+                print(span.name, span.attributes)
+
+    with SlowRequests():
+        gateway.get_gemeente_by_id(44021)
+
+Hooks that should see every span, in every thread, eg. an
+:class:`OpenTelemetryHook` for the whole application, are registered with
+:func:`register_hook`. When no hooks are registered, instrumentation costs
+next to nothing.
+
+.. versionadded:: 1.9.0
+"""
+
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from collections import defaultdict
+
+import dogpile
+
+log = logging.getLogger(__name__)
+
+REQUEST = "request"
+"""
+Kind of a span around a call to an upstream service.
+
+The name of the span is the SOAP action or the endpoint of the url. The
+attributes are the `gateway`, the `url` or `action`, the `params`, the
+number of `pages` and `bytes` received and the HTTP `status_code`.
+"""
+
+CACHE = "cache"
+"""
+Kind of a span around a cache lookup.
+
+The name of the span is the gateway method. The attributes are the
+`region`, the `key` and whether the lookup was a `hit`.
+"""
+
+LAZY_LOAD = "lazy_load"
+"""
+Kind of a span around a lazy load of an object.
+
+The name of the span is `<type>.<attribute>`. The attributes are the
+object `type`, its `id` and the `attribute` that triggered the load.
+"""
+
+CIRCUIT = "circuit"
+"""
+Kind of a span that marks a change of state of a circuit breaker.
+
+The name of the span is the name of the breaker. The attributes are the new
+`state`, the `previous` state and the number of consecutive `failures`. See
+:mod:`crabpy.circuitbreaker`.
+"""
+
+_hooks = ()
+_hooks_lock = threading.Lock()
+_scoped_hooks = contextvars.ContextVar("crabpy_hooks", default=())
+
+
+def register_hook(hook):
+    """
+    Register a hook that will be called for every span, in every thread.
+
+    Use the hook as a context manager instead to only register it in the
+    current context.
+
+    :param Hook hook: The hook to register.
+    """
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + (hook,)
+
+
+def unregister_hook(hook):
+    """
+    Unregister a hook registered with :func:`register_hook`.
+
+    :param Hook hook: The hook to unregister.
+    """
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+class Hook:
+    """
+    Base class for instrumentation hooks.
+
+    A hook can be used as a context manager, it is registered for the
+    duration of the block and only for the spans of the current context.
+    Other threads and concurrent tasks do not see it, the worker threads
+    crabpy starts inside the block do.
+    """
+
+    def before(self, span):
+        """
+        Called when a span starts.
+
+        :param Span span: The span that starts.
+        """
+
+    def after(self, span):
+        """
+        Called when a span ends. The :attr:`Span.duration` and
+        :attr:`Span.error` are set.
+
+        :param Span span: The span that ended.
+        """
+
+    def __enter__(self):
+        _scoped_hooks.set(_scoped_hooks.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _scoped_hooks.set(tuple(h for h in _scoped_hooks.get() if h is not self))
+        return False
+
+
+class Span:
+    """
+    An instrumented operation.
+
+    :param str kind: The kind of operation, eg. :data:`REQUEST`.
+    :param str name: The name of the operation.
+    :param attributes: Extra information about the operation.
+    """
+
+    def __init__(self, kind, name, **attributes):
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.duration = None
+        self.error = None
+        self._hooks = ()
+        self._start = None
+
+    def set(self, **attributes):
+        """
+        Add or replace attributes of the span.
+        """
+        self.attributes.update(attributes)
+
+    def increment(self, attribute, amount=1):
+        """
+        Add an amount to a numeric attribute of the span.
+        """
+        self.attributes[attribute] = self.attributes.get(attribute, 0) + amount
+
+    def __enter__(self):
+        self._hooks = _hooks + _scoped_hooks.get()
+        for hook in self._hooks:
+            try:
+                hook.before(self)
+            except Exception:
+                log.exception("Instrumentation hook %r failed", hook)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._start
+        self.error = exc_value
+        for hook in reversed(self._hooks):
+            try:
+                hook.after(self)
+            except Exception:
+                log.exception("Instrumentation hook %r failed", hook)
+        return False
+
+    def __repr__(self):
+        return f"Span({self.kind!r}, {self.name!r})"
+
+
+def lazy_load(obj, attribute):
+    """
+    Create a :data:`LAZY_LOAD` span for an object.
+
+    :param obj: The object that is being loaded.
+    :param str attribute: The attribute that triggered the load.
+    :rtype: Span
+    """
+    object_type = type(obj).__name__
+    return Span(
+        LAZY_LOAD,
+        f"{object_type}.{attribute}",
+        type=object_type,
+        id=getattr(obj, "id", None),
+        attribute=attribute,
+    )
+
+
+class LazyLoadWarning(UserWarning):
+    """
+    Warning issued by :class:`LazyLoadDetector`.
+    """
+
+
+class LazyLoadError(Exception):
+    """
+    Error raised by :class:`LazyLoadDetector`.
+    """
+
+
+_IGNORED_PACKAGES = tuple(
+    os.path.dirname(path) + os.sep for path in (__file__, dogpile.__file__)
+)
+
+
+def _call_site():
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename.startswith(_IGNORED_PACKAGES):
+        frame = frame.f_back
+    if frame is None:
+        return None
+    return f"{frame.f_code.co_filename}:{frame.f_lineno}"
+
+
+class LazyLoadDetector(Hook):
+    """
+    A hook that detects N+1 lazy loads.
+
+    Inside the block, every lazy load is counted per call site, object type
+    and attribute. Only the outermost lazy load is counted, loads triggered
+    by another lazy load are attributed to the first one. When the block
+    ends, a :class:`LazyLoadWarning` is issued for every call site that lazy
+    loaded the same attribute for more than `threshold` objects::
+
+        with LazyLoadDetector(threshold=5, error=True):
+            for perceel in gateway.list_percelen_by_sectie(sectie):
+                perceel.centroid
+
+    :param int threshold: The maximum number of objects that can be lazy
+        loaded per call site.
+    :param bool error: Raise a :class:`LazyLoadError` instead of warning.
+    """
+
+    def __init__(self, threshold=10, error=False):
+        self.threshold = threshold
+        self.error = error
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._loads = defaultdict(set)
+
+    def before(self, span):
+        if span.kind != LAZY_LOAD:
+            return
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        if depth:
+            return
+        key = (_call_site(), span.attributes["type"], span.attributes["attribute"])
+        object_id = span.attributes["id"]
+        with self._lock:
+            loads = self._loads[key]
+            loads.add(len(loads) if object_id is None else object_id)
+
+    def after(self, span):
+        if span.kind == LAZY_LOAD:
+            self._local.depth -= 1
+
+    def report(self):
+        """
+        Get the call sites that exceeded the threshold.
+
+        :returns: A list of `(call site, type, attribute, number of objects)`
+            tuples, the worst offender first.
+        """
+        with self._lock:
+            offenders = [
+                (*key, len(objects))
+                for key, objects in self._loads.items()
+                if len(objects) > self.threshold
+            ]
+        return sorted(offenders, key=lambda offender: -offender[3])
+
+    def __enter__(self):
+        with self._lock:
+            self._loads.clear()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        messages = [
+            f"{object_type}.{attribute} was lazy loaded for {count} objects "
+            f"at {call_site}"
+            for call_site, object_type, attribute, count in self.report()
+        ]
+        if messages and self.error:
+            raise LazyLoadError("\n".join(messages))
+        for message in messages:
+            warnings.warn(message, LazyLoadWarning, stacklevel=2)
+        return False
+
+
+class OpenTelemetryHook(Hook):
+    """
+    A hook that emits an OpenTelemetry span for every :class:`Span`.
+
+    Requires the optional `opentelemetry-api` package::
+
+        from crabpy.instrumentation import OpenTelemetryHook
+        from crabpy.instrumentation import register_hook
+
+        register_hook(OpenTelemetryHook())
+
+    :param tracer: `Optional.` The tracer to use, defaults to the `crabpy`
+        tracer of the global tracer provider.
+    """
+
+    def __init__(self, tracer=None):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("crabpy")
+        self._spans = {}
+
+    @staticmethod
+    def _attribute(value):
+        if isinstance(value, (str, bool, int, float)):
+            return value
+        return str(value)
+
+    def _attributes(self, span):
+        attributes = {"crabpy.kind": span.kind}
+        for key, value in span.attributes.items():
+            if value is not None:
+                attributes[f"crabpy.{key}"] = self._attribute(value)
+        return attributes
+
+    def before(self, span):
+        otel_span = self.tracer.start_span(
+            f"crabpy.{span.kind} {span.name}", attributes=self._attributes(span)
+        )
+        token = self._trace.use_span(otel_span, end_on_exit=False)
+        token.__enter__()
+        self._spans[id(span)] = (otel_span, token)
+
+    def after(self, span):
+        otel_span, token = self._spans.pop(id(span))
+        otel_span.set_attributes(self._attributes(span))
+        if span.error is not None:
+            otel_span.record_exception(span.error)
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        token.__exit__(None, None, None)
+        otel_span.end()
@@ -0,0 +1,167 @@
+"""
+This module decodes the arrays of large json documents as they come in.
+
+A list page of the adressenregister is a json object with an array of
+objects next to a few links. :func:`iter_array` decodes the objects of that
+array one by one while the response is received, optionally keeping only
+some of their fields, so the page is never held as one big document::
+
+    from crabpy.jsonstream import CHUNK_SIZE
+    from crabpy.jsonstream import iter_array
+
+    response = requests.get(url, stream=True)
+    chunks = response.iter_content(CHUNK_SIZE)
+    for adres in iter_array(chunks, "adressen", fields=("identificator",)):
+        print(adres["identificator"]["objectId"])
+
+Decoding a whole page with :func:`json.loads` is faster, so this only pays
+off when the objects are used while the rest of the page is still coming in.
+
+.. versionadded:: 1.9.0
+"""
+
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 65536
+"""
+The number of bytes read from a response at a time.
+"""
+
+_decoder = json.JSONDecoder()
+
+_SEPARATOR = re.compile(r"[ \t\n\r]*([,\]])[ \t\n\r]*")
+
+
+class _Reader:
+    """
+    A buffer over the chunks of a json document.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._done = False
+        self.buffer = ""
+        self.pos = 0
+
+    def _read(self):
+        if self._done:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._done = True
+            chunk = self._utf8.decode(b"", final=True)
+        elif isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk)
+        # What was decoded already is dropped.
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and get the next character, `''` at the end.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def expect(self, characters):
+        """
+        Consume the next character, which must be one of `characters`.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise json.JSONDecodeError(
+                f"Expecting one of {characters!r}", self.buffer, self.pos
+            )
+        self.pos += 1
+        return character
+
+    def value(self):
+        """
+        Decode the next json value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._read():
+                    continue
+                raise
+            # A number at the end of the buffer might continue in the next
+            # chunk.
+            if end == len(self.buffer) and self._read():
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """
+        Decode the items of an array, up to and including its `]`.
+        """
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        decode = _decoder.raw_decode
+        separator = _SEPARATOR.match
+        while True:
+            # Most items are in the buffer already, followed by a separator.
+            try:
+                item, end = decode(self.buffer, self.pos)
+                match = separator(self.buffer, end)
+            except json.JSONDecodeError:
+                match = None
+            if match is not None:
+                self.pos = match.end()
+                last = match.group(1) == "]"
+            else:
+                item = self.value()
+                last = self.expect(",]") == "]"
+                if not last:
+                    self.peek()
+            yield item
+            if last:
+                return
+
+
+def iter_array(chunks, key, fields=None, members=None):
+    """
+    Decode the items of an array in a json object as they come in.
+
+    :param chunks: An iterable of the parts of the json document, as `bytes`
+        in UTF-8 or as `str`, eg. :meth:`requests.Response.iter_content`.
+    :param str key: The member of the object that holds the array.
+    :param fields: `Optional.` Only keep these keys of every item.
+    :param dict members: `Optional.` A dict that receives the other members
+        of the object, eg. the `volgende` link. They are only complete once
+        the generator is exhausted.
+    :returns: A generator of the items.
+    :raises json.JSONDecodeError: When the document is not a json object.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name != key:
+            value = reader.value()
+            if members is not None:
+                members[name] = value
+        else:
+            reader.expect("[")
+            for item in reader.items():
+                if fields is not None:
+                    item = {field: item[field] for field in fields if field in item}
+                yield item
+        if reader.expect(",}") == "}":
+            return
@@ -0,0 +1,742 @@
+"""
+This module contains a local SQLite mirror of the adressenregister.
+
+:func:`build_mirror` fills a SQLite database from the paginated v2 endpoints
+of the adressenregister. :class:`SqliteAdressenRegisterClient` answers the
+same calls as :class:`crabpy.client.AdressenRegisterClient` from that
+database, so the :class:`crabpy.gateway.adressenregister.Gateway` runs on top
+of it unchanged::
+
+    from crabpy.client import AdressenRegisterClient
+    from crabpy.gateway.adressenregister import Gateway
+    from crabpy.mirror import SqliteAdressenRegisterClient
+    from crabpy.mirror import build_mirror
+
+    client = AdressenRegisterClient("https://api.basisregisters.vlaanderen.be", key)
+    build_mirror(client, "adressenregister.sqlite", niscodes=["44021"])
+
+    gateway = Gateway(SqliteAdressenRegisterClient("adressenregister.sqlite"))
+
+.. versionadded:: 1.9.0
+"""
+
+import contextvars
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+
+import requests
+
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway.cache import is_not_found
+from crabpy.instrumentation import REQUEST
+from crabpy.instrumentation import Span
+from crabpy.ratelimit import bulk
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+BATCH_SIZE = 500
+"""
+Number of objects whose details are fetched and stored per transaction.
+"""
+
+
+def _get(document, *path):
+    for key in path:
+        if not isinstance(document, dict) or document.get(key) is None:
+            return None
+        document = document[key]
+    return document
+
+
+def _spelling(naam):
+    return _get(naam, "geografischeNaam", "spelling")
+
+
+def _pick(*keys):
+    def summary(detail):
+        return {key: detail[key] for key in keys if key in detail}
+
+    return summary
+
+
+def _gemeente_summary(detail):
+    return {
+        "identificator": detail["identificator"],
+        "gemeentenaam": {"geografischeNaam": detail["gemeentenamen"][0]},
+        "gemeenteStatus": detail["gemeenteStatus"],
+    }
+
+
+def _straatnaam_summary(detail):
+    summary = {
+        "identificator": detail["identificator"],
+        "straatnaam": {"geografischeNaam": detail["straatnamen"][0]},
+    }
+    if detail.get("homoniemToevoegingen"):
+        summary["homoniemToevoeging"] = {
+            "geografischeNaam": detail["homoniemToevoegingen"][0]
+        }
+    summary["straatnaamStatus"] = detail["straatnaamStatus"]
+    return summary
+
+
+class _Collection:
+    """
+    How a collection of the adressenregister is mirrored.
+
+    :param str name: The name of the table and of the v2 endpoint.
+    :param str list_method: The client method that lists the collection.
+    :param str get_method: The client method that gets one object.
+    :param dict columns: Single valued filter columns, extracted from the
+        detail document.
+    :param dict terms: Multi valued filters, extracted from the detail
+        document as a list of values.
+    :param bool scoped: Whether the list method can be filtered by niscode.
+    :param summary: A function that builds the item of the list endpoint,
+        without the `detail` link, from a detail document. By default only
+        the `identificator` is kept.
+    """
+
+    def __init__(
+        self,
+        name,
+        list_method,
+        get_method,
+        columns=None,
+        terms=None,
+        scoped=False,
+        summary=None,
+    ):
+        self.name = name
+        self.list_method = list_method
+        self.get_method = get_method
+        self.columns = columns or {}
+        self.terms = terms or {}
+        self.scoped = scoped
+        self.summary = summary or _pick("identificator")
+
+    @property
+    def endpoint(self):
+        return f"/v2/{self.name}"
+
+    def item(self, detail, base_url):
+        """
+        Build the item the list endpoint returns for a detail document.
+
+        Only needed for objects that are not listed, eg. when they are
+        updated from a change feed.
+        """
+        item = self.summary(detail)
+        object_id = detail["identificator"]["objectId"]
+        item["detail"] = f"{base_url}{self.endpoint}/{object_id}"
+        return item
+
+
+COLLECTIONS = {
+    collection.name: collection
+    for collection in (
+        _Collection(
+            "gemeenten",
+            "get_gemeenten",
+            "get_gemeente",
+            columns={
+                "niscode": lambda d: _get(d, "identificator", "objectId"),
+                "status": lambda d: d.get("gemeenteStatus"),
+            },
+            terms={
+                "gemeentenaam": lambda d: [
+                    n["spelling"] for n in d.get("gemeentenamen", [])
+                ],
+            },
+            summary=_gemeente_summary,
+        ),
+        _Collection(
+            "postinfo",
+            "get_postinfos",
+            "get_postinfo",
+            columns={
+                "niscode": lambda d: _get(d, "gemeente", "objectId"),
+                "status": lambda d: d.get("postInfoStatus"),
+            },
+            terms={
+                "postnaam": lambda d: [_spelling(n) for n in d.get("postnamen", [])],
+                "gemeentenaam": lambda d: [
+                    _spelling(_get(d, "gemeente", "gemeentenaam"))
+                ],
+            },
+            summary=_pick("identificator", "postnamen", "postInfoStatus"),
+        ),
+        _Collection(
+            "straatnamen",
+            "get_straatnamen",
+            "get_straatnaam",
+            columns={
+                "niscode": lambda d: _get(d, "gemeente", "objectId"),
+                "status": lambda d: d.get("straatnaamStatus"),
+            },
+            terms={
+                "straatnaam": lambda d: [
+                    n["spelling"] for n in d.get("straatnamen", [])
+                ],
+                "gemeentenaam": lambda d: [
+                    _spelling(_get(d, "gemeente", "gemeentenaam"))
+                ],
+            },
+            scoped=True,
+            summary=_straatnaam_summary,
+        ),
+        _Collection(
+            "adressen",
+            "get_adressen",
+            "get_adres",
+            columns={
+                "niscode": lambda d: _get(d, "gemeente", "objectId"),
+                "gemeentenaam": lambda d: _spelling(
+                    _get(d, "gemeente", "gemeentenaam")
+                ),
+                "postcode": lambda d: _get(d, "postinfo", "objectId"),
+                "straatnaam_id": lambda d: _get(d, "straatnaam", "objectId"),
+                "straatnaam": lambda d: _spelling(_get(d, "straatnaam", "straatnaam")),
+                "homoniem_toevoeging": lambda d: _spelling(d.get("homoniemToevoeging")),
+                "huisnummer": lambda d: d.get("huisnummer"),
+                "busnummer": lambda d: d.get("busnummer"),
+                "status": lambda d: d.get("adresStatus"),
+            },
+            scoped=True,
+            summary=_pick(
+                "identificator",
+                "huisnummer",
+                "busnummer",
+                "volledigAdres",
+                "adresStatus",
+            ),
+        ),
+        _Collection(
+            "percelen",
+            "get_percelen",
+            "get_perceel",
+            columns={"status": lambda d: d.get("perceelStatus")},
+            terms={
+                "adres_id": lambda d: [a["objectId"] for a in d.get("adressen", [])]
+            },
+            summary=_pick("identificator", "perceelStatus"),
+        ),
+        _Collection(
+            "gebouwen",
+            "get_gebouwen",
+            "get_gebouw",
+            columns={"status": lambda d: d.get("gebouwStatus")},
+            summary=_pick("identificator", "gebouwStatus"),
+        ),
+    )
+}
+"""
+The collections that can be mirrored.
+"""
+
+
+def connect(path):
+    """
+    Open a mirror for writing and create its tables and indexes.
+
+    The database uses write-ahead logging, so it can be read while it is
+    being updated.
+
+    :param path: The path of the SQLite database.
+    :rtype: sqlite3.Connection
+    """
+    connection = sqlite3.connect(str(path))
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    with connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS terms ("
+            "collection TEXT NOT NULL, field TEXT NOT NULL, value TEXT NOT NULL, "
+            "id TEXT NOT NULL, PRIMARY KEY (collection, field, value, id)"
+            ") WITHOUT ROWID"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS terms_id ON terms (collection, id)"
+        )
+        for collection in COLLECTIONS.values():
+            columns = "".join(f", {column} TEXT" for column in collection.columns)
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {collection.name} ("
+                "id TEXT PRIMARY KEY, item TEXT NOT NULL, detail TEXT NOT NULL, "
+                f"build INTEGER NOT NULL{columns})"
+            )
+            for column in collection.columns:
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {collection.name}_{column} "
+                    f"ON {collection.name} ({column})"
+                )
+        connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('schema_version', ?)",
+            (str(SCHEMA_VERSION),),
+        )
+    return connection
+
+
+@bulk()
+def fetch_detail(client, name, object_id):
+    """
+    Get the detail document of an object, inside
+    :func:`crabpy.ratelimit.bulk`.
+
+    :param client: A :class:`crabpy.client.AdressenRegisterClient`.
+    :param str name: The name of the collection.
+    :param str object_id: The id of the object.
+    :returns: The detail document, `None` when the object does not exist.
+    """
+    try:
+        return getattr(client, COLLECTIONS[name].get_method)(object_id)
+    except AdressenRegisterClientException as e:
+        if is_not_found(e):
+            return None
+        raise
+
+
+def store(connection, name, objects, build):
+    """
+    Insert or replace objects in a mirror.
+
+    Must be called inside a transaction.
+
+    :param sqlite3.Connection connection: A connection from :func:`connect`.
+    :param str name: The name of the collection.
+    :param objects: `(id, item, detail)` tuples.
+    :param int build: The build that stores the objects.
+    """
+    collection = COLLECTIONS[name]
+    columns = list(collection.columns)
+    rows, terms = [], []
+    for object_id, item, detail in objects:
+        values = [extract(detail) for extract in collection.columns.values()]
+        rows.append([object_id, json.dumps(item), json.dumps(detail), build] + values)
+        for field, extract in collection.terms.items():
+            terms.extend(
+                (name, field, value, object_id)
+                for value in set(extract(detail))
+                if value is not None
+            )
+    remove(connection, name, [row[0] for row in rows])
+    connection.executemany(
+        f"INSERT INTO {name} "
+        f"(id, item, detail, build{''.join(f', {c}' for c in columns)}) "
+        f"VALUES (?, ?, ?, ?{', ?' * len(columns)})",
+        rows,
+    )
+    connection.executemany("INSERT OR IGNORE INTO terms VALUES (?, ?, ?, ?)", terms)
+
+
+def remove(connection, name, ids):
+    """
+    Remove objects from a mirror.
+
+    Must be called inside a transaction.
+
+    :param sqlite3.Connection connection: A connection from :func:`connect`.
+    :param str name: The name of the collection.
+    :param ids: The ids of the objects.
+    :returns: The number of removed objects.
+    """
+    ids = [(object_id,) for object_id in ids]
+    connection.executemany(
+        "DELETE FROM terms WHERE collection = ? AND id = ?",
+        [(name, object_id) for object_id, in ids],
+    )
+    before = connection.total_changes
+    connection.executemany(f"DELETE FROM {name} WHERE id = ?", ids)
+    return connection.total_changes - before
+
+
+def _store_listed(connection, executor, client, collection, items, build, niscodes):
+    """
+    Fetch the details of listed objects and store them.
+
+    :returns: The number of stored objects.
+    """
+    stored = 0
+    context = contextvars.copy_context()
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start : start + BATCH_SIZE]
+        ids = [item["identificator"]["objectId"] for item in batch]
+        details = executor.map(
+            lambda object_id: context.copy().run(
+                fetch_detail, client, collection.name, object_id
+            ),
+            ids,
+        )
+        objects = []
+        for object_id, item, detail in zip(ids, batch, details):
+            if detail is None:
+                log.warning(
+                    "%s %s disappeared while mirroring", collection.name, object_id
+                )
+                continue
+            if niscodes is not None and "niscode" in collection.columns:
+                if collection.columns["niscode"](detail) not in niscodes:
+                    continue
+            objects.append((object_id, item, detail))
+        with connection:
+            store(connection, collection.name, objects, build)
+        stored += len(objects)
+    return stored
+
+
+def _remove_stale(connection, collection, build, niscodes):
+    where = "build != ?"
+    params = [build]
+    if niscodes is not None and "niscode" in collection.columns:
+        where += f" AND niscode IN ({', '.join('?' * len(niscodes))})"
+        params += sorted(niscodes)
+    with connection:
+        removed = connection.execute(
+            f"DELETE FROM {collection.name} WHERE {where}", params
+        ).rowcount
+        connection.execute(
+            "DELETE FROM terms WHERE collection = ? "
+            f"AND id NOT IN (SELECT id FROM {collection.name})",
+            (collection.name,),
+        )
+    return removed
+
+
+@bulk()
+def build_mirror(client, path, collections=None, niscodes=None, concurrency=8):
+    """
+    Fill or update a SQLite mirror of the adressenregister.
+
+    Every collection is listed with the paginated v2 endpoints and the
+    details of every object are fetched with `concurrency` parallel
+    requests. Objects that were removed from the register since the previous
+    build are removed from the mirror.
+
+    The `niscodes` limit the gemeenten, postinfo, straatnamen and adressen
+    that are mirrored. The adressenregister can't filter percelen and
+    gebouwen by gemeente, they are always mirrored completely. Leave them
+    out of the `collections` when they are not needed. The niscodes of every
+    collection are kept in the mirror, so
+    :class:`crabpy.sync.SqliteTarget` only applies changes within them.
+
+    :param client: A :class:`crabpy.client.AdressenRegisterClient`.
+    :param path: The path of the SQLite database, it is created when needed.
+    :param collections: `Optional.` The names of the collections to mirror,
+        defaults to all :data:`COLLECTIONS`.
+    :param niscodes: `Optional.` The niscodes of the gemeenten to mirror.
+    :param int concurrency: The number of parallel detail requests.
+    :returns: A dict with the number of mirrored objects per collection.
+    """
+    names = list(collections or COLLECTIONS)
+    unknown = set(names) - set(COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown collections: {', '.join(sorted(unknown))}")
+    niscodes = {str(niscode) for niscode in niscodes} if niscodes else None
+    scopes = niscodes
+    if scopes is None and any(COLLECTIONS[name].scoped for name in names):
+        scopes = [g["identificator"]["objectId"] for g in client.get_gemeenten()]
+    build = time.time_ns()
+    counts = Counter()
+    connection = connect(path)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for name in names:
+                collection = COLLECTIONS[name]
+                list_method = getattr(client, collection.list_method)
+                if collection.scoped:
+                    pages = (list_method(niscode=niscode) for niscode in sorted(scopes))
+                else:
+                    pages = [list_method()]
+                for items in pages:
+                    counts[name] += _store_listed(
+                        connection, executor, client, collection, items, build, niscodes
+                    )
+                removed = _remove_stale(connection, collection, build, niscodes)
+                log.info("Mirrored %d %s, removed %d", counts[name], name, removed)
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                        (
+                            f"{name}.built_at",
+                            datetime.now(timezone.utc).isoformat(),
+                        ),
+                    )
+                    if niscodes is not None and "niscode" in collection.columns:
+                        connection.execute(
+                            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                            (f"{name}.niscodes", ",".join(sorted(niscodes))),
+                        )
+                    else:
+                        connection.execute(
+                            "DELETE FROM meta WHERE key = ?", (f"{name}.niscodes",)
+                        )
+    finally:
+        connection.close()
+    return dict(counts)
+
+
+def _raise_not_found(url):
+    response = requests.Response()
+    response.status_code = 404
+    response.url = url
+    raise AdressenRegisterClientException(f"{url} is not in the mirror") from (
+        requests.HTTPError(
+            f"404 Client Error: Not Found for url: {url}", response=response
+        )
+    )
+
+
+class SqliteAdressenRegisterClient:
+    """
+    A client that answers the calls of
+    :class:`crabpy.client.AdressenRegisterClient` from a mirror built with
+    :func:`build_mirror`.
+
+    Lists return the same items as the list endpoints, lookups by id return
+    the same documents as the detail endpoints. A missing object raises an
+    :class:`crabpy.client.AdressenRegisterClientException` caused by a 404,
+    just like the real client. Filters match exactly.
+
+    The client can be shared between threads, every thread gets its own
+    read-only connection. :meth:`close` closes them all, the client can also
+    be used as a context manager::
+
+        with SqliteAdressenRegisterClient("adressenregister.sqlite") as client:
+            gateway = Gateway(client)
+
+    :param path: The path of the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise ValueError(f"No mirror found at {self.path}")
+        self.base_url = self.path.resolve().as_uri()
+        self.stats = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        local = self._local
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            # Only used by this thread, but closed by the thread that calls
+            # close.
+            connection = sqlite3.connect(
+                f"{self.base_url}?mode=ro", uri=True, check_same_thread=False
+            )
+            with self._lock:
+                self._connections.append(connection)
+            local.connection = connection
+        return connection
+
+    def close(self):
+        """
+        Close the connections of all threads.
+
+        The client connects again when it is used afterwards.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _query(self, endpoint, sql, params, span_params=None):
+        url = f"{self.base_url}{endpoint}"
+        start = time.perf_counter()
+        failed = True
+        try:
+            with Span(
+                REQUEST,
+                endpoint,
+                gateway="adressenregister",
+                url=url,
+                params=span_params,
+            ) as span:
+                rows = self._connection().execute(sql, params).fetchall()
+                span.set(rows=len(rows))
+                failed = False
+                return rows
+        except sqlite3.Error as e:
+            raise AdressenRegisterClientException(str(e)) from e
+        finally:
+            if self.stats is not None:
+                self.stats.record_upstream(
+                    endpoint, time.perf_counter() - start, error=failed
+                )
+
+    def _get(self, name, object_id):
+        endpoint = f"{COLLECTIONS[name].endpoint}/{{id}}"
+        rows = self._query(
+            endpoint,
+            f"SELECT detail FROM {name} WHERE id = ?",
+            (str(object_id),),
+            {"id": object_id},
+        )
+        if not rows:
+            _raise_not_found(f"{self.base_url}{COLLECTIONS[name].endpoint}/{object_id}")
+        return json.loads(rows[0][0])
+
+    def _where(self, name, filters):
+        clauses, params = [], []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            if field in COLLECTIONS[name].columns:
+                clauses.append(f"{field} = ?")
+                params.append(str(value))
+            else:
+                clauses.append(
+                    "id IN (SELECT id FROM terms "
+                    "WHERE collection = ? AND field = ? AND value = ?)"
+                )
+                params.extend((name, field, str(value)))
+        return " AND ".join(clauses) or "1", params
+
+    def _get_list(self, name, column="item", fields=None, **filters):
+        where, params = self._where(name, filters)
+        rows = self._query(
+            COLLECTIONS[name].endpoint,
+            f"SELECT {column} FROM {name} WHERE {where} ORDER BY rowid",
+            params,
+            {k: v for k, v in filters.items() if v is not None},
+        )
+        items = [json.loads(row[0]) for row in rows]
+        if fields is not None:
+            items = [{f: item[f] for f in fields if f in item} for item in items]
+        return items
+
+    def get_gemeente(self, gemeente_id):
+        return self._get("gemeenten", gemeente_id)
+
+    def get_gemeenten(self, gemeentenaam=None, status=None, fields=None):
+        return self._get_list(
+            "gemeenten", fields=fields, gemeentenaam=gemeentenaam, status=status
+        )
+
+    def get_postinfo(self, postinfo_id):
+        return self._get("postinfo", postinfo_id)
+
+    def get_postinfos(self, gemeentenaam=None, postnaam=None, fields=None):
+        return self._get_list(
+            "postinfo", fields=fields, gemeentenaam=gemeentenaam, postnaam=postnaam
+        )
+
+    def get_straatnaam(self, straatnaam_id):
+        return self._get("straatnamen", straatnaam_id)
+
+    def get_straatnamen(
+        self, straatnaam=None, gemeentenaam=None, niscode=None, status=None, fields=None
+    ):
+        return self._get_list(
+            "straatnamen",
+            fields=fields,
+            straatnaam=straatnaam,
+            gemeentenaam=gemeentenaam,
+            niscode=niscode,
+            status=status,
+        )
+
+    def get_adres_match(
+        self,
+        gemeentenaam=None,
+        niscode=None,
+        postcode=None,
+        kadaster_straatcode=None,
+        rr_straatcode=None,
+        straatnaam=None,
+        huisnummer=None,
+        index=None,
+        busnummer=None,
+    ):
+        """
+        Match an address against the mirror.
+
+        Unlike the adresmatch service, the mirror only returns exact matches.
+        The kadaster and rijksregister straatcodes and the index are not
+        mirrored and can not be used.
+        """
+        if any(p is not None for p in (kadaster_straatcode, rr_straatcode, index)):
+            raise ValueError(
+                "The mirror can not match on straatcodes or an index, "
+                "use the adresmatch service instead."
+            )
+        details = self._get_list(
+            "adressen",
+            column="detail",
+            gemeentenaam=gemeentenaam,
+            niscode=niscode,
+            postcode=postcode,
+            straatnaam=straatnaam,
+            huisnummer=huisnummer,
+            busnummer=busnummer,
+        )
+        return {
+            "adresMatches": [dict(detail, score=100.0) for detail in details[:10]],
+            "warnings": [],
+        }
+
+    def get_adres(self, adres_id):
+        return self._get("adressen", adres_id)
+
+    def get_adressen(
+        self,
+        gemeentenaam=None,
+        postcode=None,
+        straatnaam=None,
+        homoniem_toevoeging=None,
+        huisnummer=None,
+        busnummer=None,
+        niscode=None,
+        status=None,
+        straatnaamObjectId=None,
+        fields=None,
+    ):
+        return self._get_list(
+            "adressen",
+            fields=fields,
+            gemeentenaam=gemeentenaam,
+            postcode=postcode,
+            straatnaam=straatnaam,
+            homoniem_toevoeging=homoniem_toevoeging,
+            huisnummer=huisnummer,
+            busnummer=busnummer,
+            niscode=niscode,
+            status=status,
+            straatnaam_id=straatnaamObjectId,
+        )
+
+    def get_perceel(self, perceel_id):
+        return self._get("percelen", perceel_id)
+
+    def get_percelen(self, status=None, adresObjectId=None, fields=None):
+        return self._get_list(
+            "percelen", fields=fields, status=status, adres_id=adresObjectId
+        )
+
+    def get_gebouw(self, gebouw_id):
+        return self._get("gebouwen", gebouw_id)
+
+    def get_gebouwen(self, status=None, fields=None):
+        return self._get_list("gebouwen", fields=fields, status=status)
@@ -0,0 +1,319 @@
+"""
+This module keeps the requests to the upstream APIs within their limits.
+
+Every API key gets one shared :class:`Limiter`, used by the requests made
+inside :func:`bulk`, eg. by the mirror, the sync, the exports and the batch
+matching. Other requests only go through a limiter that is passed to their
+client or gateway. A limiter caps the request rate and adapts the number of
+requests in flight: more while the API answers quickly, fewer when the
+latency rises or the API answers `429 Too Many Requests`. After a 429 no
+requests are sent until its `Retry-After` passed, then the request is
+retried. A `Retry-After` longer than `max_retry_after` is not waited for,
+the request fails with the 429 instead, and requests with a
+:func:`crabpy.timeouts.deadline` that ends before the pause fail right away.
+Bulk jobs settle close to the highest throughput the API allows without
+being told what it is.
+
+The limits are configured per API and optionally per API key::
+
+    from crabpy.ratelimit import configure_limits
+
+    configure_limits("adressenregister", rate=50, max_concurrency=16)
+    configure_limits("adressenregister", api_key="KEY", rate=200)
+
+.. versionadded:: 1.9.0
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import remaining
+
+RETRIES = 3
+"""
+How many times a request that was answered with a 429 is retried.
+"""
+
+MAX_RETRY_AFTER = 60
+"""
+The longest `Retry-After`, in seconds, a :class:`Limiter` waits for.
+"""
+
+WARM_UP = 20
+"""
+The number of answers a :class:`Limiter` needs before it reacts to latency.
+"""
+
+_bulk = contextvars.ContextVar("crabpy_bulk", default=False)
+
+
+@contextlib.contextmanager
+def bulk():
+    """
+    Send the requests inside this context through the shared limiters.
+
+    Can also decorate a function. Functions that run in other threads need
+    their own :func:`bulk`.
+    """
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+def in_bulk():
+    """
+    Check if the current requests are sent inside :func:`bulk`.
+    """
+    return _bulk.get()
+
+
+class Limiter:
+    """
+    A token bucket rate limiter with an adaptive concurrency limit.
+
+    The concurrency limit grows by about one for every `limit` answers and
+    is multiplied by `decrease` on a 429, or when the recent latency is more
+    than `latency_tolerance` times and `min_latency_growth` seconds above
+    the long-term latency (additive increase, multiplicative decrease). The
+    jitter of answers that take a few milliseconds is not mistaken for an
+    overloaded API.
+
+    :param float rate: `Optional.` The highest number of requests per second.
+    :param int burst: The number of requests that may be sent at once when
+        the rate allows it, defaults to the rate.
+    :param int concurrency: The initial number of requests in flight.
+    :param int min_concurrency: The lowest concurrency limit.
+    :param int max_concurrency: The highest concurrency limit.
+    :param float latency_tolerance: How much slower than usual the recent
+        answers may be before the concurrency is lowered.
+    :param float min_latency_growth: The seconds the recent answers must at
+        least be slower than usual before the concurrency is lowered.
+    :param float decrease: The factor the concurrency is multiplied with
+        when lowered.
+    :param float max_retry_after: The longest pause after a 429. Throttled
+        requests that are asked to wait longer are not retried.
+    """
+
+    def __init__(
+        self,
+        rate=None,
+        burst=None,
+        concurrency=16,
+        min_concurrency=1,
+        max_concurrency=64,
+        latency_tolerance=2.0,
+        min_latency_growth=0.05,
+        decrease=0.5,
+        max_retry_after=MAX_RETRY_AFTER,
+    ):
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.min_latency_growth = min_latency_growth
+        self.decrease = decrease
+        self.max_retry_after = max_retry_after
+        self.in_flight = 0
+        self._limit = float(concurrency)
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._latency = None
+        self._recent_latency = None
+        self._samples = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """
+        The current number of requests that may be in flight.
+        """
+        return max(self.min_concurrency, int(self._limit))
+
+    def _refill(self, now):
+        if self.rate:
+            elapsed = now - self._refilled_at
+            self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._refilled_at = now
+
+    def acquire(self):
+        """
+        Wait until a request may be sent.
+
+        :raises crabpy.timeouts.DeadlineExceeded: When the current deadline
+            passes while waiting, or ends before a pause after a 429.
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= self.limit:
+                    wait = None
+                elif self.rate and self._tokens < 1:
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1 if self.rate else 0
+                    self.in_flight += 1
+                    return
+                left = remaining()
+                if left is not None:
+                    if left <= 0:
+                        raise DeadlineExceeded("Deadline exceeded waiting to send")
+                    if now + left < self._paused_until:
+                        raise DeadlineExceeded("Deadline ends before the Retry-After")
+                    wait = left if wait is None else min(wait, left)
+                self._condition.wait(wait)
+
+    def release(self, latency=None, throttled=False, retry_after=None):
+        """
+        Report the outcome of a request that was allowed by :meth:`acquire`.
+
+        :param float latency: `Optional.` How long the request took, leave
+            it out for requests that failed.
+        :param bool throttled: Whether the API answered with a 429.
+        :param float retry_after: `Optional.` The seconds to wait before
+            sending new requests, at most `max_retry_after`.
+        """
+        with self._condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            if retry_after:
+                pause = min(retry_after, self.max_retry_after)
+                self._paused_until = max(self._paused_until, now + pause)
+            if throttled:
+                self._lower(now, self._latency or 0.1)
+            elif latency is not None:
+                # The long-term latency is the mean of the first answers, then
+                # a slow moving average.
+                self._samples += 1
+                if self._latency is None:
+                    self._latency = self._recent_latency = latency
+                weight = max(1 / self._samples, 0.01)
+                self._latency += (latency - self._latency) * weight
+                self._recent_latency += (latency - self._recent_latency) * 0.2
+                if (
+                    self._samples > WARM_UP
+                    and self._recent_latency > self._latency * self.latency_tolerance
+                    and self._recent_latency - self._latency > self.min_latency_growth
+                ):
+                    self._lower(now, self._recent_latency)
+                else:
+                    self._limit = min(
+                        self.max_concurrency, self._limit + 1 / self.limit
+                    )
+            self._condition.notify_all()
+
+    def _lower(self, now, window):
+        # Lower at most once per round trip, the answers to the requests that
+        # were in flight already carry no news.
+        if now - self._decreased_at < window:
+            return
+        self._decreased_at = now
+        self._limit = max(self.min_concurrency, self._limit * self.decrease)
+
+
+def retry_after(response):
+    """
+    Get the seconds to wait from the `Retry-After` header of a response.
+
+    :returns: The seconds, `None` when the header is missing or invalid.
+    """
+    from email.utils import parsedate_to_datetime
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def limited(limiter, fn, stats=None, retries=RETRIES):
+    """
+    Send a request through a limiter, retrying it when it is throttled.
+
+    :param Limiter limiter: The limiter, `None` to send without limits.
+    :param fn: A function without arguments that sends the request and
+        returns the :class:`requests.Response`.
+    :param stats: `Optional.` A :class:`crabpy.stats.Statistics` that counts
+        the `throttled_requests`.
+    :param int retries: How many times a throttled request is retried.
+    :returns: The response, a 429 when it was still throttled after the
+        retries or the API asked to wait longer than the `max_retry_after`
+        of the limiter.
+    """
+    if limiter is None:
+        return fn()
+    for _ in range(retries + 1):
+        limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = fn()
+        except BaseException:
+            limiter.release()
+            raise
+        if response.status_code != 429:
+            limiter.release(time.perf_counter() - start)
+            return response
+        delay = retry_after(response)
+        if stats is not None:
+            stats.increment("throttled_requests")
+        if delay is not None and delay > limiter.max_retry_after:
+            limiter.release(throttled=True)
+            return response
+        limiter.release(throttled=True, retry_after=1 if delay is None else delay)
+    return response
+
+
+_settings = {}
+_limiters = {}
+_lock = threading.Lock()
+
+
+def configure_limits(api, api_key=None, **settings):
+    """
+    Configure the limiter of an API, or of one API key.
+
+    The clients and gateways look their limiter up for every request, so
+    the new limits apply to them right away.
+
+    :param str api: `adressenregister` or `capakey`.
+    :param str api_key: `Optional.` The API key, leave it out to configure
+        the default for all keys.
+    :param settings: The arguments of :class:`Limiter`.
+    """
+    with _lock:
+        _settings[(api, api_key)] = settings
+        for key in [key for key in _limiters if key[0] == api]:
+            if api_key is None or key[1] == api_key:
+                del _limiters[key]
+
+
+def get_limiter(api, api_key=None):
+    """
+    Get the shared limiter of an API key.
+
+    :param str api: `adressenregister` or `capakey`.
+    :param str api_key: `Optional.` The API key.
+    :rtype: Limiter
+    """
+    with _lock:
+        limiter = _limiters.get((api, api_key))
+        if limiter is None:
+            settings = _settings.get((api, api_key), _settings.get((api, None), {}))
+            limiter = _limiters[(api, api_key)] = Limiter(**settings)
+        return limiter
@@ -0,0 +1,223 @@
+"""
+This module resolves addresses from local data before asking the adresmatch
+service.
+
+A :class:`Resolver` looks the address up in the straten and adressen the
+adressenregister gateway already has in its cache regions, or in a mirror.
+Only when the address is not known locally, the adresmatch service is
+called::
+
+    from crabpy.resolver import Resolver
+
+    resolver = Resolver(gateway)
+    adres = resolver.resolve(
+        gemeentenaam="Gent", straatnaam="Kerkstraat", huisnummer="1"
+    )
+
+.. versionadded:: 1.9.0
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from collections import OrderedDict
+
+from dogpile.cache.api import NO_VALUE
+
+from crabpy.gateway.adressenregister import Adres
+from crabpy.mirror import SqliteAdressenRegisterClient
+from crabpy.text import clean
+from crabpy.text import normalise
+
+log = logging.getLogger(__name__)
+
+
+class Resolver:
+    """
+    Resolves addresses from local data first.
+
+    The gemeente is found in the local gemeenten and deelgemeenten of the
+    gateway. The straten of that gemeente and the adressen of the straat are
+    looked up in the cache regions of `list_straten` and
+    `list_adressen_by_straat`, without calling the adressenregister. The
+    resolver indexes them on normalised names and numbers, so repeated
+    lookups in the same straat are cheap. The indexes of the last
+    `index_size` gemeenten and straten are kept, and rebuilt when they are
+    older than `index_max_age` seconds or the list they were built from
+    changed in length.
+
+    :param gateway: A :class:`crabpy.gateway.adressenregister.Gateway`.
+    :param bool fetch: Load straten and adressen that are not cached through
+        the gateway. Defaults to `True` when the gateway runs on a
+        :class:`crabpy.mirror.SqliteAdressenRegisterClient` and `False`
+        otherwise.
+    :param float min_score: The lowest adresmatch score that is accepted
+        when falling back to the adresmatch service.
+    :param int index_size: The number of straten and adressen indexes to
+        keep.
+    :param float index_max_age: The number of seconds an index is used
+        before it is rebuilt.
+    """
+
+    def __init__(
+        self, gateway, fetch=None, min_score=0, index_size=1000, index_max_age=3600
+    ):
+        self.gateway = gateway
+        if fetch is None:
+            fetch = isinstance(gateway.client, SqliteAdressenRegisterClient)
+        self.fetch = fetch
+        self.min_score = min_score
+        self.index_size = index_size
+        self.index_max_age = index_max_age
+        self.counts = Counter()
+        self._gemeenten = None
+        self._straten = OrderedDict()
+        self._adressen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _gemeente_index(self):
+        if self._gemeenten is None:
+            index = {}
+            for deelgemeente in self.gateway.deelgemeenten:
+                index.setdefault(
+                    normalise(deelgemeente.naam), deelgemeente.gemeente_niscode
+                )
+            for gemeente in self.gateway.gemeenten:
+                for naam in gemeente.namen:
+                    index[normalise(naam["naam"])] = gemeente.niscode
+            self._gemeenten = index
+        return self._gemeenten
+
+    def _load(self, method, *args):
+        if self.fetch:
+            return method(*args)
+        result = method.get(*args)
+        return None if result is NO_VALUE else result
+
+    def _index(self, cache, key, source, build):
+        """
+        Get the index of a list by the id of the gemeente or straat.
+
+        The cached lists are copies when the cache backend serializes them,
+        so an index is reused by key and rebuilt when it is too old or the
+        list changed in length.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = cache.get(key)
+            if (
+                cached is not None
+                and cached[0] == len(source)
+                and now - cached[1] <= self.index_max_age
+            ):
+                cache.move_to_end(key)
+                return cached[2]
+        index = {}
+        for item in source:
+            index.setdefault(build(item), []).append(item)
+        with self._lock:
+            cache[key] = (len(source), now, index)
+            cache.move_to_end(key)
+            while len(cache) > self.index_size:
+                cache.popitem(last=False)
+        return index
+
+    def niscode(self, gemeentenaam):
+        """
+        Find the niscode of a gemeente or deelgemeente by name.
+
+        :returns: The niscode, `None` when the name is unknown.
+        """
+        return self._gemeente_index().get(normalise(gemeentenaam))
+
+    def resolve_locally(
+        self, straatnaam, huisnummer, busnummer=None, gemeentenaam=None, niscode=None
+    ):
+        """
+        Resolve an address from local data only.
+
+        :returns: An :class:`crabpy.gateway.adressenregister.Adres`, `None`
+            when the address is not known locally.
+        """
+        if niscode is None and gemeentenaam:
+            niscode = self.niscode(gemeentenaam)
+        if niscode is None:
+            return None
+        gateway_type = type(self.gateway)
+        straten = self._load(gateway_type.list_straten, self.gateway, niscode)
+        if not straten:
+            return None
+        straten_index = self._index(
+            self._straten, niscode, straten, lambda straat: normalise(straat.naam())
+        )
+        nummer = (normalise(huisnummer), normalise(busnummer or ""))
+        for straat in straten_index.get(normalise(straatnaam), ()):
+            adressen = self._load(
+                gateway_type.list_adressen_by_straat, self.gateway, straat
+            )
+            if not adressen:
+                continue
+            adressen_index = self._index(
+                self._adressen,
+                straat.id,
+                adressen,
+                lambda adres: (
+                    normalise(adres.huisnummer),
+                    normalise(adres.busnummer or ""),
+                ),
+            )
+            found = adressen_index.get(nummer)
+            if found:
+                return found[0]
+        return None
+
+    def resolve(
+        self,
+        straatnaam,
+        huisnummer,
+        busnummer=None,
+        gemeentenaam=None,
+        niscode=None,
+        postcode=None,
+    ):
+        """
+        Resolve an address, from local data when possible.
+
+        :param str straatnaam: The name of the straat.
+        :param str huisnummer: The huisnummer.
+        :param str busnummer: `Optional.` The busnummer.
+        :param str gemeentenaam: `Optional.` The name of the gemeente or
+            deelgemeente.
+        :param str niscode: `Optional.` The niscode of the gemeente.
+        :param str postcode: `Optional.` The postcode, only used by the
+            adresmatch service.
+        :returns: An :class:`crabpy.gateway.adressenregister.Adres`, `None`
+            when the address can't be found or adresmatch only matches the
+            gemeente or straat.
+        """
+        adres = self.resolve_locally(
+            straatnaam, huisnummer, busnummer, gemeentenaam, niscode
+        )
+        if adres is not None:
+            self.counts["local"] += 1
+            return adres
+        self.counts["remote"] += 1
+        response = self.gateway.client.get_adres_match(
+            gemeentenaam=clean(gemeentenaam),
+            niscode=niscode,
+            postcode=postcode,
+            straatnaam=clean(straatnaam),
+            huisnummer=clean(huisnummer),
+            busnummer=clean(busnummer),
+        )
+        matches = [
+            match
+            for match in response["adresMatches"]
+            if "identificator" in match
+            and "huisnummer" in match
+            and match.get("score", 0) >= self.min_score
+        ]
+        if not matches:
+            return None
+        return Adres.from_list_response(matches[0], self.gateway)
@@ -0,0 +1,318 @@
+"""
+This module contains in-memory search indexes over names, for
+autocompletion and lookups of user input.
+
+Names are compared on their :func:`crabpy.text.normalise` form, so case,
+accents, hyphens and common abbreviations don't matter.
+
+.. versionadded:: 1.9.0
+"""
+
+import bisect
+import itertools
+import threading
+import time
+from collections import Counter
+from collections import defaultdict
+from collections import namedtuple
+
+from crabpy.text import normalise
+
+Candidate = namedtuple("Candidate", ["item", "naam", "score"])
+Candidate.__doc__ = """
+A search result: the found object, the name that matched and a score
+between 0 and 1, where 1 is an exact match.
+"""
+
+EXACT = 1.0
+PREFIX = 0.9
+WORD_PREFIX = 0.8
+
+
+def trigrams(text):
+    """
+    Get the trigrams of a normalised text, padded at the start and the end.
+
+    :rtype: set
+    """
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    A prefix and trigram index over the names of objects.
+
+    Objects are identified by a key, adding an object again replaces its
+    names. The index can be searched and updated from several threads.
+    """
+
+    def __init__(self):
+        self._names = {}
+        self._suffixes = []
+        self._entries = {}
+        self._trigrams = defaultdict(set)
+        self._next_entry = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, key, item, namen):
+        """
+        Add or replace an object.
+
+        :param key: The key of the object.
+        :param item: The object returned by searches.
+        :param namen: The names of the object.
+        """
+        entries = {(normalise(naam), naam) for naam in namen if naam}
+        with self._lock:
+            if key in self._names:
+                self._remove(key)
+            self._names[key] = (item, entries)
+            for normalised, naam in entries:
+                words = normalised.split(" ")
+                start = 0
+                for word in words:
+                    bisect.insort(
+                        self._suffixes, (normalised[start:], start, key, naam)
+                    )
+                    start += len(word) + 1
+                entry = next(self._next_entry)
+                grams = trigrams(normalised)
+                self._entries[entry] = (key, naam, grams)
+                for trigram in grams:
+                    self._trigrams[trigram].add(entry)
+
+    def _remove(self, key):
+        del self._names[key]
+        self._suffixes = [entry for entry in self._suffixes if entry[2] != key]
+        for entry in [e for e, value in self._entries.items() if value[0] == key]:
+            for trigram in self._entries.pop(entry)[2]:
+                self._trigrams[trigram].discard(entry)
+
+    def remove(self, key):
+        """
+        Remove an object.
+        """
+        with self._lock:
+            if key in self._names:
+                self._remove(key)
+
+    def prefix(self, text, limit=10):
+        """
+        Find objects with a name, or a word of a name, that starts with text.
+
+        Names that start with the text rank above names with a later word
+        that does, shorter names rank above longer ones.
+
+        :rtype: A :class:`list` of :class:`Candidate`.
+        """
+        query = normalise(text)
+        if not query:
+            return []
+        found = {}
+        with self._lock:
+            suffixes = self._suffixes
+            index = bisect.bisect_left(suffixes, (query,))
+            while index < len(suffixes) and suffixes[index][0].startswith(query):
+                suffix, start, key, naam = suffixes[index]
+                index += 1
+                if start == 0:
+                    score = EXACT if suffix == query else PREFIX
+                else:
+                    score = WORD_PREFIX
+                if score > found.get(key, (0,))[0]:
+                    found[key] = (score, naam, self._names[key][0])
+        ranked = sorted(found.values(), key=lambda f: (-f[0], len(f[1]), f[1]))
+        return [Candidate(item, naam, score) for score, naam, item in ranked[:limit]]
+
+    def similar(self, text, limit=10, min_score=0.3):
+        """
+        Find objects with a name that shares many trigrams with text.
+
+        Finds names with typos or with the text in the middle. The score is
+        the Jaccard similarity of the trigrams.
+
+        :rtype: A :class:`list` of :class:`Candidate`.
+        """
+        query = normalise(text)
+        if not query:
+            return []
+        wanted = trigrams(query)
+        best = {}
+        with self._lock:
+            shared = Counter()
+            for trigram in wanted:
+                shared.update(self._trigrams.get(trigram, ()))
+            for entry, count in shared.items():
+                key, naam, grams = self._entries[entry]
+                score = count / (len(wanted) + len(grams) - count)
+                if score >= min_score and score > best.get(key, (0,))[0]:
+                    best[key] = (score, naam, self._names[key][0])
+        ranked = sorted(best.values(), key=lambda f: (-f[0], len(f[1]), f[1]))
+        return [
+            Candidate(item, naam, round(score, 3))
+            for score, naam, item in ranked[:limit]
+        ]
+
+    def search(self, text, limit=10):
+        """
+        Find objects by prefix, completed with similar names when there are
+        fewer than `limit` prefix matches.
+
+        :rtype: A :class:`list` of :class:`Candidate`.
+        """
+        results = self.prefix(text, limit)
+        if len(results) < limit:
+            seen = {id(candidate.item) for candidate in results}
+            for candidate in self.similar(text, limit):
+                if id(candidate.item) not in seen:
+                    results.append(candidate)
+                    seen.add(id(candidate.item))
+        return results[:limit]
+
+
+def straat_namen(straat):
+    """
+    Get all names a :class:`crabpy.gateway.adressenregister.Straat` is known
+    by, without loading it.
+
+    Straten from `list_straten` only know their Dutch name and homoniem.
+    Straten that were loaded completely also add their names in the other
+    languages.
+    """
+    namen = [straat.naam()]
+    homoniem = straat.homoniem()
+    if homoniem:
+        namen.append(f"{straat.naam()} ({homoniem})")
+    namen.extend(straat.loaded_namen())
+    return namen
+
+
+class StraatIndex(NameIndex):
+    """
+    A :class:`NameIndex` over the straten of one gemeente.
+
+    Built incrementally: :meth:`update` only indexes straten that are new or
+    got other names.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._source = None
+        self._update_lock = threading.Lock()
+        self.updated_at = None
+
+    def update(self, straten):
+        """
+        Index a list of straten, eg. the result of `list_straten`.
+
+        A list that was indexed before is skipped. Concurrent updates run
+        one after the other.
+        """
+        with self._update_lock:
+            self.updated_at = time.monotonic()
+            if straten is self._source:
+                return
+            with self._lock:
+                stale = set(self._names) - {straat.id for straat in straten}
+            for key in stale:
+                self.remove(key)
+            for straat in straten:
+                namen = straat_namen(straat)
+                with self._lock:
+                    current = self._names.get(straat.id)
+                if current is None or {n for _, n in current[1]} != set(namen):
+                    self.add(straat.id, straat, namen)
+                else:
+                    with self._lock:
+                        self._names[straat.id] = (straat, current[1])
+            self._source = straten
+
+
+def levenshtein(a, b):
+    """
+    Get the edit distance between two texts.
+
+    :rtype: int
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        previous = current
+    return previous[-1]
+
+
+def similarity(a, b):
+    """
+    Get the similarity of two normalised texts based on their edit distance.
+
+    :returns: A score between 0 and 1, where 1 means equal.
+    """
+    if not a and not b:
+        return 1.0
+    return 1 - levenshtein(a, b) / max(len(a), len(b))
+
+
+class GemeenteIndex(NameIndex):
+    """
+    A :class:`NameIndex` over gemeenten and deelgemeenten in all languages.
+
+    :param gemeenten: :class:`crabpy.gateway.adressenregister.Gemeente`
+        objects.
+    :param deelgemeenten: `Optional.`
+        :class:`crabpy.gateway.adressenregister.Deelgemeente` objects.
+    """
+
+    def __init__(self, gemeenten, deelgemeenten=()):
+        super().__init__()
+        self._exact = defaultdict(list)
+        self._order = {}
+        for gemeente in gemeenten:
+            namen = [naam["naam"] for naam in gemeente.namen]
+            self._add(("gemeente", gemeente.niscode), gemeente, namen)
+        for deelgemeente in deelgemeenten:
+            self._add(
+                ("deelgemeente", deelgemeente.id), deelgemeente, [deelgemeente.naam]
+            )
+
+    def _add(self, key, item, namen):
+        self.add(key, item, namen)
+        self._order[id(item)] = len(self._order)
+        for naam in dict.fromkeys(namen):
+            self._exact[normalise(naam)].append(Candidate(item, naam, EXACT))
+
+    def find(self, naam, limit=5, min_score=0.6):
+        """
+        Find gemeenten and deelgemeenten by a name as a user typed it.
+
+        An exact match after normalisation wins, gemeenten before
+        deelgemeenten. Otherwise the names that share trigrams with the
+        input are ranked by their edit distance to it.
+
+        :param str naam: The name.
+        :param int limit: The maximum number of candidates.
+        :param float min_score: The lowest accepted similarity.
+        :rtype: A :class:`list` of :class:`Candidate`.
+        """
+        query = normalise(naam)
+        if not query:
+            return []
+        exact = self._exact.get(query)
+        if exact:
+            return exact[:limit]
+        candidates = []
+        for candidate in self.similar(naam, limit=4 * limit, min_score=0.2):
+            score = round(similarity(query, normalise(candidate.naam)), 3)
+            if score >= min_score:
+                candidates.append(candidate._replace(score=score))
+        candidates.sort(key=lambda c: (-c.score, self._order[id(c.item)]))
+        return candidates[:limit]
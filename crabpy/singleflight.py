@@ -0,0 +1,96 @@
+"""
+This module coalesces concurrent identical calls to the upstream services.
+
+When many threads ask for the same object at the same time, only the first
+one calls the service. The others wait for that call and share its result::
+
+    from crabpy.singleflight import SingleFlight
+
+    flight = SingleFlight()
+    straat = flight.do(("straatnaam", "1"), lambda: client.get_straatnaam("1"))
+
+.. versionadded:: 1.9.0
+"""
+
+import threading
+
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import remaining
+
+
+def freeze(mapping):
+    """
+    Turn a dict of parameters or headers into a hashable key.
+
+    :param dict mapping: The dict, or `None`.
+    :rtype: tuple
+    """
+    if not mapping:
+        return ()
+    return tuple(sorted(mapping.items()))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key.
+
+    While a call for a key is in flight, other calls with that key wait for
+    it and get its result, or its exception, instead of calling again. The
+    result is not remembered: the next call after it finished runs again.
+
+    Callers that share a result get the same object, they should not modify
+    it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, stats=None):
+        """
+        Call `fn`, unless a call with the same key is in flight already.
+
+        :param key: A hashable key. Calls with a key that can't be hashed
+            are never coalesced.
+        :param fn: A function without arguments that performs the call.
+        :param stats: `Optional.` A :class:`crabpy.stats.Statistics` that
+            counts the calls that waited for another one as
+            `coalesced_requests`.
+        :returns: The result of `fn`.
+        :raises crabpy.timeouts.DeadlineExceeded: When the current deadline
+            passes while waiting for another call.
+        """
+        try:
+            hash(key)
+        except TypeError:
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not call.done.wait(remaining()):
+                raise DeadlineExceeded("Deadline exceeded waiting for a request")
+            if stats is not None:
+                stats.increment("coalesced_requests")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
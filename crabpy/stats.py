@@ -0,0 +1,339 @@
+"""
+This module contains statistics about the caches and upstream services used
+by the gateways.
+
+Every gateway has a :class:`Statistics` object available as `gateway.stats`.
+
+.. versionadded:: 1.9.0
+"""
+
+import re
+import threading
+from collections import Counter
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""
+Upper bounds in seconds of the upstream latency histogram buckets.
+"""
+
+_ID_SEGMENT = re.compile(r"/(?!v\d+(?:/|$))[^/]*\d[^/]*")
+
+
+def endpoint_name(url):
+    """
+    Reduce a url to the endpoint it calls.
+
+    The query string is dropped and every path segment that contains a digit,
+    except for a version segment such as `v2`, is replaced by `{id}`. This
+    keeps the number of distinct endpoints small.
+
+    :param str url: The requested url.
+    :rtype: str
+    """
+    return _ID_SEGMENT.sub("/{id}", urlsplit(url).path)
+
+
+def method_name(key):
+    """
+    Get the name of the gateway method from one of its cache keys.
+
+    Handles both the `method#arguments` keys of the CRAB and capakey gateways
+    and the `module:method|arguments` keys generated by dogpile.
+
+    :param str key: A cache key.
+    :rtype: str
+    """
+    name = str(key).split("|", 1)[0].split("#", 1)[0]
+    return name.rsplit(":", 1)[-1]
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed buckets.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """
+        :returns: A dict with the cumulative count per upper bound, the sum
+            and the count of all observed values.
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class Statistics:
+    """
+    Statistics about the caches and upstream calls of a gateway.
+
+    Cache statistics are kept per region and per gateway method. Upstream
+    statistics are kept per endpoint: the SOAP action for CRAB and the path
+    of the url, see :func:`endpoint_name`, for the REST services.
+
+    All methods are thread safe.
+
+    :param str name: The name of the gateway, used as a label when exporting.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Reset all statistics to zero.
+        """
+        with self._lock:
+            self._cache = defaultdict(lambda: {"hits": 0, "misses": 0})
+            self._upstream = defaultdict(
+                lambda: {
+                    "calls": 0,
+                    "errors": 0,
+                    "bytes": 0,
+                    "latency": Histogram(),
+                }
+            )
+            self._counters = Counter()
+
+    def record_cache(self, region, method, hit):
+        """
+        Record a cache lookup.
+
+        :param str region: The name of the cache region.
+        :param str method: The name of the gateway method.
+        :param bool hit: Whether the value was found in the cache.
+        """
+        with self._lock:
+            self._cache[(region, method)]["hits" if hit else "misses"] += 1
+
+    def record_upstream(self, endpoint, duration, nbytes=0, error=False):
+        """
+        Record a call to the upstream service.
+
+        :param str endpoint: The endpoint or SOAP action that was called.
+        :param float duration: The duration of the call in seconds.
+        :param int nbytes: The number of bytes that were decoded.
+        :param bool error: Whether the call failed.
+        """
+        with self._lock:
+            upstream = self._upstream[endpoint]
+            upstream["calls"] += 1
+            upstream["errors"] += 1 if error else 0
+            upstream["bytes"] += nbytes
+            upstream["latency"].observe(duration)
+
+    def increment(self, counter, amount=1):
+        """
+        Increment a named counter.
+
+        :param str counter: The name of the counter.
+        :param int amount: The amount to add.
+        """
+        with self._lock:
+            self._counters[counter] += amount
+
+    def snapshot(self):
+        """
+        Get a copy of the current statistics.
+
+        :returns: A dict with `cache` statistics per region and method,
+            `upstream` statistics per endpoint and named `counters`.
+        """
+        with self._lock:
+            cache = {}
+            for (region, method), counts in self._cache.items():
+                lookups = counts["hits"] + counts["misses"]
+                cache.setdefault(region, {})[method] = {
+                    "hits": counts["hits"],
+                    "misses": counts["misses"],
+                    "hit_rate": counts["hits"] / lookups if lookups else 0.0,
+                }
+            upstream = {
+                endpoint: {
+                    "calls": counts["calls"],
+                    "errors": counts["errors"],
+                    "bytes": counts["bytes"],
+                    "latency": counts["latency"].snapshot(),
+                }
+                for endpoint, counts in self._upstream.items()
+            }
+            return {
+                "cache": cache,
+                "upstream": upstream,
+                "counters": dict(self._counters),
+            }
+
+    def to_openmetrics(self, prefix="crabpy"):
+        """
+        Export the statistics in the OpenMetrics text format.
+
+        :param str prefix: Prefix for the metric names.
+        :rtype: str
+        """
+        return to_openmetrics([self], prefix=prefix)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+def _bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def to_openmetrics(statistics, prefix="crabpy"):
+    """
+    Export the statistics of one or more gateways in the OpenMetrics format.
+
+    :param statistics: An iterable of :class:`Statistics`.
+    :param str prefix: Prefix for the metric names.
+    :rtype: str
+    """
+    snapshots = [(s.name, s.snapshot()) for s in statistics]
+    lines = []
+
+    for metric, field in (("cache_hits", "hits"), ("cache_misses", "misses")):
+        lines.append(f"# TYPE {prefix}_{metric} counter")
+        for gateway, snapshot in snapshots:
+            for region, methods in sorted(snapshot["cache"].items()):
+                for method, counts in sorted(methods.items()):
+                    labels = _labels(gateway=gateway, region=region, method=method)
+                    lines.append(f"{prefix}_{metric}_total{{{labels}}} {counts[field]}")
+
+    for metric, field in (
+        ("upstream_requests", "calls"),
+        ("upstream_errors", "errors"),
+        ("upstream_bytes", "bytes"),
+    ):
+        lines.append(f"# TYPE {prefix}_{metric} counter")
+        for gateway, snapshot in snapshots:
+            for endpoint, counts in sorted(snapshot["upstream"].items()):
+                labels = _labels(gateway=gateway, endpoint=endpoint)
+                lines.append(f"{prefix}_{metric}_total{{{labels}}} {counts[field]}")
+
+    lines.append(f"# TYPE {prefix}_upstream_latency_seconds histogram")
+    lines.append(f"# UNIT {prefix}_upstream_latency_seconds seconds")
+    for gateway, snapshot in snapshots:
+        for endpoint, counts in sorted(snapshot["upstream"].items()):
+            latency = counts["latency"]
+            labels = _labels(gateway=gateway, endpoint=endpoint)
+            for bound, count in latency["buckets"].items():
+                lines.append(
+                    f"{prefix}_upstream_latency_seconds_bucket"
+                    f'{{{labels},le="{_bound(bound)}"}} {count}'
+                )
+            lines.append(
+                f"{prefix}_upstream_latency_seconds_sum{{{labels}}} {latency['sum']}"
+            )
+            lines.append(
+                f"{prefix}_upstream_latency_seconds_count{{{labels}}} "
+                f"{latency['count']}"
+            )
+
+    lines.append(f"# TYPE {prefix}_events counter")
+    for gateway, snapshot in snapshots:
+        for counter, value in sorted(snapshot["counters"].items()):
+            labels = _labels(gateway=gateway, event=counter)
+            lines.append(f"{prefix}_events_total{{{labels}}} {value}")
+
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusCollector:
+    """
+    A collector for the `prometheus_client` library.
+
+    Requires the optional `prometheus_client` package::
+
+        from prometheus_client import REGISTRY
+
+        REGISTRY.register(PrometheusCollector(gateway.stats))
+
+    :param statistics: One or more :class:`Statistics` to collect.
+    """
+
+    def __init__(self, *statistics, prefix="crabpy"):
+        self.statistics = statistics
+        self.prefix = prefix
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily
+        from prometheus_client.core import HistogramMetricFamily
+
+        prefix = self.prefix
+        snapshots = [(s.name, s.snapshot()) for s in self.statistics]
+
+        for metric, field in (("cache_hits", "hits"), ("cache_misses", "misses")):
+            family = CounterMetricFamily(
+                f"{prefix}_{metric}",
+                f"Number of cache {field} per region and gateway method.",
+                labels=["gateway", "region", "method"],
+            )
+            for gateway, snapshot in snapshots:
+                for region, methods in snapshot["cache"].items():
+                    for method, counts in methods.items():
+                        family.add_metric([gateway, region, method], counts[field])
+            yield family
+
+        for metric, field, documentation in (
+            ("upstream_requests", "calls", "Number of upstream calls."),
+            ("upstream_errors", "errors", "Number of failed upstream calls."),
+            ("upstream_bytes", "bytes", "Number of bytes decoded."),
+        ):
+            family = CounterMetricFamily(
+                f"{prefix}_{metric}", documentation, labels=["gateway", "endpoint"]
+            )
+            for gateway, snapshot in snapshots:
+                for endpoint, counts in snapshot["upstream"].items():
+                    family.add_metric([gateway, endpoint], counts[field])
+            yield family
+
+        family = HistogramMetricFamily(
+            f"{prefix}_upstream_latency_seconds",
+            "Latency of upstream calls.",
+            labels=["gateway", "endpoint"],
+        )
+        for gateway, snapshot in snapshots:
+            for endpoint, counts in snapshot["upstream"].items():
+                latency = counts["latency"]
+                family.add_metric(
+                    [gateway, endpoint],
+                    [(_bound(b), c) for b, c in latency["buckets"].items()],
+                    latency["sum"],
+                )
+        yield family
+
+        family = CounterMetricFamily(
+            f"{prefix}_events",
+            "Number of named gateway events.",
+            labels=["gateway", "event"],
+        )
+        for gateway, snapshot in snapshots:
+            for counter, value in snapshot["counters"].items():
+                family.add_metric([gateway, counter], value)
+        yield family
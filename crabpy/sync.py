@@ -0,0 +1,356 @@
+"""
+This module keeps a local copy of the adressenregister up to date with the
+change feeds of the basisregisters.
+
+Every feed is a list of CloudEvents, paginated by `page` and `pageSize`. A
+:class:`Synchroniser` reads the events after the last processed position,
+fetches the current state of every changed object once and applies the
+changes to a :class:`SyncTarget`. Changes of objects outside the niscodes
+of the target are skipped::
+
+    from crabpy.client import AdressenRegisterClient
+    from crabpy.mirror import build_mirror
+    from crabpy.sync import SqliteTarget
+    from crabpy.sync import Synchroniser
+
+    client = AdressenRegisterClient("https://api.basisregisters.vlaanderen.be", key)
+    target = SqliteTarget("adressenregister.sqlite", client.base_url)
+    synchroniser = Synchroniser(client, target)
+    synchroniser.start()
+    build_mirror(client, "adressenregister.sqlite")
+    ...
+    synchroniser.sync()
+
+.. versionadded:: 1.9.0
+"""
+
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crabpy.gateway.adressenregister import Adres
+from crabpy.gateway.adressenregister import Gebouw
+from crabpy.gateway.adressenregister import NOT_FOUND_CACHE
+from crabpy.gateway.adressenregister import Perceel
+from crabpy.gateway.adressenregister import Straat
+from crabpy.gateway.adressenregister import canonical_key_generator
+from crabpy.gateway.cache import NOT_FOUND_KEY_PREFIX
+from crabpy.mirror import COLLECTIONS
+from crabpy.mirror import connect
+from crabpy.mirror import fetch_detail
+from crabpy.mirror import remove
+from crabpy.mirror import store
+from crabpy.ratelimit import bulk
+
+log = logging.getLogger(__name__)
+
+FEEDS = ("adressen", "straatnamen", "percelen", "gebouwen")
+"""
+The collections with a change feed.
+"""
+
+PAGE_SIZE = 100
+"""
+Number of events on a page of a change feed.
+"""
+
+
+def is_removal(event):
+    """
+    Check if a CloudEvent of a change feed removes its object.
+    """
+    return ".delete." in event["type"]
+
+
+class SyncTarget:
+    """
+    Base class for the stores a :class:`Synchroniser` applies changes to.
+
+    The positions are kept in memory, subclasses with a persistent store
+    should keep them in that store.
+    """
+
+    def __init__(self):
+        self.positions = {}
+
+    def position(self, collection):
+        """
+        :returns: The position of the last applied event of a feed, `None`
+            when the feed was never read.
+        """
+        return self.positions.get(collection)
+
+    def scope(self, collection):
+        """
+        :returns: The niscodes of the objects of a collection that are kept,
+            `None` when all of them are kept.
+        """
+        return None
+
+    def apply(self, collection, changes, position):
+        """
+        Apply changes and remember the position of the last applied event.
+
+        :param str collection: The name of the collection.
+        :param dict changes: The new detail document per changed object id,
+            `None` for removed objects.
+        :param int position: The position of the last applied event.
+        """
+        self.positions[collection] = position
+
+
+class SqliteTarget(SyncTarget):
+    """
+    Applies changes to a mirror built with :func:`crabpy.mirror.build_mirror`.
+
+    The changes and the position of a page of events are committed in one
+    transaction. When the mirror was built for some niscodes, objects
+    outside them are not stored, and removed when they moved out.
+
+    :param path: The path of the SQLite database.
+    :param str base_url: The url of the adressenregister, used for the
+        `detail` links in list items.
+    """
+
+    def __init__(self, path, base_url):
+        super().__init__()
+        self.path = path
+        self.base_url = base_url.rstrip("/")
+
+    def _meta(self, key):
+        connection = connect(self.path)
+        try:
+            row = connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            connection.close()
+        return row[0] if row is not None else None
+
+    def position(self, collection):
+        position = self._meta(f"{collection}.position")
+        return int(position) if position is not None else None
+
+    def scope(self, collection):
+        niscodes = self._meta(f"{collection}.niscodes")
+        return set(niscodes.split(",")) if niscodes is not None else None
+
+    def apply(self, collection, changes, position):
+        build = time.time_ns()
+        spec = COLLECTIONS[collection]
+        niscodes = self.scope(collection)
+        if niscodes is not None:
+            changes = {
+                i: (
+                    detail
+                    if detail is None or spec.columns["niscode"](detail) in niscodes
+                    else None
+                )
+                for i, detail in changes.items()
+            }
+        connection = connect(self.path)
+        try:
+            with connection:
+                remove(
+                    connection,
+                    collection,
+                    [i for i, detail in changes.items() if detail is None],
+                )
+                store(
+                    connection,
+                    collection,
+                    [
+                        (i, spec.item(detail, self.base_url), detail)
+                        for i, detail in changes.items()
+                        if detail is not None
+                    ],
+                    build,
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                    (f"{collection}.position", str(position)),
+                )
+        finally:
+            connection.close()
+
+
+class CacheTarget(SyncTarget):
+    """
+    Applies changes to the cache regions of an adressenregister gateway.
+
+    Changed objects replace the cached `get_*_by_id` results, removed
+    objects are evicted. Both are evicted from the `notfound` region. Lists
+    are not touched, they expire as usual.
+
+    :param gateway: A :class:`crabpy.gateway.adressenregister.Gateway`.
+    """
+
+    methods = {
+        "adressen": ("get_adres_by_id", Adres),
+        "straatnamen": ("get_straat_by_id", Straat),
+        "percelen": ("get_perceel_by_id", Perceel),
+        "gebouwen": ("get_gebouw_by_id", Gebouw),
+    }
+
+    def __init__(self, gateway):
+        super().__init__()
+        self.gateway = gateway
+
+    def apply(self, collection, changes, position):
+        name, cls = self.methods[collection]
+        method = getattr(type(self.gateway), name)
+        generate_key = canonical_key_generator(None, method)
+        for object_id, detail in changes.items():
+            NOT_FOUND_CACHE.delete(
+                NOT_FOUND_KEY_PREFIX + generate_key(self.gateway, object_id)
+            )
+            if detail is None:
+                method.invalidate(self.gateway, object_id)
+            else:
+                obj = cls.from_get_response(detail, self.gateway)
+                method.set(obj, self.gateway, object_id)
+        super().apply(collection, changes, position)
+
+
+class Synchroniser:
+    """
+    Applies the change feeds of the basisregisters to a :class:`SyncTarget`.
+
+    :param client: A :class:`crabpy.client.AdressenRegisterClient`.
+    :param SyncTarget target: Where the changes are applied.
+    :param collections: `Optional.` The feeds to follow, defaults to all
+        :data:`FEEDS`.
+    :param int concurrency: The number of parallel detail requests.
+    :param int page_size: The number of events on a page of the feeds. It
+        is sent with every request, a feed that is paged differently raises
+        a `ValueError`.
+    """
+
+    def __init__(
+        self, client, target, collections=None, concurrency=8, page_size=PAGE_SIZE
+    ):
+        self.client = client
+        self.target = target
+        self.collections = list(collections or FEEDS)
+        unknown = set(self.collections) - set(FEEDS)
+        if unknown:
+            raise ValueError(f"No change feed for: {', '.join(sorted(unknown))}")
+        self.concurrency = concurrency
+        self.page_size = page_size
+
+    @bulk()
+    def _page(self, collection, page):
+        events = self.client.get_wijzigingen(
+            collection, page=page, page_size=self.page_size
+        )
+        first = (page - 1) * self.page_size + 1
+        if len(events) > self.page_size or (events and int(events[0]["id"]) != first):
+            raise ValueError(
+                f"The {collection} feed is not paged by {self.page_size} events"
+            )
+        return events
+
+    def head(self, collection):
+        """
+        Find the position of the last event of a feed.
+
+        Only reads a number of pages logarithmic in the length of the feed.
+
+        :rtype: int
+        """
+        if not self._page(collection, 1):
+            return 0
+        low, high = 1, 2
+        while self._page(collection, high):
+            low, high = high, high * 2
+        # The last page with events lies in [low, high)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if self._page(collection, middle):
+                low = middle
+            else:
+                high = middle
+        return int(self._page(collection, low)[-1]["id"])
+
+    def start(self):
+        """
+        Skip all events that were published so far.
+
+        Call this right before building a mirror, so the changes made during
+        the build are applied by the next :meth:`sync`.
+        """
+        for collection in self.collections:
+            self.target.apply(collection, {}, self.head(collection))
+
+    def sync(self):
+        """
+        Apply all events published since the last sync.
+
+        A feed that was never read is started at its current head, like
+        :meth:`start`. Objects outside the :meth:`SyncTarget.scope` are not
+        fetched.
+
+        :returns: A dict with the number of `updated` and `removed` objects
+            and the new `position` per feed.
+        """
+        result = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for collection in self.collections:
+                result[collection] = self._sync(executor, collection)
+        return result
+
+    def _sync(self, executor, collection):
+        updated = removed = 0
+        position = self.target.position(collection)
+        if position is None:
+            position = self.head(collection)
+            log.info("Starting the %s feed at %d", collection, position)
+            self.target.apply(collection, {}, position)
+        niscodes = self.target.scope(collection)
+        context = contextvars.copy_context()
+        number = position // self.page_size + 1
+        # Read on to the first empty page, a feed that is paged differently
+        # fails the check of its first event there at the latest.
+        while True:
+            page = self._page(collection, number)
+            if not page:
+                break
+            number += 1
+            events = [event for event in page if int(event["id"]) > position]
+            if not events:
+                continue
+            # Only the last event of an object matters
+            latest = {event["data"]["objectId"]: event for event in events}
+            outside = {
+                i
+                for i, event in latest.items()
+                if niscodes is not None
+                and event["data"].get("nisCodes")
+                and niscodes.isdisjoint(event["data"]["nisCodes"])
+            }
+            fetch = [
+                i
+                for i, event in latest.items()
+                if not is_removal(event) and i not in outside
+            ]
+            details = executor.map(
+                lambda object_id: context.copy().run(
+                    fetch_detail, self.client, collection, object_id
+                ),
+                fetch,
+            )
+            # Objects outside the scope are removed, in case they moved out
+            changes = dict.fromkeys(latest)
+            changes.update(zip(fetch, details))
+            position = int(events[-1]["id"])
+            self.target.apply(collection, changes, position)
+            gone = sum(
+                1
+                for i, detail in changes.items()
+                if detail is None and i not in outside
+            )
+            removed += gone
+            updated += len(changes) - len(outside) - gone
+            log.debug("Applied %s up to %d", collection, position)
+        return {"updated": updated, "removed": removed, "position": position}
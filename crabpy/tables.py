@@ -0,0 +1,250 @@
+"""
+This module builds columnar tables from the json of the REST APIs.
+
+Building a gateway object for every item of a long list and reading its
+attributes one by one is slow when the list is only needed as a table. The
+list methods of the gateways that take `as_table` fill a :class:`Table`
+straight from the json instead, one typed column per field, in a single
+pass over the items. The table converts to a `pyarrow.Table` or a
+`pandas.DataFrame`, or is written to Parquet::
+
+    adressen = gateway.list_adressen_with_params(niscode="44021", as_table=True)
+    df = adressen.to_pandas()
+
+Converting needs the optional `pyarrow` or `pandas` packages, building the
+table itself does not.
+
+.. versionadded:: 1.9.0
+"""
+
+from array import array
+
+STRING = "string"
+"""
+A column of strings, `None` when the json has no value.
+"""
+
+CATEGORY = "category"
+"""
+A column of strings from a small set of values, eg. a status. It becomes a
+dictionary encoded column in Arrow and a categorical in pandas.
+"""
+
+FLOAT64 = "float64"
+"""
+A column of floats, eg. coordinates, kept in an :class:`array.array` of
+doubles. Missing values are `nan`.
+"""
+
+BATCH_SIZE = 65536
+"""
+The number of rows per row group written by :func:`write_parquet`.
+"""
+
+
+class Column:
+    """
+    A column of a :class:`Schema`.
+
+    :param str name: The name of the column.
+    :param str type: :data:`STRING`, :data:`CATEGORY` or :data:`FLOAT64`.
+    :param get: A function that reads the value of the column from the json
+        of an item. Its `keys` attribute, when it has one, lists the members
+        of the json it needs.
+    """
+
+    def __init__(self, name, type, get):
+        if type not in (STRING, CATEGORY, FLOAT64):
+            raise ValueError(f"Unknown column type {type}")
+        self.name = name
+        self.type = type
+        self.get = get
+
+    def __repr__(self):
+        return f"Column({self.name!r}, {self.type!r})"
+
+
+class Schema:
+    """
+    The columns of a :class:`Table`.
+
+    :param columns: The :class:`Column` objects.
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+
+    @property
+    def names(self):
+        return tuple(column.name for column in self.columns)
+
+    @property
+    def keys(self):
+        """
+        The members of the json the columns are read from, these can be
+        passed as `fields` to the client. `None` when a column does not
+        tell which members it needs.
+        """
+        keys = {}
+        for column in self.columns:
+            column_keys = getattr(column.get, "keys", None)
+            if column_keys is None:
+                return None
+            keys.update(dict.fromkeys(column_keys))
+        return tuple(keys)
+
+    def to_arrow(self):
+        """
+        Get the `pyarrow.Schema` of the tables.
+
+        Requires the optional `pyarrow` package.
+        """
+        import pyarrow
+
+        types = {
+            STRING: pyarrow.string(),
+            CATEGORY: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()),
+            FLOAT64: pyarrow.float64(),
+        }
+        return pyarrow.schema(
+            [(column.name, types[column.type]) for column in self.columns]
+        )
+
+
+class Table:
+    """
+    A columnar table of the items of a list.
+
+    The columns are plain python containers, available in :attr:`columns`: a
+    list for strings and an :class:`array.array` of doubles for floats, which
+    `numpy.frombuffer` turns into an array without copying.
+
+    :param Schema schema: The columns of the table.
+    :param items: `Optional.` The json of the items to add.
+    """
+
+    def __init__(self, schema, items=()):
+        self.schema = schema
+        self.columns = {
+            column.name: array("d") if column.type == FLOAT64 else []
+            for column in schema.columns
+        }
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.columns[self.schema.columns[0].name])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def extend(self, items):
+        """
+        Add the json of items to the table, filling all columns in one pass.
+        """
+        appenders = [
+            (
+                column.get,
+                self.columns[column.name].append,
+                column.type == FLOAT64,
+            )
+            for column in self.schema.columns
+        ]
+        nan = float("nan")
+        for item in items:
+            for get, append, is_float in appenders:
+                value = get(item)
+                if is_float:
+                    value = nan if value is None else value
+                append(value)
+
+    def to_arrow(self):
+        """
+        Convert the table to a `pyarrow.Table`.
+
+        Requires the optional `pyarrow` package. The floats are not copied.
+        """
+        import pyarrow
+
+        schema = self.schema.to_arrow()
+        arrays = []
+        for column, field in zip(self.schema.columns, schema):
+            values = self.columns[column.name]
+            if column.type == FLOAT64:
+                arrays.append(
+                    pyarrow.Array.from_buffers(
+                        field.type, len(values), [None, pyarrow.py_buffer(values)]
+                    )
+                )
+            elif column.type == CATEGORY:
+                arrays.append(
+                    pyarrow.array(values, pyarrow.string()).dictionary_encode()
+                )
+            else:
+                arrays.append(pyarrow.array(values, field.type))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def to_pandas(self):
+        """
+        Convert the table to a `pandas.DataFrame`.
+
+        Requires the optional `pandas` package.
+        """
+        import numpy
+        import pandas
+
+        data = {}
+        for column in self.schema.columns:
+            values = self.columns[column.name]
+            if column.type == FLOAT64:
+                data[column.name] = numpy.frombuffer(values, dtype=numpy.float64)
+            elif column.type == CATEGORY:
+                data[column.name] = pandas.Categorical(values)
+            else:
+                data[column.name] = pandas.array(values, dtype=object)
+        return pandas.DataFrame(data, columns=list(self.columns))
+
+    def to_parquet(self, where, **options):
+        """
+        Write the table to a Parquet file.
+
+        Requires the optional `pyarrow` package.
+
+        :param where: A path or a writable binary file.
+        :param options: Passed to `pyarrow.parquet.write_table`.
+        """
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(self.to_arrow(), where, **options)
+
+
+def write_parquet(schema, items, where, batch_size=BATCH_SIZE, **options):
+    """
+    Write the json of items to a Parquet file as they come in.
+
+    Every `batch_size` items are written as a row group, so the whole table
+    is never held in memory.
+
+    Requires the optional `pyarrow` package.
+
+    :param Schema schema: The columns to write.
+    :param items: An iterable of the json of the items.
+    :param where: A path or a writable binary file.
+    :param int batch_size: The number of rows per row group.
+    :param options: Passed to `pyarrow.parquet.ParquetWriter`.
+    :returns: The number of rows written.
+    """
+    import pyarrow.parquet
+
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(where, schema.to_arrow(), **options) as writer:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                writer.write_table(Table(schema, batch).to_arrow())
+                rows += len(batch)
+                batch = []
+        if batch or not rows:
+            writer.write_table(Table(schema, batch).to_arrow())
+            rows += len(batch)
+    return rows
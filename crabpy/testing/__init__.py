@@ -0,0 +1,8 @@
+"""
+This package contains local stand-ins for the webservices used by crabpy.
+
+They are meant for load testing, benchmarking and tuning applications that
+use the gateways, without putting load on the production services.
+
+.. versionadded:: 1.9.0
+"""
@@ -0,0 +1,917 @@
+"""
+This module contains a local SOAP stand-in for the CRAB service.
+
+The server publishes a WSDL and answers the main CRAB operations with
+responses of a realistic size, so the suds serialization cost is part of
+every measurement::
+
+    from crabpy.client import crab_factory
+    from crabpy.gateway.crab import CrabGateway
+    from crabpy.testing.fakecrab import FakeCrabServer
+
+    with FakeCrabServer(latency=0.02) as server:
+        gateway = CrabGateway(crab_factory(wsdl=server.wsdl_url, cache=None))
+        straten = gateway.list_straten(1)
+
+The throughput of a :class:`crabpy.gateway.crab.CrabGateway` under
+concurrency can be measured with :func:`load_test`, or from the command
+line::
+
+    python -m crabpy.testing.fakecrab --load-test --concurrency 8
+
+.. versionadded:: 1.9.0
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from crabpy.testing.fakeserver import STRAAT_PREFIXES
+from crabpy.testing.fakeserver import STRAAT_SUFFIXES
+from crabpy.testing.loadtest import run_load_test
+
+log = logging.getLogger(__name__)
+
+NAMESPACE = "http://crab.agiv.be"
+
+SOAP_NAMESPACE = "http://schemas.xmlsoap.org/soap/envelope/"
+
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+
+BEGIN_DATUM = "2003-06-12T00:00:00"
+
+BEGIN_TIJD = "2011-04-29T14:51:01"
+
+GEWESTEN = {
+    1: {"nl": "Brussels Hoofdstedelijk Gewest", "fr": "Région de Bruxelles-Capitale"},
+    2: {"nl": "Vlaams Gewest", "fr": "Région flamande"},
+    3: {"nl": "Waals Gewest", "fr": "Région wallonne"},
+}
+
+PROVINCIE_GEWESTEN = {
+    "10000": 2,
+    "20001": 2,
+    "30000": 2,
+    "40000": 2,
+    "70000": 2,
+    "20002": 3,
+    "50000": 3,
+    "60000": 3,
+    "80000": 3,
+    "90000": 3,
+}
+
+_STATUSSEN = (
+    ("1", "voorgesteld", None),
+    ("2", "gereserveerd", None),
+    ("3", "inGebruik", None),
+    ("4", "buitenGebruik", None),
+    ("99", "nietGerealiseerd", None),
+)
+
+CODE_LISTS = {
+    "ListTalen": (
+        ("nl", "Nederlands", None),
+        ("fr", "Frans", None),
+        ("de", "Duits", None),
+    ),
+    "ListBewerkingen": (
+        ("1", "invoer", "Invoer in de databank."),
+        ("2", "historering", "Historering van een object."),
+        ("3", "correctie", "Correctie van de attributen van een object."),
+        ("4", "verwijdering", "Verwijdering van een object."),
+    ),
+    "ListOrganisaties": (
+        ("1", "gemeente", "Gemeente."),
+        ("2", "vkbo", "Kruispuntbank voor ondernemingen."),
+        ("3", "akred", "Administratie Kadaster."),
+        ("5", "agiv", "Agentschap voor Geografische Informatie Vlaanderen."),
+        ("6", "ngi", "Nationaal Geografisch Instituut."),
+    ),
+    "ListAardSubadressen": (
+        ("1", "appartementNummer", "Nummer van het appartement."),
+        ("2", "busNummer", "Nummer van de brievenbus."),
+    ),
+    "ListAardAdressen": (("1", "subAdres", None), ("2", "huisnummer", None)),
+    "ListAardGebouwen": (
+        ("1", "hoofdgebouw", "hoofdgebouw volgens het GRB"),
+        ("2", "bijgebouw", "bijgebouw volgens het GRB"),
+        ("3", "afdak", "afdak volgens het GRB"),
+    ),
+    "ListAardWegobjecten": (
+        ("1", "taTEL", "Wegverbinding volgens TeleAtlas."),
+        ("5", "ntLink", "Wegverbinding volgens NavTeq."),
+        ("7", "wegverbindingGRB", "Wegverbinding volgens GRB."),
+    ),
+    "ListAardTerreinobjecten": (
+        ("1", "kadastraalPerceel", "Perceel volgens het Kadaster."),
+        ("2", "grbPerceel", "Perceel volgens het GRB."),
+    ),
+    "ListStatusHuisnummers": _STATUSSEN,
+    "ListStatusSubadressen": _STATUSSEN,
+    "ListStatusStraatnamen": _STATUSSEN,
+    "ListStatusWegsegmenten": (
+        ("1", "vergunningAangevraagd", None),
+        ("2", "bestemmingsplan", None),
+        ("3", "inGebruik", None),
+        ("4", "buitenGebruik", None),
+        ("5", "nietGerealiseerd", None),
+    ),
+    "ListGeometriemethodeWegsegmenten": (
+        ("1", "gedigitaliseerd", None),
+        ("2", "ingemeten", None),
+        ("3", "afgeleid", None),
+    ),
+    "ListStatusGebouwen": (
+        ("1", "vergunningAangevraagd", None),
+        ("2", "inAanbouw", None),
+        ("3", "inGebruik", None),
+        ("4", "buitenGebruik", None),
+        ("5", "gesloopt", None),
+    ),
+    "ListGeometriemethodeGebouwen": (
+        ("1", "gedigitaliseerd", None),
+        ("2", "ingemetenGRB", None),
+        ("3", "ingemeten", None),
+    ),
+    "ListHerkomstAdresposities": (
+        ("1", "manueleAanduidingVanLot", None),
+        ("2", "manueleAanduidingVanPerceel", None),
+        ("10", "manueleAanduidingVanIngang", None),
+    ),
+}
+
+_METADATA = (
+    ("BeginDatum", "dateTime"),
+    ("BeginTijd", "dateTime"),
+    ("BeginBewerking", "int"),
+    ("BeginOrganisatie", "int"),
+)
+
+_EXTENT = (
+    ("CenterX", "double"),
+    ("CenterY", "double"),
+    ("MinimumX", "double"),
+    ("MinimumY", "double"),
+    ("MaximumX", "double"),
+    ("MaximumY", "double"),
+)
+
+_STRAATNAAM = (
+    ("StraatnaamId", "int"),
+    ("StraatnaamLabel", "string"),
+    ("StatusStraatnaam", "string"),
+    ("Straatnaam", "string"),
+    ("TaalCode", "string"),
+    ("StraatnaamTweedeTaal", "string"),
+    ("TaalCodeTweedeTaal", "string"),
+)
+
+_HUISNUMMER = (
+    ("HuisnummerId", "int"),
+    ("StatusHuisnummer", "string"),
+    ("Huisnummer", "string"),
+)
+
+TYPES = {
+    "CodeItem": (("Code", "string"), ("Naam", "string"), ("Definitie", "string")),
+    "GewestItem": (
+        ("GewestId", "int"),
+        ("TaalCodeGewestNaam", "string"),
+        ("GewestNaam", "string"),
+    ),
+    "GewestObject": (
+        ("GewestId", "int"),
+        ("TaalCodeGewestNaam", "string"),
+        ("GewestNaam", "string"),
+    )
+    + _EXTENT,
+    "GemeenteItem": (
+        ("GemeenteId", "int"),
+        ("GemeenteNaam", "string"),
+        ("NISGemeenteCode", "int"),
+        ("TaalCode", "string"),
+        ("TaalCodeGemeenteNaam", "string"),
+    ),
+    "GemeenteObject": (
+        ("GemeenteId", "int"),
+        ("GemeenteNaam", "string"),
+        ("NisGemeenteCode", "int"),
+        ("GewestId", "int"),
+        ("TaalCode", "string"),
+        ("TaalCodeTweedeTaal", "string"),
+    )
+    + _EXTENT
+    + _METADATA,
+    "StraatnaamWithStatusItem": _STRAATNAAM,
+    "StraatnaamWithStatusObject": _STRAATNAAM[:2]
+    + (("GemeenteId", "int"),)
+    + _STRAATNAAM[2:]
+    + _METADATA,
+    "HuisnummerWithStatusItem": _HUISNUMMER,
+    "HuisnummerWithStatusObject": _HUISNUMMER + (("StraatnaamId", "int"),) + _METADATA,
+}
+"""
+The complex types of the WSDL, as `(element, xsd type)` tuples in order.
+"""
+
+OPERATIONS = {
+    "ListGewesten": ((("SorteerVeld", "int"),), "ArrayOfGewestItem"),
+    "GetGewestByGewestIdAndTaalCode": (
+        (("GewestId", "int"), ("GewestTaalCode", "string")),
+        "GewestObject",
+    ),
+    "ListGemeentenByGewestId": (
+        (("GewestId", "int"), ("SorteerVeld", "int")),
+        "ArrayOfGemeenteItem",
+    ),
+    "GetGemeenteByGemeenteId": ((("GemeenteId", "int"),), "GemeenteObject"),
+    "GetGemeenteByNISGemeenteCode": (
+        (("NISGemeenteCode", "int"),),
+        "GemeenteObject",
+    ),
+    "ListStraatnamenWithStatusByGemeenteId": (
+        (("GemeenteId", "int"), ("SorteerVeld", "int")),
+        "ArrayOfStraatnaamWithStatusItem",
+    ),
+    "GetStraatnaamWithStatusByStraatnaamId": (
+        (("StraatnaamId", "int"),),
+        "StraatnaamWithStatusObject",
+    ),
+    "ListHuisnummersWithStatusByStraatnaamId": (
+        (("StraatnaamId", "int"), ("SorteerVeld", "int")),
+        "ArrayOfHuisnummerWithStatusItem",
+    ),
+    "GetHuisnummerWithStatusByHuisnummerId": (
+        (("HuisnummerId", "int"),),
+        "HuisnummerWithStatusObject",
+    ),
+}
+"""
+The operations of the WSDL as `(parameters, result type)` tuples.
+"""
+OPERATIONS.update(
+    (name, ((("SorteerVeld", "int"),), "ArrayOfCodeItem")) for name in CODE_LISTS
+)
+
+
+class CrabDataset:
+    """
+    The data served by a :class:`FakeCrabServer`.
+
+    The gemeenten are all Belgian gemeenten. The straten and huisnummers are
+    derived from their id instead of stored, so a dataset with the size of
+    the real register costs no memory. The defaults are roughly the averages
+    of the Flemish register.
+
+    :param int straten: Number of straten per gemeente.
+    :param int huisnummers: Number of huisnummers per straat.
+    """
+
+    def __init__(self, straten=280, huisnummers=30):
+        self.straten_per_gemeente = straten
+        self.huisnummers_per_straat = huisnummers
+        data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+        with open(os.path.join(data_dir, "gemeenten.json"), encoding="utf-8") as f:
+            gemeenten = json.load(f)
+        self.gemeenten = {}
+        for index, gemeente in enumerate(gemeenten):
+            gewest = PROVINCIE_GEWESTEN.get(gemeente["provincie"], 1)
+            namen = {n["taal"]: n["naam"] for n in gemeente["namen"]}
+            taal = "fr" if gewest == 3 else "nl"
+            self.gemeenten[index + 1] = {
+                "GemeenteId": index + 1,
+                "NisGemeenteCode": int(gemeente["niscode"]),
+                "GewestId": gewest,
+                "TaalCode": taal,
+                "TaalCodeTweedeTaal": "fr" if gewest == 1 else None,
+                "namen": namen,
+                "naam": namen.get(taal, gemeente["namen"][0]["naam"]),
+            }
+        self._niscodes = {g["NisGemeenteCode"]: g for g in self.gemeenten.values()}
+
+    @property
+    def straat_ids(self):
+        """
+        The range of all straat ids.
+        """
+        return range(1, len(self.gemeenten) * self.straten_per_gemeente + 1)
+
+    @property
+    def huisnummer_ids(self):
+        """
+        The range of all huisnummer ids.
+        """
+        return range(1, len(self.straat_ids) * self.huisnummers_per_straat + 1)
+
+    @staticmethod
+    def _extent(x, y, size):
+        return {
+            "CenterX": x,
+            "CenterY": y,
+            "MinimumX": x - size / 2,
+            "MinimumY": y - size / 2,
+            "MaximumX": x + size / 2,
+            "MaximumY": y + size / 2,
+        }
+
+    @staticmethod
+    def _metadata(object_id):
+        return {
+            "BeginDatum": BEGIN_DATUM,
+            "BeginTijd": BEGIN_TIJD,
+            "BeginBewerking": 1 + object_id % 3,
+            "BeginOrganisatie": 1,
+        }
+
+    def list_gewesten(self):
+        return [
+            {"GewestId": gewest_id, "TaalCodeGewestNaam": taal, "GewestNaam": naam}
+            for gewest_id, namen in GEWESTEN.items()
+            for taal, naam in namen.items()
+        ]
+
+    def get_gewest(self, gewest_id, taal):
+        namen = GEWESTEN.get(gewest_id)
+        if namen is None:
+            return None
+        gewest = {
+            "GewestId": gewest_id,
+            "TaalCodeGewestNaam": taal,
+            "GewestNaam": namen.get(taal, namen["nl"]),
+        }
+        gewest.update(self._extent(150000.0 + 50000 * gewest_id, 170000.0, 100000))
+        return gewest
+
+    def list_gemeenten(self, gewest_id):
+        return [
+            {
+                "GemeenteId": g["GemeenteId"],
+                "GemeenteNaam": naam,
+                "NISGemeenteCode": g["NisGemeenteCode"],
+                "TaalCode": g["TaalCode"],
+                "TaalCodeGemeenteNaam": taal,
+            }
+            for g in self.gemeenten.values()
+            if g["GewestId"] == gewest_id
+            for taal, naam in g["namen"].items()
+        ]
+
+    def get_gemeente(self, gemeente_id=None, niscode=None):
+        if niscode is not None:
+            gemeente = self._niscodes.get(niscode)
+        else:
+            gemeente = self.gemeenten.get(gemeente_id)
+        if gemeente is None:
+            return None
+        result = {
+            key: gemeente[key]
+            for key in (
+                "GemeenteId",
+                "NisGemeenteCode",
+                "GewestId",
+                "TaalCode",
+                "TaalCodeTweedeTaal",
+            )
+        }
+        result["GemeenteNaam"] = gemeente["naam"]
+        x = 20000.0 + 100 * (gemeente["GemeenteId"] % 250)
+        result.update(self._extent(x, 170000.0, 10000))
+        result.update(self._metadata(gemeente["GemeenteId"]))
+        return result
+
+    def _straat(self, straat_id):
+        index = (straat_id - 1) % self.straten_per_gemeente
+        gemeente = self.gemeenten[(straat_id - 1) // self.straten_per_gemeente + 1]
+        prefix = STRAAT_PREFIXES[index % len(STRAAT_PREFIXES)]
+        suffix = STRAAT_SUFFIXES[(index // len(STRAAT_PREFIXES)) % 6]
+        naam = prefix + suffix
+        if index >= len(STRAAT_PREFIXES) * len(STRAAT_SUFFIXES):
+            naam += f" {index}"
+        tweede_taal = gemeente["TaalCodeTweedeTaal"]
+        return gemeente, {
+            "StraatnaamId": straat_id,
+            "StraatnaamLabel": naam if not tweede_taal else f"{naam} - {naam}",
+            "StatusStraatnaam": "3",
+            "Straatnaam": naam,
+            "TaalCode": gemeente["TaalCode"],
+            "StraatnaamTweedeTaal": naam if tweede_taal else None,
+            "TaalCodeTweedeTaal": tweede_taal,
+        }
+
+    def list_straten(self, gemeente_id):
+        if gemeente_id not in self.gemeenten:
+            return []
+        first = (gemeente_id - 1) * self.straten_per_gemeente + 1
+        return [
+            self._straat(straat_id)[1]
+            for straat_id in range(first, first + self.straten_per_gemeente)
+        ]
+
+    def get_straat(self, straat_id):
+        if straat_id not in self.straat_ids:
+            return None
+        gemeente, straat = self._straat(straat_id)
+        straat["GemeenteId"] = gemeente["GemeenteId"]
+        straat.update(self._metadata(straat_id))
+        return straat
+
+    def _huisnummer(self, huisnummer_id):
+        index = (huisnummer_id - 1) % self.huisnummers_per_straat
+        nummer = str(index + 1)
+        if index % 10 == 9:
+            nummer = f"{index}A"
+        return {
+            "HuisnummerId": huisnummer_id,
+            "StatusHuisnummer": "3",
+            "Huisnummer": nummer,
+        }
+
+    def list_huisnummers(self, straat_id):
+        if straat_id not in self.straat_ids:
+            return []
+        first = (straat_id - 1) * self.huisnummers_per_straat + 1
+        return [
+            self._huisnummer(huisnummer_id)
+            for huisnummer_id in range(first, first + self.huisnummers_per_straat)
+        ]
+
+    def get_huisnummer(self, huisnummer_id):
+        if huisnummer_id not in self.huisnummer_ids:
+            return None
+        huisnummer = self._huisnummer(huisnummer_id)
+        huisnummer["StraatnaamId"] = (
+            huisnummer_id - 1
+        ) // self.huisnummers_per_straat + 1
+        huisnummer.update(self._metadata(huisnummer_id))
+        return huisnummer
+
+    def list_codes(self, operation):
+        return [
+            {"Code": code, "Naam": naam, "Definitie": definitie}
+            for code, naam, definitie in CODE_LISTS[operation]
+        ]
+
+
+def _complex_type(name, elements):
+    children = "".join(
+        f'<xs:element minOccurs="0" name="{element}" nillable="true" '
+        f'type="xs:{xsd_type}"/>'
+        for element, xsd_type in elements
+    )
+    return (
+        f'<xs:complexType name="{name}"><xs:sequence>{children}'
+        "</xs:sequence></xs:complexType>"
+    )
+
+
+def _array_type(item):
+    return (
+        f'<xs:complexType name="ArrayOf{item}"><xs:sequence>'
+        f'<xs:element minOccurs="0" maxOccurs="unbounded" name="{item}" '
+        f'nillable="true" type="tns:{item}"/>'
+        "</xs:sequence></xs:complexType>"
+    )
+
+
+def wsdl(location):
+    """
+    Generate the WSDL of the stand-in.
+
+    :param str location: The url the service is published on.
+    :rtype: str
+    """
+    types = [_complex_type(name, elements) for name, elements in TYPES.items()]
+    types += [
+        _array_type(item)
+        for item in ("CodeItem", "GewestItem", "GemeenteItem")
+        + ("StraatnaamWithStatusItem", "HuisnummerWithStatusItem")
+    ]
+    elements, messages, port_type, binding = [], [], [], []
+    for operation, (parameters, result) in OPERATIONS.items():
+        children = "".join(
+            f'<xs:element minOccurs="0" name="{name}" type="xs:{xsd_type}"/>'
+            for name, xsd_type in parameters
+        )
+        elements.append(
+            f'<xs:element name="{operation}"><xs:complexType><xs:sequence>'
+            f"{children}</xs:sequence></xs:complexType></xs:element>"
+            f'<xs:element name="{operation}Response"><xs:complexType><xs:sequence>'
+            f'<xs:element minOccurs="0" name="{operation}Result" nillable="true" '
+            f'type="tns:{result}"/></xs:sequence></xs:complexType></xs:element>'
+        )
+        messages.append(
+            f'<wsdl:message name="{operation}In">'
+            f'<wsdl:part name="parameters" element="tns:{operation}"/></wsdl:message>'
+            f'<wsdl:message name="{operation}Out">'
+            f'<wsdl:part name="parameters" element="tns:{operation}Response"/>'
+            "</wsdl:message>"
+        )
+        port_type.append(
+            f'<wsdl:operation name="{operation}">'
+            f'<wsdl:input message="tns:{operation}In"/>'
+            f'<wsdl:output message="tns:{operation}Out"/></wsdl:operation>'
+        )
+        binding.append(
+            f'<wsdl:operation name="{operation}">'
+            f'<soap:operation soapAction="{NAMESPACE}/IWsCrab4/{operation}" '
+            'style="document"/>'
+            '<wsdl:input><soap:body use="literal"/></wsdl:input>'
+            '<wsdl:output><soap:body use="literal"/></wsdl:output>'
+            "</wsdl:operation>"
+        )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<wsdl:definitions name="WsCrab" '
+        'xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+        'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+        'xmlns:xs="http://www.w3.org/2001/XMLSchema" '
+        f'xmlns:tns="{NAMESPACE}" targetNamespace="{NAMESPACE}">'
+        "<wsdl:types>"
+        f'<xs:schema elementFormDefault="qualified" targetNamespace="{NAMESPACE}">'
+        f"{''.join(types)}{''.join(elements)}</xs:schema>"
+        "</wsdl:types>"
+        f"{''.join(messages)}"
+        f'<wsdl:portType name="IWsCrab4">{"".join(port_type)}</wsdl:portType>'
+        '<wsdl:binding name="WsCrab4" type="tns:IWsCrab4">'
+        '<soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>'
+        f'{"".join(binding)}</wsdl:binding>'
+        '<wsdl:service name="WsCrab"><wsdl:port name="WsCrab4" binding="tns:WsCrab4">'
+        f'<soap:address location="{escape(location)}"/></wsdl:port></wsdl:service>'
+        "</wsdl:definitions>"
+    )
+
+
+def _value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return escape(str(value))
+
+
+def _serialize(item, elements):
+    return "".join(
+        (
+            f'<{element} i:nil="true"/>'
+            if item.get(element) is None
+            else f"<{element}>{_value(item[element])}</{element}>"
+        )
+        for element, _ in elements
+    )
+
+
+def _envelope(body):
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<s:Envelope xmlns:s="{SOAP_NAMESPACE}" xmlns:i="{XSI_NAMESPACE}">'
+        f"<s:Body>{body}</s:Body>"
+        "</s:Envelope>"
+    ).encode("utf-8")
+
+
+def soap_response(operation, result):
+    """
+    Serialize the result of an operation to a SOAP envelope.
+
+    :param str operation: The name of the operation.
+    :param result: A dict for an object, a list of dicts for an array or
+        `None` when nothing was found.
+    :rtype: bytes
+    """
+    result_type = OPERATIONS[operation][1]
+    if result is None:
+        content = ""
+    elif result_type.startswith("ArrayOf"):
+        item_type = result_type[len("ArrayOf") :]
+        elements = TYPES[item_type]
+        items = "".join(
+            f"<{item_type}>{_serialize(item, elements)}</{item_type}>"
+            for item in result
+        )
+        content = f"<{operation}Result>{items}</{operation}Result>"
+    else:
+        content = (
+            f"<{operation}Result>{_serialize(result, TYPES[result_type])}"
+            f"</{operation}Result>"
+        )
+    return _envelope(
+        f'<{operation}Response xmlns="{NAMESPACE}">{content}</{operation}Response>'
+    )
+
+
+def soap_fault(message, code="s:Server"):
+    """
+    Serialize a SOAP fault.
+
+    :param str message: The fault string.
+    :param str code: The fault code.
+    :rtype: bytes
+    """
+    return _envelope(
+        f"<s:Fault><faultcode>{code}</faultcode>"
+        f"<faultstring>{escape(message)}</faultstring></s:Fault>"
+    )
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+class FakeCrabServer:
+    """
+    A local HTTP server that behaves like the CRAB SOAP service.
+
+    The WSDL is published at :attr:`wsdl_url`. Unknown ids are answered with
+    an empty result, like the real service.
+
+    :param CrabDataset dataset: The data to serve, created when omitted.
+    :param latency: Seconds to wait before every response, or a
+        `(minimum, maximum)` tuple for a random latency.
+    :param float error_rate: Fraction of requests answered with a SOAP fault.
+    :param str host: The host to listen on.
+    :param int port: The port to listen on, 0 picks a free port.
+    :param int seed: Seed for the random errors and latencies.
+    """
+
+    def __init__(
+        self, dataset=None, latency=0, error_rate=0, host="127.0.0.1", port=0, seed=None
+    ):
+        self.dataset = dataset if dataset is not None else CrabDataset()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.host = host
+        self.port = port
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._wsdl = None
+        self._operations = {
+            "ListGewesten": lambda sort=None: self.dataset.list_gewesten(),
+            "GetGewestByGewestIdAndTaalCode": self.dataset.get_gewest,
+            "ListGemeentenByGewestId": (
+                lambda gewest_id, sort=None: self.dataset.list_gemeenten(gewest_id)
+            ),
+            "GetGemeenteByGemeenteId": self.dataset.get_gemeente,
+            "GetGemeenteByNISGemeenteCode": (
+                lambda niscode: self.dataset.get_gemeente(niscode=niscode)
+            ),
+            "ListStraatnamenWithStatusByGemeenteId": (
+                lambda gemeente_id, sort=None: self.dataset.list_straten(gemeente_id)
+            ),
+            "GetStraatnaamWithStatusByStraatnaamId": self.dataset.get_straat,
+            "ListHuisnummersWithStatusByStraatnaamId": (
+                lambda straat_id, sort=None: self.dataset.list_huisnummers(straat_id)
+            ),
+            "GetHuisnummerWithStatusByHuisnummerId": self.dataset.get_huisnummer,
+        }
+        for operation in CODE_LISTS:
+            self._operations[operation] = (
+                lambda sort=None, operation=operation: self.dataset.list_codes(
+                    operation
+                )
+            )
+
+    @property
+    def url(self):
+        """
+        Url of the SOAP service.
+        """
+        return f"http://{self.host}:{self.port}/wscrab/wscrab.svc"
+
+    @property
+    def wsdl_url(self):
+        """
+        Url of the WSDL, to pass to :func:`crabpy.client.crab_factory`.
+        """
+        return f"{self.url}?wsdl"
+
+    def start(self):
+        """
+        Start serving in a background thread.
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.app = self
+        self.port = self._server.server_address[1]
+        self._wsdl = wsdl(self.url).encode("utf-8")
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="crabpy-fakecrab",
+            daemon=True,
+        )
+        self._thread.start()
+        log.info("Fake CRAB server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def handle(self, body):
+        """
+        Answer a SOAP request.
+
+        :param bytes body: The SOAP envelope that was posted.
+        :returns: A `(status, envelope)` tuple.
+        """
+        with self._lock:
+            self.counts["requests"] += 1
+            latency = self.latency
+            if isinstance(latency, tuple):
+                latency = self._random.uniform(*latency)
+            failed = self._random.random() < self.error_rate
+        if latency:
+            time.sleep(latency)
+        try:
+            request = ElementTree.fromstring(body)
+            soap_body = next(e for e in request if _local_name(e.tag) == "Body")
+            element = soap_body[0]
+        except (ElementTree.ParseError, StopIteration, IndexError):
+            return 400, soap_fault("Invalid SOAP request.", "s:Client")
+        operation = _local_name(element.tag)
+        with self._lock:
+            self.counts[operation] += 1
+        if failed:
+            return 500, soap_fault("The service is temporarily unavailable.")
+        if operation not in self._operations:
+            return 500, soap_fault(f"Unknown operation {operation}.", "s:Client")
+        converters = {"int": int, "string": str}
+        parameters = OPERATIONS[operation][0]
+        values = {_local_name(child.tag): child.text for child in element}
+        args = [
+            converters[xsd_type](values[name])
+            for name, xsd_type in parameters
+            if values.get(name) is not None
+        ]
+        try:
+            result = self._operations[operation](*args)
+        except (TypeError, ValueError) as e:
+            return 500, soap_fault(str(e), "s:Client")
+        return 200, soap_response(operation, result)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlsplit(self.path).query.lower() != "wsdl":
+            self._send(404, b"")
+            return
+        self._send(200, self.server.app._wsdl)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send(*self.server.app.handle(body))
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+def crab_workload(dataset, seed=0):
+    """
+    Create a mix of gateway calls that resembles an address lookup
+    application.
+
+    :param CrabDataset dataset: The dataset the server answers from.
+    :param int seed: Seed for the ids that are requested.
+    :returns: A function that performs the call with the given index on a
+        :class:`crabpy.gateway.crab.CrabGateway`.
+    """
+    gemeente_ids = list(dataset.gemeenten)
+    straat_ids = dataset.straat_ids
+    huisnummer_ids = dataset.huisnummer_ids
+    calls = (
+        (1, lambda gateway, rnd: gateway.list_gemeenten(2)),
+        (1, lambda gateway, rnd: gateway.get_gemeente_by_id(rnd.choice(gemeente_ids))),
+        (2, lambda gateway, rnd: gateway.list_straten(rnd.choice(gemeente_ids))),
+        (2, lambda gateway, rnd: gateway.get_straat_by_id(rnd.choice(straat_ids))),
+        (
+            4,
+            lambda gateway, rnd: gateway.list_huisnummers_by_straat(
+                rnd.choice(straat_ids)
+            ),
+        ),
+        (
+            4,
+            lambda gateway, rnd: gateway.get_huisnummer_by_id(
+                rnd.choice(huisnummer_ids)
+            ),
+        ),
+    )
+    weighted = [call for weight, call in calls for _ in range(weight)]
+
+    def operation(gateway, index):
+        rnd = random.Random(seed * 1000003 + index)
+        return rnd.choice(weighted)(gateway, rnd)
+
+    return operation
+
+
+def load_test(
+    server, concurrency=4, requests=200, cache_config=None, operation=None, seed=0
+):
+    """
+    Measure the throughput of a :class:`crabpy.gateway.crab.CrabGateway`
+    against a running :class:`FakeCrabServer`.
+
+    Every worker thread uses its own suds client, since a suds client keeps
+    the last request and response and can not be shared between threads. The
+    gateway caches and statistics are shared.
+
+    :param FakeCrabServer server: The running server.
+    :param int concurrency: Number of worker threads.
+    :param int requests: Number of gateway calls.
+    :param dict cache_config: `Optional.` The cache configuration of the
+        gateway.
+    :param operation: `Optional.` A function that makes a call on the gateway
+        with a given index, defaults to :func:`crab_workload`.
+    :param int seed: Seed of the default workload.
+    :rtype: crabpy.testing.loadtest.LoadTestResult
+    """
+    from crabpy.client import crab_factory
+    from crabpy.gateway.crab import CrabGateway
+
+    kwargs = {"cache_config": cache_config} if cache_config else {}
+    gateway = CrabGateway(crab_factory(wsdl=server.wsdl_url, cache=None), **kwargs)
+    if operation is None:
+        operation = crab_workload(server.dataset, seed)
+
+    def setup():
+        worker_gateway = copy.copy(gateway)
+        worker_gateway.client = crab_factory(wsdl=server.wsdl_url, cache=None)
+        return worker_gateway
+
+    return run_load_test(
+        operation, concurrency=concurrency, requests=requests, setup=setup
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--straten", type=int, default=280)
+    parser.add_argument("--huisnummers", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument(
+        "--load-test",
+        action="store_true",
+        help="Run a load test against the server instead of serving forever.",
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args(argv)
+    server = FakeCrabServer(
+        CrabDataset(args.straten, args.huisnummers),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        host=args.host,
+        port=0 if args.load_test else args.port,
+    )
+    with server:
+        if args.load_test:
+            print(load_test(server, args.concurrency, args.requests))
+            return
+        print(f"wsdl: {server.wsdl_url}")
+        try:
+            server._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,982 @@
+"""
+This module contains a local HTTP stand-in for the adressenregister and
+capakey REST services.
+
+The server answers from a :class:`Dataset` and can be made slow and
+unreliable on purpose::
+
+    from crabpy.client import AdressenRegisterClient
+    from crabpy.gateway.capakey import CapakeyRestGateway
+    from crabpy.testing.fakeserver import Dataset
+    from crabpy.testing.fakeserver import FakeServer
+
+    with FakeServer(Dataset.generate(), latency=0.05, error_rate=0.01) as server:
+        client = AdressenRegisterClient(server.url, "key")
+        capakey = CapakeyRestGateway(base_url=server.capakey_url)
+
+It can also be started from the command line::
+
+    python -m crabpy.testing.fakeserver --port 8080 --latency 0.05
+
+.. versionadded:: 1.9.0
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qsl
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+"""
+Page size of the adressenregister lists when no `limit` is passed.
+"""
+
+MAX_PAGE_SIZE = 500
+"""
+Largest page size the adressenregister lists will return.
+"""
+
+FEED_PAGE_SIZE = 100
+"""
+Number of events on a page of a change feed when no `pageSize` is passed.
+"""
+
+FEED_EVENT_TYPES = {
+    "adressen": ("address", "adres"),
+    "straatnamen": ("streetname", "straatnaam"),
+    "percelen": ("parcel", "perceel"),
+    "gebouwen": ("building", "gebouw"),
+}
+"""
+The collections with a change feed, with their event type and namespace.
+"""
+
+DATA_URL = "https://data.vlaanderen.be/id"
+
+CRS = {
+    "type": "link",
+    "properties": {"href": "http://www.opengis.net/def/crs/EPSG/0/31370"},
+}
+
+STRAAT_PREFIXES = (
+    "Kerk",
+    "Stations",
+    "Dorps",
+    "Molen",
+    "Beek",
+    "Linden",
+    "Kapel",
+    "School",
+    "Veld",
+    "Hof",
+    "Bos",
+    "Kouter",
+)
+STRAAT_SUFFIXES = ("straat", "laan", "weg", "plein", "dreef", "hoek")
+
+
+def _identificator(namespace, object_id):
+    return {
+        "id": f"{DATA_URL}/{namespace}/{object_id}",
+        "naamruimte": f"{DATA_URL}/{namespace}",
+        "objectId": str(object_id),
+        "versieId": "2011-04-29T14:51:01+02:00",
+    }
+
+
+def _geografische_naam(spelling, taal="nl"):
+    return {"geografischeNaam": {"spelling": spelling, "taal": taal}}
+
+
+def _bounding_box(x, y, size):
+    """A closed ring of the corners of a square around x, y."""
+    x1, y1, x2, y2 = x - size / 2, y - size / 2, x + size / 2, y + size / 2
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2], [x1, y1]]
+
+
+def _ring(x, y, size, vertices):
+    """A closed ring with the given number of vertices inside a square."""
+    ring = [
+        [
+            round(x + size / 2 * math.cos(2 * math.pi * i / vertices), 3),
+            round(y + size / 2 * math.sin(2 * math.pi * i / vertices), 3),
+        ]
+        for i in range(vertices)
+    ]
+    return ring + [ring[0]]
+
+
+def _capakey_geometry(x, y, size, vertices):
+    return {
+        "boundingBox": json.dumps(
+            {"coordinates": [_bounding_box(x, y, size)], "type": "Polygon", "crs": CRS}
+        ),
+        "center": json.dumps({"coordinates": [x, y], "type": "Point", "crs": CRS}),
+        "shape": json.dumps(
+            {
+                "coordinates": [_ring(x, y, size, vertices)],
+                "type": "Polygon",
+                "crs": CRS,
+            }
+        ),
+    }
+
+
+class Dataset:
+    """
+    The data served by a :class:`FakeServer`.
+
+    Every collection maps an id to the json document returned by the detail
+    endpoint. Use :meth:`generate` to create a consistent dataset.
+    """
+
+    def __init__(self):
+        self.gemeenten = {}
+        self.postinfo = {}
+        self.straatnamen = {}
+        self.adressen = {}
+        self.percelen = {}
+        self.gebouwen = {}
+        self.municipalities = {}
+        self.departments = {}
+        self.sections = {}
+        self.parcels = {}
+        self.events = {collection: [] for collection in FEED_EVENT_TYPES}
+
+    @classmethod
+    def generate(cls, gemeenten=3, straten=10, adressen=20, shape_vertices=64, seed=0):
+        """
+        Generate a dataset.
+
+        The gemeenten are real Flemish gemeenten. Every gemeente gets one
+        postinfo, one kadastrale afdeling with one sectie and the given number
+        of straten. Every straat gets the given number of adressen. Every
+        adres lies on its own perceel, every two percelen share a gebouw.
+
+        :param int gemeenten: Number of gemeenten.
+        :param int straten: Number of straten per gemeente.
+        :param int adressen: Number of adressen per straat.
+        :param int shape_vertices: Number of vertices of the capakey shapes,
+            which drives the size of the capakey responses.
+        :param int seed: Seed for the positions of the adressen.
+        :rtype: Dataset
+        """
+        dataset = cls()
+        rnd = random.Random(seed)
+        data_dir = os.path.join(os.path.dirname(__file__), "..", "data")
+        with open(os.path.join(data_dir, "gemeenten.json"), encoding="utf-8") as f:
+            candidates = [
+                g for g in json.load(f) if g["provincie"] and g["status"] == "inGebruik"
+            ]
+        straat_id = 0
+        adres_id = 200000
+        gebouw_id = 5000000
+        for index, gemeente in enumerate(candidates[:gemeenten]):
+            niscode = gemeente["niscode"]
+            naam = next(
+                (n["naam"] for n in gemeente["namen"] if n["taal"] == "nl"),
+                gemeente["namen"][0]["naam"],
+            )
+            postcode = str(1000 + 10 * index)
+            x0, y0 = 100000.0 + 20000 * index, 180000.0
+            dataset.add_gemeente(niscode, naam)
+            dataset.add_postinfo(postcode, niscode)
+            afdeling = int(niscode)
+            dataset.add_municipality(niscode, naam, x0, y0, shape_vertices)
+            dataset.add_department(niscode, afdeling, x0, y0, shape_vertices)
+            dataset.add_section(afdeling, "A", x0, y0, shape_vertices)
+            grondnummer = 0
+            for s in range(straten):
+                straat_id += 1
+                prefix = STRAAT_PREFIXES[s % len(STRAAT_PREFIXES)]
+                suffix = STRAAT_SUFFIXES[(s // len(STRAAT_PREFIXES)) % 6]
+                straatnaam = prefix + suffix
+                if s >= len(STRAAT_PREFIXES) * len(STRAAT_SUFFIXES):
+                    straatnaam += f" {s}"
+                dataset.add_straatnaam(straat_id, straatnaam, niscode)
+                for a in range(adressen):
+                    adres_id += 1
+                    grondnummer += 1
+                    x = x0 + 200 * s + rnd.uniform(0, 100)
+                    y = y0 + 20 * a + rnd.uniform(0, 10)
+                    busnummer = "1" if a % 10 == 9 else None
+                    dataset.add_adres(
+                        adres_id, straat_id, str(a + 1), postcode, x, y, busnummer
+                    )
+                    capakey = f"{afdeling}A{grondnummer:04d}/00A000"
+                    dataset.add_parcel(
+                        afdeling, "A", capakey, [adres_id], x, y, shape_vertices
+                    )
+                    if grondnummer % 2:
+                        gebouw_id += 1
+                    dataset.add_gebouw(gebouw_id, capakey, x, y)
+        return dataset
+
+    def add_gemeente(self, niscode, naam, status="inGebruik"):
+        self.gemeenten[niscode] = {
+            "identificator": _identificator("gemeente", niscode),
+            "officieleTalen": ["nl"],
+            "faciliteitenTalen": [],
+            "gemeentenamen": [{"spelling": naam, "taal": "nl"}],
+            "gemeenteStatus": status,
+        }
+
+    def _gemeente_reference(self, niscode):
+        gemeente = self.gemeenten[niscode]
+        return {
+            "objectId": niscode,
+            "detail": f"/v2/gemeenten/{niscode}",
+            "gemeentenaam": _geografische_naam(
+                gemeente["gemeentenamen"][0]["spelling"]
+            ),
+        }
+
+    def add_postinfo(self, postcode, niscode):
+        naam = self.gemeenten[niscode]["gemeentenamen"][0]["spelling"]
+        self.postinfo[postcode] = {
+            "identificator": _identificator("postinfo", postcode),
+            "gemeente": self._gemeente_reference(niscode),
+            "postnamen": [_geografische_naam(naam.upper())],
+            "postInfoStatus": "gerealiseerd",
+        }
+
+    def add_straatnaam(self, straat_id, naam, niscode, status="inGebruik"):
+        self.straatnamen[str(straat_id)] = {
+            "identificator": _identificator("straatnaam", straat_id),
+            "gemeente": self._gemeente_reference(niscode),
+            "straatnamen": [{"spelling": naam, "taal": "nl"}],
+            "homoniemToevoegingen": [],
+            "straatnaamStatus": status,
+        }
+
+    def add_adres(
+        self, adres_id, straat_id, huisnummer, postcode, x, y, busnummer=None
+    ):
+        straat = self.straatnamen[str(straat_id)]
+        straatnaam = straat["straatnamen"][0]["spelling"]
+        niscode = straat["gemeente"]["objectId"]
+        gemeentenaam = straat["gemeente"]["gemeentenaam"]["geografischeNaam"][
+            "spelling"
+        ]
+        nummer = f"{huisnummer} bus {busnummer}" if busnummer else huisnummer
+        adres = {
+            "identificator": _identificator("adres", adres_id),
+            "gemeente": self._gemeente_reference(niscode),
+            "postinfo": {"objectId": postcode, "detail": f"/v2/postinfo/{postcode}"},
+            "straatnaam": {
+                "objectId": str(straat_id),
+                "detail": f"/v2/straatnamen/{straat_id}",
+                "straatnaam": _geografische_naam(straatnaam),
+            },
+            "huisnummer": huisnummer,
+            "volledigAdres": _geografische_naam(
+                f"{straatnaam} {nummer}, {postcode} {gemeentenaam}"
+            ),
+            "adresPositie": {
+                "point": {"coordinates": [round(x, 2), round(y, 2)], "type": "Point"}
+            },
+            "positieGeometrieMethode": "afgeleidVanObject",
+            "positieSpecificatie": "gebouweenheid",
+            "adresStatus": "inGebruik",
+            "officieelToegekend": True,
+        }
+        if busnummer:
+            adres["busnummer"] = busnummer
+        self.adressen[str(adres_id)] = adres
+
+    def add_gebouw(self, gebouw_id, capakey, x, y):
+        perceel_id = capakey.replace("/", "-")
+        gebouw = self.gebouwen.setdefault(
+            str(gebouw_id),
+            {
+                "identificator": _identificator("gebouw", gebouw_id),
+                "geometriePolygoon": {
+                    "polygon": {
+                        "coordinates": [_bounding_box(x, y, 8)],
+                        "type": "Polygon",
+                    }
+                },
+                "geometrieMethode": "ingemetenGRB",
+                "gebouwStatus": "gerealiseerd",
+                "gebouweenheden": [],
+                "percelen": [],
+            },
+        )
+        gebouw["percelen"].append(
+            {"objectId": perceel_id, "detail": f"/v2/percelen/{perceel_id}"}
+        )
+
+    def add_municipality(self, niscode, naam, x, y, vertices):
+        self.municipalities[str(int(niscode))] = {
+            "municipalityCode": str(int(niscode)),
+            "municipalityName": naam,
+            "geometry": _capakey_geometry(x, y, 20000, vertices),
+        }
+
+    def add_department(self, niscode, code, x, y, vertices):
+        municipality = self.municipalities[str(int(niscode))]
+        self.departments[str(code)] = {
+            "municipalityCode": municipality["municipalityCode"],
+            "municipalityName": municipality["municipalityName"],
+            "departmentCode": str(code),
+            "departmentName": f"{municipality['municipalityName'].upper()} 1 AFD",
+            "geometry": _capakey_geometry(x, y, 10000, vertices),
+        }
+
+    def add_section(self, department, code, x, y, vertices):
+        section = dict(self.departments[str(department)])
+        section["sectionCode"] = code
+        section["geometry"] = _capakey_geometry(x, y, 5000, vertices)
+        self.sections[(str(department), code)] = section
+
+    def add_parcel(self, department, section, capakey, adressen, x, y, vertices):
+        perceelnummer = capakey.split(section, 1)[1]
+        grondnummer, rest = perceelnummer.split("/")
+        parcel = dict(self.sections[(str(department), section)])
+        parcel.update(
+            {
+                "perceelnummer": perceelnummer,
+                "capakey": capakey,
+                "grondnummer": str(int(grondnummer)),
+                "exponent": rest[2],
+                "macht": rest[3:],
+                "bisnummer": rest[:2],
+                "adres": [
+                    self.adressen[str(a)]["volledigAdres"]["geografischeNaam"][
+                        "spelling"
+                    ]
+                    for a in adressen
+                ],
+                "geometry": _capakey_geometry(x, y, 20, vertices),
+            }
+        )
+        self.parcels[capakey] = parcel
+        perceel_id = capakey.replace("/", "-")
+        self.percelen[perceel_id] = {
+            "identificator": _identificator("perceel", perceel_id),
+            "perceelStatus": "gerealiseerd",
+            "adressen": [
+                {"objectId": str(a), "detail": f"/v2/adressen/{a}"} for a in adressen
+            ],
+        }
+
+    def change(self, collection, object_id, document=None):
+        """
+        Create, update or remove an object and publish it on the change feed.
+
+        Objects created by :meth:`generate` and the `add_` methods are not
+        published, the feed starts out empty.
+
+        :param str collection: `adressen`, `straatnamen`, `percelen` or
+            `gebouwen`.
+        :param str object_id: The id of the object.
+        :param dict document: The new detail document, `None` to remove the
+            object.
+        :returns: The CloudEvent that was published.
+        """
+        objects = getattr(self, collection)
+        object_id = str(object_id)
+        if document is None:
+            objects.pop(object_id)
+            action = "delete"
+        else:
+            action = "update" if object_id in objects else "create"
+            objects[object_id] = document
+        event_type, namespace = FEED_EVENT_TYPES[collection]
+        namespace = f"{DATA_URL}/{namespace}"
+        events = self.events[collection]
+        position = len(events) + 1
+        niscode = (document or {}).get("gemeente", {}).get("objectId")
+        event = {
+            "specversion": "1.0",
+            "id": str(position),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "type": f"basisregisters.{event_type}.{action}.v1",
+            "source": f"https://api.basisregisters.vlaanderen.be/v2/{collection}"
+            "/wijzigingen",
+            "datacontenttype": "application/json",
+            "data": {
+                "@id": f"{namespace}/{object_id}",
+                "objectId": object_id,
+                "naamruimte": namespace,
+                "versieId": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
+                "nisCodes": [niscode] if niscode else [],
+            },
+        }
+        events.append(event)
+        return event
+
+
+def _name(item, *path):
+    for key in path:
+        item = item[key]
+    return item
+
+
+def _any_spelling(items):
+    return {i.get("spelling") or i["geografischeNaam"]["spelling"] for i in items}
+
+
+ADRESSENREGISTER_COLLECTIONS = {
+    "gemeenten": {
+        "key": "gemeenten",
+        "list": lambda item: {
+            "identificator": item["identificator"],
+            "gemeentenaam": _geografische_naam(item["gemeentenamen"][0]["spelling"]),
+            "gemeenteStatus": item["gemeenteStatus"],
+        },
+        "filters": {
+            "gemeentenaam": lambda item: _any_spelling(item["gemeentenamen"]),
+            "status": lambda item: {item["gemeenteStatus"]},
+        },
+    },
+    "postinfo": {
+        "key": "postInfoObjecten",
+        "list": lambda item: {
+            "identificator": item["identificator"],
+            "postnamen": item["postnamen"],
+            "postInfoStatus": item["postInfoStatus"],
+        },
+        "filters": {
+            "gemeentenaam": lambda item: {
+                _name(item, "gemeente", "gemeentenaam", "geografischeNaam", "spelling")
+            },
+            "postnaam": lambda item: _any_spelling(item["postnamen"]),
+        },
+    },
+    "straatnamen": {
+        "key": "straatnamen",
+        "list": lambda item: {
+            "identificator": item["identificator"],
+            "straatnaam": _geografische_naam(item["straatnamen"][0]["spelling"]),
+            "straatnaamStatus": item["straatnaamStatus"],
+        },
+        "filters": {
+            "straatnaam": lambda item: _any_spelling(item["straatnamen"]),
+            "gemeentenaam": lambda item: {
+                _name(item, "gemeente", "gemeentenaam", "geografischeNaam", "spelling")
+            },
+            "nisCode": lambda item: {item["gemeente"]["objectId"]},
+            "status": lambda item: {item["straatnaamStatus"]},
+        },
+    },
+    "adressen": {
+        "key": "adressen",
+        "list": lambda item: {
+            key: item[key]
+            for key in (
+                "identificator",
+                "huisnummer",
+                "busnummer",
+                "volledigAdres",
+                "adresStatus",
+            )
+            if key in item
+        },
+        "filters": {
+            "gemeentenaam": lambda item: {
+                _name(item, "gemeente", "gemeentenaam", "geografischeNaam", "spelling")
+            },
+            "postcode": lambda item: {item["postinfo"]["objectId"]},
+            "straatnaam": lambda item: {
+                _name(item, "straatnaam", "straatnaam", "geografischeNaam", "spelling")
+            },
+            "huisnummer": lambda item: {item["huisnummer"]},
+            "busnummer": lambda item: {item.get("busnummer")},
+            "niscode": lambda item: {item["gemeente"]["objectId"]},
+            "status": lambda item: {item["adresStatus"]},
+            "straatnaamObjectId": lambda item: {item["straatnaam"]["objectId"]},
+        },
+    },
+    "percelen": {
+        "key": "percelen",
+        "list": lambda item: {
+            "@type": "Perceel",
+            "identificator": item["identificator"],
+            "perceelStatus": item["perceelStatus"],
+        },
+        "filters": {
+            "status": lambda item: {item["perceelStatus"]},
+            "adresObjectId": lambda item: {a["objectId"] for a in item["adressen"]},
+        },
+    },
+    "gebouwen": {
+        "key": "gebouwen",
+        "list": lambda item: {
+            "identificator": item["identificator"],
+            "gebouwStatus": item["gebouwStatus"],
+        },
+        "filters": {"status": lambda item: {item["gebouwStatus"]}},
+    },
+}
+
+ADRESMATCH_FILTERS = ("gemeentenaam", "niscode", "postcode", "straatnaam")
+
+
+class Response:
+    """
+    A response of the :class:`FakeServer`.
+    """
+
+    def __init__(self, status=200, body=None, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    def encode(self):
+        return json.dumps(self.body).encode("utf-8") if self.body is not None else b""
+
+
+def _not_found():
+    return Response(404, {"title": "Not Found", "status": 404})
+
+
+class FakeServer:
+    """
+    A local HTTP server that behaves like the adressenregister and capakey
+    services.
+
+    The adressenregister lists are paginated with `offset` and `limit` and
+    link to the next page with a `volgende` url, like the real service.
+
+    :param Dataset dataset: The data to serve, generated when omitted.
+    :param latency: Seconds to wait before every response, or a
+        `(minimum, maximum)` tuple for a random latency.
+    :param float error_rate: Fraction of requests answered with a 503.
+    :param float throttle_rate: Fraction of requests answered with a 429.
+    :param float max_requests_per_second: Answer with a 429 when more
+        requests come in, `None` for no limit.
+    :param int retry_after: The `Retry-After` of a 429 response.
+    :param str host: The host to listen on.
+    :param int port: The port to listen on, 0 picks a free port.
+    :param int seed: Seed for the random errors and latencies.
+    """
+
+    def __init__(
+        self,
+        dataset=None,
+        latency=0,
+        error_rate=0,
+        throttle_rate=0,
+        max_requests_per_second=None,
+        retry_after=1,
+        host="127.0.0.1",
+        port=0,
+        seed=None,
+    ):
+        self.dataset = dataset if dataset is not None else Dataset.generate()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_requests_per_second = max_requests_per_second
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = (0, 0)
+        self._server = None
+        self._thread = None
+        self._routes = [
+            (re.compile(r"/v1/adresmatch"), self.adresmatch),
+            (re.compile(r"/v2/(?P<collection>[a-z]+)"), self.list),
+            (re.compile(r"/v2/(?P<collection>[a-z]+)/wijzigingen"), self.feed),
+            (re.compile(r"/v2/(?P<collection>[a-z]+)/(?P<id>[^/]+)"), self.get),
+            (re.compile(r"/capakey/v2/municipality"), self.municipalities),
+            (re.compile(r"/capakey/v2/municipality/(?P<m>\d+)"), self.municipality),
+            (
+                re.compile(r"/capakey/v2/municipality/(?P<m>\d+)/department"),
+                self.departments,
+            ),
+            (re.compile(r"/capakey/v2/department/(?P<d>\d+)"), self.department),
+            (
+                re.compile(
+                    r"/capakey/v2/municipality/\d+/department/(?P<d>\d+)/section"
+                ),
+                self.sections,
+            ),
+            (
+                re.compile(
+                    r"/capakey/v2/municipality/\d+/department/(?P<d>\d+)"
+                    r"/section/(?P<s>[^/]+)"
+                ),
+                self.section,
+            ),
+            (
+                re.compile(
+                    r"/capakey/v2/municipality/\d+/department/(?P<d>\d+)"
+                    r"/section/(?P<s>[^/]+)/parcel"
+                ),
+                self.parcels,
+            ),
+            (
+                re.compile(
+                    r"/capakey/v2/municipality/\d+/department/(?P<d>\d+)"
+                    r"/section/(?P<s>[^/]+)/parcel/(?P<p>.+)"
+                ),
+                self.parcel,
+            ),
+            (re.compile(r"/capakey/v2/parcel"), self.parcel_by_coordinates),
+            (re.compile(r"/capakey/v2/parcel/(?P<capakey>.+)"), self.parcel_by_capakey),
+        ]
+
+    @property
+    def url(self):
+        """
+        Base url of the adressenregister service.
+        """
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def capakey_url(self):
+        """
+        Base url of the capakey service.
+        """
+        return f"{self.url}/capakey/v2"
+
+    def start(self):
+        """
+        Start serving in a background thread.
+        """
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.app = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="crabpy-fakeserver",
+            daemon=True,
+        )
+        self._thread.start()
+        log.info("Fake server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        """
+        Stop serving.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def handle(self, path, params):
+        """
+        Answer a GET request.
+
+        :param str path: The path of the request.
+        :param dict params: The query parameters of the request.
+        :rtype: Response
+        """
+        with self._lock:
+            self.counts["requests"] += 1
+            latency = self.latency
+            if isinstance(latency, tuple):
+                latency = self._random.uniform(*latency)
+            throttled = self._throttled()
+            failed = self._random.random() < self.error_rate
+        if latency:
+            time.sleep(latency)
+        if throttled:
+            response = Response(
+                429,
+                {"title": "Too Many Requests", "status": 429},
+                {"Retry-After": str(self.retry_after)},
+            )
+        elif failed:
+            response = Response(503, {"title": "Service Unavailable", "status": 503})
+        else:
+            response = self._route(path, params)
+        with self._lock:
+            self.counts[response.status] += 1
+        return response
+
+    def _throttled(self):
+        if self._random.random() < self.throttle_rate:
+            return True
+        if self.max_requests_per_second is None:
+            return False
+        second = int(time.monotonic())
+        window, count = self._window
+        count = count + 1 if window == second else 1
+        self._window = (second, count)
+        return count > self.max_requests_per_second
+
+    def _route(self, path, params):
+        for pattern, view in self._routes:
+            match = pattern.fullmatch(path)
+            if match:
+                return view(params, **match.groupdict())
+        return _not_found()
+
+    def list(self, params, collection):
+        config = ADRESSENREGISTER_COLLECTIONS.get(collection)
+        if config is None:
+            return _not_found()
+        items = [
+            item
+            for item in getattr(self.dataset, collection).values()
+            if all(
+                params[name] in values(item)
+                for name, values in config["filters"].items()
+                if name in params
+            )
+        ]
+        offset = int(params.get("offset", 0))
+        limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        page = items[offset : offset + limit]
+        body = {
+            config["key"]: [
+                dict(config["list"](item), detail=self._detail(collection, item))
+                for item in page
+            ]
+        }
+        if offset + limit < len(items):
+            next_params = dict(params, offset=offset + limit, limit=limit)
+            body["volgende"] = f"{self.url}/v2/{collection}?{urlencode(next_params)}"
+        return Response(200, body)
+
+    def get(self, params, collection, id):
+        if collection not in ADRESSENREGISTER_COLLECTIONS:
+            return _not_found()
+        item = getattr(self.dataset, collection).get(id)
+        return Response(200, item) if item is not None else _not_found()
+
+    def feed(self, params, collection):
+        events = self.dataset.events.get(collection)
+        if events is None:
+            return _not_found()
+        size = min(int(params.get("pageSize", FEED_PAGE_SIZE)), MAX_PAGE_SIZE)
+        start = (int(params.get("page", 1)) - 1) * size
+        return Response(200, events[start : start + size])
+
+    def _detail(self, collection, item):
+        return f"{self.url}/v2/{collection}/{item['identificator']['objectId']}"
+
+    def adresmatch(self, params):
+        filters = ADRESSENREGISTER_COLLECTIONS["adressen"]["filters"]
+        matches = [
+            dict(adres, score=100.0)
+            for adres in self.dataset.adressen.values()
+            if all(
+                params[name].lower() in {v.lower() for v in filters[name](adres) if v}
+                for name in ADRESMATCH_FILTERS + ("huisnummer", "busnummer")
+                if name in params
+            )
+        ]
+        return Response(200, {"adresMatches": matches[:10], "warnings": []})
+
+    @staticmethod
+    def _capakey(item, params, *keys):
+        result = {key: item[key] for key in keys}
+        if "geometry" in params:
+            result["geometry"] = item["geometry"]
+        if params.get("data") == "adp" and "adres" in item:
+            result["adres"] = item["adres"]
+        return result
+
+    def municipalities(self, params):
+        municipalities = sorted(
+            self.dataset.municipalities.values(),
+            key=lambda m: (
+                m["municipalityCode"]
+                if params.get("orderbyCode") == "True"
+                else m["municipalityName"]
+            ),
+        )
+        return Response(
+            200,
+            {
+                "municipalities": [
+                    {key: m[key] for key in ("municipalityCode", "municipalityName")}
+                    for m in municipalities
+                ]
+            },
+        )
+
+    def municipality(self, params, m):
+        item = self.dataset.municipalities.get(m)
+        if item is None:
+            return _not_found()
+        return Response(
+            200, self._capakey(item, params, "municipalityCode", "municipalityName")
+        )
+
+    def departments(self, params, m):
+        if m not in self.dataset.municipalities:
+            return _not_found()
+        departments = [
+            {key: d[key] for key in ("departmentCode", "departmentName")}
+            for d in self.dataset.departments.values()
+            if d["municipalityCode"] == m
+        ]
+        return Response(200, {"departments": departments})
+
+    def department(self, params, d):
+        item = self.dataset.departments.get(d)
+        if item is None:
+            return _not_found()
+        keys = (
+            "municipalityCode",
+            "municipalityName",
+            "departmentCode",
+            "departmentName",
+        )
+        return Response(200, self._capakey(item, params, *keys))
+
+    def sections(self, params, d):
+        if d not in self.dataset.departments:
+            return _not_found()
+        sections = [
+            {"sectionCode": s["sectionCode"]}
+            for (department, _), s in self.dataset.sections.items()
+            if department == d
+        ]
+        return Response(200, {"sections": sections})
+
+    def section(self, params, d, s):
+        item = self.dataset.sections.get((d, s))
+        if item is None:
+            return _not_found()
+        keys = (
+            "municipalityCode",
+            "municipalityName",
+            "departmentCode",
+            "departmentName",
+            "sectionCode",
+        )
+        return Response(200, self._capakey(item, params, *keys))
+
+    def parcels(self, params, d, s):
+        if (d, s) not in self.dataset.sections:
+            return _not_found()
+        parcels = [
+            {"perceelnummer": p["perceelnummer"], "capakey": p["capakey"]}
+            for p in self.dataset.parcels.values()
+            if p["departmentCode"] == d and p["sectionCode"] == s
+        ]
+        return Response(200, {"parcels": parcels})
+
+    def parcel(self, params, d, s, p):
+        return self.parcel_by_capakey(params, f"{d}{s}{p}")
+
+    def parcel_by_capakey(self, params, capakey):
+        item = self.dataset.parcels.get(capakey)
+        if item is None:
+            return _not_found()
+        keys = (
+            "municipalityCode",
+            "municipalityName",
+            "departmentCode",
+            "departmentName",
+            "sectionCode",
+            "perceelnummer",
+            "capakey",
+            "grondnummer",
+            "exponent",
+            "macht",
+            "bisnummer",
+        )
+        return Response(200, self._capakey(item, params, *keys))
+
+    def parcel_by_coordinates(self, params):
+        try:
+            x, y = float(params["x"]), float(params["y"])
+        except (KeyError, ValueError):
+            return Response(400, {"title": "Bad Request", "status": 400})
+        for capakey, parcel in self.dataset.parcels.items():
+            box = json.loads(parcel["geometry"]["boundingBox"])["coordinates"][0]
+            if box[0][0] <= x <= box[2][0] and box[0][1] <= y <= box[2][1]:
+                return self.parcel_by_capakey(params, capakey)
+        return _not_found()
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Hedged and cancelled requests hang up before their answer is sent.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            log.debug("%s disconnected early", client_address[0])
+            return
+        super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        response = self.server.app.handle(url.path, params)
+        body = response.encode()
+        self.send_response(response.status)
+        content_type = "application/json"
+        if response.status >= 400:
+            content_type = "application/problem+json"
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--gemeenten", type=int, default=3)
+    parser.add_argument("--straten", type=int, default=10)
+    parser.add_argument("--adressen", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0)
+    parser.add_argument("--max-requests-per-second", type=float, default=None)
+    args = parser.parse_args(argv)
+    dataset = Dataset.generate(args.gemeenten, args.straten, args.adressen)
+    server = FakeServer(
+        dataset,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        max_requests_per_second=args.max_requests_per_second,
+        host=args.host,
+        port=args.port,
+    )
+    with server:
+        print(f"adressenregister: {server.url}")
+        print(f"capakey: {server.capakey_url}")
+        try:
+            server._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+This module contains a small harness to measure the throughput of a gateway
+under concurrency.
+
+.. versionadded:: 1.9.0
+"""
+
+import itertools
+import math
+import threading
+import time
+from collections import Counter
+
+
+class LoadTestResult:
+    """
+    The outcome of :func:`run_load_test`.
+
+    :param list latencies: The duration in seconds of every call.
+    :param Counter errors: The number of failed calls per exception type.
+    :param float duration: The wall clock time of the whole test in seconds.
+    :param int concurrency: The number of worker threads.
+    """
+
+    def __init__(self, latencies, errors, duration, concurrency):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.duration = duration
+        self.concurrency = concurrency
+
+    @property
+    def requests(self):
+        """
+        The number of calls, including the failed ones.
+        """
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        """
+        The number of calls per second.
+        """
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentile(self, percentile):
+        """
+        Get a latency percentile.
+
+        :param float percentile: The percentile, between 0 and 100.
+        :returns: The latency in seconds, `None` when nothing was called.
+        """
+        if not self.latencies:
+            return None
+        rank = math.ceil(percentile / 100 * len(self.latencies))
+        return self.latencies[max(rank, 1) - 1]
+
+    def summary(self):
+        """
+        :returns: A dict with the main figures of the test.
+        """
+        return {
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": sum(self.errors.values()),
+            "duration": self.duration,
+            "throughput": self.throughput,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+    def __str__(self):
+        if not self.latencies:
+            return "No requests were made."
+        lines = [
+            f"{self.requests} requests with {self.concurrency} threads "
+            f"in {self.duration:.2f}s: {self.throughput:.1f} requests/s",
+            "latency p50 {:.1f}ms, p95 {:.1f}ms, p99 {:.1f}ms".format(
+                *(1000 * self.percentile(p) for p in (50, 95, 99))
+            ),
+        ]
+        for error, count in self.errors.most_common():
+            lines.append(f"{count} x {error}")
+        return "\n".join(lines)
+
+
+def run_load_test(operation, concurrency=4, requests=100, setup=None):
+    """
+    Call an operation a number of times, spread over worker threads.
+
+    All workers start at the same time and take the next index until
+    `requests` calls were made. Exceptions are counted, not raised::
+
+        result = run_load_test(
+            lambda gateway, i: gateway.get_straat_by_id(i + 1),
+            concurrency=8,
+            requests=1000,
+            setup=lambda: CrabGateway(crab_factory()),
+        )
+        print(result)
+
+    :param operation: A function that is called with the state of the worker
+        and the index of the call.
+    :param int concurrency: The number of worker threads.
+    :param int requests: The total number of calls.
+    :param setup: `Optional.` A function called once in every worker thread,
+        before the test starts, to create the state of the worker. When it
+        fails, the test is not started and the exception is reraised.
+    :rtype: LoadTestResult
+    """
+    indexes = itertools.count()
+    barrier = threading.Barrier(concurrency + 1)
+    lock = threading.Lock()
+    latencies = []
+    errors = Counter()
+    setup_errors = []
+
+    def worker():
+        try:
+            state = setup() if setup is not None else None
+        except Exception as e:
+            setup_errors.append(e)
+            barrier.abort()
+            return
+        own_latencies = []
+        own_errors = Counter()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            return
+        for index in indexes:
+            if index >= requests:
+                break
+            start = time.perf_counter()
+            try:
+                operation(state, index)
+            except Exception as e:
+                own_errors[type(e).__name__] += 1
+            own_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own_latencies)
+            errors.update(own_errors)
+
+    threads = [
+        threading.Thread(target=worker, name=f"crabpy-loadtest-{i}", daemon=True)
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        raise setup_errors[0]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return LoadTestResult(latencies, errors, time.perf_counter() - start, concurrency)
@@ -0,0 +1,110 @@
+"""
+This module contains helpers to normalise and parse free text addresses.
+
+.. versionadded:: 1.9.0
+"""
+
+import re
+import unicodedata
+
+ABBREVIATIONS = (
+    (re.compile(r"(?<=\w)str\.?(?=[\s,]|$)", re.IGNORECASE), "straat"),
+    (re.compile(r"(?<=\s)str\.(?=[\s,]|$)", re.IGNORECASE), "straat"),
+    (re.compile(r"(?<=\w)(?:stwg|stw)\.?(?=[\s,]|$)", re.IGNORECASE), "steenweg"),
+    (re.compile(r"(?<=\s)(?:stwg|stw)\.?(?=[\s,]|$)", re.IGNORECASE), "steenweg"),
+    (re.compile(r"(?<=[\w\s])ln\.(?=[\s,]|$)", re.IGNORECASE), "laan"),
+    (re.compile(r"(?<=[\w\s])pl\.(?=[\s,]|$)", re.IGNORECASE), "plein"),
+    (re.compile(r"\b[Ss]t\.\s*-?\s*(?=\w)"), "Sint-"),
+)
+"""
+Common abbreviations in Flemish street names and what they stand for.
+"""
+
+WHITESPACE = re.compile(r"\s+")
+
+ADDRESS_PATTERN = re.compile(
+    r"^\s*(?P<straatnaam>.*?\D)\s*"
+    r"(?P<huisnummer>\d+(?:\s?[A-Za-z](?![A-Za-z]))?)"
+    r"(?:\s*(?:bus|bt\.?|b\.|/)\s*(?P<busnummer>[\w.]+))?"
+    r"\s*(?:,\s*|\s+|$)"
+    r"(?:(?P<postcode>\d{4})\s*)?"
+    r"(?P<gemeentenaam>\D*?)\s*$",
+    re.IGNORECASE,
+)
+"""
+Splits `Kerkstraat 12 bus 3, 9000 Gent` in its parts.
+"""
+
+
+def clean(text):
+    """
+    Collapse whitespace and write out abbreviations.
+
+    The case and accents are kept, so the result can still be shown or sent
+    to the adressenregister::
+
+        >>> clean("  Kerkstr.   12")
+        'Kerkstraat 12'
+
+    :param str text: The text to clean.
+    :rtype: str
+    """
+    if text is None:
+        return None
+    text = WHITESPACE.sub(" ", str(text)).strip()
+    for pattern, replacement in ABBREVIATIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def strip_accents(text):
+    """
+    Remove the accents from the letters of a text.
+
+    :param str text: The text.
+    :rtype: str
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalise(text):
+    """
+    Reduce a text to a key that is the same for all ways to write it.
+
+    Cleans the text and removes case and accents::
+
+        >>> normalise("Sint-Pietersstr. ") == normalise("st. pietersstraat")
+        True
+
+    :param str text: The text to normalise.
+    :rtype: str
+    """
+    if text is None:
+        return None
+    text = strip_accents(clean(text)).casefold()
+    return WHITESPACE.sub(" ", text.replace("-", " ")).strip()
+
+
+def parse_address(text):
+    """
+    Split a free text address in its parts.
+
+    Recognises addresses written as `straatnaam huisnummer [bus busnummer][,]
+    [postcode] [gemeentenaam]`. Parts that are missing are left out::
+
+        >>> parse_address("Kerkstraat 12 bus 3, 9000 Gent")["busnummer"]
+        '3'
+
+    :param str text: The address.
+    :returns: A dict with the `straatnaam`, `huisnummer`, `busnummer`,
+        `postcode` and `gemeentenaam`, or `None` when the text is not an
+        address.
+    """
+    match = ADDRESS_PATTERN.match(clean(text) or "")
+    if match is None:
+        return None
+    parts = {key: value for key, value in match.groupdict().items() if value}
+    parts["straatnaam"] = parts["straatnaam"].rstrip(" ,")
+    parts["huisnummer"] = parts["huisnummer"].replace(" ", "").upper()
+    return parts
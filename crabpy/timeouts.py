@@ -0,0 +1,244 @@
+"""
+This module limits how long the gateways wait for the upstream services.
+
+A :func:`deadline` bounds everything that happens inside it: gateway
+methods, every page of a listing and every lazy load. Calls that are still
+waiting when the time is up fail with :class:`DeadlineExceeded`, wrapped in
+the usual exception of the gateway::
+
+    from crabpy.timeouts import deadline
+
+    with deadline(2):
+        gateway.get_adres_by_id(200001).straat
+
+A :class:`Hedging` policy sends a second request when the first one is
+slower than most requests to the same endpoint, and uses whichever answers
+first. It can be passed to the :class:`crabpy.client.AdressenRegisterClient`
+and the :class:`crabpy.gateway.capakey.CapakeyRestGateway`::
+
+    client = AdressenRegisterClient(url, key, hedging=Hedging(percentile=0.95))
+
+.. versionadded:: 1.9.0
+"""
+
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from collections import defaultdict
+from collections import deque
+
+import requests
+
+from crabpy.stats import endpoint_name
+
+_deadline = contextvars.ContextVar("crabpy_deadline", default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """
+    The deadline passed before an upstream call could be answered.
+    """
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """
+    Limit the time the calls inside this context may take.
+
+    Nested deadlines can only shorten the deadline, never extend it.
+
+    :param float seconds: The number of seconds from now.
+    """
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        at = min(at, current)
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """
+    Get the time left before the current deadline.
+
+    :returns: The number of seconds, `None` when there is no deadline.
+    """
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+class Hedging:
+    """
+    A policy that sends a duplicate request when the first one is slow.
+
+    The delay before the duplicate is sent is a percentile of the recent
+    latencies of the endpoint, so only the slowest requests are hedged.
+    Until enough latencies are known, a fixed delay is used.
+
+    Only use it for requests that can safely be sent twice.
+
+    :param float percentile: The latency percentile, between 0 and 1.
+    :param float delay: The delay while fewer than `min_samples` latencies
+        are known.
+    :param float min_delay: The shortest delay.
+    :param int min_samples: The number of latencies needed to use the
+        percentile.
+    :param int window: The number of recent latencies kept per endpoint.
+    :param int max_workers: The number of threads sending requests.
+    """
+
+    def __init__(
+        self,
+        percentile=0.95,
+        delay=1.0,
+        min_delay=0.05,
+        min_samples=20,
+        window=200,
+        max_workers=16,
+    ):
+        self.percentile = percentile
+        self.delay = delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def delay_for(self, endpoint):
+        """
+        Get the delay before a request to an endpoint is hedged.
+
+        :param str endpoint: The endpoint, see
+            :func:`crabpy.stats.endpoint_name`.
+        :rtype: float
+        """
+        with self._lock:
+            latencies = sorted(self._latencies[endpoint])
+        if len(latencies) < self.min_samples:
+            return self.delay
+        index = min(len(latencies) - 1, int(self.percentile * len(latencies)))
+        return max(self.min_delay, latencies[index])
+
+    def observe(self, endpoint, duration):
+        """
+        Remember the latency of a request.
+        """
+        with self._lock:
+            self._latencies[endpoint].append(duration)
+
+    def _timed(self, endpoint, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.observe(endpoint, time.perf_counter() - start)
+        return result
+
+    def _get_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="crabpy-hedging"
+                )
+            return self._executor
+
+    def call(self, endpoint, fn, timeout=None, stats=None):
+        """
+        Call `fn`, and call it again when it does not answer in time.
+
+        :param str endpoint: The endpoint that is called.
+        :param fn: A function without arguments that sends the request.
+        :param float timeout: `Optional.` The time left for the call. No
+            duplicate is sent when the delay is longer.
+        :param stats: `Optional.` A :class:`crabpy.stats.Statistics` that
+            counts the `hedged_requests` and the `hedged_requests_won`.
+        :returns: The first successful result. When both requests fail, the
+            exception of the first one is raised. The result of the other
+            request is closed when it has a `close` method, so a streamed
+            response gives its connection back to the pool.
+        """
+        from concurrent.futures import FIRST_COMPLETED
+        from concurrent.futures import wait
+
+        delay = self.delay_for(endpoint)
+        if timeout is not None and delay >= timeout:
+            return self._timed(endpoint, fn)
+        executor = self._get_executor()
+        # Both requests run in a copy of the context, so they respect the
+        # current deadline.
+        first = executor.submit(
+            contextvars.copy_context().run, self._timed, endpoint, fn
+        )
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        if stats is not None:
+            stats.increment("hedged_requests")
+        second = executor.submit(
+            contextvars.copy_context().run, self._timed, endpoint, fn
+        )
+        pending = [first, second]
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in (first, second):
+                if future not in done:
+                    continue
+                if future.exception() is None:
+                    if future is second and stats is not None:
+                        stats.increment("hedged_requests_won")
+                    other = second if future is first else first
+                    other.add_done_callback(_close_result)
+                    return future.result()
+                if error is None or future is first:
+                    error = future.exception()
+        raise error
+
+
+def _close_result(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if close is not None:
+        close()
+
+
+def send(get, url, hedging=None, stats=None, **kwargs):
+    """
+    Send a GET request within the current deadline.
+
+    The time left is passed on as the `timeout` of the request, which bounds
+    the time to connect and every wait for data. When that timeout fires,
+    the deadline of the caller ran out rather than the upstream failing, so
+    it is raised as :class:`DeadlineExceeded`.
+
+    :param get: A function with the signature of :func:`requests.get`.
+    :param str url: The url.
+    :param Hedging hedging: `Optional.` The hedging policy.
+    :param stats: `Optional.` A :class:`crabpy.stats.Statistics` for the
+        hedging counters.
+    :returns: The :class:`requests.Response`.
+    :raises DeadlineExceeded: When the deadline passed before or while
+        requesting.
+    """
+    timeout = remaining()
+    if timeout is not None:
+        if timeout <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before requesting {url}")
+        kwargs["timeout"] = timeout
+    try:
+        if hedging is None:
+            return get(url, **kwargs)
+        return hedging.call(
+            endpoint_name(url), functools.partial(get, url, **kwargs), timeout, stats
+        )
+    except requests.Timeout as e:
+        if timeout is None or isinstance(e, DeadlineExceeded):
+            raise
+        raise DeadlineExceeded(f"Deadline exceeded while requesting {url}") from e
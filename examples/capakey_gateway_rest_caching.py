@@ -21,6 +21,8 @@ g = CapakeyRestGateway(
         "short.backend": "dogpile.cache.dbm",
         "short.expiration_time": 3600,
         "short.arguments.filename": os.path.join(root, "capakey_short.dbm"),
+        "notfound.backend": "dogpile.cache.memory",
+        "notfound.expiration_time": 300,
     }
 )
 
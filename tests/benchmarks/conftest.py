@@ -0,0 +1,46 @@
+import re
+
+import pytest
+
+ADRESSENREGISTER_URL = "https://api.basisregisters.vlaanderen.be"
+
+PAGE_SIZE = 500
+
+
+def adressen_item(number):
+    return {
+        "identificator": {
+            "id": f"https://data.vlaanderen.be/id/adres/{200000 + number}",
+            "naamruimte": "https://data.vlaanderen.be/id/adres",
+            "objectId": str(200000 + number),
+            "versieId": "2011-04-29T14:51:01+02:00",
+        },
+        "detail": f"{ADRESSENREGISTER_URL}/v2/adressen/{200000 + number}",
+        "huisnummer": str(number),
+        "volledigAdres": {
+            "geografischeNaam": {
+                "spelling": f"Goorbaan {number}, 2230 Herselt",
+                "taal": "nl",
+            }
+        },
+        "adresStatus": "inGebruik",
+    }
+
+
+@pytest.fixture(scope="function")
+def adressen_response(mocked_responses):
+    """Two pages of adressen for a straat, linked by a `volgende` url."""
+    url = f"{ADRESSENREGISTER_URL}/v2/adressen"
+    mocked_responses.add(
+        method="GET",
+        url=re.compile(rf"{url}\?.*straatnaamObjectId="),
+        json={
+            "adressen": [adressen_item(n) for n in range(PAGE_SIZE)],
+            "volgende": f"{url}?offset={PAGE_SIZE}&limit={PAGE_SIZE}",
+        },
+    )
+    mocked_responses.add(
+        method="GET",
+        url=re.compile(rf"{url}\?offset="),
+        json={"adressen": [adressen_item(n) for n in range(PAGE_SIZE, 2 * PAGE_SIZE)]},
+    )
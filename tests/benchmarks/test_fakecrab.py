@@ -0,0 +1,31 @@
+"""
+Benchmarks of the CRAB gateway over SOAP against the local fake CRAB server.
+
+These include the cost of the suds serialization, which the benchmarks with
+mocked clients skip.
+"""
+
+import pytest
+
+from crabpy.client import crab_factory
+from crabpy.gateway.crab import CrabGateway
+from crabpy.testing.fakecrab import CrabDataset
+from crabpy.testing.fakecrab import FakeCrabServer
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def gateway():
+    with FakeCrabServer(CrabDataset(straten=280, huisnummers=30)) as server:
+        yield CrabGateway(crab_factory(wsdl=server.wsdl_url, cache=None))
+
+
+def test_list_straten(benchmark, gateway):
+    straten = benchmark(gateway.list_straten, 20)
+    assert len(straten) == 280
+
+
+def test_get_huisnummer_by_id(benchmark, gateway):
+    huisnummer = benchmark(gateway.get_huisnummer_by_id, 1)
+    assert huisnummer.id == 1
@@ -0,0 +1,39 @@
+"""
+Benchmarks of the gateways over HTTP against the local fake server.
+
+Unlike the benchmarks replaying recorded responses, these include the cost of
+the HTTP connection and the json decoding of realistic payloads.
+"""
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.gateway import adressenregister
+from crabpy.gateway.capakey import CapakeyRestGateway
+from tests.benchmarks.test_gateways import ADRESSENREGISTER_NO_CACHE_CONFIG
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(adressen=1000, shape_vertices=64)
+
+
+def test_list_adressen_by_straat(benchmark, server):
+    client = AdressenRegisterClient(server.url, "key")
+    gateway = adressenregister.Gateway(
+        client, cache_settings=dict(ADRESSENREGISTER_NO_CACHE_CONFIG)
+    )
+    straat = adressenregister.Straat("1", gateway)
+    adressen = benchmark(gateway.list_adressen_by_straat, straat)
+    assert len(adressen) == 1000
+
+
+def test_list_percelen_by_sectie(benchmark, server):
+    gateway = CapakeyRestGateway(base_url=server.capakey_url)
+    gemeente = gateway.list_gemeenten()[0]
+    (afdeling,) = gateway.list_kadastrale_afdelingen_by_gemeente(gemeente)
+    (sectie,) = gateway.list_secties_by_afdeling(afdeling)
+    percelen = benchmark(gateway.list_percelen_by_sectie, sectie)
+    assert len(percelen) == 2000
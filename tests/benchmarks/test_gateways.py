@@ -0,0 +1,94 @@
+"""
+Benchmarks of the main gateway paths.
+
+The upstream services are replaced by the recorded responses in
+`tests/dummy_responses`. Run them with::
+
+    pytest tests/benchmarks --benchmark-json=benchmark.json
+
+and compare two runs with `pytest-benchmark compare`.
+"""
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.gateway import adressenregister
+from crabpy.gateway.capakey import CapakeyRestGateway
+from crabpy.gateway.crab import CrabGateway
+from tests.benchmarks.conftest import ADRESSENREGISTER_URL
+from tests.benchmarks.conftest import PAGE_SIZE
+
+pytest.importorskip("pytest_benchmark")
+
+CAPAKEY_CACHE_CONFIG = {
+    "permanent.backend": "dogpile.cache.memory",
+    "long.backend": "dogpile.cache.memory",
+    "short.backend": "dogpile.cache.memory",
+}
+
+ADRESSENREGISTER_CACHE_CONFIG = {
+    "long.backend": "dogpile.cache.memory",
+    "short.backend": "dogpile.cache.memory",
+}
+
+ADRESSENREGISTER_NO_CACHE_CONFIG = {
+    "long.backend": "dogpile.cache.null",
+    "short.backend": "dogpile.cache.null",
+}
+
+
+@pytest.fixture(params=["uncached", "cached"])
+def capakey_gateway(request):
+    if request.param == "cached":
+        return CapakeyRestGateway(cache_config=dict(CAPAKEY_CACHE_CONFIG))
+    return CapakeyRestGateway()
+
+
+@pytest.fixture(params=["uncached", "cached"])
+def adressenregister_gateway(request):
+    client = AdressenRegisterClient(ADRESSENREGISTER_URL, "key")
+    if request.param == "cached":
+        settings = dict(ADRESSENREGISTER_CACHE_CONFIG)
+    else:
+        settings = dict(ADRESSENREGISTER_NO_CACHE_CONFIG)
+    yield adressenregister.Gateway(client, cache_settings=settings)
+    adressenregister.setup_cache(dict(ADRESSENREGISTER_NO_CACHE_CONFIG), None)
+
+
+class TestConstruction:
+    def test_capakey_gateway(self, benchmark):
+        benchmark(CapakeyRestGateway, cache_config=dict(CAPAKEY_CACHE_CONFIG))
+
+    def test_crab_gateway(self, benchmark, crab_client_mock):
+        benchmark(CrabGateway, crab_client_mock)
+
+    def test_adressenregister_gateway(self, benchmark):
+        client = AdressenRegisterClient(ADRESSENREGISTER_URL, "key")
+        benchmark(adressenregister.Gateway, client)
+
+
+class TestCapakey:
+    def test_list_percelen_by_sectie(
+        self,
+        benchmark,
+        capakey_gateway,
+        department_response,
+        department_section_response,
+        department_section_parcels_response,
+    ):
+        sectie = capakey_gateway.get_sectie_by_id_and_afdeling("A", 44021)
+        percelen = benchmark(capakey_gateway.list_percelen_by_sectie, sectie)
+        assert len(percelen) > 0
+
+    def test_get_perceel_by_capakey(self, benchmark, capakey_gateway, parcel_response):
+        perceel = benchmark(capakey_gateway.get_perceel_by_capakey, "44021A0001/00A000")
+        assert perceel.capakey is not None
+
+
+class TestAdressenRegister:
+    def test_list_adressen_by_straat(
+        self, benchmark, adressenregister_gateway, adressen_response
+    ):
+        straat = adressenregister.Straat("1", adressenregister_gateway)
+        adressen = benchmark(adressenregister_gateway.list_adressen_by_straat, straat)
+        assert len(adressen) == 2 * PAGE_SIZE
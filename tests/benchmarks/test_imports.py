@@ -0,0 +1,23 @@
+"""
+Benchmarks of the time it takes to start an interpreter and import a gateway,
+which command line tools and serverless functions pay on every invocation.
+"""
+
+import pytest
+
+from tests.test_imports import import_times
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "crabpy.gateway.adressenregister",
+        "crabpy.gateway.capakey",
+        "crabpy.gateway.crab",
+    ],
+)
+def test_import(benchmark, module):
+    times = benchmark.pedantic(import_times, args=(module,), rounds=5)
+    benchmark.extra_info["import_time_us"] = times[module]
@@ -0,0 +1,61 @@
+"""
+Benchmarks of decoding a page of a list, whole or while it comes in.
+"""
+
+import json
+
+import pytest
+
+from crabpy.jsonstream import CHUNK_SIZE
+from crabpy.jsonstream import iter_array
+from tests.benchmarks.conftest import PAGE_SIZE
+from tests.benchmarks.conftest import adressen_item
+
+pytest.importorskip("pytest_benchmark")
+
+FIELDS = ("identificator", "huisnummer")
+
+
+@pytest.fixture(scope="module")
+def page():
+    return json.dumps(
+        {
+            "adressen": [adressen_item(n) for n in range(PAGE_SIZE)],
+            "volgende": "https://api.basisregisters.vlaanderen.be/v2/adressen",
+        }
+    ).encode()
+
+
+def chunked(content):
+    return [
+        content[start : start + CHUNK_SIZE]
+        for start in range(0, len(content), CHUNK_SIZE)
+    ]
+
+
+def test_loads(benchmark, page):
+    result = benchmark(json.loads, page)
+    assert len(result["adressen"]) == PAGE_SIZE
+
+
+def test_loads_fields(benchmark, page):
+    def decode():
+        result = json.loads(page)
+        return [
+            {field: item[field] for field in FIELDS if field in item}
+            for item in result["adressen"]
+        ]
+
+    assert len(benchmark(decode)) == PAGE_SIZE
+
+
+def test_iter_array(benchmark, page):
+    chunks = chunked(page)
+    result = benchmark(lambda: list(iter_array(chunks, "adressen")))
+    assert len(result) == PAGE_SIZE
+
+
+def test_iter_array_fields(benchmark, page):
+    chunks = chunked(page)
+    result = benchmark(lambda: list(iter_array(chunks, "adressen", FIELDS)))
+    assert len(result) == PAGE_SIZE
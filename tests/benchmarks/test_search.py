@@ -0,0 +1,39 @@
+"""
+Benchmarks of the in-memory search indexes.
+"""
+
+import pytest
+
+from crabpy.gateway import adressenregister
+from crabpy.search import StraatIndex
+
+pytest.importorskip("pytest_benchmark")
+
+PREFIXES = ("Kerk", "Stations", "Dorps", "Molen", "Beek", "Linden", "Kapel")
+SUFFIXES = ("straat", "laan", "weg", "plein", "dreef", "hoek")
+
+
+@pytest.fixture(scope="module")
+def index():
+    straten = [
+        adressenregister.Straat(
+            str(i),
+            None,
+            naam=f"{PREFIXES[i % 7]}{SUFFIXES[i // 7 % 6]} {i}",
+            homoniem=None,
+        )
+        for i in range(1000)
+    ]
+    index = StraatIndex()
+    index.update(straten)
+    return index
+
+
+def test_prefix(benchmark, index):
+    results = benchmark(index.search, "molenw", 10)
+    assert len(results) == 10
+
+
+def test_similar(benchmark, index):
+    results = benchmark(index.search, "moelnweg 3", 10)
+    assert results
@@ -1,3 +1,4 @@
+import contextlib
 import json
 import os
 import re
@@ -7,6 +8,8 @@ import pytest
 import responses
 
 from crabpy.gateway.crab import CrabGateway
+from crabpy.testing.fakeserver import Dataset
+from crabpy.testing.fakeserver import FakeServer
 
 
 CAPAKEY_URL = "https://geo.api.vlaanderen.be/capakey/v2"
@@ -57,6 +60,51 @@ def crab_gateway(crab_client_mock):
     return CrabGateway(crab_client_mock)
 
 
+def _fake_servers():
+    with contextlib.ExitStack() as stack:
+
+        def start(
+            gemeenten=1,
+            straten=2,
+            adressen=3,
+            shape_vertices=8,
+            latency=0,
+            dataset=None,
+            **options,
+        ):
+            """
+            Start a FakeServer, on a generated dataset of the given size
+            unless a `dataset` is passed. The other `options` are passed to
+            the FakeServer. The dataset is `server.dataset`.
+            """
+            if dataset is None:
+                dataset = Dataset.generate(
+                    gemeenten=gemeenten,
+                    straten=straten,
+                    adressen=adressen,
+                    shape_vertices=shape_vertices,
+                )
+            return stack.enter_context(FakeServer(dataset, latency=latency, **options))
+
+        yield start
+
+
+@pytest.fixture(scope="function")
+def fake_server():
+    """
+    A factory of FakeServers that are stopped after the test.
+    """
+    yield from _fake_servers()
+
+
+@pytest.fixture(scope="module")
+def module_fake_server():
+    """
+    A factory of FakeServers that are stopped after the tests of the module.
+    """
+    yield from _fake_servers()
+
+
 @pytest.fixture(scope="function")
 def mocked_responses():
     with responses.RequestsMock() as rsps:
@@ -1,7 +1,11 @@
+import math
+import pickle
 from unittest.mock import Mock
 
 import pytest
+import requests
 
+from crabpy.client import AdressenRegisterClientException
 from crabpy.gateway import adressenregister
 from crabpy.gateway.adressenregister import Adres
 from crabpy.gateway.adressenregister import Deelgemeente
@@ -11,7 +15,9 @@ from crabpy.gateway.adressenregister import Gewest
 from crabpy.gateway.adressenregister import Perceel
 from crabpy.gateway.adressenregister import Postinfo
 from crabpy.gateway.adressenregister import Provincie
+from crabpy.gateway.adressenregister import Record
 from crabpy.gateway.adressenregister import Straat
+from crabpy.tables import Table
 
 
 @pytest.fixture()
@@ -778,3 +784,296 @@ class TestCaching:
         straten_call_2[0].adressen
 
         client.get_adressen.assert_called_once()
+
+    def test_cache_statistics(self, cached_gateway, client):
+        client.get_adressen.return_value = [create_client_list_adressen_item()]
+        cached_gateway.stats.reset()
+
+        cached_gateway.list_adressen_by_straat(Straat("1", cached_gateway))
+        cached_gateway.list_adressen_by_straat(Straat("1", cached_gateway))
+
+        stats = cached_gateway.stats.snapshot()["cache"]["short"]
+        assert stats["list_adressen_by_straat"] == {
+            "hits": 1,
+            "misses": 1,
+            "hit_rate": 0.5,
+        }
+
+    def test_cache_statistics_per_gateway(self, cached_gateway, client):
+        client.get_adressen.return_value = [create_client_list_adressen_item()]
+        cached_gateway.stats.reset()
+        other = adressenregister.Gateway(Mock())
+
+        cached_gateway.list_adressen_by_straat(Straat("1", cached_gateway))
+        cached_gateway.list_adressen_by_straat(Straat("1", cached_gateway))
+
+        stats = cached_gateway.stats.snapshot()["cache"]["short"]
+        assert stats["list_adressen_by_straat"]["hits"] == 1
+        assert other.stats.snapshot()["cache"] == {}
+
+    def test_list_straten_object_and_niscode_share_key(self, cached_gateway, client):
+        client.get_straatnamen.return_value = [create_client_list_straatnamen_item()]
+        gemeente = cached_gateway.get_gemeente_by_niscode("11001")
+
+        cached_gateway.list_straten(gemeente)
+        cached_gateway.list_straten("11001")
+        cached_gateway.list_straten(gemeente=gemeente, include_homoniem=False)
+
+        client.get_straatnamen.assert_called_once()
+
+    def test_list_straten_different_arguments_no_cache_hit(
+        self, cached_gateway, client
+    ):
+        client.get_straatnamen.return_value = [create_client_list_straatnamen_item()]
+
+        cached_gateway.list_straten("11001")
+        cached_gateway.list_straten("11001", status="inGebruik")
+
+        assert client.get_straatnamen.call_count == 2
+
+    def test_list_adressen_by_perceel_object_and_id_share_key(
+        self, cached_gateway, client
+    ):
+        client.get_perceel.return_value = create_client_get_perceel_item()
+
+        cached_gateway.list_adressen_by_perceel("11001B0009-00H004")
+        cached_gateway.list_adressen_by_perceel(
+            Perceel(id_="11001B0009-00H004", gateway=cached_gateway)
+        )
+
+        client.get_perceel.assert_called_once()
+
+    def test_list_adressen_with_params_subsumed(self, cached_gateway, client):
+        bus = dict(create_client_list_adressen_item(), busnummer="1")
+        bus["identificator"] = dict(bus["identificator"], objectId="200002")
+        client.get_adressen.return_value = [create_client_list_adressen_item(), bus]
+        cached_gateway.list_adressen_by_straat(Straat("1", cached_gateway))
+
+        adressen = cached_gateway.list_adressen_with_params(
+            straatnaamObjectId="1", huisnummer="59", busnummer="1"
+        )
+        assert [adres.id for adres in adressen] == ["200002"]
+        assert (
+            cached_gateway.list_adressen_with_params(
+                straatnaamObjectId="1", status="gehistoreerd"
+            )
+            == []
+        )
+        client.get_adressen.assert_called_once()
+        counters = cached_gateway.stats.snapshot()["counters"]
+        assert counters["subsumed_queries"] == 2
+
+    def test_list_adressen_with_params_subsumed_by_broader_query(
+        self, cached_gateway, client
+    ):
+        client.get_adressen.return_value = [create_client_list_adressen_item()]
+        cached_gateway.list_adressen_with_params(
+            straatnaamObjectId="1", huisnummer="59"
+        )
+        adressen = cached_gateway.list_adressen_with_params(
+            straatnaamObjectId="1", huisnummer="59", status="inGebruik"
+        )
+        assert [adres.id for adres in adressen] == ["200001"]
+        client.get_adressen.assert_called_once()
+
+    def test_list_adressen_with_params_not_subsumed(self, cached_gateway, client):
+        client.get_adressen.return_value = [create_client_list_adressen_item()]
+        cached_gateway.list_adressen_by_straat(Straat("1", cached_gateway))
+        cached_gateway.list_adressen_with_params(straatnaamObjectId="2")
+        cached_gateway.list_adressen_with_params(
+            straatnaamObjectId="1", postcode="2230"
+        )
+        assert client.get_adressen.call_count == 3
+
+
+def client_http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    error = AdressenRegisterClientException()
+    error.__cause__ = requests.HTTPError(response=response)
+    return error
+
+
+class TestNegativeCaching:
+    @pytest.fixture()
+    def cached_gateway(self, client):
+        cache_settings = {
+            "long.backend": "dogpile.cache.memory",
+            "short.backend": "dogpile.cache.memory",
+            "notfound.backend": "dogpile.cache.memory",
+        }
+        yield adressenregister.Gateway(client, cache_settings=cache_settings)
+        adressenregister.setup_cache(
+            {
+                "long.backend": "dogpile.cache.null",
+                "short.backend": "dogpile.cache.null",
+            },
+            None,
+        )
+
+    def test_get_straat_by_unexisting_id(self, cached_gateway, client):
+        client.get_straatnaam.side_effect = client_http_error(404)
+        for _ in range(3):
+            with pytest.raises(AdressenRegisterClientException):
+                cached_gateway.get_straat_by_id("0")
+        client.get_straatnaam.assert_called_once()
+
+    def test_get_adres_by_retired_id(self, cached_gateway, client):
+        client.get_adres.side_effect = client_http_error(410)
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                cached_gateway.get_adres_by_id(1)
+        client.get_adres.assert_called_once()
+
+    def test_server_error_not_remembered(self, cached_gateway, client):
+        client.get_perceel.side_effect = client_http_error(500)
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                cached_gateway.get_perceel_by_id("1")
+        assert client.get_perceel.call_count == 2
+
+    def test_lazy_load_unexisting_adres(self, cached_gateway, client):
+        client.get_adres.side_effect = client_http_error(404)
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                Adres(id_="1", gateway=cached_gateway).label
+        client.get_adres.assert_called_once()
+
+    def test_not_found_cache_disabled_by_default(self, gateway, client):
+        client.get_straatnaam.side_effect = client_http_error(404)
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                gateway.get_straat_by_id("0")
+        assert client.get_straatnaam.call_count == 2
+
+
+class TestFields:
+    def test_list_adressen_by_straat(self, gateway, client):
+        client.get_adressen.return_value = [create_client_list_adressen_item()]
+        (adres,) = gateway.list_adressen_by_straat(
+            Straat("1", gateway), fields=("id", "label", "busnummer")
+        )
+        assert adres == Record(
+            id="200001", label="Goorbaan 59, 2230 Herselt", busnummer=""
+        )
+        client.get_adressen.assert_called_once_with(
+            fields=("identificator", "volledigAdres", "busnummer"),
+            straatnaamObjectId="1",
+        )
+
+    def test_get_adres_by_id(self, gateway, client):
+        client.get_adres.return_value = create_client_get_adres_item()
+        adres = gateway.get_adres_by_id("763445", fields=["id", "huisnummer"])
+        assert adres == Record(id="763445", huisnummer="27")
+
+    def test_straat_naam(self, gateway, client):
+        client.get_straatnamen.return_value = [create_client_list_straatnamen_item()]
+        client.get_straatnaam.return_value = create_client_get_straatnaam_item()
+        gemeente = Gemeente(niscode="11001", naam="Aartselaar", gateway=gateway)
+        (straat,) = gateway.list_straten(gemeente, fields=("naam", "homoniem"))
+        assert straat == Record(naam="Acacialaan", homoniem=None)
+        straat = gateway.get_straat_by_id("748", fields=("naam", "status"))
+        assert straat == Record(naam="Edelvalklaan", status="inGebruik")
+
+    def test_perceel_and_gebouw(self, gateway, client):
+        client.get_percelen.return_value = [create_client_get_perceel_list_item()]
+        client.get_gebouw.return_value = create_client_get_gebouw_item()
+        (perceel,) = gateway.list_percelen_with_params(fields=("id", "status"))
+        assert perceel == Record(id="13013C0384-02H003", status="gerealiseerd")
+        gebouw = gateway.get_gebouw_by_id("5666547", fields=("uri",))
+        assert gebouw.uri == "https://data.vlaanderen.be/id/gebouw/5666547"
+
+    def test_unknown_field(self, gateway):
+        with pytest.raises(ValueError):
+            gateway.get_adres_by_id("763445", fields=("id", "gemeente"))
+
+    def test_record_pickles(self):
+        record = Record(id="1", label="Kerkstraat 1")
+        assert pickle.loads(pickle.dumps(record)) == record
+
+    def test_cached_separately(self, client):
+        gateway = adressenregister.Gateway(
+            client,
+            cache_settings={
+                "long.backend": "dogpile.cache.memory",
+                "short.backend": "dogpile.cache.memory",
+            },
+        )
+        try:
+            client.get_adressen.return_value = [create_client_list_adressen_item()]
+            straat = Straat("1", gateway)
+            for _ in range(2):
+                (adres,) = gateway.list_adressen_by_straat(straat, fields=("id",))
+            assert adres == Record(id="200001")
+            (adres,) = gateway.list_adressen_by_straat(straat)
+            assert isinstance(adres, Adres)
+            assert client.get_adressen.call_count == 2
+        finally:
+            adressenregister.setup_cache(
+                {
+                    "long.backend": "dogpile.cache.null",
+                    "short.backend": "dogpile.cache.null",
+                },
+                None,
+            )
+
+
+class TestTables:
+    def test_list_adressen_with_params(self, gateway, client):
+        client.get_adressen.return_value = [create_client_list_adressen_item()]
+        table = gateway.list_adressen_with_params(niscode="11001", as_table=True)
+        assert isinstance(table, Table)
+        assert table["id"] == ["200001"]
+        assert table["status"] == ["inGebruik"]
+        assert math.isnan(table["x"][0])
+        fields = client.get_adressen.call_args.kwargs["fields"]
+        assert fields == Adres.table_schema().keys
+
+    def test_columns(self, gateway, client):
+        client.get_straatnamen.return_value = [create_client_list_straatnamen_item()]
+        gemeente = Gemeente(niscode="11001", naam="Aartselaar", gateway=gateway)
+        table = gateway.list_straten(gemeente, fields=("naam",), as_table=True)
+        assert table.columns == {"naam": ["Acacialaan"]}
+        client.get_straatnamen.assert_called_once_with(
+            fields=("straatnaam", "straatnamen"), niscode="11001", status=None
+        )
+
+    def test_list_percelen_with_params(self, gateway, client):
+        client.get_percelen.return_value = [create_client_get_perceel_list_item()]
+        table = gateway.list_percelen_with_params(as_table=True)
+        assert table["id"] == ["13013C0384-02H003"]
+
+
+class TestCanonicalKeyGenerator:
+    def test_gateway_objects_reduced_to_id(self, gateway):
+        generate_key = adressenregister.canonical_key_generator(
+            None, adressenregister.Gateway.list_adressen_by_straat
+        )
+        straat = Straat("1", gateway, naam="Acacialaan")
+        assert generate_key(gateway, straat) == generate_key(gateway, "1")
+        assert generate_key(gateway, straat=straat) == generate_key(gateway, "1")
+
+    def test_gemeente_reduced_to_niscode(self, gateway):
+        generate_key = adressenregister.canonical_key_generator(
+            None, adressenregister.Gateway.list_straten
+        )
+        gemeente = Gemeente(niscode="11001", naam="Aartselaar", gateway=gateway)
+        assert generate_key(gateway, gemeente) == (
+            "crabpy.gateway.adressenregister:list_straten|11001 False None None False"
+        )
+
+    def test_fields_list_is_tuple(self, gateway):
+        generate_key = adressenregister.canonical_key_generator(
+            None, adressenregister.Gateway.get_adres_by_id
+        )
+        assert generate_key(gateway, 1, fields=["id", "label"]) == generate_key(
+            gateway, 1, ("id", "label")
+        )
+
+    def test_namespace(self, gateway):
+        generate_key = adressenregister.canonical_key_generator(
+            "ns", adressenregister.Gateway.get_adres_by_id
+        )
+        assert generate_key(gateway, 1) == (
+            "crabpy.gateway.adressenregister:get_adres_by_id|ns|1 None"
+        )
@@ -0,0 +1,136 @@
+from unittest.mock import Mock
+
+import pytest
+import requests
+from dogpile.cache import make_region
+
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway.cache import GatewayCacheRegion
+from crabpy.gateway.cache import NOT_FOUND_EXPIRATION_TIME
+from crabpy.gateway.cache import configure_not_found_region
+from crabpy.gateway.cache import is_not_found
+from crabpy.gateway.cache import negative_cache
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from crabpy.gateway.exception import GatewayRuntimeException
+from crabpy.instrumentation import Hook
+from crabpy.stats import Statistics
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    error = AdressenRegisterClientException()
+    error.__cause__ = requests.HTTPError(response=response)
+    return error
+
+
+class Recorder(Hook):
+    def __init__(self):
+        self.spans = []
+
+    def after(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture()
+def region():
+    region = make_region()
+    configure_not_found_region(region, {"notfound.backend": "dogpile.cache.memory"})
+    return region
+
+
+class TestIsNotFound:
+    @pytest.mark.parametrize("status_code", [400, 404, 410])
+    def test_not_found_status(self, status_code):
+        assert is_not_found(http_error(status_code))
+
+    @pytest.mark.parametrize("status_code", [429, 500, 503])
+    def test_other_status(self, status_code):
+        assert not is_not_found(http_error(status_code))
+
+    def test_resource_not_found_exception(self):
+        assert is_not_found(GatewayResourceNotFoundException())
+
+    def test_runtime_exception(self):
+        assert not is_not_found(GatewayRuntimeException("Timeout", None))
+
+
+class TestConfigureNotFoundRegion:
+    def test_default_expiration_time(self, region):
+        assert region.is_configured
+        assert region.expiration_time == NOT_FOUND_EXPIRATION_TIME
+
+    def test_expiration_time(self):
+        region = make_region()
+        configure_not_found_region(
+            region,
+            {"notfound.backend": "dogpile.cache.memory", "notfound.expiration_time": 5},
+        )
+        assert region.expiration_time == 5
+
+    def test_no_backend(self):
+        region = make_region()
+        configure_not_found_region(region, {"short.backend": "dogpile.cache.memory"})
+        assert not region.is_configured
+
+
+class TestNegativeCache:
+    def test_not_found_is_remembered(self, region):
+        creator = Mock(side_effect=GatewayResourceNotFoundException())
+        for _ in range(3):
+            with pytest.raises(GatewayResourceNotFoundException):
+                negative_cache(region, "key", creator)()
+        creator.assert_called_once()
+
+    def test_other_errors_are_not_remembered(self, region):
+        creator = Mock(side_effect=http_error(503))
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                negative_cache(region, "key", creator)()
+        assert creator.call_count == 2
+
+    def test_exception(self, region):
+        creator = Mock(side_effect=http_error(404))
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                negative_cache(
+                    region, "key", creator, exception=AdressenRegisterClientException
+                )()
+        creator.assert_called_once()
+
+    def test_found_is_returned(self, region):
+        creator = Mock(return_value="value")
+        assert negative_cache(region, "key", creator)() == "value"
+        assert negative_cache(region, "key", creator)() == "value"
+        assert creator.call_count == 2
+
+    def test_shared_backend(self):
+        shared = {}
+        long, notfound = make_region(), make_region()
+        long.configure("dogpile.cache.memory", arguments={"cache_dict": shared})
+        notfound.configure("dogpile.cache.memory", arguments={"cache_dict": shared})
+        creator = Mock(side_effect=GatewayResourceNotFoundException())
+        for _ in range(2):
+            with pytest.raises(GatewayResourceNotFoundException):
+                long.get_or_create("key", negative_cache(notfound, "key", creator))
+        creator.assert_called_once()
+
+    def test_unconfigured_region(self):
+        creator = Mock(side_effect=GatewayResourceNotFoundException())
+        for _ in range(2):
+            with pytest.raises(GatewayResourceNotFoundException):
+                negative_cache(make_region(), "key", creator)()
+        assert creator.call_count == 2
+
+    def test_null_backend(self):
+        region = GatewayCacheRegion(name="notfound")
+        region.stats = Statistics("test")
+        configure_not_found_region(region, {"notfound.backend": "dogpile.cache.null"})
+        creator = Mock(side_effect=GatewayResourceNotFoundException())
+        with Recorder() as recorder:
+            for _ in range(2):
+                with pytest.raises(GatewayResourceNotFoundException):
+                    negative_cache(region, "key", creator)()
+        assert creator.call_count == 2
+        assert recorder.spans == []
+        assert region.stats.snapshot()["cache"] == {}
@@ -118,6 +118,20 @@ class TestCapakeyRestGateway:
         assert isinstance(res, list)
         assert len(res) > 0
 
+    def test_list_percelen_by_sectie_as_table(
+        self,
+        capakey_rest_gateway,
+        department_response,
+        department_section_response,
+        department_section_parcels_response,
+    ):
+        s = capakey_rest_gateway.get_sectie_by_id_and_afdeling("A", 44021)
+        percelen = capakey_rest_gateway.list_percelen_by_sectie(s)
+        table = capakey_rest_gateway.list_percelen_by_sectie(s, as_table=True)
+        assert table["id"] == [p.id for p in percelen]
+        assert table["percid"] == [p.percid for p in percelen]
+        assert s.gateway is capakey_rest_gateway
+
     def test_get_perceel_by_id_and_sectie(
         self,
         capakey_rest_gateway,
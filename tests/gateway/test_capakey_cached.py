@@ -1,9 +1,13 @@
+import re
+
 import pytest
 
 from crabpy.gateway.capakey import Afdeling
 from crabpy.gateway.capakey import Gemeente
 from crabpy.gateway.capakey import Perceel
 from crabpy.gateway.capakey import Sectie
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from tests.conftest import CAPAKEY_URL
 
 
 @pytest.fixture(scope="function")
@@ -18,6 +22,8 @@ def capakey_rest_gateway():
             "long.expiration_time": 3600,
             "short.backend": "dogpile.cache.memory",
             "short.expiration_time": 600,
+            "notfound.backend": "dogpile.cache.memory",
+            "notfound.expiration_time": 60,
         }
     )
     return capakey_rest_gateway
@@ -221,3 +227,80 @@ class TestCapakeyRestCachedGateway:
             )
             == res
         )
+
+    def test_get_perceel_by_unexisting_capakey(
+        self, capakey_rest_gateway, mocked_responses
+    ):
+        url = re.compile(rf"{CAPAKEY_URL}/parcel/[^/]+/[^/]+\?")
+        mocked_responses.add(method="GET", url=url, status=404)
+        for _ in range(3):
+            with pytest.raises(GatewayResourceNotFoundException):
+                capakey_rest_gateway.get_perceel_by_capakey("44021A0000/00A000")
+        assert len(mocked_responses.calls) == 1
+        assert capakey_rest_gateway.caches["notfound"].get(
+            "notfound|get_perceel_by_capakey_rest#44021A0000/00A000"
+        )
+
+    def test_not_found_in_shared_backend(self, mocked_responses):
+        from crabpy.gateway.capakey import CapakeyRestGateway
+
+        shared = {}
+        cache_config = {}
+        for region in ("permanent", "long", "short", "notfound"):
+            cache_config[f"{region}.backend"] = "dogpile.cache.memory"
+            cache_config[f"{region}.arguments.cache_dict"] = shared
+        gateway = CapakeyRestGateway(cache_config=cache_config)
+        url = re.compile(rf"{CAPAKEY_URL}/municipality/[^/]+\?")
+        mocked_responses.add(method="GET", url=url, status=404)
+        for _ in range(2):
+            with pytest.raises(GatewayResourceNotFoundException):
+                gateway.get_gemeente_by_id(99999)
+        assert len(mocked_responses.calls) == 1
+
+    def test_get_gemeente_by_id_server_error_not_remembered(
+        self, capakey_rest_gateway, mocked_responses
+    ):
+        url = re.compile(rf"{CAPAKEY_URL}/municipality/[^/]+\?")
+        mocked_responses.add(method="GET", url=url, status=503)
+        for _ in range(2):
+            with pytest.raises(GatewayResourceNotFoundException):
+                capakey_rest_gateway.get_gemeente_by_id(99999)
+        assert len(mocked_responses.calls) == 2
+
+    def test_statistics(self, capakey_rest_gateway, municipality_response):
+        capakey_rest_gateway.stats.reset()
+        capakey_rest_gateway.get_gemeente_by_id(44021)
+        capakey_rest_gateway.get_gemeente_by_id(44021)
+        stats = capakey_rest_gateway.stats.snapshot()
+        assert stats["cache"]["long"]["get_gemeente_by_id_rest"] == {
+            "hits": 1,
+            "misses": 1,
+            "hit_rate": 0.5,
+        }
+        upstream = stats["upstream"]["/capakey/v2/municipality/{id}"]
+        assert upstream["calls"] == 1
+        assert upstream["errors"] == 0
+        assert upstream["bytes"] > 0
+        assert upstream["latency"]["count"] == 1
+
+    def test_statistics_per_gateway(self, capakey_rest_gateway, municipality_response):
+        from crabpy.gateway.capakey import CapakeyRestGateway
+
+        capakey_rest_gateway.stats.reset()
+        other = CapakeyRestGateway()
+        capakey_rest_gateway.get_gemeente_by_id(44021)
+        capakey_rest_gateway.get_gemeente_by_id(44021)
+        stats = capakey_rest_gateway.stats.snapshot()
+        assert stats["cache"]["long"]["get_gemeente_by_id_rest"]["hits"] == 1
+        assert other.stats.snapshot()["cache"] == {}
+
+    def test_statistics_not_found(self, capakey_rest_gateway, mocked_responses):
+        capakey_rest_gateway.stats.reset()
+        url = re.compile(rf"{CAPAKEY_URL}/municipality/[^/]+\?")
+        mocked_responses.add(method="GET", url=url, status=404)
+        for _ in range(2):
+            with pytest.raises(GatewayResourceNotFoundException):
+                capakey_rest_gateway.get_gemeente_by_id(99999)
+        stats = capakey_rest_gateway.stats.snapshot()
+        assert stats["cache"]["notfound"]["get_gemeente_by_id_rest"]["hits"] == 1
+        assert stats["upstream"]["/capakey/v2/municipality/{id}"]["errors"] == 1
@@ -0,0 +1,168 @@
+import json
+import threading
+
+import pytest
+
+from crabpy.adresmatch import BatchMatcher
+from crabpy.adresmatch import Checkpoint
+from crabpy.adresmatch import MatchResult
+from crabpy.adresmatch import main
+from crabpy.adresmatch import to_params
+from crabpy.client import AdressenRegisterClient
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(adressen=5)
+
+
+@pytest.fixture()
+def client(server):
+    return AdressenRegisterClient(server.url, "key")
+
+
+class CountingClient:
+    def __init__(self, client):
+        self.client = client
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_adres_match(self, **params):
+        with self.lock:
+            self.calls += 1
+        return self.client.get_adres_match(**params)
+
+
+def test_to_params():
+    assert to_params({"adres": "Kerkstr. 1, Aartselaar"}) == {
+        "straatnaam": "Kerkstraat",
+        "huisnummer": "1",
+        "gemeentenaam": "Aartselaar",
+    }
+    assert to_params({"straatnaam": " Kerkstr.", "huisnummer": "1", "x": 2}) == {
+        "straatnaam": "Kerkstraat",
+        "huisnummer": "1",
+    }
+    assert to_params({"adres": ""}) == {}
+
+
+def test_partial_matches():
+    gemeente = {
+        "gemeente": {
+            "objectId": "11001",
+            "gemeentenaam": {"geografischeNaam": {"spelling": "Aartselaar"}},
+        },
+        "score": 90,
+    }
+    adres = {
+        "identificator": {"objectId": "200001"},
+        "volledigAdres": {"geografischeNaam": {"spelling": "Kerkstraat 1"}},
+        "score": 70,
+    }
+    result = MatchResult(0, {"adres": "Aartselaar"}, {}, [gemeente])
+    assert result.best is None
+    assert result.to_record() == {
+        "adres": "Aartselaar",
+        "adres_id": None,
+        "volledig_adres": None,
+        "score": None,
+        "matches": 1,
+        "error": None,
+    }
+    result = MatchResult(0, {}, {}, [gemeente, adres])
+    assert (result.adres_id, result.score) == ("200001", 70)
+
+
+class TestBatchMatcher:
+    def test_match(self, client):
+        records = [
+            {"adres": "Kerkstraat 1, Aartselaar"},
+            {"adres": "kerkstr.  1 aartselaar"},
+            {"adres": "Stationsstraat 2"},
+            {"adres": "Nergens"},
+            {"adres": "Kerkstraat 99"},
+        ]
+        counting = CountingClient(client)
+        matcher = BatchMatcher(counting, concurrency=2)
+        results = list(matcher.match(records))
+        assert [r.index for r in results] == [0, 1, 2, 3, 4]
+        assert results[0].adres_id == results[1].adres_id == "200001"
+        assert results[0].score == 100
+        assert results[0].volledig_adres == "Kerkstraat 1, 1000 Aartselaar"
+        assert results[2].adres_id == "200007"
+        assert results[3].error
+        assert results[4].matches == [] and results[4].adres_id is None
+        assert counting.calls == 3
+        assert matcher.counts["requests"] == 3
+
+    def test_cache(self, client):
+        counting = CountingClient(client)
+        matcher = BatchMatcher(counting, concurrency=4, window=2)
+        records = [
+            {"straatnaam": "Kerkstraat", "huisnummer": str(i % 3 + 1)}
+            for i in range(30)
+        ]
+        results = list(matcher.match(records))
+        assert len(results) == 30
+        assert counting.calls == 3
+        assert matcher.counts["cache_hits"] + matcher.counts["duplicates"] == 27
+
+    def test_start(self, client):
+        records = [{"adres": f"Kerkstraat {i}"} for i in range(1, 6)]
+        results = list(BatchMatcher(client).match(records, start=3))
+        assert [r.index for r in results] == [3, 4]
+
+    def test_errors(self, server, fake_server):
+        failing = fake_server(dataset=server.dataset, error_rate=1)
+        client = AdressenRegisterClient(failing.url, "key")
+        matcher = BatchMatcher(client)
+        results = list(matcher.match([{"adres": "Kerkstraat 1"}] * 2))
+        assert all("503" in r.error for r in results)
+        assert matcher.counts["errors"] == 1
+        assert not matcher._cache
+
+
+class TestCli:
+    def test_csv(self, server, tmp_path):
+        source = tmp_path / "in.csv"
+        source.write_text("id,adres\n1,Kerkstraat 1\n2,Kerkstr. 2\n", encoding="utf-8")
+        output = tmp_path / "out.csv"
+        main([str(source), "-o", str(output), "--base-url", server.url])
+        lines = output.read_text(encoding="utf-8").splitlines()
+        assert lines[0] == "id,adres,adres_id,volledig_adres,score,matches,error"
+        assert lines[2].startswith("2,Kerkstr. 2,200002,")
+
+    def test_resume(self, server, tmp_path):
+        source = tmp_path / "in.ndjson"
+        source.write_text(
+            "".join(
+                json.dumps({"adres": f"Kerkstraat {i}"}) + "\n" for i in range(1, 6)
+            ),
+            encoding="utf-8",
+        )
+        output = tmp_path / "out.ndjson"
+        checkpoint = tmp_path / "checkpoint"
+        # A previous run stopped after 2 records and wrote half a line
+        output.write_bytes(b'{"adres": "Kerkstraat 1"}\n{"adres": "Kerkstraat 2"}\n{"a')
+        Checkpoint(str(checkpoint)).save(2, len(output.read_bytes()) - 3)
+        main(
+            [
+                str(source),
+                "-o",
+                str(output),
+                "--base-url",
+                server.url,
+                "--checkpoint",
+                str(checkpoint),
+                "--checkpoint-every",
+                "1",
+            ]
+        )
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        assert [r["adres"] for r in records] == [f"Kerkstraat {i}" for i in range(1, 6)]
+        assert [r.get("adres_id") for r in records[2:]] == [
+            "200003",
+            "200004",
+            "200005",
+        ]
+        assert Checkpoint(str(checkpoint)).load() == (5, len(output.read_bytes()))
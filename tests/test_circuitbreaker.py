@@ -0,0 +1,212 @@
+import time
+from unittest.mock import Mock
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+from crabpy.circuitbreaker import CLOSED
+from crabpy.circuitbreaker import CircuitBreaker
+from crabpy.circuitbreaker import CircuitOpenError
+from crabpy.circuitbreaker import HALF_OPEN
+from crabpy.circuitbreaker import OPEN
+from crabpy.circuitbreaker import circuit_states
+from crabpy.circuitbreaker import configure_breakers
+from crabpy.circuitbreaker import get_breaker
+from crabpy.circuitbreaker import is_circuit_open
+from crabpy.circuitbreaker import is_failure
+from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway import adressenregister
+from crabpy.gateway.capakey import capakey_rest_gateway_request
+from crabpy.gateway.exception import GatewayException
+from crabpy.gateway.exception import GatewayRuntimeException
+from crabpy.instrumentation import CIRCUIT
+from crabpy.instrumentation import Hook
+from crabpy.stats import Statistics
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import deadline
+
+
+class Transitions(Hook):
+    def __init__(self):
+        self.spans = []
+
+    def after(self, span):
+        if span.kind == CIRCUIT:
+            self.spans.append(span)
+
+
+def http_error(status_code):
+    return requests.HTTPError(response=Mock(status_code=status_code))
+
+
+class TestCircuitBreaker:
+    def test_opens_after_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2)
+        stats = Statistics("test")
+        for _ in range(2):
+            breaker.allow()
+            breaker.record(requests.ConnectionError())
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.allow(stats)
+        assert stats.snapshot()["counters"] == {"circuit_rejected_requests": 1}
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2)
+        breaker.record(requests.ConnectionError())
+        breaker.record()
+        breaker.record(requests.ConnectionError())
+        assert breaker.state == CLOSED
+
+    def test_half_open(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+        breaker.record(requests.Timeout())
+        time.sleep(0.06)
+        assert breaker.state == HALF_OPEN
+        breaker.allow()
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        breaker.record(requests.Timeout())
+        assert breaker.state == OPEN
+        time.sleep(0.06)
+        breaker.allow()
+        breaker.record()
+        assert breaker.state == CLOSED
+        breaker.allow()
+
+    def test_probe_not_sent(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+        breaker.record(requests.Timeout())
+        breaker.record(DeadlineExceeded())
+        assert breaker.failures == 1
+        breaker.record(requests.Timeout())
+        time.sleep(0.06)
+        breaker.allow()
+        breaker.record(DeadlineExceeded())
+        assert breaker.state == HALF_OPEN
+        breaker.allow()
+        breaker.record(requests.Timeout())
+        assert breaker.state == OPEN
+
+    def test_transitions_are_instrumented(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        with Transitions() as hook:
+            breaker.record(requests.ConnectionError())
+            breaker.allow()
+            breaker.record()
+        assert [(s.name, s.attributes) for s in hook.spans] == [
+            ("test", {"state": OPEN, "previous": CLOSED, "failures": 1}),
+            ("test", {"state": HALF_OPEN, "previous": OPEN, "failures": 1}),
+            ("test", {"state": CLOSED, "previous": HALF_OPEN, "failures": 0}),
+        ]
+
+
+def test_is_failure():
+    assert is_failure(requests.ConnectionError())
+    assert is_failure(http_error(503))
+    assert not is_failure(http_error(404))
+    assert not is_failure(http_error(429))
+    assert not is_failure(CircuitOpenError())
+
+
+def test_is_circuit_open():
+    try:
+        try:
+            raise CircuitOpenError()
+        except CircuitOpenError as e:
+            raise AdressenRegisterClientException from e
+    except AdressenRegisterClientException as e:
+        assert is_circuit_open(e)
+    assert not is_circuit_open(AdressenRegisterClientException())
+
+
+def test_shared_breakers():
+    configure_breakers("test", failure_threshold=2)
+    breaker = get_breaker("test", "localhost:1")
+    assert breaker is get_breaker("test", "localhost:1")
+    assert breaker is not get_breaker("test", "localhost:2")
+    assert breaker.failure_threshold == 2
+    assert circuit_states()["test localhost:1"] == CLOSED
+    configure_breakers("test")
+    assert get_breaker("test", "localhost:1").failure_threshold == 5
+
+
+@pytest.fixture()
+def breakers():
+    configure_breakers("adressenregister", failure_threshold=2, reset_timeout=60)
+    configure_breakers("capakey", failure_threshold=2, reset_timeout=60)
+    yield
+    configure_breakers("adressenregister")
+    configure_breakers("capakey")
+
+
+def test_client_fails_fast(breakers, fake_server):
+    server = fake_server(straten=1, error_rate=1)
+    client = AdressenRegisterClient(server.url, "key")
+    client.stats = Statistics("adressenregister")
+    for _ in range(4):
+        with pytest.raises(AdressenRegisterClientException):
+            client.get_adres("200001")
+    assert server.counts[503] == 2
+    assert client.stats.snapshot()["counters"]["circuit_rejected_requests"] == 2
+
+
+def test_short_deadlines_do_not_open(breakers, fake_server):
+    server = fake_server(straten=1, latency=0.2)
+    client = AdressenRegisterClient(server.url, "key")
+    for _ in range(4):
+        with deadline(0.05):
+            with pytest.raises(AdressenRegisterClientException) as e:
+                client.get_adres("200001")
+        assert isinstance(e.value.__cause__, DeadlineExceeded)
+    host = f"adressenregister {urlparse(server.url).netloc}"
+    assert circuit_states()[host] == CLOSED
+    assert client.get_adres("200001")
+
+
+def test_capakey_fails_fast(breakers, fake_server):
+    server = fake_server()
+    server.error_rate = 1
+    url = f"{server.url}/capakey/v2/municipality"
+    for _ in range(2):
+        with pytest.raises(GatewayException):
+            capakey_rest_gateway_request(url)
+    with pytest.raises(GatewayRuntimeException) as e:
+        capakey_rest_gateway_request(url)
+    assert is_circuit_open(e.value)
+    assert server.counts[503] == 2
+
+
+def test_serves_stale_values(breakers, fake_server):
+    server = fake_server(straten=1)
+    client = AdressenRegisterClient(server.url, "key")
+    gateway = adressenregister.Gateway(
+        client,
+        cache_settings={
+            "long.backend": "dogpile.cache.memory",
+            "long.expiration_time": 0.05,
+            "short.backend": "dogpile.cache.null",
+        },
+    )
+    try:
+        adres = gateway.get_adres_by_id("200001")
+        server.error_rate = 1
+        time.sleep(0.06)
+        for _ in range(2):
+            with pytest.raises(AdressenRegisterClientException):
+                gateway.get_adres_by_id("200001")
+        assert gateway.get_adres_by_id("200001").id == adres.id
+        with pytest.raises(AdressenRegisterClientException):
+            gateway.get_adres_by_id("200002")
+        counters = gateway.stats.snapshot()["counters"]
+        assert counters["stale_values_served"] == 1
+    finally:
+        adressenregister.setup_cache(
+            {
+                "long.backend": "dogpile.cache.null",
+                "short.backend": "dogpile.cache.null",
+            },
+            None,
+        )
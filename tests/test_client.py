@@ -2,6 +2,18 @@ import pytest
 from responses import RequestsMock
 
 from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.instrumentation import Hook
+from crabpy.stats import Statistics
+from crabpy.timeouts import deadline
+
+
+class Recorder(Hook):
+    def __init__(self):
+        self.spans = []
+
+    def after(self, span):
+        self.spans.append(span)
 
 
 class TestAdressenRegisterClient:
@@ -165,3 +177,76 @@ class TestAdressenRegisterClient:
         )
         res = client.get_gemeenten()
         assert res == [{"name": "test-gemeente1"}, {"name": "test-gemeente2"}]
+
+    def test_invalid_json(self, client, requests_mock):
+        requests_mock.add(
+            method=requests_mock.GET,
+            url="https://test-adres.be/v2/gemeenten",
+            body='{"gemeenten": [{"name": "test-gemeente1"}',
+        )
+        with pytest.raises(AdressenRegisterClientException):
+            client.get_gemeenten()
+
+    def test_statistics(self, client, requests_mock):
+        client.stats = Statistics("adressenregister")
+        requests_mock.add(
+            method=requests_mock.GET,
+            url="https://test-adres.be/v2/gemeenten/123",
+            json={"name": "test-gemeente"},
+        )
+        requests_mock.add(
+            method=requests_mock.GET,
+            url="https://test-adres.be/v2/gemeenten/456",
+            status=404,
+        )
+        client.get_gemeente("123")
+        with pytest.raises(AdressenRegisterClientException):
+            client.get_gemeente("456")
+        upstream = client.stats.snapshot()["upstream"]["/v2/gemeenten/{id}"]
+        assert upstream["calls"] == 2
+        assert upstream["errors"] == 1
+        assert upstream["bytes"] == len(b'{"name": "test-gemeente"}')
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(adressen=30, latency=0.05)
+
+
+class TestParallelPages:
+    def test_same_result(self, server):
+        serial = AdressenRegisterClient(server.url, "key", page_size=7)
+        parallel = AdressenRegisterClient(
+            server.url, "key", page_size=7, page_concurrency=4
+        )
+        before = server.counts["requests"]
+        adressen = parallel.get_adressen()
+        assert server.counts["requests"] - before <= 9 + 3
+        assert adressen == serial.get_adressen()
+        assert len(adressen) == 60
+
+    def test_span(self, server):
+        client = AdressenRegisterClient(
+            server.url, "key", page_size=7, page_concurrency=4
+        )
+        with Recorder() as recorder:
+            client.get_adressen()
+        (span,) = recorder.spans
+        assert span.attributes["pages"] == 9
+        assert span.attributes["status_code"] == 200
+
+    def test_fields(self, server):
+        client = AdressenRegisterClient(
+            server.url, "key", page_size=7, page_concurrency=4
+        )
+        adressen = client.get_adressen(fields=("huisnummer", "busnummer"))
+        assert len(adressen) == 60
+        assert adressen[0] == {"huisnummer": "1"}
+
+    def test_deadline(self, server):
+        client = AdressenRegisterClient(
+            server.url, "key", page_size=1, page_concurrency=4
+        )
+        with deadline(0.15):
+            with pytest.raises(AdressenRegisterClientException):
+                client.get_adressen()
@@ -0,0 +1,220 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.export import GEOJSON
+from crabpy.export import NDJSON
+from crabpy.export import export_gebouwen
+from crabpy.export import export_percelen
+from crabpy.export import gebouw_feature
+from crabpy.gateway import adressenregister
+from crabpy.gateway.adressenregister import Record
+from crabpy.gateway.capakey import CapakeyRestGateway
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from crabpy.gateway.exception import GatewayRuntimeException
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(gemeenten=3)
+
+
+@pytest.fixture(scope="module")
+def dataset(server):
+    return server.dataset
+
+
+@pytest.fixture()
+def capakey_gateway(server):
+    return CapakeyRestGateway(base_url=server.capakey_url)
+
+
+def afdelingen(dataset):
+    return [int(d) for d in dataset.departments]
+
+
+class TestExportPercelen:
+    def test_geojson(self, dataset, capakey_gateway):
+        out = io.BytesIO()
+        count = export_percelen(capakey_gateway, out, afdelingen=afdelingen(dataset))
+        collection = json.loads(out.getvalue())
+        assert collection["type"] == "FeatureCollection"
+        assert count == len(collection["features"]) == len(dataset.parcels)
+        feature = collection["features"][0]
+        capakey = feature["id"]
+        assert feature["properties"]["capakey"] == capakey
+        assert feature["properties"]["adressen"] == dataset.parcels[capakey]["adres"]
+        assert feature["geometry"]["type"] == "Polygon"
+        assert "crs" not in feature["geometry"]
+
+    def test_ndjson(self, dataset, capakey_gateway):
+        sectie = capakey_gateway.get_sectie_by_id_and_afdeling(
+            "A", afdelingen(dataset)[0]
+        )
+        out = io.BytesIO()
+        export_percelen(capakey_gateway, out, secties=[sectie], format=NDJSON)
+        lines = out.getvalue().decode().splitlines()
+        assert len(lines) == 6
+        assert all(json.loads(line)["type"] == "Feature" for line in lines)
+
+    @pytest.mark.parametrize("format", [GEOJSON, NDJSON])
+    def test_resume(self, dataset, capakey_gateway, tmp_path, format):
+        expected = io.BytesIO()
+        export_percelen(
+            capakey_gateway, expected, afdelingen=afdelingen(dataset), format=format
+        )
+        failing = sorted(dataset.parcels)[-1]
+        get_perceel_by_capakey = capakey_gateway.get_perceel_by_capakey
+
+        def interrupted(capakey):
+            if capakey == failing:
+                raise GatewayRuntimeException("Connection lost", None)
+            return get_perceel_by_capakey(capakey)
+
+        path = tmp_path / "percelen"
+        checkpoint = str(tmp_path / "percelen.checkpoint")
+        with open(path, "wb") as out:
+            with patch.object(
+                capakey_gateway, "get_perceel_by_capakey", side_effect=interrupted
+            ):
+                with pytest.raises(GatewayRuntimeException):
+                    export_percelen(
+                        capakey_gateway,
+                        out,
+                        afdelingen=afdelingen(dataset),
+                        format=format,
+                        checkpoint=checkpoint,
+                    )
+        state = json.loads((tmp_path / "percelen.checkpoint").read_text())
+        assert len(state["done"]) == 2
+        with open(path, "r+b") as out:
+            with patch.object(
+                capakey_gateway,
+                "list_percelen_by_sectie",
+                wraps=capakey_gateway.list_percelen_by_sectie,
+            ) as list_percelen:
+                count = export_percelen(
+                    capakey_gateway,
+                    out,
+                    afdelingen=afdelingen(dataset),
+                    format=format,
+                    checkpoint=checkpoint,
+                )
+            assert list_percelen.call_count == 1
+        assert count == len(dataset.parcels)
+        assert path.read_bytes() == expected.getvalue()
+        assert not (tmp_path / "percelen.checkpoint").exists()
+
+    def test_server_error(self, dataset, server, capakey_gateway):
+        get_perceel_by_capakey = capakey_gateway.get_perceel_by_capakey
+
+        def failing(capakey):
+            server.error_rate = 1
+            try:
+                return get_perceel_by_capakey(capakey)
+            finally:
+                server.error_rate = 0
+
+        with patch.object(
+            capakey_gateway, "get_perceel_by_capakey", side_effect=failing
+        ):
+            with pytest.raises(GatewayResourceNotFoundException):
+                export_percelen(
+                    capakey_gateway,
+                    io.BytesIO(),
+                    afdelingen=afdelingen(dataset),
+                    concurrency=1,
+                )
+
+    def test_truncated_file(self, dataset, capakey_gateway, tmp_path):
+        checkpoint = tmp_path / "percelen.checkpoint"
+        checkpoint.write_text(
+            json.dumps({"format": GEOJSON, "done": [], "offset": 100, "features": 0})
+        )
+        with pytest.raises(ValueError):
+            export_percelen(
+                capakey_gateway,
+                io.BytesIO(),
+                afdelingen=afdelingen(dataset),
+                checkpoint=str(checkpoint),
+            )
+
+    def test_unknown_format(self, capakey_gateway):
+        with pytest.raises(ValueError):
+            export_percelen(capakey_gateway, io.BytesIO(), format="shp")
+
+
+class TestExportGebouwen:
+    @pytest.fixture()
+    def gateway(self, server):
+        return adressenregister.Gateway(AdressenRegisterClient(server.url, "key"))
+
+    def test_ndjson(self, dataset, gateway, tmp_path):
+        ids = list(dataset.gebouwen) + ["1"]
+        out = io.BytesIO()
+        count = export_gebouwen(
+            gateway,
+            out,
+            iter(ids),
+            format=NDJSON,
+            checkpoint=str(tmp_path / "checkpoint"),
+            batch_size=4,
+        )
+        features = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert count == len(features) == len(dataset.gebouwen)
+        assert [f["id"] for f in features] == list(dataset.gebouwen)
+        assert features[0]["geometry"]["type"] == "Polygon"
+        assert features[0]["properties"]["status"] == "gerealiseerd"
+
+    @pytest.mark.parametrize("format", [GEOJSON, NDJSON])
+    def test_resume_first_batch(self, dataset, gateway, tmp_path, format):
+        ids = list(dataset.gebouwen)
+        expected = io.BytesIO()
+        export_gebouwen(gateway, expected, ids, format=format)
+        get_gebouw_by_id = gateway.get_gebouw_by_id
+
+        def interrupted(gebouw_id, **kwargs):
+            if gebouw_id == ids[-1]:
+                raise GatewayRuntimeException("Connection lost", None)
+            return get_gebouw_by_id(gebouw_id, **kwargs)
+
+        path = tmp_path / "gebouwen"
+        checkpoint = str(tmp_path / "gebouwen.checkpoint")
+        with open(path, "ab") as out:
+            with patch.object(gateway, "get_gebouw_by_id", side_effect=interrupted):
+                with pytest.raises(GatewayRuntimeException):
+                    export_gebouwen(
+                        gateway,
+                        out,
+                        ids,
+                        format=format,
+                        checkpoint=checkpoint,
+                        concurrency=1,
+                    )
+        assert path.stat().st_size > 0
+        with open(path, "ab") as out:
+            count = export_gebouwen(
+                gateway, out, ids, format=format, checkpoint=checkpoint
+            )
+        assert count == len(ids)
+        assert path.read_bytes() == expected.getvalue()
+
+
+def test_gml_polygon():
+    gml = (
+        '<gml:Polygon xmlns:gml="http://www.opengis.net/gml/3.2">'
+        "<gml:exterior><gml:LinearRing><gml:posList>"
+        "0.0 0.0 10.0 0.0 10.0 10.0 0.0 0.0"
+        "</gml:posList></gml:LinearRing></gml:exterior>"
+        "</gml:Polygon>"
+    )
+    gebouw = Record(
+        id="1", uri="uri", status="gepland", geojson={"polygon": {"gml": gml}}
+    )
+    assert gebouw_feature(gebouw)["geometry"] == {
+        "type": "Polygon",
+        "coordinates": [[[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 0.0]]],
+    }
@@ -0,0 +1,69 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def import_times(module):
+    """
+    Import a module in a fresh interpreter with `python -X importtime`.
+
+    :returns: A dict with the cumulative import time in microseconds of every
+        module that was imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+GATEWAYS = [
+    "crabpy.client",
+    "crabpy.gateway.adressenregister",
+    "crabpy.gateway.capakey",
+    "crabpy.gateway.crab",
+]
+
+LAZY_MODULES = {
+    "concurrent.futures",
+    "crabpy.circuitbreaker",
+    "crabpy.search",
+    "crabpy.tables",
+    "crabpy.text",
+}
+"""
+Modules only some calls need, the gateways import them when they are used.
+"""
+
+
+@pytest.mark.parametrize("module", GATEWAYS)
+def test_suds_is_imported_lazily(module):
+    times = import_times(module)
+    assert module in times
+    assert "suds" not in times
+
+
+@pytest.mark.parametrize("module", GATEWAYS)
+def test_optional_modules_are_imported_lazily(module):
+    times = import_times(module)
+    assert module in times
+    assert not LAZY_MODULES & set(times)
+
+
+def test_capakey_patterns():
+    from crabpy.gateway.capakey import CAPAKEY_PATTERN
+    from crabpy.gateway.capakey import PERCID_PATTERN
+
+    assert CAPAKEY_PATTERN.match("46013A1154/02C000")
+    assert PERCID_PATTERN.match("46013_A_1154_C_000_02")
+    assert not CAPAKEY_PATTERN.match("46013_A_1154_C_000_02")
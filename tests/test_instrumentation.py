@@ -0,0 +1,248 @@
+import threading
+
+import pytest
+from responses import RequestsMock
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.gateway.capakey import CapakeyRestGateway
+from crabpy.gateway.capakey import Gemeente
+from crabpy.instrumentation import CACHE
+from crabpy.instrumentation import Hook
+from crabpy.instrumentation import LAZY_LOAD
+from crabpy.instrumentation import LazyLoadDetector
+from crabpy.instrumentation import LazyLoadError
+from crabpy.instrumentation import LazyLoadWarning
+from crabpy.instrumentation import OpenTelemetryHook
+from crabpy.instrumentation import REQUEST
+from crabpy.instrumentation import Span
+from crabpy.instrumentation import lazy_load
+from crabpy.instrumentation import register_hook
+from crabpy.instrumentation import unregister_hook
+from crabpy.mirror import build_mirror
+
+
+class RecordingHook(Hook):
+    def __init__(self):
+        self.events = []
+
+    def before(self, span):
+        self.events.append(("before", span))
+
+    def after(self, span):
+        self.events.append(("after", span))
+
+    def spans(self, kind):
+        return [
+            span
+            for event, span in self.events
+            if event == "after" and span.kind == kind
+        ]
+
+
+@pytest.fixture()
+def hook():
+    with RecordingHook() as hook:
+        yield hook
+
+
+class TestSpan:
+    def test_hooks_are_called(self, hook):
+        with Span(REQUEST, "test", url="https://test.be") as span:
+            span.set(status_code=200)
+            span.increment("pages")
+            span.increment("pages")
+        assert hook.events == [("before", span), ("after", span)]
+        assert span.attributes == {
+            "url": "https://test.be",
+            "status_code": 200,
+            "pages": 2,
+        }
+        assert span.duration >= 0
+        assert span.error is None
+
+    def test_error(self, hook):
+        with pytest.raises(ValueError):
+            with Span(REQUEST, "test") as span:
+                raise ValueError("boom")
+        assert isinstance(span.error, ValueError)
+
+    def test_failing_hook_is_ignored(self, hook):
+        class FailingHook(Hook):
+            def after(self, span):
+                raise RuntimeError()
+
+        with FailingHook():
+            with Span(REQUEST, "test"):
+                pass
+        assert len(hook.spans(REQUEST)) == 1
+
+    def test_unregister(self):
+        hook = RecordingHook()
+        register_hook(hook)
+        unregister_hook(hook)
+        with Span(REQUEST, "test"):
+            pass
+        assert hook.events == []
+
+
+def span_in_thread():
+    def target():
+        with Span(REQUEST, "test"):
+            pass
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+
+class TestScope:
+    def test_hook_is_not_seen_by_other_threads(self, hook):
+        span_in_thread()
+        assert hook.events == []
+
+    def test_registered_hook_is_seen_by_other_threads(self):
+        hook = RecordingHook()
+        register_hook(hook)
+        try:
+            span_in_thread()
+        finally:
+            unregister_hook(hook)
+        assert [event for event, span in hook.events] == ["before", "after"]
+
+    def test_hook_follows_worker_threads(self, hook, fake_server, tmp_path):
+        server = fake_server(gemeenten=1, straten=1, adressen=2)
+        client = AdressenRegisterClient(server.url, "key")
+        build_mirror(client, tmp_path / "mirror.sqlite", ["adressen"], concurrency=2)
+        endpoints = {span.name for span in hook.spans(REQUEST)}
+        assert "/v2/adressen/{id}" in endpoints
+
+
+class TestGateways:
+    def test_capakey_request_and_cache(self, hook, municipality_response):
+        gateway = CapakeyRestGateway(
+            cache_config={"long.backend": "dogpile.cache.memory"}
+        )
+        gateway.get_gemeente_by_id(44021)
+        gateway.get_gemeente_by_id(44021)
+
+        request = hook.spans(REQUEST)[0]
+        assert len(hook.spans(REQUEST)) == 1
+        assert request.name == "/capakey/v2/municipality/{id}"
+        assert request.attributes["gateway"] == "capakey"
+        assert request.attributes["status_code"] == 200
+        assert request.attributes["bytes"] > 0
+        cache = [s for s in hook.spans(CACHE) if s.attributes["region"] == "long"]
+        assert [s.attributes["hit"] for s in cache] == [False, True]
+        assert cache[0].name == "get_gemeente_by_id_rest"
+
+    def test_capakey_lazy_load(self, hook, municipality_response):
+        gemeente = Gemeente(44021, gateway=CapakeyRestGateway())
+        gemeente.naam
+        gemeente.centroid
+        (lazy_load,) = hook.spans(LAZY_LOAD)
+        assert lazy_load.name == "Gemeente.naam"
+        assert lazy_load.attributes["id"] == 44021
+        assert hook.events[0] == ("before", lazy_load)
+
+    def test_adressenregister_pages(self, hook):
+        client = AdressenRegisterClient("https://test-adres.be", "key")
+        with RequestsMock() as requests_mock:
+            requests_mock.add(
+                method=requests_mock.GET,
+                url="https://test-adres.be/v2/gemeenten?limit=500",
+                json={
+                    "gemeenten": [{"name": "1"}],
+                    "volgende": "https://test-adres.be/v2/gemeenten?offset=1",
+                },
+            )
+            requests_mock.add(
+                method=requests_mock.GET,
+                url="https://test-adres.be/v2/gemeenten?offset=1",
+                json={"gemeenten": [{"name": "2"}]},
+            )
+            client.get_gemeenten()
+        (request,) = hook.spans(REQUEST)
+        assert request.name == "/v2/gemeenten"
+        assert request.attributes["pages"] == 2
+        assert request.attributes["params"] == {"limit": 500}
+
+
+class Thing:
+    def __init__(self, id):
+        self.id = id
+
+
+class TestLazyLoadDetector:
+    def test_warns_above_threshold(self, municipality_response):
+        gateway = CapakeyRestGateway()
+        gemeenten = [Gemeente(id, gateway=gateway) for id in (44021, 44022, 44023)]
+        with pytest.warns(LazyLoadWarning, match="Gemeente.naam .* 3 objects"):
+            with LazyLoadDetector(threshold=2):
+                for gemeente in gemeenten:
+                    gemeente.naam
+
+    def test_below_threshold(self, recwarn):
+        with LazyLoadDetector(threshold=2) as detector:
+            for id in (1, 2):
+                with lazy_load(Thing(id), "naam"):
+                    pass
+            # The same object again is not another N+1 load.
+            with lazy_load(Thing(1), "naam"):
+                pass
+        assert detector.report() == []
+        assert len(recwarn) == 0
+
+    def test_counts_per_call_site(self):
+        def load(id):
+            with lazy_load(Thing(id), "naam"):
+                pass
+
+        with pytest.warns(LazyLoadWarning):
+            with LazyLoadDetector(threshold=1) as detector:
+                load(1)
+                load(2)
+        ((call_site, object_type, attribute, count),) = detector.report()
+        assert __file__ in call_site
+        assert (object_type, attribute, count) == ("Thing", "naam", 2)
+
+    def test_nested_loads_count_once(self):
+        with LazyLoadDetector(threshold=1, error=True) as detector:
+            with lazy_load(Thing(1), "status"):
+                with lazy_load(Thing(1), "_source_json"):
+                    pass
+        assert detector.report() == []
+
+    def test_error(self):
+        with pytest.raises(LazyLoadError, match="Thing.naam"):
+            with LazyLoadDetector(threshold=1, error=True):
+                for id in (1, 2):
+                    with lazy_load(Thing(id), "naam"):
+                        pass
+
+
+def test_open_telemetry_hook():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    with OpenTelemetryHook(tracer=provider.get_tracer("test")):
+        with Span(LAZY_LOAD, "Gemeente.naam", id=44021):
+            with Span(REQUEST, "/capakey/v2/municipality/{id}") as span:
+                span.set(bytes=10, params={"srs": "31370"})
+        with pytest.raises(ValueError):
+            with Span(REQUEST, "failing"):
+                raise ValueError()
+
+    request, lazy_load, failing = exporter.get_finished_spans()
+    assert request.name == "crabpy.request /capakey/v2/municipality/{id}"
+    assert request.attributes["crabpy.bytes"] == 10
+    assert request.attributes["crabpy.params"] == "{'srs': '31370'}"
+    assert request.parent.span_id == lazy_load.context.span_id
+    assert lazy_load.attributes["crabpy.id"] == 44021
+    assert not failing.status.is_ok
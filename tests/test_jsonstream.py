@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from crabpy.jsonstream import iter_array
+
+DOCUMENT = {
+    "@context": "https://docs.basisregisters.vlaanderen.be/context/adres.json",
+    "adressen": [
+        {"huisnummer": "1", "straat": "Éénstraat", "positie": [104.25, 19.5]},
+        {"huisnummer": "2", "straat": "Zeestraat", "positie": [-3, 1e3]},
+        {"huisnummer": "3", "busnummer": None, "tags": []},
+    ],
+    "totaal": 123456789,
+    "volgende": "https://api.basisregisters.vlaanderen.be/v2/adressen?offset=3",
+}
+
+
+def chunked(text, size):
+    data = text.encode("utf-8")
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("size", [1, 3, 64, 65536])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_array(size, indent):
+    text = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False)
+    members = {}
+    items = list(iter_array(chunked(text, size), "adressen", members=members))
+    assert items == DOCUMENT["adressen"]
+    assert members == {
+        "@context": DOCUMENT["@context"],
+        "totaal": 123456789,
+        "volgende": DOCUMENT["volgende"],
+    }
+
+
+def test_numbers_across_chunks():
+    text = '{"items": [12345, 678], "n": 9012}'
+    members = {}
+    assert list(iter_array(chunked(text, 2), "items", members=members)) == [
+        12345,
+        678,
+    ]
+    assert members == {"n": 9012}
+
+
+def test_fields():
+    text = json.dumps(DOCUMENT)
+    items = list(iter_array([text], "adressen", fields=("huisnummer", "busnummer")))
+    assert items == [
+        {"huisnummer": "1"},
+        {"huisnummer": "2"},
+        {"huisnummer": "3", "busnummer": None},
+    ]
+
+
+@pytest.mark.parametrize(
+    "text, items",
+    [
+        ("{}", []),
+        ('{"adressen": []}', []),
+        ('{"volgende": "x"}', []),
+        (' { "adressen" : [ {} ] } ', [{}]),
+    ],
+)
+def test_empty(text, items):
+    assert list(iter_array(chunked(text, 1), "adressen")) == items
+
+
+@pytest.mark.parametrize(
+    "text", ["", "[]", '{"adressen": [1, 2}', '{"adressen": [1 2]}', '{"a": 1']
+)
+def test_invalid(text):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_array(chunked(text, 4), "adressen"))
@@ -0,0 +1,163 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway import adressenregister
+from crabpy.gateway.cache import is_not_found
+from crabpy.mirror import SqliteAdressenRegisterClient
+from crabpy.mirror import build_mirror
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(gemeenten=2, straten=3, adressen=10)
+
+
+@pytest.fixture(scope="module")
+def dataset(server):
+    return server.dataset
+
+
+@pytest.fixture(scope="module")
+def client(server):
+    return AdressenRegisterClient(server.url, "key")
+
+
+@pytest.fixture(scope="module")
+def mirror(client, tmp_path_factory):
+    path = tmp_path_factory.mktemp("mirror") / "adressenregister.sqlite"
+    build_mirror(client, path, concurrency=4)
+    with SqliteAdressenRegisterClient(path) as mirror:
+        yield mirror
+
+
+class TestBuildMirror:
+    def test_counts(self, client, tmp_path):
+        counts = build_mirror(client, tmp_path / "mirror.sqlite")
+        assert counts == {
+            "gemeenten": 2,
+            "postinfo": 2,
+            "straatnamen": 6,
+            "adressen": 60,
+            "percelen": 60,
+            "gebouwen": 30,
+        }
+
+    def test_wal(self, mirror):
+        connection = sqlite3.connect(mirror.path)
+        assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        indexes = {
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        assert {"adressen_straatnaam_id", "adressen_niscode", "terms_id"} <= indexes
+
+    def test_niscodes(self, client, dataset, tmp_path):
+        niscode = next(iter(dataset.gemeenten))
+        counts = build_mirror(
+            client,
+            tmp_path / "mirror.sqlite",
+            collections=["gemeenten", "straatnamen", "adressen"],
+            niscodes=[niscode],
+        )
+        assert counts == {"gemeenten": 1, "straatnamen": 3, "adressen": 30}
+
+    def test_unknown_collection(self, client, tmp_path):
+        with pytest.raises(ValueError):
+            build_mirror(client, tmp_path / "mirror.sqlite", collections=["wegen"])
+
+    def test_rebuild_removes_stale_objects(self, fake_server, tmp_path):
+        path = tmp_path / "mirror.sqlite"
+        server = fake_server(straten=3, adressen=0)
+        client = AdressenRegisterClient(server.url, "key")
+        build_mirror(client, path, collections=["straatnamen"])
+        del server.dataset.straatnamen["1"]
+        counts = build_mirror(client, path, collections=["straatnamen"])
+        assert counts == {"straatnamen": 2}
+        mirror = SqliteAdressenRegisterClient(path)
+        assert [s["identificator"]["objectId"] for s in mirror.get_straatnamen()] == [
+            "2",
+            "3",
+        ]
+        assert mirror.get_straatnamen(straatnaam="Kerkstraat") == []
+
+
+class TestSqliteAdressenRegisterClient:
+    def test_missing_database(self, tmp_path):
+        with pytest.raises(ValueError):
+            SqliteAdressenRegisterClient(tmp_path / "missing.sqlite")
+
+    def test_close(self, mirror):
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda _: mirror.get_gemeenten(), range(8)))
+        connections = list(mirror._connections)
+        assert connections
+        mirror.close()
+        assert mirror._connections == []
+        with pytest.raises(sqlite3.ProgrammingError):
+            connections[0].execute("SELECT 1")
+        assert mirror.get_gemeenten()
+
+    def test_same_documents(self, client, mirror):
+        assert mirror.get_gemeenten() == client.get_gemeenten()
+        assert mirror.get_adres("200001") == client.get_adres("200001")
+        assert mirror.get_adressen(straatnaamObjectId="2") == client.get_adressen(
+            straatnaamObjectId="2"
+        )
+        assert mirror.get_percelen(adresObjectId="200001") == client.get_percelen(
+            adresObjectId="200001"
+        )
+        fields = ("identificator", "huisnummer")
+        assert mirror.get_adressen(fields=fields) == client.get_adressen(fields=fields)
+
+    def test_filters(self, client, mirror, dataset):
+        niscode, gemeente = next(iter(dataset.gemeenten.items()))
+        gemeentenaam = gemeente["gemeentenamen"][0]["spelling"]
+        assert mirror.get_straatnamen(niscode=niscode) == client.get_straatnamen(
+            niscode=niscode
+        )
+        assert mirror.get_postinfos(gemeentenaam=gemeentenaam) == (
+            client.get_postinfos(gemeentenaam=gemeentenaam)
+        )
+        assert mirror.get_adressen(
+            gemeentenaam=gemeentenaam, straatnaam="Kerkstraat", huisnummer="10"
+        ) == client.get_adressen(
+            gemeentenaam=gemeentenaam, straatnaam="Kerkstraat", huisnummer="10"
+        )
+
+    def test_not_found(self, mirror):
+        with pytest.raises(AdressenRegisterClientException) as e:
+            mirror.get_adres("1")
+        assert is_not_found(e.value)
+
+    def test_adres_match(self, mirror):
+        match = mirror.get_adres_match(straatnaam="Kerkstraat", huisnummer="1")
+        assert len(match["adresMatches"]) == 2
+        assert match["adresMatches"][0]["score"] == 100
+        with pytest.raises(ValueError):
+            mirror.get_adres_match(index="1")
+
+
+class TestGateway:
+    def test_gateway(self, client, mirror):
+        remote = adressenregister.Gateway(client)
+        local = adressenregister.Gateway(mirror)
+        straten = local.list_straten("11001")
+        assert [s.id for s in straten] == [s.id for s in remote.list_straten("11001")]
+        adressen = local.list_adressen_by_straat(straten[0].id)
+        assert len(adressen) == 10
+        adres = local.get_adres_by_id(adressen[0].id)
+        assert adres.label == remote.get_adres_by_id(adressen[0].id).label
+        percelen = local.list_percelen_with_params(adresObjectId=adres.id)
+        assert [p.id for p in percelen] == [
+            p.id for p in remote.list_percelen_with_params(adresObjectId=adres.id)
+        ]
+
+    def test_gateway_not_found(self, mirror):
+        with pytest.raises(AdressenRegisterClientException):
+            adressenregister.Gateway(mirror).get_adres_by_id("1")
@@ -0,0 +1,201 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from unittest.mock import Mock
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.ratelimit import Limiter
+from crabpy.ratelimit import WARM_UP
+from crabpy.ratelimit import bulk
+from crabpy.ratelimit import configure_limits
+from crabpy.ratelimit import get_limiter
+from crabpy.ratelimit import limited
+from crabpy.ratelimit import retry_after
+from crabpy.stats import Statistics
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import Hedging
+from crabpy.timeouts import deadline
+
+
+class TestLimiter:
+    def test_concurrency(self):
+        limiter = Limiter(concurrency=2)
+        limiter.acquire()
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(
+            target=lambda: (limiter.acquire(), acquired.set()), daemon=True
+        )
+        thread.start()
+        assert not acquired.wait(0.05)
+        limiter.release(0.01)
+        assert acquired.wait(1)
+        assert limiter.in_flight == 2
+
+    def test_additive_increase(self):
+        limiter = Limiter(concurrency=2, max_concurrency=3)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(0.01)
+        assert limiter.limit == 3
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.01)
+        assert limiter.limit == 3
+
+    def test_decrease_when_throttled(self):
+        limiter = Limiter(concurrency=16)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.limit == 8
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.limit == 8
+
+    def test_decrease_when_slow(self):
+        limiter = Limiter(concurrency=16)
+        for _ in range(WARM_UP + 1):
+            limiter.acquire()
+            limiter.release(0.01)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(0.2)
+        assert limiter.limit < 16
+
+    def test_jitter_is_not_slow(self):
+        limiter = Limiter(concurrency=16)
+        for _ in range(WARM_UP + 1):
+            limiter.acquire()
+            limiter.release(0.001)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.006)
+        assert limiter.limit >= 16
+
+    def test_retry_after_pauses(self):
+        limiter = Limiter()
+        limiter.acquire()
+        limiter.release(throttled=True, retry_after=0.2)
+        start = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - start >= 0.15
+
+    def test_max_retry_after(self):
+        limiter = Limiter(max_retry_after=0.1)
+        limiter.acquire()
+        limiter.release(throttled=True, retry_after=3600)
+        start = time.monotonic()
+        limiter.acquire()
+        assert time.monotonic() - start < 1
+
+    def test_deadline_before_retry_after(self):
+        limiter = Limiter()
+        limiter.acquire()
+        limiter.release(throttled=True, retry_after=30)
+        start = time.monotonic()
+        with deadline(5):
+            with pytest.raises(DeadlineExceeded):
+                limiter.acquire()
+        assert time.monotonic() - start < 1
+
+    def test_rate(self):
+        limiter = Limiter(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+            limiter.release()
+        assert time.monotonic() - start >= 0.09
+
+    def test_deadline(self):
+        limiter = Limiter(concurrency=1)
+        limiter.acquire()
+        with deadline(0.05):
+            with pytest.raises(DeadlineExceeded):
+                limiter.acquire()
+
+
+def test_retry_after():
+    assert retry_after(Mock(headers={"Retry-After": "2"})) == 2
+    later = formatdate(time.time() + 60, usegmt=True)
+    assert 55 < retry_after(Mock(headers={"Retry-After": later})) <= 60
+    assert retry_after(Mock(headers={})) is None
+    assert retry_after(Mock(headers={"Retry-After": "soon"})) is None
+
+
+def test_long_retry_after_fails():
+    limiter = Limiter(max_retry_after=10)
+    response = Mock(status_code=429, headers={"Retry-After": "3600"})
+    fn = Mock(return_value=response)
+    stats = Statistics("test")
+    start = time.monotonic()
+    assert limited(limiter, fn, stats) is response
+    assert time.monotonic() - start < 1
+    assert fn.call_count == 1
+    assert stats.snapshot()["counters"]["throttled_requests"] == 1
+    limiter.acquire()
+    assert time.monotonic() - start < 1
+
+
+def test_shared_limiters():
+    configure_limits("test", rate=10)
+    configure_limits("test", api_key="key", rate=20)
+    assert get_limiter("test") is get_limiter("test")
+    assert get_limiter("test").rate == 10
+    assert get_limiter("test", "other").rate == 10
+    limiter = get_limiter("test", "key")
+    assert limiter.rate == 20
+    configure_limits("test", api_key="key", rate=30)
+    assert get_limiter("test", "key") is not limiter
+    assert get_limiter("test", "key").rate == 30
+
+
+def test_client_retries_throttled_requests(fake_server):
+    server = fake_server(
+        straten=1, adressen=20, max_requests_per_second=10, retry_after=1
+    )
+    dataset = server.dataset
+    client = AdressenRegisterClient(server.url, "key", limiter=Limiter())
+    client.stats = Statistics("adressenregister")
+    with ThreadPoolExecutor(8) as executor:
+        adressen = list(executor.map(client.get_adres, dataset.adressen, timeout=10))
+    assert len(adressen) == 20
+    assert server.counts[429] > 0
+    throttled = client.stats.snapshot()["counters"]["throttled_requests"]
+    assert throttled == server.counts[429]
+    assert client.limiter.limit < 16
+
+
+def test_limiter_is_opt_in():
+    client = AdressenRegisterClient("https://localhost", "opt-in")
+    assert client.limiter is None
+    with bulk():
+        assert client.limiter is get_limiter("adressenregister", "opt-in")
+    limiter = Limiter()
+    client = AdressenRegisterClient("https://localhost", "opt-in", limiter=limiter)
+    assert client.limiter is limiter
+
+
+def test_hedged_requests_are_limited(fake_server):
+    class CountingLimiter(Limiter):
+        acquired = most_in_flight = 0
+
+        def acquire(self):
+            super().acquire()
+            self.acquired += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+
+    server = fake_server(straten=1, adressen=1, latency=0.2)
+    limiter = CountingLimiter(concurrency=1)
+    client = AdressenRegisterClient(
+        server.url, "key", hedging=Hedging(delay=0.05), limiter=limiter
+    )
+    client.get_adres("200001")
+    # The duplicate waits for the slot of the first request
+    deadline = time.monotonic() + 2
+    while server.counts["requests"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.acquired == 2
+    assert limiter.most_in_flight == 1
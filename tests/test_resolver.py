@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.gateway import adressenregister
+from crabpy.mirror import SqliteAdressenRegisterClient
+from crabpy.mirror import build_mirror
+from crabpy.resolver import Resolver
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(adressen=10)
+
+
+@pytest.fixture()
+def gateway(server):
+    client = AdressenRegisterClient(server.url, "key")
+    cache_settings = {
+        "long.backend": "dogpile.cache.memory",
+        "short.backend": "dogpile.cache.memory",
+    }
+    yield adressenregister.Gateway(client, cache_settings=cache_settings)
+    adressenregister.setup_cache(
+        {"long.backend": "dogpile.cache.null", "short.backend": "dogpile.cache.null"},
+        None,
+    )
+
+
+@pytest.fixture()
+def pickling_gateway(server):
+    client = AdressenRegisterClient(server.url, "key")
+    cache_settings = {
+        "long.backend": "dogpile.cache.memory_pickle",
+        "short.backend": "dogpile.cache.memory_pickle",
+    }
+    yield adressenregister.Gateway(client, cache_settings=cache_settings)
+    adressenregister.setup_cache(
+        {"long.backend": "dogpile.cache.null", "short.backend": "dogpile.cache.null"},
+        None,
+    )
+
+
+class TestResolver:
+    def test_niscode(self, gateway):
+        resolver = Resolver(gateway)
+        assert resolver.niscode("gent") == "44021"
+        assert resolver.niscode("Ledeberg") == "44021"
+        assert resolver.niscode("Atlantis") is None
+
+    def test_remote_then_local(self, gateway, server):
+        resolver = Resolver(gateway)
+        adres = resolver.resolve("Kerkstr.", "3", gemeentenaam="Aartselaar")
+        assert adres.id == "200003"
+        assert resolver.counts == {"remote": 1}
+
+        straat = gateway.list_straten("11001")[0]
+        gateway.list_adressen_by_straat(straat)
+        requests = server.counts["requests"]
+        adres = resolver.resolve("kerkstraat", "10", busnummer="1", niscode="11001")
+        assert adres.id == "200010"
+        assert adres.busnummer == "1"
+        assert resolver.resolve("KERKSTRAAT", "4", gemeentenaam="aartselaar").id == (
+            "200004"
+        )
+        assert resolver.counts == {"remote": 1, "local": 2}
+        assert server.counts["requests"] == requests
+
+    def test_unknown(self, gateway):
+        resolver = Resolver(gateway, min_score=50)
+        assert resolver.resolve("Kerkstraat", "99", gemeentenaam="Aartselaar") is None
+        assert resolver.resolve_locally("Kerkstraat", "1", gemeentenaam="X") is None
+
+    def test_mirror(self, server, tmp_path):
+        client = AdressenRegisterClient(server.url, "key")
+        build_mirror(client, tmp_path / "mirror.sqlite")
+        mirror = SqliteAdressenRegisterClient(tmp_path / "mirror.sqlite")
+        resolver = Resolver(adressenregister.Gateway(mirror))
+        assert resolver.fetch
+        adres = resolver.resolve("Stationsstraat", "2", gemeentenaam="Aartselaar")
+        assert adres.id == "200012"
+        assert resolver.counts == {"local": 1}
+
+    def test_partial_match(self, gateway):
+        resolver = Resolver(gateway)
+        response = {
+            "adresMatches": [
+                {"gemeente": {"objectId": "11001"}, "score": 100},
+                {"straatnaam": {"objectId": "1"}, "score": 90},
+            ]
+        }
+        with patch.object(gateway.client, "get_adres_match", return_value=response):
+            assert resolver.resolve("Kerkstraat", "1", gemeentenaam="X") is None
+
+    def test_serializing_backend(self, pickling_gateway):
+        gateway = pickling_gateway
+        resolver = Resolver(gateway, index_size=1)
+        for straat in gateway.list_straten("11001"):
+            gateway.list_adressen_by_straat(straat)
+        assert resolver.resolve_locally("Kerkstraat", "3", niscode="11001")
+        index = resolver._adressen[next(iter(resolver._adressen))][2]
+        assert resolver.resolve_locally("Kerkstraat", "4", niscode="11001")
+        assert resolver._adressen[next(iter(resolver._adressen))][2] is index
+        assert resolver.resolve_locally("Stationsstraat", "2", niscode="11001")
+        assert len(resolver._adressen) == 1
+        assert resolver._adressen[next(iter(resolver._adressen))][2] is not index
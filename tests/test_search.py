@@ -0,0 +1,175 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.gateway import adressenregister
+from crabpy.search import NameIndex
+from crabpy.search import StraatIndex
+from crabpy.search import similarity
+from crabpy.search import straat_namen
+from crabpy.search import trigrams
+
+
+@pytest.fixture()
+def index():
+    index = NameIndex()
+    index.add(1, "kerk", ["Kerkstraat"])
+    index.add(2, "oude kerk", ["Oude Kerkstraat"])
+    index.add(3, "kerkhof", ["Kerkhofweg"])
+    index.add(4, "sint", ["Sint-Annaplein", "Place Sainte-Anne"])
+    index.add(5, "helene", ["Hélène Dutrieulaan"])
+    return index
+
+
+def test_trigrams():
+    assert trigrams("ab") == {"  a", " ab", "ab "}
+
+
+class TestNameIndex:
+    def test_prefix(self, index):
+        results = index.prefix("kerk")
+        assert [c.item for c in results] == ["kerkhof", "kerk", "oude kerk"]
+        assert [c.score for c in results] == [0.9, 0.9, 0.8]
+        assert index.prefix("Kerkstraat")[0].score == 1.0
+
+    def test_accents_case_and_languages(self, index):
+        assert index.prefix("HELENE")[0].naam == "Hélène Dutrieulaan"
+        assert index.prefix("st.-anna")[0].item == "sint"
+        assert index.prefix("place sainte")[0].naam == "Place Sainte-Anne"
+
+    def test_similar(self, index):
+        results = index.similar("Kerkstaat")
+        assert results[0].item == "kerk"
+        assert 0 < results[0].score < 1
+
+    def test_search_completes_with_similar(self, index):
+        results = index.search("dutrieu", limit=3)
+        assert [c.item for c in results] == ["helene"]
+        assert index.search("") == []
+
+    def test_replace_and_remove(self, index):
+        index.add(1, "kerk", ["Kapelstraat"])
+        assert [c.item for c in index.prefix("kerk")] == ["kerkhof", "oude kerk"]
+        index.remove(3)
+        assert len(index) == 4
+        assert [c.item for c in index.prefix("kerk")] == ["oude kerk"]
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(straten=30, adressen=0)
+
+
+class TestSearchStraten:
+    @pytest.fixture()
+    def gateway(self, server):
+        return adressenregister.Gateway(AdressenRegisterClient(server.url, "key"))
+
+    def test_search_straten(self, gateway, server):
+        results = gateway.search_straten("11001", "kerk", limit=5)
+        assert [c.naam for c in results] == ["Kerkweg", "Kerklaan", "Kerkstraat"]
+        assert isinstance(results[0].item, adressenregister.Straat)
+        requests = server.counts["requests"]
+        assert gateway.search_straten("11001", "molen")[0].naam == "Molenweg"
+        assert server.counts["requests"] == requests
+
+    def test_unknown_gemeente(self, gateway):
+        assert gateway.search_straten("00000", "kerk") == []
+
+    def test_refresh(self, gateway, server):
+        gateway.search_straten("11001", "kerk")
+        gateway.search_index_max_age = 0
+        requests = server.counts["requests"]
+        gateway.search_straten("11001", "kerk")
+        assert server.counts["requests"] == requests + 1
+
+
+def test_straat_index_update():
+    gateway = None
+    straten = [
+        adressenregister.Straat("1", gateway, naam="Kerkstraat", homoniem=None),
+        adressenregister.Straat("2", gateway, naam="Kerkstraat", homoniem="Gent"),
+    ]
+    index = StraatIndex()
+    index.update(straten)
+    assert [c.naam for c in index.prefix("kerkstraat (")] == ["Kerkstraat (Gent)"]
+    index.update(straten[:1])
+    assert len(index) == 1
+
+
+def test_straat_index_concurrent_updates():
+    lists = [
+        [
+            adressenregister.Straat(str(i), None, naam=f"Straat {i}", homoniem=None)
+            for i in range(start, start + 200)
+        ]
+        for start in range(0, 800, 100)
+    ]
+    index = StraatIndex()
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(index.update, lists))
+    assert len(index) == 200
+
+
+def test_straat_namen():
+    straat = adressenregister.Straat.from_get_response(
+        {
+            "identificator": {"objectId": "1"},
+            "straatnamen": [
+                {"spelling": "Kerkstraat", "taal": "nl"},
+                {"spelling": "Rue de l'Eglise", "taal": "fr"},
+            ],
+            "homoniemToevoegingen": [],
+        },
+        None,
+    )
+    assert straat_namen(straat) == ["Kerkstraat", "Kerkstraat", "Rue de l'Eglise"]
+    straat = adressenregister.Straat("2", None, naam="Molenweg", homoniem=None)
+    assert straat_namen(straat) == ["Molenweg"]
+    assert straat.loaded_namen() == []
+
+
+def test_similarity():
+    assert similarity("gent", "gent") == 1.0
+    assert similarity("gnt", "gent") == 0.75
+    assert similarity("", "") == 1.0
+
+
+@pytest.fixture(scope="module")
+def offline_gateway():
+    return adressenregister.Gateway(AdressenRegisterClient("http://localhost", ""))
+
+
+class TestFindGemeenten:
+    def test_exact(self, offline_gateway):
+        for naam in ("Sint-Niklaas", "sint niklaas", " SINT-NIKLAAS "):
+            candidate = offline_gateway.find_gemeenten(naam)[0]
+            assert candidate.item.niscode == "46021"
+            assert candidate.score == 1.0
+
+    def test_languages_and_accents(self, offline_gateway):
+        assert offline_gateway.find_gemeenten("Bruxelles")[0].item.niscode == "21004"
+        assert offline_gateway.find_gemeenten("Mouscron")[0].item.niscode == "57096"
+
+    def test_deelgemeente(self, offline_gateway):
+        candidate = offline_gateway.find_gemeenten("ledeberg")[0]
+        assert isinstance(candidate.item, adressenregister.Deelgemeente)
+        assert candidate.item.gemeente_niscode == "44021"
+
+    def test_typos(self, offline_gateway):
+        candidate = offline_gateway.find_gemeenten("Kortrik")[0]
+        assert candidate.item.niscode == "34022"
+        assert candidate.naam == "Kortrijk"
+        assert 0.6 < candidate.score < 1
+        assert (
+            offline_gateway.find_gemeenten("Antwerpn", limit=1)[0].naam == "Antwerpen"
+        )
+        assert offline_gateway.find_gemeenten("Xyzzy") == []
+        assert offline_gateway.find_gemeenten("") == []
+
+    def test_gemeente_before_deelgemeente(self, offline_gateway):
+        first, second = offline_gateway.find_gemeenten("Brasschaax", limit=2)
+        assert first.score == second.score
+        assert isinstance(first.item, adressenregister.Gemeente)
+        assert isinstance(second.item, adressenregister.Deelgemeente)
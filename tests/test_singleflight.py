@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.singleflight import SingleFlight
+from crabpy.stats import Statistics
+
+
+def run_together(fn, count=10):
+    with ThreadPoolExecutor(count) as executor:
+        futures = [executor.submit(fn) for _ in range(count)]
+        return [future.exception() or future.result() for future in futures]
+
+
+def in_flight(flight, key, result=None, error=None, followers=4):
+    """
+    Call `flight.do` from a leader that blocks until the followers called too.
+    """
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        if error is not None:
+            raise error
+        return result
+
+    executor = ThreadPoolExecutor(followers + 1)
+    futures = [executor.submit(flight.do, key, call)]
+    started.wait(5)
+    futures += [executor.submit(flight.do, key, call) for _ in range(followers)]
+    time.sleep(0.1)
+    release.set()
+    executor.shutdown()
+    return calls, futures
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_result(self):
+        calls, futures = in_flight(SingleFlight(), "key", result={"id": 1})
+        assert len(calls) == 1
+        results = [future.result() for future in futures]
+        assert all(result is results[0] for result in results)
+
+    def test_exception_is_shared(self):
+        calls, futures = in_flight(SingleFlight(), "key", error=ValueError("boom"))
+        assert len(calls) == 1
+        assert all(isinstance(f.exception(), ValueError) for f in futures)
+
+    def test_coalesced_calls_are_counted(self):
+        flight = SingleFlight()
+        stats = Statistics("test")
+        started = threading.Event()
+        release = threading.Event()
+
+        def call():
+            started.set()
+            release.wait(5)
+
+        with ThreadPoolExecutor(2) as executor:
+            executor.submit(flight.do, "key", call)
+            started.wait(5)
+            follower = executor.submit(flight.do, "key", call, stats)
+            time.sleep(0.1)
+            release.set()
+        follower.result()
+        assert stats.snapshot()["counters"] == {"coalesced_requests": 1}
+
+    def test_not_remembered(self):
+        flight = SingleFlight()
+        assert flight.do("key", lambda: 1) == 1
+        assert flight.do("key", lambda: 2) == 2
+
+    def test_unhashable_key(self):
+        flight = SingleFlight()
+        assert flight.do({"a": 1}.items(), lambda: 1) == 1
+        assert flight.do([1], lambda: 2) == 2
+
+
+def test_client_coalesces_requests(fake_server):
+    server = fake_server(straten=1, adressen=1, latency=0.2)
+    client = AdressenRegisterClient(server.url, "key")
+    client.stats = Statistics("adressenregister")
+    results = run_together(lambda: client.get_straatnaam("1"))
+    assert all(result == results[0] for result in results)
+    coalesced = client.stats.snapshot()["counters"]["coalesced_requests"]
+    assert server.counts["requests"] + coalesced == 10
+    assert server.counts["requests"] < 10
+    results = run_together(lambda: client.get_adressen(straatnaamObjectId="1"))
+    assert all(len(result) == 1 for result in results)
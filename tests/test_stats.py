@@ -0,0 +1,120 @@
+import pytest
+
+from crabpy.stats import Histogram
+from crabpy.stats import PrometheusCollector
+from crabpy.stats import Statistics
+from crabpy.stats import endpoint_name
+from crabpy.stats import method_name
+from crabpy.stats import to_openmetrics
+
+
+@pytest.mark.parametrize(
+    "url,endpoint",
+    [
+        ("https://api.be/v2/gemeenten/11001", "/v2/gemeenten/{id}"),
+        ("https://api.be/v2/gemeenten?limit=500", "/v2/gemeenten"),
+        (
+            "https://geo.be/capakey/v2/municipality/44021/department/44021/section",
+            "/capakey/v2/municipality/{id}/department/{id}/section",
+        ),
+        ("https://api.be/v2/percelen/13013C0384-02G005", "/v2/percelen/{id}"),
+    ],
+)
+def test_endpoint_name(url, endpoint):
+    assert endpoint_name(url) == endpoint
+
+
+@pytest.mark.parametrize(
+    "key,method",
+    [
+        ("get_gemeente_by_id_rest#44021", "get_gemeente_by_id_rest"),
+        ("ListGewesten#1", "ListGewesten"),
+        (
+            "crabpy.gateway.adressenregister:get_gemeente_by_niscode|11001",
+            "get_gemeente_by_niscode",
+        ),
+    ],
+)
+def test_method_name(key, method):
+    assert method_name(key) == method
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {0.1: 1, 1: 3, float("inf"): 4}
+    assert snapshot["count"] == 4
+    assert snapshot["sum"] == pytest.approx(4.25)
+
+
+class TestStatistics:
+    @pytest.fixture()
+    def stats(self):
+        stats = Statistics("capakey")
+        stats.record_cache("long", "get_gemeente_by_id_rest", hit=False)
+        stats.record_cache("long", "get_gemeente_by_id_rest", hit=True)
+        stats.record_cache("long", "get_gemeente_by_id_rest", hit=True)
+        stats.record_upstream("/capakey/v2/municipality/{id}", 0.2, nbytes=100)
+        stats.record_upstream("/capakey/v2/municipality/{id}", 0.01, error=True)
+        stats.increment("retries")
+        return stats
+
+    def test_snapshot(self, stats):
+        snapshot = stats.snapshot()
+        cache = snapshot["cache"]["long"]["get_gemeente_by_id_rest"]
+        assert cache["hits"] == 2
+        assert cache["misses"] == 1
+        assert cache["hit_rate"] == pytest.approx(2 / 3)
+        upstream = snapshot["upstream"]["/capakey/v2/municipality/{id}"]
+        assert upstream["calls"] == 2
+        assert upstream["errors"] == 1
+        assert upstream["bytes"] == 100
+        assert upstream["latency"]["count"] == 2
+        assert snapshot["counters"] == {"retries": 1}
+
+    def test_reset(self, stats):
+        stats.reset()
+        assert stats.snapshot() == {"cache": {}, "upstream": {}, "counters": {}}
+
+    def test_to_openmetrics(self, stats):
+        text = stats.to_openmetrics()
+        assert "# TYPE crabpy_cache_hits counter" in text
+        assert (
+            'crabpy_cache_hits_total{gateway="capakey",region="long",'
+            'method="get_gemeente_by_id_rest"} 2'
+        ) in text
+        assert (
+            'crabpy_upstream_errors_total{gateway="capakey",'
+            'endpoint="/capakey/v2/municipality/{id}"} 1'
+        ) in text
+        assert (
+            'crabpy_upstream_latency_seconds_bucket{gateway="capakey",'
+            'endpoint="/capakey/v2/municipality/{id}",le="+Inf"} 2'
+        ) in text
+        assert 'crabpy_events_total{gateway="capakey",event="retries"} 1' in text
+        assert text.endswith("# EOF\n")
+
+    def test_to_openmetrics_multiple_gateways(self, stats):
+        other = Statistics("crab")
+        other.record_upstream("ListGewesten", 0.3)
+        text = to_openmetrics([stats, other], prefix="test")
+        assert 'test_upstream_requests_total{gateway="crab",' in text
+        assert 'test_upstream_requests_total{gateway="capakey",' in text
+
+    def test_prometheus_collector(self, stats):
+        prometheus_client = pytest.importorskip("prometheus_client")
+        registry = prometheus_client.CollectorRegistry()
+        registry.register(PrometheusCollector(stats))
+        assert (
+            registry.get_sample_value(
+                "crabpy_cache_hits_total",
+                {
+                    "gateway": "capakey",
+                    "region": "long",
+                    "method": "get_gemeente_by_id_rest",
+                },
+            )
+            == 2
+        )
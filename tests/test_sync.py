@@ -0,0 +1,195 @@
+import copy
+
+import pytest
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway import adressenregister
+from crabpy.mirror import SqliteAdressenRegisterClient
+from crabpy.mirror import build_mirror
+from crabpy.sync import CacheTarget
+from crabpy.sync import SqliteTarget
+from crabpy.sync import SyncTarget
+from crabpy.sync import Synchroniser
+
+
+@pytest.fixture()
+def server(fake_server):
+    return fake_server()
+
+
+@pytest.fixture()
+def dataset(server):
+    return server.dataset
+
+
+@pytest.fixture()
+def client(server):
+    return AdressenRegisterClient(server.url, "key")
+
+
+def renumber(dataset, adres_id, huisnummer):
+    adres = copy.deepcopy(dataset.adressen[adres_id])
+    adres["huisnummer"] = huisnummer
+    dataset.change("adressen", adres_id, adres)
+
+
+class TestFeed:
+    def test_events(self, dataset, client):
+        renumber(dataset, "200001", "1A")
+        dataset.change("straatnamen", "2")
+        events = client.get_wijzigingen("adressen")
+        assert [e["type"] for e in events] == ["basisregisters.address.update.v1"]
+        assert events[0]["data"]["objectId"] == "200001"
+        assert client.get_wijzigingen("straatnamen")[0]["id"] == "1"
+        assert client.get_wijzigingen("gebouwen") == []
+
+    def test_head(self, dataset, client):
+        synchroniser = Synchroniser(client, SyncTarget())
+        assert synchroniser.head("adressen") == 0
+        for i in range(250):
+            renumber(dataset, "200001", str(i))
+        assert synchroniser.head("adressen") == 250
+
+    def test_page_size(self, dataset, client):
+        for i in range(600):
+            renumber(dataset, "200001", str(i))
+        assert len(client.get_wijzigingen("adressen", page_size=50)) == 50
+        synchroniser = Synchroniser(client, SyncTarget(), page_size=1000)
+        with pytest.raises(ValueError):
+            synchroniser.sync()
+
+    def test_unknown_feed(self, client):
+        with pytest.raises(ValueError):
+            Synchroniser(client, SyncTarget(), collections=["gemeenten"])
+
+
+class TestSqliteTarget:
+    @pytest.fixture()
+    def mirror(self, client, tmp_path):
+        path = tmp_path / "mirror.sqlite"
+        synchroniser = Synchroniser(client, SqliteTarget(path, client.base_url))
+        synchroniser.start()
+        build_mirror(client, path)
+        return synchroniser, SqliteAdressenRegisterClient(path)
+
+    def test_sync(self, dataset, mirror):
+        synchroniser, local = mirror
+        renumber(dataset, "200001", "1A")
+        renumber(dataset, "200001", "1B")
+        added = copy.deepcopy(dataset.adressen["200002"])
+        added["identificator"]["objectId"] = "300000"
+        added["huisnummer"] = "99"
+        dataset.change("adressen", "300000", added)
+        dataset.change("straatnamen", "2")
+
+        result = synchroniser.sync()
+
+        assert result["adressen"] == {"updated": 2, "removed": 0, "position": 3}
+        assert result["straatnamen"] == {"updated": 0, "removed": 1, "position": 1}
+        assert local.get_adres("200001")["huisnummer"] == "1B"
+        adressen = local.get_adressen(straatnaamObjectId="1")
+        assert adressen[-1]["huisnummer"] == "99"
+        assert local.get_adressen(huisnummer="99")[0]["detail"].endswith(
+            "/v2/adressen/300000"
+        )
+        with pytest.raises(AdressenRegisterClientException):
+            local.get_straatnaam("2")
+        assert synchroniser.sync()["adressen"] == {
+            "updated": 0,
+            "removed": 0,
+            "position": 3,
+        }
+
+    def test_gateway_on_synced_mirror(self, dataset, mirror):
+        synchroniser, local = mirror
+        straat = copy.deepcopy(dataset.straatnamen["1"])
+        straat["straatnamen"][0]["spelling"] = "Nieuwstraat"
+        dataset.change("straatnamen", "1", straat)
+        synchroniser.sync()
+        gateway = adressenregister.Gateway(local)
+        assert gateway.list_straten("11001")[-1].naam() == "Nieuwstraat"
+
+    def test_many_pages(self, dataset, mirror):
+        synchroniser, local = mirror
+        for i in range(250):
+            renumber(dataset, "200003", str(i))
+        result = synchroniser.sync()
+        assert result["adressen"] == {"updated": 3, "removed": 0, "position": 250}
+        assert local.get_adres("200003")["huisnummer"] == "249"
+
+    def test_niscodes(self, fake_server, tmp_path):
+        server = fake_server(gemeenten=2)
+        dataset = server.dataset
+        client = AdressenRegisterClient(server.url, "key")
+        path = tmp_path / "mirror.sqlite"
+        target = SqliteTarget(path, client.base_url)
+        synchroniser = Synchroniser(client, target, collections=["adressen"])
+        synchroniser.start()
+        build_mirror(client, path, collections=["adressen"], niscodes=["11001"])
+        local = SqliteAdressenRegisterClient(path)
+        renumber(dataset, "200001", "1A")
+        renumber(dataset, "200007", "7A")
+        moved = copy.deepcopy(dataset.adressen["200002"])
+        moved["gemeente"] = copy.deepcopy(dataset.adressen["200007"]["gemeente"])
+        dataset.change("adressen", "200002", moved)
+        requests = server.counts["requests"]
+
+        result = synchroniser.sync()
+
+        assert result["adressen"] == {"updated": 1, "removed": 0, "position": 3}
+        # Two pages of the feed and the detail of the one adres in scope
+        assert server.counts["requests"] - requests == 3
+        assert target.scope("adressen") == {"11001"}
+        assert local.get_adres("200001")["huisnummer"] == "1A"
+        for adres_id in ("200002", "200007"):
+            with pytest.raises(AdressenRegisterClientException):
+                local.get_adres(adres_id)
+        local.close()
+
+    def test_removed_before_fetch(self, dataset, mirror):
+        synchroniser, local = mirror
+        renumber(dataset, "200001", "1A")
+        del dataset.adressen["200001"]
+        assert synchroniser.sync()["adressen"]["removed"] == 1
+        with pytest.raises(AdressenRegisterClientException):
+            local.get_adres("200001")
+
+
+class TestCacheTarget:
+    @pytest.fixture()
+    def gateway(self, client):
+        cache_settings = {
+            "long.backend": "dogpile.cache.memory",
+            "short.backend": "dogpile.cache.memory",
+            "notfound.backend": "dogpile.cache.memory",
+        }
+        yield adressenregister.Gateway(client, cache_settings=cache_settings)
+        adressenregister.setup_cache(
+            {
+                "long.backend": "dogpile.cache.null",
+                "short.backend": "dogpile.cache.null",
+                "notfound.backend": "dogpile.cache.null",
+            },
+            None,
+        )
+
+    def test_sync(self, dataset, client, gateway, server):
+        synchroniser = Synchroniser(client, CacheTarget(gateway))
+        synchroniser.start()
+        assert gateway.get_adres_by_id("200001").huisnummer == "1"
+        with pytest.raises(AdressenRegisterClientException):
+            gateway.get_adres_by_id("300000")
+        gateway.get_straat_by_id("2")
+
+        renumber(dataset, "200001", "1A")
+        dataset.change("adressen", "300000", copy.deepcopy(dataset.adressen["200002"]))
+        dataset.change("straatnamen", "2")
+        synchroniser.sync()
+
+        requests = server.counts["requests"]
+        assert gateway.get_adres_by_id("200001").huisnummer == "1A"
+        assert gateway.get_adres_by_id("300000").huisnummer == "2"
+        assert server.counts["requests"] == requests
+        with pytest.raises(AdressenRegisterClientException):
+            gateway.get_straat_by_id("2")
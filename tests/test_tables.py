@@ -0,0 +1,113 @@
+import io
+import math
+import pickle
+
+import pytest
+
+from crabpy.gateway.adressenregister import Adres
+from crabpy.tables import CATEGORY
+from crabpy.tables import Column
+from crabpy.tables import FLOAT64
+from crabpy.tables import STRING
+from crabpy.tables import Schema
+from crabpy.tables import Table
+from crabpy.tables import write_parquet
+
+
+def adres(object_id, status="inGebruik", point=None):
+    item = {
+        "identificator": {
+            "id": f"https://data.vlaanderen.be/id/adres/{object_id}",
+            "objectId": str(object_id),
+        },
+        "volledigAdres": {
+            "geografischeNaam": {"spelling": f"Kerkstraat {object_id}, 2630 Aartselaar"}
+        },
+        "huisnummer": str(object_id),
+        "adresStatus": status,
+    }
+    if point is not None:
+        item["adresPositie"] = {"point": {"coordinates": point, "type": "Point"}}
+    return item
+
+
+@pytest.fixture()
+def table():
+    return Table(
+        Adres.table_schema(),
+        [
+            adres(1, point=[150000.5, 200000.25]),
+            adres(2, status="gehistoreerd"),
+            adres(3, point=[150010, 200010]),
+        ],
+    )
+
+
+class TestTable:
+    def test_columns(self, table):
+        assert len(table) == 3
+        assert table["id"] == ["1", "2", "3"]
+        assert table["label"][0] == "Kerkstraat 1, 2630 Aartselaar"
+        assert table["busnummer"] == ["", "", ""]
+        assert table["status"] == ["inGebruik", "gehistoreerd", "inGebruik"]
+        assert table["x"].typecode == "d"
+        assert table["x"][0] == 150000.5
+        assert math.isnan(table["x"][1])
+        assert table["y"][2] == 200010.0
+
+    def test_schema_keys(self):
+        schema = Adres.table_schema(("id", "label", "x"))
+        assert schema.names == ("id", "label", "x")
+        assert schema.keys == ("identificator", "volledigAdres", "adresPositie")
+        assert Schema([Column("id", STRING, lambda item: item)]).keys is None
+
+    def test_unknown_column(self):
+        with pytest.raises(ValueError):
+            Adres.table_schema(("id", "gemeente"))
+        with pytest.raises(ValueError):
+            Column("id", "int8", None)
+        with pytest.raises(ValueError):
+            Adres.table_schema(())
+
+    def test_empty(self):
+        assert len(Table(Adres.table_schema())) == 0
+
+    def test_pickle(self, table):
+        copy = pickle.loads(pickle.dumps(table))
+        assert copy.columns["id"] == table.columns["id"]
+        assert copy.columns["x"][0] == 150000.5
+
+    def test_to_arrow(self, table):
+        pyarrow = pytest.importorskip("pyarrow")
+        arrow = table.to_arrow()
+        assert arrow.num_rows == 3
+        assert arrow.schema.field("x").type == pyarrow.float64()
+        assert pyarrow.types.is_dictionary(arrow.schema.field("status").type)
+        assert arrow.column("id").to_pylist() == ["1", "2", "3"]
+
+    def test_to_pandas(self, table):
+        pytest.importorskip("pandas")
+        df = table.to_pandas()
+        assert list(df.columns) == list(Adres.column_types)
+        assert df["x"].dtype == "float64"
+        assert df["status"].dtype == "category"
+        assert df["id"].tolist() == ["1", "2", "3"]
+
+
+def test_write_parquet():
+    pytest.importorskip("pyarrow")
+    parquet = pytest.importorskip("pyarrow.parquet")
+    schema = Schema(
+        [
+            Column("id", STRING, lambda item: item["identificator"]["objectId"]),
+            Column("status", CATEGORY, lambda item: item["adresStatus"]),
+            Column("x", FLOAT64, lambda item: None),
+        ]
+    )
+    where = io.BytesIO()
+    rows = write_parquet(schema, (adres(i) for i in range(25)), where, batch_size=10)
+    assert rows == 25
+    where.seek(0)
+    result = parquet.ParquetFile(where)
+    assert result.metadata.num_row_groups == 3
+    assert result.read().column("id").to_pylist() == [str(i) for i in range(25)]
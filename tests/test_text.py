@@ -0,0 +1,57 @@
+import pytest
+
+from crabpy.text import clean
+from crabpy.text import normalise
+from crabpy.text import parse_address
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("  Kerkstr.   12", "Kerkstraat 12"),
+        ("Kerkstr 12", "Kerkstraat 12"),
+        ("Brusselse stwg. 3", "Brusselse steenweg 3"),
+        ("Gentse Ln. 3", "Gentse laan 3"),
+        ("Koning Albertpl.", "Koning Albertplein"),
+        ("St.-Pietersnieuwstraat", "Sint-Pietersnieuwstraat"),
+        ("Strijdersstraat", "Strijdersstraat"),
+    ],
+)
+def test_clean(text, expected):
+    assert clean(text) == expected
+
+
+def test_normalise():
+    assert normalise("Sint-Pietersstr. ") == normalise("st. pietersstraat")
+    assert normalise("Hélène  Dutrieu") == "helene dutrieu"
+    assert normalise(None) is None
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            "Kerkstraat 12 bus 3, 9000 Gent",
+            {
+                "straatnaam": "Kerkstraat",
+                "huisnummer": "12",
+                "busnummer": "3",
+                "postcode": "9000",
+                "gemeentenaam": "Gent",
+            },
+        ),
+        ("Kerkstr. 12a", {"straatnaam": "Kerkstraat", "huisnummer": "12A"}),
+        (
+            "Brusselse stwg 12/3 Gent",
+            {
+                "straatnaam": "Brusselse steenweg",
+                "huisnummer": "12",
+                "busnummer": "3",
+                "gemeentenaam": "Gent",
+            },
+        ),
+        ("Groenplaats", None),
+    ],
+)
+def test_parse_address(text, expected):
+    assert parse_address(text) == expected
@@ -0,0 +1,147 @@
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway.capakey import capakey_rest_gateway_request
+from crabpy.gateway.exception import GatewayRuntimeException
+from crabpy.stats import Statistics
+from crabpy.timeouts import DeadlineExceeded
+from crabpy.timeouts import Hedging
+from crabpy.timeouts import deadline
+from crabpy.timeouts import remaining
+
+
+def test_deadline():
+    assert remaining() is None
+    with deadline(10):
+        assert 9 < remaining() <= 10
+        with deadline(20):
+            assert remaining() <= 10
+        with deadline(1):
+            assert remaining() <= 1
+    assert remaining() is None
+
+
+def test_deadline_in_thread():
+    with deadline(10):
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(remaining()))
+        thread.start()
+        thread.join()
+    assert seen == [None]
+
+
+class TestHedging:
+    def test_slow_request_is_hedged(self):
+        hedging = Hedging(delay=0.05)
+        stats = Statistics("test")
+        calls = []
+
+        def call():
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        assert hedging.call("/v2/adressen", call, stats=stats) == "fast"
+        assert stats.snapshot()["counters"] == {
+            "hedged_requests": 1,
+            "hedged_requests_won": 1,
+        }
+
+    def test_losing_response_is_closed(self):
+        hedging = Hedging(delay=0.05)
+        responses = [Mock(), Mock()]
+        closed = threading.Event()
+        responses[0].close.side_effect = lambda: closed.set()
+
+        def call():
+            response = responses.pop(0)
+            if response.close.side_effect:
+                time.sleep(0.2)
+            return response
+
+        winner = hedging.call("/v2/adressen", call)
+        assert closed.wait(1)
+        winner.close.assert_not_called()
+
+    def test_deadline_in_hedged_requests(self):
+        hedging = Hedging(delay=0.05)
+        seen = []
+
+        def call():
+            seen.append(remaining())
+            if len(seen) == 1:
+                time.sleep(0.2)
+            return "done"
+
+        with deadline(10):
+            assert hedging.call("/v2/adressen", call) == "done"
+        assert len(seen) == 2
+        assert all(left is not None and left <= 10 for left in seen)
+
+    def test_fast_request_is_not_hedged(self):
+        hedging = Hedging(delay=0.5)
+        stats = Statistics("test")
+        assert hedging.call("/v2/adressen", lambda: "fast", stats=stats) == "fast"
+        assert stats.snapshot()["counters"] == {}
+
+    def test_errors(self):
+        hedging = Hedging(delay=0.01)
+
+        def fail():
+            time.sleep(0.05)
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            hedging.call("/v2/adressen", fail)
+
+    def test_percentile_delay(self):
+        hedging = Hedging(percentile=0.9, delay=1, min_delay=0.001, min_samples=10)
+        for i in range(1, 10):
+            hedging.observe("/v2/adressen", i / 100)
+        assert hedging.delay_for("/v2/adressen") == 1
+        hedging.observe("/v2/adressen", 0.1)
+        assert hedging.delay_for("/v2/adressen") == 0.1
+        assert hedging.delay_for("/v2/gebouwen") == 1
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(straten=1, latency=0.3)
+
+
+class TestClient:
+    def test_deadline(self, server):
+        client = AdressenRegisterClient(server.url, "key")
+        with deadline(0.05):
+            with pytest.raises(AdressenRegisterClientException) as e:
+                client.get_adres("200001")
+        assert isinstance(e.value.__cause__, requests.Timeout)
+
+    def test_deadline_passed(self, server):
+        client = AdressenRegisterClient(server.url, "key")
+        requests_before = server.counts["requests"]
+        with deadline(0):
+            with pytest.raises(AdressenRegisterClientException) as e:
+                client.get_adressen(straatnaamObjectId="1")
+        assert isinstance(e.value.__cause__, DeadlineExceeded)
+        assert server.counts["requests"] == requests_before
+
+    def test_hedging(self, server):
+        client = AdressenRegisterClient(server.url, "key", hedging=Hedging(delay=0.1))
+        client.stats = Statistics("adressenregister")
+        assert client.get_adres("200001")["huisnummer"] == "1"
+        assert client.stats.snapshot()["counters"]["hedged_requests"] == 1
+
+
+def test_capakey_deadline_passed():
+    with deadline(0):
+        with pytest.raises(GatewayRuntimeException):
+            capakey_rest_gateway_request("http://localhost:1/capakey/v2/gemeente")
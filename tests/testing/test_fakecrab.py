@@ -0,0 +1,108 @@
+import pytest
+
+from crabpy.client import crab_factory
+from crabpy.gateway.crab import CrabGateway
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from crabpy.gateway.exception import GatewayRuntimeException
+from crabpy.testing.fakecrab import CrabDataset
+from crabpy.testing.fakecrab import FakeCrabServer
+from crabpy.testing.fakecrab import load_test
+from crabpy.testing.loadtest import run_load_test
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    return CrabDataset(straten=5, huisnummers=4)
+
+
+@pytest.fixture(scope="module")
+def server(dataset):
+    with FakeCrabServer(dataset, seed=1) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def gateway(server):
+    return CrabGateway(crab_factory(wsdl=server.wsdl_url, cache=None))
+
+
+class TestCrabDataset:
+    def test_ids_are_derived(self, dataset):
+        straat = dataset.get_straat(7)
+        assert straat["GemeenteId"] == 2
+        assert [h["HuisnummerId"] for h in dataset.list_huisnummers(2)] == [5, 6, 7, 8]
+        assert dataset.get_huisnummer(8)["StraatnaamId"] == 2
+
+    def test_unknown_ids(self, dataset):
+        assert dataset.get_gemeente(0) is None
+        assert dataset.get_straat(len(dataset.straat_ids) + 1) is None
+        assert dataset.list_huisnummers(0) == []
+
+
+class TestCrabGateway:
+    def test_gemeenten(self, gateway, dataset):
+        gemeenten = gateway.list_gemeenten(2)
+        assert len(gemeenten) == sum(
+            1 for g in dataset.gemeenten.values() if g["GewestId"] == 2
+        )
+        gemeente = gateway.get_gemeente_by_niscode(44021)
+        assert gemeente.naam == "Gent"
+        assert gemeente.metadata.begin_organisatie.naam == "gemeente"
+
+    def test_straten_and_huisnummers(self, gateway):
+        gemeente = gateway.get_gemeente_by_niscode(44021)
+        straten = gateway.list_straten(gemeente)
+        assert [s.label for s in straten][:2] == ["Kerkstraat", "Stationsstraat"]
+        straat = gateway.get_straat_by_id(straten[1].id)
+        assert straat.gemeente_id == gemeente.id
+        huisnummers = gateway.list_huisnummers_by_straat(straat)
+        assert len(huisnummers) == 4
+        huisnummer = gateway.get_huisnummer_by_id(huisnummers[0].id)
+        assert huisnummer.huisnummer == "1"
+        assert huisnummer.straat_id == straat.id
+
+    def test_tweede_taal(self, gateway):
+        straat = gateway.list_straten(1)[0]
+        assert straat.label == "Kerkstraat - Kerkstraat"
+        assert straat.namen[1] == ("Kerkstraat", "fr")
+
+    def test_code_lists(self, gateway):
+        assert [t.id for t in gateway.list_talen()] == ["nl", "fr", "de"]
+        assert len(gateway.list_statushuisnummers()) == 5
+
+    def test_not_found(self, gateway):
+        with pytest.raises(GatewayResourceNotFoundException):
+            gateway.get_huisnummer_by_id(10**9)
+
+    def test_fault(self, dataset):
+        with FakeCrabServer(dataset, error_rate=1) as server:
+            gateway = CrabGateway(crab_factory(wsdl=server.wsdl_url, cache=None))
+            with pytest.raises(GatewayRuntimeException):
+                gateway.list_talen()
+            assert server.counts["ListTalen"] == 1
+
+
+class TestLoadTest:
+    def test_load_test(self, server):
+        result = load_test(server, concurrency=2, requests=10)
+        assert result.requests == 10
+        assert not result.errors
+        assert result.throughput > 0
+        assert result.percentile(50) <= result.percentile(99)
+
+    def test_errors_are_counted(self):
+        def operation(state, index):
+            if index % 2:
+                raise ValueError(index)
+
+        result = run_load_test(operation, concurrency=3, requests=10)
+        assert result.requests == 10
+        assert result.errors == {"ValueError": 5}
+        assert "5 x ValueError" in str(result)
+
+    def test_setup_failure(self):
+        def setup():
+            raise RuntimeError("no client")
+
+        with pytest.raises(RuntimeError):
+            run_load_test(lambda state, index: None, concurrency=2, setup=setup)
@@ -0,0 +1,164 @@
+import socket
+import struct
+import time
+
+import pytest
+import requests
+
+from crabpy.client import AdressenRegisterClient
+from crabpy.client import AdressenRegisterClientException
+from crabpy.gateway import adressenregister
+from crabpy.gateway.capakey import CapakeyRestGateway
+from crabpy.gateway.exception import GatewayResourceNotFoundException
+from crabpy.testing.fakeserver import Dataset
+from crabpy.testing.fakeserver import FakeServer
+
+
+@pytest.fixture(scope="module")
+def server(module_fake_server):
+    return module_fake_server(gemeenten=2, straten=3, adressen=10, seed=1)
+
+
+@pytest.fixture(scope="module")
+def dataset(server):
+    return server.dataset
+
+
+@pytest.fixture()
+def client(server):
+    return AdressenRegisterClient(server.url, "key")
+
+
+@pytest.fixture()
+def gateway(client):
+    return adressenregister.Gateway(client)
+
+
+@pytest.fixture()
+def capakey_gateway(server):
+    return CapakeyRestGateway(base_url=server.capakey_url)
+
+
+class TestDataset:
+    def test_generate(self, dataset):
+        assert len(dataset.gemeenten) == 2
+        assert len(dataset.straatnamen) == 6
+        assert len(dataset.adressen) == 60
+        assert len(dataset.percelen) == 60
+        assert len(dataset.parcels) == 60
+        assert len(dataset.gebouwen) == 30
+        assert len(dataset.postinfo) == 2
+
+    def test_generate_is_deterministic(self, dataset):
+        other = Dataset.generate(gemeenten=2, straten=3, adressen=10, shape_vertices=8)
+        assert other.adressen == dataset.adressen
+
+
+class TestAdressenRegister:
+    def test_list(self, client, dataset):
+        niscode = next(iter(dataset.gemeenten))
+        assert len(client.get_gemeenten()) == 2
+        assert len(client.get_straatnamen(niscode=niscode)) == 3
+        assert len(client.get_adressen(straatnaamObjectId="1")) == 10
+        assert len(client.get_postinfos()) == 2
+        assert len(client.get_percelen()) == 60
+        assert len(client.get_gebouwen()) == 30
+
+    def test_pagination(self, client, server):
+        before = server.counts["requests"]
+        adressen = client._get_list("/v2/adressen", "adressen", params={"limit": 7})
+        assert len(adressen) == 60
+        assert len({a["identificator"]["objectId"] for a in adressen}) == 60
+        assert server.counts["requests"] - before == 9
+
+    def test_gateway(self, gateway):
+        straat = gateway.get_straat_by_id("1")
+        adressen = gateway.list_adressen_by_straat(straat)
+        assert len(adressen) == 10
+        adres = gateway.get_adres_by_id(adressen[0].id)
+        assert adres.straat.id == "1"
+        assert adres.label.startswith(straat.naam())
+        perceel = gateway.list_percelen_with_params(adresObjectId=adres.id)[0]
+        assert [a.id for a in perceel.adressen] == [adres.id]
+        gebouw = gateway.get_gebouw_by_id("5000001")
+        assert len(gebouw.percelen) == 2
+        assert gateway.get_postinfo_by_id("1000").namen()
+
+    def test_not_found(self, client):
+        with pytest.raises(AdressenRegisterClientException):
+            client.get_adres("1")
+
+    def test_adresmatch(self, client, dataset):
+        adres = dataset.adressen["200001"]
+        straatnaam = adres["straatnaam"]["straatnaam"]["geografischeNaam"]["spelling"]
+        result = client.get_adres_match(
+            niscode=adres["gemeente"]["objectId"],
+            straatnaam=straatnaam.upper(),
+            huisnummer="1",
+        )
+        assert [m["identificator"]["objectId"] for m in result["adresMatches"]] == [
+            "200001"
+        ]
+
+
+class TestCapakey:
+    def test_gateway(self, capakey_gateway, dataset):
+        gemeenten = capakey_gateway.list_gemeenten()
+        assert len(gemeenten) == 2
+        gemeente = capakey_gateway.get_gemeente_by_id(gemeenten[0].id)
+        assert gemeente.centroid is not None
+        (afdeling,) = capakey_gateway.list_kadastrale_afdelingen_by_gemeente(gemeente)
+        afdeling = capakey_gateway.get_kadastrale_afdeling_by_id(afdeling.id)
+        (sectie,) = capakey_gateway.list_secties_by_afdeling(afdeling)
+        sectie = capakey_gateway.get_sectie_by_id_and_afdeling(sectie.id, afdeling)
+        percelen = capakey_gateway.list_percelen_by_sectie(sectie)
+        assert len(percelen) == 30
+        perceel = capakey_gateway.get_perceel_by_capakey(percelen[0].capakey)
+        assert perceel.adres == dataset.parcels[perceel.capakey]["adres"]
+        x, y = perceel.centroid
+        by_coordinates = capakey_gateway.get_perceel_by_coordinates(x, y)
+        assert by_coordinates.capakey == perceel.capakey
+
+    def test_not_found(self, capakey_gateway):
+        with pytest.raises(GatewayResourceNotFoundException):
+            capakey_gateway.get_perceel_by_capakey("99999A0001/00A000")
+
+
+class TestFaults:
+    def test_error_rate(self, dataset):
+        with FakeServer(dataset, error_rate=1) as server:
+            response = requests.get(f"{server.url}/v2/gemeenten")
+        assert response.status_code == 503
+        assert server.counts[503] == 1
+
+    def test_throttle_rate(self, dataset):
+        with FakeServer(dataset, throttle_rate=1, retry_after=3) as server:
+            response = requests.get(f"{server.url}/v2/gemeenten")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "3"
+
+    def test_max_requests_per_second(self, dataset):
+        with FakeServer(dataset, max_requests_per_second=2) as server:
+            statuses = [
+                requests.get(f"{server.capakey_url}/municipality").status_code
+                for _ in range(6)
+            ]
+        assert 429 in statuses
+
+    def test_latency(self, dataset):
+        with FakeServer(dataset, latency=(0.05, 0.06)) as server:
+            response = requests.get(f"{server.url}/v2/gemeenten")
+        assert response.elapsed.total_seconds() >= 0.05
+
+    def test_early_disconnect_is_quiet(self, dataset, capfd):
+        with FakeServer(dataset, latency=0.05) as server:
+            with socket.create_connection((server.host, server.port)) as sock:
+                sock.sendall(b"GET /v2/gemeenten HTTP/1.1\r\nHost: test\r\n\r\n")
+                # Close with a reset instead of a graceful shutdown.
+                sock.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                )
+            while not server.counts[200]:
+                time.sleep(0.01)
+            time.sleep(0.1)
+        assert "Traceback" not in capfd.readouterr().err